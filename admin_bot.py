@@ -6,6 +6,13 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
+
+from app.bot.render import PARSE_MODE
+from app.bot.sender import SendScheduler
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.broadcast import broadcast_engine
 
 # Настройка логирования
 logging.basicConfig(
@@ -323,6 +330,108 @@ async def order_status_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     # Возвращаемся к управлению заказом
     await order_manage_handler(update, context)
 
+def format_broadcast_progress(progress):
+    eta = progress['eta_seconds']
+    status = "⏹️ Остановлена" if progress['cancelled'] else ("✅ Завершена" if not progress['remaining'] else "📤 Идет")
+    text = f"""📧 *Рассылка #{progress['broadcast_id']}* - {status}
+
+• Отправлено: {progress['sent']} из {progress['total']}
+• Не доставлено: {progress['failed']} (заблокировали бота: {progress['blocked']})
+• Осталось: {progress['remaining']}
+• Скорость: {progress['rate']} сообщ./с
+• Осталось времени: {f"{eta // 60} мин {eta % 60} с" if eta is not None else "-"}"""
+    if progress['unconfirmed']:
+        text += f"\n• Без подтверждения после сбоя: {progress['unconfirmed']}"
+    return text
+
+async def users_broadcast_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("❌ Нет прав доступа")
+        return
+    
+    context.user_data["broadcast_draft"] = True
+    keyboard = [[InlineKeyboardButton("🔙 Отмена", callback_data="admin_users")]]
+    
+    await query.edit_message_text(
+        "📧 *Новая рассылка*\n\nОтправьте текст сообщения для всех пользователей.\n"
+        "Разметка MarkdownV2: `*жирный*`, `_курсив_`; `{first_name}` - имя получателя.",
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def broadcast_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if not is_admin(user_id) or not context.user_data.pop("broadcast_draft", False):
+        return
+    
+    text = update.message.text
+    try:
+        # Черновик в БД создается, только если Telegram принял текст превью
+        preview = broadcast_engine.preview(text)
+        await update.message.reply_text(preview, parse_mode=PARSE_MODE)
+        broadcast = await broadcast_engine.create(text, created_by=user_id)
+    except (ValueError, BadRequest) as e:
+        context.user_data["broadcast_draft"] = True
+        await update.message.reply_text(f"❌ Текст не подходит: {e}\nОтправьте исправленный текст.")
+        return
+    
+    keyboard = [
+        [InlineKeyboardButton("🚀 Запустить", callback_data=f"broadcast_start_{broadcast.id}")],
+        [InlineKeyboardButton("❌ Отменить", callback_data=f"broadcast_cancel_{broadcast.id}")]
+    ]
+    await update.message.reply_text(
+        f"👆 Так увидят сообщение пользователи. Запустить рассылку #{broadcast.id}?",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+async def broadcast_start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_admin(query.from_user.id):
+        await query.edit_message_text("❌ Нет прав доступа")
+        return
+    
+    broadcast_id = int(query.data.split("_")[2])  # broadcast_start_15
+    message = query.message
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⏹️ Остановить", callback_data=f"broadcast_cancel_{broadcast_id}")]])
+    
+    async def report(progress):
+        # Ход рассылки - правкой одного сообщения
+        finished = progress['cancelled'] or not progress['remaining']
+        await message.edit_text(
+            format_broadcast_progress(progress),
+            parse_mode=ParseMode.MARKDOWN,
+            reply_markup=None if finished else keyboard
+        )
+    
+    await message.edit_text(f"📧 Рассылка #{broadcast_id} запускается...", reply_markup=keyboard)
+    broadcast_engine.launch(broadcast_id, on_progress=report)
+    logger.info(f"Админ {query.from_user.id} запустил рассылку {broadcast_id}")
+
+async def broadcast_cancel_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    
+    if not is_admin(query.from_user.id):
+        await query.answer("❌ Нет прав доступа")
+        return
+    
+    broadcast_id = int(query.data.split("_")[2])  # broadcast_cancel_15
+    cancelled = await broadcast_engine.cancel(broadcast_id)
+    await query.answer("Рассылка остановлена" if cancelled else "Рассылка уже завершена")
+    if broadcast_engine.progress(broadcast_id) is None:
+        await query.edit_message_text(f"📧 Рассылка #{broadcast_id} отменена")
+
+async def post_init(application: Application):
+    # Рассылки уходят от клиентского бота в пределах его доли CAMPAIGN_RATE; прерванные продолжаются здесь
+    broadcast_engine.start(AsyncSessionLocal, resume=True, rate=settings.CAMPAIGN_RATE)
+
+async def post_shutdown(application: Application):
+    await broadcast_engine.stop()
+
 async def admin_main_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -356,7 +465,14 @@ def main():
     print("🔧 Запуск админ-панели FoodDelivery...")
     logger.info("Инициализация админ-бота")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(SendScheduler())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Основные обработчики
     application.add_handler(CommandHandler("admin", start_handler))
@@ -373,6 +489,12 @@ def main():
     # Управление ресторанами
     application.add_handler(CallbackQueryHandler(restaurant_toggle_handler, pattern="^restaurant_toggle_"))
     
+    # Рассылки
+    application.add_handler(CallbackQueryHandler(users_broadcast_handler, pattern="^users_broadcast$"))
+    application.add_handler(CallbackQueryHandler(broadcast_start_handler, pattern=r"^broadcast_start_\d+$"))
+    application.add_handler(CallbackQueryHandler(broadcast_cancel_handler, pattern=r"^broadcast_cancel_\d+$"))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, broadcast_text_handler))
+    
     logger.info("Админ-панель запущена!")
     print("✅ Админ-панель @FoodDeliveryV8_Bot запущена!")
     print("👨‍💼 Команда для админов: /admin")
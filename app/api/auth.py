@@ -5,9 +5,10 @@ API для аутентификации
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from app.core.database import get_db
+from app.api.deps import get_current_user_id, get_telegram_init_data
 from app.services.auth_service import AuthService
 
 router = APIRouter()
@@ -18,6 +19,7 @@ class TelegramAuthData(BaseModel):
     username: Optional[str] = None
     first_name: Optional[str] = None
     last_name: Optional[str] = None
+    photo_url: Optional[str] = None
     auth_date: int
     hash: str
 
@@ -37,8 +39,10 @@ async def telegram_auth(
     """Аутентификация через Telegram"""
     service = AuthService(db)
     
-    # Проверяем подлинность данных от Telegram
-    if not service.verify_telegram_auth(auth_data.dict()):
+    # Проверяем подлинность данных от Telegram (виджет подписывает поле id)
+    widget_fields = auth_data.dict(exclude={"telegram_id"})
+    widget_fields["id"] = auth_data.telegram_id
+    if not service.verify_telegram_auth(widget_fields):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid Telegram authentication data"
@@ -57,9 +61,41 @@ async def telegram_auth(
     )
 
 
+@router.post("/webapp", response_model=AuthResponse)
+async def webapp_auth(
+    init_data: Dict[str, Any] = Depends(get_telegram_init_data),
+    db: AsyncSession = Depends(get_db)
+):
+    """Аутентификация Telegram WebApp по initData"""
+    telegram_user = init_data.get("user")
+    if not isinstance(telegram_user, dict) or "id" not in telegram_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Telegram WebApp data has no user"
+        )
+    
+    service = AuthService(db)
+    
+    # Подпись initData уже проверена зависимостью
+    user, is_new = await service.get_or_create_user(TelegramAuthData(
+        telegram_id=telegram_user["id"],
+        username=telegram_user.get("username"),
+        first_name=telegram_user.get("first_name"),
+        last_name=telegram_user.get("last_name"),
+        auth_date=init_data["auth_date"],
+        hash=""
+    ))
+    
+    return AuthResponse(
+        access_token=service.create_access_token(user.id),
+        user_id=user.id,
+        is_new_user=is_new
+    )
+
+
 @router.post("/refresh")
 async def refresh_token(
-    user_id: int,  # Получаем из текущего токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновить токен доступа"""
@@ -0,0 +1,126 @@
+"""
+API корзины пользователя Telegram WebApp
+"""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_telegram_user_id
+from app.core.database import get_db
+from app.models import MenuItem, Restaurant
+from app.services.cart import Cart, cart_service
+
+router = APIRouter()
+
+
+class CartItemAdd(BaseModel):
+    menu_item_id: int
+    quantity: int = 1
+
+
+class CartLineResponse(BaseModel):
+    item_id: str
+    name: str
+    price: float
+    quantity: int
+    total: float
+    restaurant: Optional[str] = None
+
+
+class CartResponse(BaseModel):
+    items: List[CartLineResponse]
+    total: float
+    count: int
+
+
+def cart_response(cart: Cart) -> CartResponse:
+    """Ответ с корзиной; итоги берутся готовыми"""
+    return CartResponse(
+        items=[
+            CartLineResponse(
+                item_id=item_id,
+                name=line.name,
+                price=line.price,
+                quantity=line.quantity,
+                total=line.total,
+                restaurant=line.restaurant
+            )
+            for item_id, line in cart
+        ],
+        total=cart.total,
+        count=cart.count
+    )
+
+
+@router.get("", response_model=CartResponse)
+async def get_cart(telegram_id: int = Depends(get_telegram_user_id)):
+    """Корзина текущего пользователя"""
+    return cart_response(await cart_service.get(telegram_id))
+
+
+@router.post("/items", response_model=CartResponse)
+async def add_cart_item(
+    item: CartItemAdd,
+    telegram_id: int = Depends(get_telegram_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Добавить блюдо в корзину по текущей цене меню"""
+    result = await db.execute(
+        select(MenuItem.name, MenuItem.price, MenuItem.is_available, Restaurant.name)
+        .join(Restaurant, Restaurant.id == MenuItem.restaurant_id)
+        .where(MenuItem.id == item.menu_item_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Menu item not found"
+        )
+
+    name, price, is_available, restaurant_name = row
+    if not is_available:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Menu item is not available"
+        )
+
+    try:
+        cart = await cart_service.add_item(
+            telegram_id, item.menu_item_id, name, price, item.quantity, restaurant_name
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return cart_response(cart)
+
+
+@router.delete("/items/{item_id}", response_model=CartResponse)
+async def remove_cart_item(
+    item_id: str,
+    quantity: Optional[int] = None,
+    telegram_id: int = Depends(get_telegram_user_id)
+):
+    """Убрать блюдо из корзины (quantity не указан - целиком)"""
+    try:
+        cart = await cart_service.remove_item(telegram_id, item_id, quantity)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return cart_response(cart)
+
+
+@router.delete("")
+async def clear_cart(telegram_id: int = Depends(get_telegram_user_id)):
+    """Очистить корзину"""
+    await cart_service.clear(telegram_id)
+    return {"message": "Cart cleared"}
@@ -1,18 +1,94 @@
 ﻿"""
-API для курьеров (заглушка)
+API для курьеров
 """
 
-from fastapi import APIRouter
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_admin_user_id, get_current_courier_id, get_current_user_id
+from app.core.database import get_db
+from app.services.dispatch_service import courier_dispatcher
+from app.services.location_service import courier_assignments, courier_locations
+from app.services.presence import courier_presence
 
 router = APIRouter()
 
 
+class CourierLocationPing(BaseModel):
+    order_id: Optional[int] = None
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+    accuracy: Optional[float] = None
+    timestamp: Optional[datetime] = None
+
+
+class CourierLocationBatch(BaseModel):
+    pings: List[CourierLocationPing]
+
+
+class CourierLocationAccepted(BaseModel):
+    accepted: int
+    pending: int
+
+
+class OnlineCouriersResponse(BaseModel):
+    count: int
+    courier_ids: List[int]
+
+
 @router.get("/")
 async def get_couriers():
     """Получить список курьеров"""
     return {"message": "Couriers API - coming soon"}
 
 
+@router.post("/locations", response_model=CourierLocationAccepted)
+async def ingest_locations(
+    batch: CourierLocationBatch,
+    courier_id: int = Depends(get_current_courier_id),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Принять пачку геопозиций текущего курьера (запись в БД выполняется пакетно в фоне).
+    Пинги с заказом, который курьер не везет, отбрасываются.
+    """
+    orders = await courier_assignments.orders(db, user_id)
+    accepted = courier_locations.ingest(
+        ({**ping.dict(), "courier_id": courier_id} for ping in batch.pings), orders=orders
+    )
+    return CourierLocationAccepted(accepted=accepted, pending=courier_locations.pending)
+
+
+@router.get("/online", response_model=OnlineCouriersResponse)
+async def get_online_couriers():
+    """Курьеры, присылавшие геопозицию за последнюю минуту (из памяти, без запроса к БД)"""
+    courier_ids = sorted(courier_presence.online())
+    return OnlineCouriersResponse(count=len(courier_ids), courier_ids=courier_ids)
+
+
+@router.post("/dispatch")
+async def run_dispatch(
+    user_id: int = Depends(get_admin_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Внеочередной такт назначения курьеров на заказы"""
+    assignments = await courier_dispatcher.tick(db)
+    return {
+        "assignments": [
+            {"order_id": order_id, "courier_id": courier_id}
+            for order_id, courier_id in assignments
+        ],
+        "stats": courier_dispatcher.stats()
+    }
+
+
 @router.get("/{courier_id}")
 async def get_courier(courier_id: int):
     """Получить информацию о курьере"""
@@ -0,0 +1,129 @@
+"""
+Общие зависимости API
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, Header, HTTPException, Query, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.models import Courier, User, UserRole
+from app.services.presence import user_presence
+from app.services.telegram_auth import telegram_auth_validator
+from app.services.tokens import token_verifier
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# user_id -> id курьера: связь не меняется, повторные пинги не ходят в БД.
+# Хранится не больше COURIER_IDS_CACHE_SIZE курьеров, дольше всех не обращавшиеся вытесняются
+COURIER_IDS_CACHE_SIZE = 10_000
+_courier_ids: "OrderedDict[int, int]" = OrderedDict()
+
+
+def user_id_from_token(token: Optional[str]) -> Optional[int]:
+    """user_id из токена доступа (кэш проверенных токенов, без запроса к БД)"""
+    if not token:
+        return None
+
+    user_id = token_verifier.verify(token)
+    if user_id is not None:
+        user_presence.heartbeat(user_id)
+    return user_id
+
+
+async def get_current_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> int:
+    """ID текущего пользователя из заголовка Authorization: Bearer <token>"""
+    user_id = user_id_from_token(credentials.credentials if credentials else None)
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return user_id
+
+
+async def get_stream_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    token: Optional[str] = Query(None)
+) -> int:
+    """ID текущего пользователя для потоков: EventSource не задает заголовки, токен можно передать в ?token="""
+    return await get_current_user_id(
+        credentials or HTTPAuthorizationCredentials(scheme="Bearer", credentials=token or "")
+    )
+
+
+async def get_staff_user_id(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> int:
+    """ID текущего пользователя, если это администратор или сотрудник ресторана"""
+    role = await db.scalar(select(User.role).where(User.id == user_id))
+    if role not in (UserRole.ADMIN, UserRole.RESTAURANT):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return user_id
+
+
+async def get_admin_user_id(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> int:
+    """ID текущего пользователя, если это администратор"""
+    role = await db.scalar(select(User.role).where(User.id == user_id))
+    if role != UserRole.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return user_id
+
+
+async def get_current_courier_id(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> int:
+    """ID курьера текущего пользователя"""
+    courier_id = _courier_ids.get(user_id)
+    if courier_id is not None:
+        _courier_ids.move_to_end(user_id)
+        return courier_id
+
+    courier_id = await db.scalar(select(Courier.id).where(Courier.user_id == user_id))
+    if courier_id is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a courier")
+    _courier_ids[user_id] = courier_id
+    if len(_courier_ids) > COURIER_IDS_CACHE_SIZE:
+        _courier_ids.popitem(last=False)
+    return courier_id
+
+
+async def get_telegram_init_data(
+    authorization: Optional[str] = Header(None),
+    x_telegram_init_data: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """Проверенные данные Telegram WebApp: Authorization: tma <initData> или X-Telegram-Init-Data"""
+    init_data = x_telegram_init_data
+    if authorization and authorization[:4].lower() == "tma ":
+        init_data = authorization[4:]
+
+    data = telegram_auth_validator.validate_init_data(init_data) if init_data else None
+    if data is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Telegram WebApp data"
+        )
+    return data
+
+
+async def get_telegram_user_id(init_data: Dict[str, Any] = Depends(get_telegram_init_data)) -> int:
+    """Telegram ID пользователя WebApp из проверенных initData"""
+    telegram_user = init_data.get("user")
+    if not isinstance(telegram_user, dict) or "id" not in telegram_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Telegram WebApp data has no user"
+        )
+    return telegram_user["id"]
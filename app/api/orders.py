@@ -2,18 +2,27 @@
 API для работы с заказами
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
-from app.core.database import get_db
-from app.models import Order, OrderItem, OrderStatus, PaymentMethod
+from app.core.database import get_db, AsyncSessionLocal
+from app.api.deps import get_admin_user_id, get_current_user_id, get_stream_user_id, user_id_from_token
+from app.models import Order, OrderItem, OrderStatus, PaymentMethod, User, UserRole
 from app.services.order_service import OrderService
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.tracking_hub import tracking_hub, TrackingSubscription
 
 router = APIRouter()
 
+# Интервал keepalive для push-соединений отслеживания, секунды
+TRACKING_KEEPALIVE_SECONDS = 15
+
 
 class OrderItemCreate(BaseModel):
     menu_item_id: int
@@ -33,6 +42,17 @@ class OrderCreate(BaseModel):
     payment_method: PaymentMethod = PaymentMethod.CASH
 
 
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[int]
+    new_status: OrderStatus
+    restaurant_id: Optional[int] = None
+
+
+class OrderStatusBulkResponse(BaseModel):
+    moved: List[int]
+    skipped: List[int]
+
+
 class OrderResponse(BaseModel):
     id: int
     order_number: str
@@ -53,7 +73,7 @@ class OrderResponse(BaseModel):
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Создать новый заказ"""
@@ -68,21 +88,59 @@ async def create_order(
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_user_orders(
-    user_id: int,  # Получаем из JWT токена
-    skip: int = 0,
-    limit: int = 20,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить заказы пользователя"""
+    """Получить заказы пользователя (курсор следующей страницы - в заголовке X-Next-Cursor)"""
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor")
+    
     service = OrderService(db)
-    orders = await service.get_user_orders(user_id, skip, limit)
+    
+    try:
+        orders = await service.get_user_orders(user_id, skip, limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if len(orders) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = service.order_cursor(orders[-1])
+    
     return orders
 
 
+@router.patch("/status", response_model=OrderStatusBulkResponse)
+async def bulk_update_order_status(
+    update_data: OrderStatusBulkUpdate,
+    user_id: int = Depends(get_admin_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Перевести несколько заказов в новый статус (только администратору:
+    сотрудники не привязаны к ресторанам); restaurant_id сужает выборку
+    """
+    service = OrderService(db)
+    
+    moved = await service.transition_orders(
+        update_data.order_ids,
+        update_data.new_status,
+        restaurant_id=update_data.restaurant_id
+    )
+    
+    moved_ids = set(moved)
+    return OrderStatusBulkResponse(
+        moved=moved,
+        skipped=[order_id for order_id in update_data.order_ids if order_id not in moved_ids]
+    )
+
+
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить заказ по ID"""
@@ -99,7 +157,7 @@ async def get_order(
 async def update_order_status(
     order_id: int,
     new_status: OrderStatus,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновить статус заказа"""
@@ -115,7 +173,7 @@ async def update_order_status(
 @router.delete("/{order_id}")
 async def cancel_order(
     order_id: int,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Отменить заказ"""
@@ -131,7 +189,7 @@ async def cancel_order(
 @router.get("/{order_id}/track")
 async def track_order(
     order_id: int,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Отследить заказ"""
@@ -142,3 +200,86 @@ async def track_order(
         raise HTTPException(status_code=404, detail="Order not found")
     
     return tracking_info
+
+
+async def _open_tracking_subscription(order_id: int, user_id: int) -> Optional[TrackingSubscription]:
+    """Снимок заказа из БД и подписка на его обновления (свой заказ или любой - администратору)"""
+    
+    # Сессия закрывается до начала потока, соединение с БД не удерживается
+    async with AsyncSessionLocal() as db:
+        service = OrderService(db)
+        tracking_info = await service.get_order_tracking(order_id, user_id)
+        if not tracking_info and await db.scalar(select(User.role).where(User.id == user_id)) == UserRole.ADMIN:
+            owner_id = await db.scalar(select(Order.user_id).where(Order.id == order_id))
+            if owner_id is not None:
+                tracking_info = await service.get_order_tracking(order_id, owner_id)
+    
+    if not tracking_info:
+        return None
+    
+    return tracking_hub.subscribe(order_id, jsonable_encoder(tracking_info))
+
+
+async def tracking_event_stream(subscription: TrackingSubscription):
+    """Server-Sent Events: полный снимок заказа, затем только изменения"""
+    try:
+        yield f"data: {tracking_hub.snapshot_message(subscription.order_id)}\n\n"
+        
+        while True:
+            message = await subscription.get(TRACKING_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            
+            yield f"data: {message}\n\n"
+    finally:
+        tracking_hub.unsubscribe(subscription)
+
+
+@router.get("/{order_id}/events")
+async def track_order_events(
+    order_id: int,
+    user_id: int = Depends(get_stream_user_id)
+):
+    """Отслеживание заказа в реальном времени (SSE; для EventSource токен в ?token=)"""
+    subscription = await _open_tracking_subscription(order_id, user_id)
+    if subscription is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    return StreamingResponse(
+        tracking_event_stream(subscription),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # nginx не должен буферизовать поток
+        }
+    )
+
+
+@router.websocket("/{order_id}/ws")
+async def track_order_ws(
+    websocket: WebSocket,
+    order_id: int,
+    token: Optional[str] = Query(None)
+):
+    """Отслеживание заказа в реальном времени (WebSocket; браузер не задает заголовки - токен в ?token=)"""
+    user_id = user_id_from_token(token)
+    subscription = await _open_tracking_subscription(order_id, user_id) if user_id is not None else None
+    if subscription is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    try:
+        await websocket.send_text(tracking_hub.snapshot_message(order_id))
+        
+        while True:
+            message = await subscription.get(TRACKING_KEEPALIVE_SECONDS)
+            if message is None:
+                message = '{"type": "ping"}'
+            
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tracking_hub.unsubscribe(subscription)
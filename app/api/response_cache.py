@@ -0,0 +1,232 @@
+"""
+Кэш HTTP-ответов каталога: ETag, 304 и Cache-Control
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Атрибут эндпоинта с правилом кэширования
+RULE_ATTRIBUTE = "__response_cache__"
+
+
+class CacheRule(NamedTuple):
+    """Правило кэширования маршрута"""
+    ttl: float  # сколько ответ живет в кэше процесса, секунды
+    max_age: int  # сколько клиент и nginx считают ответ свежим без перепроверки
+    version: Optional[Callable[[Dict[str, Any]], Hashable]]  # версия данных по параметрам пути
+    query_params: Optional[Sequence[str]]  # параметры запроса, от которых зависит ответ (None - все)
+
+
+class CachedResponse(NamedTuple):
+    version: Hashable
+    stored_at: float
+    etag: bytes
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+def cache_response(
+    ttl: float = 60,
+    max_age: int = 10,
+    version: Optional[Callable[[Dict[str, Any]], Hashable]] = None,
+    query_params: Optional[Sequence[str]] = None
+):
+    """
+    Кэшировать ответы GET-эндпоинта (ставится под @router.get).
+
+    version(path_params) - версия данных, из которых собран ответ: при
+    другой версии ответ собирается заново. Ответы без версии живут ttl.
+    """
+    def decorator(endpoint):
+        setattr(endpoint, RULE_ATTRIBUTE, CacheRule(ttl, max_age, version, query_params))
+        return endpoint
+    return decorator
+
+
+def _etag_matches(if_none_match: Optional[bytes], etag: bytes) -> bool:
+    """Совпадает ли ETag с If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if if_none_match is None:
+        return False
+    for tag in if_none_match.split(b","):
+        tag = tag.strip()
+        if tag == b"*" or (tag[2:] if tag.startswith(b"W/") else tag) == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Готовые ответы в памяти процесса.
+
+    Ключ - путь и отобранные параметры запроса; запись действительна, пока
+    не изменилась версия данных маршрута и не истек ttl. ETag - хэш тела,
+    поэтому он совпадает у всех процессов и после перезапуска, а проверка
+    If-None-Match по действительной записи отвечает 304 без обращения к БД.
+
+    Версии маршрутов каталога и меню берутся из menu_cache, который сверяет
+    их с общей таблицей cache_versions: ответ, собранный другим воркером
+    до изменения данных, перестает быть действительным не позже чем через
+    menu_cache.sync_interval, а не через ttl.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_body: int = 1024 * 1024, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_body = max_body
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stored = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self.bytes_saved = 0
+
+    def get(self, key: Hashable, version: Hashable, ttl: float) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version or self.clock() - entry.stored_at >= ttl:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, version: Hashable, headers: List[Tuple[bytes, bytes]], body: bytes) -> CachedResponse:
+        entry = CachedResponse(
+            version, self.clock(), b'"' + hashlib.sha256(body).hexdigest()[:32].encode() + b'"', headers, body
+        )
+        if len(body) <= self.max_body:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stored += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша: доля ответов без сборки и сэкономленные байты"""
+        lookups = self.hits + self.not_modified + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.not_modified) / lookups, 3) if lookups else 0.0,
+            "stored": self.stored,
+            "evictions": self.evictions,
+            "bytes_served": self.bytes_served,
+            "bytes_saved": self.bytes_saved
+        }
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI-посредник для маршрутов с @cache_response.
+
+    Маршрут ищется до вызова приложения, поэтому попадание в кэш и ответ
+    304 не создают сессию БД и не сериализуют ответ заново. Промах
+    выполняет эндпоинт, запоминает ответ 200 и добавляет ETag и
+    Cache-Control: public, max-age - nginx и браузер перепроверяют
+    ответ после max_age запросом с If-None-Match.
+    """
+
+    def __init__(self, app: ASGIApp, cache: Optional[ResponseCache] = None):
+        self.app = app
+        self.cache = cache if cache is not None else response_cache
+
+    @staticmethod
+    def _rule(scope: Scope) -> Optional[Tuple[CacheRule, Dict[str, Any]]]:
+        for route in scope["app"].router.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                rule = getattr(child_scope.get("endpoint"), RULE_ATTRIBUTE, None)
+                return (rule, child_scope.get("path_params", {})) if rule is not None else None
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        found = self._rule(scope)
+        if found is None:
+            await self.app(scope, receive, send)
+            return
+        rule, path_params = found
+
+        query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        if rule.query_params is not None:
+            query = [(name, value) for name, value in query if name in rule.query_params]
+        key = (scope["path"], urlencode(sorted(query)))
+        try:
+            version = rule.version(path_params) if rule.version is not None else None
+        except (ValueError, KeyError):
+            # Параметры пути не прошли бы проверку - ошибку вернет сам эндпоинт
+            await self.app(scope, receive, send)
+            return
+        if_none_match = next((value for name, value in scope["headers"] if name == b"if-none-match"), None)
+
+        entry = self.cache.get(key, version, rule.ttl)
+        if entry is None:
+            self.cache.misses += 1
+            entry = await self._render(scope, receive, send, key, version)
+            if entry is None:
+                return
+            # Даже после сборки ответа клиенту с тем же ETag тело не нужно
+            not_modified = _etag_matches(if_none_match, entry.etag)
+        else:
+            not_modified = _etag_matches(if_none_match, entry.etag)
+            if not_modified:
+                self.cache.not_modified += 1
+            else:
+                self.cache.hits += 1
+
+        cache_headers = [
+            (b"etag", entry.etag),
+            (b"cache-control", f"public, max-age={rule.max_age}".encode())
+        ]
+        if not_modified:
+            self.cache.bytes_saved += len(entry.body)
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        self.cache.bytes_served += len(entry.body)
+        await send({"type": "http.response.start", "status": 200, "headers": entry.headers + cache_headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _render(self, scope: Scope, receive: Receive, send: Send, key: Hashable, version: Hashable):
+        """Выполнить эндпоинт; успешный ответ - в кэш, остальные отдаются как есть"""
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+
+        headers = list(start["headers"]) if start is not None else []
+        if start is None or start["status"] != 200 or any(name == b"set-cookie" for name, _ in headers):
+            if start is not None:
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+            return None
+
+        return self.cache.put(key, version, headers, body)
+
+
+# Глобальный кэш ответов
+response_cache = ResponseCache()
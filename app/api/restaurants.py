@@ -2,18 +2,34 @@
 API для работы с ресторанами
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
+import enum
 
+from app.api.deps import get_admin_user_id
+from app.api.response_cache import cache_response
 from app.core.database import get_db
 from app.models import Restaurant, MenuItem, MenuCategory
+from app.services.aggregates import order_aggregates
 from app.services.restaurant_service import RestaurantService
+from app.services.menu_cache import menu_cache
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.uploads import ACCEPTED_TYPES, UploadTooLarge, image_pipeline
 
 router = APIRouter()
 
 
+# Версии данных для кэша ответов
+def catalog_version(path_params) -> int:
+    return menu_cache.catalog_version()
+
+
+def menu_version(path_params) -> int:
+    return menu_cache.version(int(path_params["restaurant_id"]))
+
+
 # Pydantic модели для API
 class RestaurantResponse(BaseModel):
     id: int
@@ -27,6 +43,8 @@ class RestaurantResponse(BaseModel):
     is_active: bool
     logo_url: Optional[str]
     cover_url: Optional[str]
+    logo_variants: Optional[Dict[str, Dict[str, Any]]] = None
+    cover_variants: Optional[Dict[str, Dict[str, Any]]] = None
     
     class Config:
         from_attributes = True
@@ -40,6 +58,7 @@ class MenuItemResponse(BaseModel):
     weight: Optional[int]
     calories: Optional[int]
     image_url: Optional[str]
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     is_available: bool
     is_popular: bool
     is_vegetarian: bool
@@ -48,6 +67,34 @@ class MenuItemResponse(BaseModel):
         from_attributes = True
 
 
+class DeliveryQuoteResponse(BaseModel):
+    restaurant_id: int
+    distance_km: float
+    delivery_fee: float
+    delivery_available: bool
+    estimated_minutes: int
+
+
+class SearchMenuItemResponse(MenuItemResponse):
+    restaurant_id: int
+
+
+class SearchResponse(BaseModel):
+    restaurants: List[RestaurantResponse]
+    items: List[SearchMenuItemResponse]
+
+
+class RestaurantImageKind(str, enum.Enum):
+    LOGO = "logo"
+    COVER = "cover"
+
+
+class RestaurantStatsResponse(BaseModel):
+    restaurant_id: int
+    total_orders: int
+    total_revenue: float
+
+
 class MenuCategoryResponse(BaseModel):
     id: int
     name: str
@@ -60,29 +107,81 @@ class MenuCategoryResponse(BaseModel):
 
 
 @router.get("/", response_model=List[RestaurantResponse])
+@cache_response(
+    ttl=300, max_age=30, version=catalog_version,
+    query_params=("skip", "limit", "cursor", "search", "latitude", "longitude", "max_distance")
+)
 async def get_restaurants(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
     latitude: Optional[float] = Query(None),
     longitude: Optional[float] = Query(None),
     max_distance: Optional[float] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить список ресторанов"""
+    """Получить список ресторанов (курсор следующей страницы - в заголовке X-Next-Cursor)"""
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor")
+    
     service = RestaurantService(db)
-    restaurants = await service.get_restaurants(
-        skip=skip,
-        limit=limit,
-        search=search,
-        latitude=latitude,
-        longitude=longitude,
-        max_distance=max_distance
-    )
+    
+    try:
+        restaurants = await service.get_restaurants(
+            skip=skip,
+            limit=limit,
+            search=search,
+            latitude=latitude,
+            longitude=longitude,
+            max_distance=max_distance,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Поиск и выдача рядом листаются только через skip
+    nearby = latitude is not None and longitude is not None and max_distance
+    if len(restaurants) == limit and not nearby and not search:
+        response.headers[NEXT_CURSOR_HEADER] = service.restaurant_cursor(restaurants[-1])
+    
     return restaurants
 
 
+@router.get("/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """Поиск ресторанов и блюд с учетом словоформ и опечаток"""
+    service = RestaurantService(db)
+    return await service.search(q, limit)
+
+
+@router.get("/delivery-quotes", response_model=List[DeliveryQuoteResponse])
+async def get_delivery_quotes(
+    latitude: float = Query(...),
+    longitude: float = Query(...),
+    restaurant_ids: List[int] = Query(...),
+    order_total: float = Query(0.0, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Стоимость и время доставки для ресторанов каталога"""
+    service = RestaurantService(db)
+    
+    quotes = await service.get_delivery_quotes(
+        restaurant_ids=restaurant_ids,
+        user_latitude=latitude,
+        user_longitude=longitude,
+        order_total=order_total
+    )
+    return quotes
+
+
 @router.get("/{restaurant_id}", response_model=RestaurantResponse)
+@cache_response(ttl=300, max_age=60, version=menu_version, query_params=())
 async def get_restaurant(
     restaurant_id: int,
     db: AsyncSession = Depends(get_db)
@@ -96,6 +195,7 @@ async def get_restaurant(
 
 
 @router.get("/{restaurant_id}/menu", response_model=List[MenuCategoryResponse])
+@cache_response(ttl=300, max_age=10, version=menu_version, query_params=())
 async def get_restaurant_menu(
     restaurant_id: int,
     db: AsyncSession = Depends(get_db)
@@ -103,36 +203,58 @@ async def get_restaurant_menu(
     """Получить меню ресторана"""
     service = RestaurantService(db)
     
-    # Проверяем существование ресторана
-    restaurant = await service.get_restaurant(restaurant_id)
-    if not restaurant:
+    # Готовый JSON из кэша меню (None - ресторан не найден)
+    menu = await service.get_menu_snapshot(restaurant_id)
+    if menu is None:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     
-    # Получаем меню
-    menu = await service.get_restaurant_menu(restaurant_id)
-    return menu
+    return Response(content=menu, media_type="application/json")
 
 
 @router.get("/{restaurant_id}/menu/items", response_model=List[MenuItemResponse])
+@cache_response(
+    ttl=300, max_age=10, version=menu_version,
+    query_params=("category_id", "search", "vegetarian_only", "available_only", "limit", "cursor")
+)
 async def get_menu_items(
     restaurant_id: int,
     category_id: Optional[int] = Query(None),
     search: Optional[str] = Query(None),
     vegetarian_only: bool = Query(False),
     available_only: bool = Query(True),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить блюда ресторана"""
+    """Получить блюда ресторана (постранично - при указании limit/cursor)"""
     service = RestaurantService(db)
     
-    items = await service.get_menu_items(
+    if limit is not None or cursor:
+        try:
+            page, next_cursor = await service.get_menu_items_page(
+                restaurant_id=restaurant_id,
+                category_id=category_id,
+                search=search,
+                vegetarian_only=vegetarian_only,
+                available_only=available_only,
+                limit=limit or 20,
+                cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return Response(content=page, media_type="application/json", headers=headers)
+    
+    # Меню целиком - готовый JSON из кэша
+    items = await service.get_menu_items_snapshot(
         restaurant_id=restaurant_id,
         category_id=category_id,
         search=search,
         vegetarian_only=vegetarian_only,
         available_only=available_only
     )
-    return items
+    return Response(content=items, media_type="application/json")
 
 
 @router.get("/{restaurant_id}/menu/items/{item_id}", response_model=MenuItemResponse)
@@ -152,6 +274,8 @@ async def get_menu_item(
 
 
 @router.get("/{restaurant_id}/popular", response_model=List[MenuItemResponse])
+# Популярность меняется с заказами без версии - ответ живет минуту
+@cache_response(ttl=60, max_age=30, version=menu_version, query_params=("limit",))
 async def get_popular_items(
     restaurant_id: int,
     limit: int = Query(10, ge=1, le=20),
@@ -162,3 +286,96 @@ async def get_popular_items(
     
     items = await service.get_popular_items(restaurant_id, limit)
     return items
+
+
+@router.get("/{restaurant_id}/trending", response_model=List[MenuItemResponse])
+async def get_trending_items(
+    restaurant_id: int,
+    limit: int = Query(10, ge=1, le=20),
+    db: AsyncSession = Depends(get_db)
+):
+    """Получить блюда ресторана, популярные за последний час"""
+    service = RestaurantService(db)
+    
+    items = await service.get_trending_items(restaurant_id, limit)
+    return items
+
+
+@router.get("/{restaurant_id}/stats", response_model=RestaurantStatsResponse)
+async def get_restaurant_stats(
+    restaurant_id: int,
+    admin_id: int = Depends(get_admin_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Доставленные заказы и выручка ресторана, включая еще не учтенные в счетчиках"""
+    totals = await order_aggregates.restaurant_totals(db, restaurant_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    total_orders, total_revenue = totals
+    return RestaurantStatsResponse(
+        restaurant_id=restaurant_id, total_orders=total_orders, total_revenue=total_revenue
+    )
+
+
+async def _receive_image(request: Request) -> Dict[str, Dict[str, Any]]:
+    """Изображение из тела запроса (не multipart) и его варианты"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in ACCEPTED_TYPES:
+        raise HTTPException(status_code=415, detail=f"Supported types: {', '.join(sorted(ACCEPTED_TYPES))}")
+    
+    content_length = request.headers.get("content-length")
+    try:
+        return await image_pipeline.process(
+            request.stream(), int(content_length) if content_length and content_length.isdigit() else None
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/{restaurant_id}/images/{kind}", response_model=RestaurantResponse)
+async def upload_restaurant_image(
+    restaurant_id: int,
+    kind: RestaurantImageKind,
+    request: Request,
+    admin_id: int = Depends(get_admin_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Загрузить логотип или обложку ресторана (тело запроса - файл изображения)"""
+    service = RestaurantService(db)
+    # Существование проверяется до приема файла
+    if await db.get(Restaurant, restaurant_id) is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    # Транзакция проверки не держится открытой, пока файл принимается и сжимается
+    await db.rollback()
+    
+    variants = await _receive_image(request)
+    restaurant = await service.set_restaurant_image(restaurant_id, kind.value, variants)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return restaurant
+
+
+@router.put("/{restaurant_id}/menu/items/{item_id}/image", response_model=MenuItemResponse)
+async def upload_menu_item_image(
+    restaurant_id: int,
+    item_id: int,
+    request: Request,
+    admin_id: int = Depends(get_admin_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Загрузить фото блюда (тело запроса - файл изображения)"""
+    service = RestaurantService(db)
+    # Существование проверяется до приема файла
+    item = await db.get(MenuItem, item_id)
+    if item is None or item.restaurant_id != restaurant_id:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    # Транзакция проверки не держится открытой, пока файл принимается и сжимается
+    await db.rollback()
+    
+    variants = await _receive_image(request)
+    item = await service.set_menu_item_image(restaurant_id, item_id, variants)
+    if not item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
+    return item
@@ -3,7 +3,22 @@
 """
 
 from fastapi import APIRouter
-from app.api import auth, restaurants, orders, users, couriers
+from app.api import auth, restaurants, orders, users, couriers, cart
+from app.api.response_cache import response_cache
+from app.services.dispatch_service import courier_dispatcher
+from app.services.location_service import courier_locations
+from app.services.menu_cache import menu_cache
+from app.services.popularity import popularity
+from app.services.aggregates import order_aggregates
+from app.services.broadcast import broadcast_engine
+from app.services.media_cache import media_cache
+from app.services.uploads import image_pipeline
+from app.services.cart import cart_service
+from app.services.presence import user_presence, courier_presence
+from app.services.telegram_auth import telegram_auth_validator
+from app.services.tokens import token_verifier
+from app.services.tracking_hub import tracking_hub
+from app.bot.webhook import update_dispatcher
 
 # Создание основного роутера
 api_router = APIRouter()
@@ -14,6 +29,7 @@ api_router.include_router(restaurants.router, prefix="/restaurants", tags=["rest
 api_router.include_router(orders.router, prefix="/orders", tags=["orders"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(couriers.router, prefix="/couriers", tags=["couriers"])
+api_router.include_router(cart.router, prefix="/cart", tags=["cart"])
 
 
 @api_router.get("/")
@@ -26,6 +42,34 @@ async def api_root():
             "restaurants": "/api/v1/restaurants", 
             "orders": "/api/v1/orders",
             "users": "/api/v1/users",
-            "couriers": "/api/v1/couriers"
+            "couriers": "/api/v1/couriers",
+            "cart": "/api/v1/cart"
+        }
+    }
+
+
+@api_router.get("/metrics")
+async def api_metrics():
+    """Метрики фоновых подсистем"""
+    return {
+        "tracking": tracking_hub.stats(),
+        "courier_locations": courier_locations.stats(),
+        "dispatch": courier_dispatcher.stats(),
+        "menu_cache": menu_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "popularity": popularity.stats(),
+        "order_aggregates": order_aggregates.stats(),
+        "cart": cart_service.stats(),
+        "broadcast": broadcast_engine.stats(),
+        "media": media_cache.stats(),
+        "uploads": image_pipeline.stats(),
+        "webhook": update_dispatcher.stats(),
+        "presence": {
+            "users": user_presence.stats(),
+            "couriers": courier_presence.stats()
+        },
+        "auth": {
+            "tokens": token_verifier.stats(),
+            "telegram": telegram_auth_validator.stats()
         }
     }
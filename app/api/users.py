@@ -8,7 +8,9 @@ from pydantic import BaseModel
 from typing import Optional
 
 from app.core.database import get_db
+from app.api.deps import get_current_user_id
 from app.models import User, UserRole
+from app.services.aggregates import order_aggregates
 from app.services.user_service import UserService
 
 router = APIRouter()
@@ -38,9 +40,18 @@ class UserUpdate(BaseModel):
     longitude: Optional[float] = None
 
 
+async def _user_response(db: AsyncSession, user: User) -> UserResponse:
+    """Ответ с точным числом заказов: счетчик строки плюс еще не учтенные доставленные"""
+    response = UserResponse.model_validate(user)
+    totals = await order_aggregates.user_totals(db, user.id)
+    if totals is not None:
+        response.total_orders = totals[0]
+    return response
+
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить информацию о текущем пользователе"""
@@ -50,13 +61,13 @@ async def get_current_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return user
+    return await _user_response(db, user)
 
 
 @router.patch("/me", response_model=UserResponse)
 async def update_current_user(
     user_data: UserUpdate,
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновить информацию о текущем пользователе"""
@@ -66,12 +77,12 @@ async def update_current_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return user
+    return await _user_response(db, user)
 
 
 @router.get("/loyalty")
 async def get_loyalty_info(
-    user_id: int,  # Получаем из JWT токена
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить информацию о программе лояльности"""
@@ -2,21 +2,50 @@
 Обработчики команд Telegram бота
 """
 
+import json
+import logging
+
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
 
-from app.bot.keyboards import get_main_menu_keyboard, get_restaurants_keyboard
+from app.bot.keyboards import (
+    get_main_menu_keyboard,
+    get_restaurants_keyboard,
+    get_restaurant_menu_keyboard,
+    get_menu_items_keyboard,
+    get_item_actions_keyboard
+)
+from app.bot.render import PARSE_MODE, Template, View, keyboard, render_cache, render_stats
+from app.core.database import AsyncSessionLocal
+from app.services.media_cache import media_cache
+from app.services.menu_cache import menu_cache
+from app.services.restaurant_service import RestaurantService
 
+logger = logging.getLogger(__name__)
 
-async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик команды /start"""
-    user = update.effective_user
+
+class DemoRestaurant:
+    """Ресторан демонстрационного списка"""
     
-    welcome_text = f"""
+    def __init__(self, id, name, rating):
+        self.id = id
+        self.name = name
+        self.rating = rating
+
+
+# Здесь будет список ресторанов из базы данных
+DEMO_RESTAURANTS = [
+    DemoRestaurant(1, "🍕 Pizza Palace", 4.8),
+    DemoRestaurant(2, "🍔 Burger King", 4.5),
+    DemoRestaurant(3, "🍜 Суши Мастер", 4.9),
+    DemoRestaurant(4, "🥗 Healthy Food", 4.6),
+]
+
+WELCOME_TEMPLATE = Template("""
 🍕 *Добро пожаловать в FoodDelivery Bot!*
 
-Привет, {user.first_name}! 👋
+Привет, {first_name}! 👋
 
 Я помогу тебе заказать вкусную еду из лучших ресторанов города.
 
@@ -28,132 +57,103 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • 🎁 Начислять бонусы
 
 Нажми на кнопку ниже, чтобы начать! 👇
-    """
-    
-    await update.message.reply_text(
-        welcome_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=get_main_menu_keyboard()
-    )
-
+""")
 
-async def restaurants_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик списка ресторанов"""
-    query = update.callback_query
-    await query.answer()
-    
-    # Здесь будет логика получения ресторанов из базы данных
-    restaurants_text = """
+# Сообщения без данных готовятся один раз при загрузке модуля
+RESTAURANTS_VIEW = View(
+    Template("""
 🏪 *Доступные рестораны:*
 
-🍕 **Pizza Palace**
+🍕 *Pizza Palace*
 ⭐ 4.8 • 🚚 25-35 мин • 💰 от 500₽
 
-🍔 **Burger King**
+🍔 *Burger King*
 ⭐ 4.5 • 🚚 20-30 мин • 💰 от 300₽
 
-🍜 **Суши Мастер**
+🍜 *Суши Мастер*
 ⭐ 4.9 • 🚚 30-40 мин • 💰 от 800₽
 
-🥗 **Healthy Food**
+🥗 *Healthy Food*
 ⭐ 4.6 • 🚚 15-25 мин • 💰 от 400₽
-    """
-    
-    # Создаем фиктивные рестораны для демонстрации
-    class MockRestaurant:
-        def __init__(self, id, name, rating):
-            self.id = id
-            self.name = name
-            self.rating = rating
-    
-    mock_restaurants = [
-        MockRestaurant(1, "🍕 Pizza Palace", 4.8),
-        MockRestaurant(2, "🍔 Burger King", 4.5),
-        MockRestaurant(3, "🍜 Суши Мастер", 4.9),
-        MockRestaurant(4, "🥗 Healthy Food", 4.6),
-    ]
-    
-    await query.edit_message_text(
-        restaurants_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=get_restaurants_keyboard(mock_restaurants)
-    )
+""").render(),
+    get_restaurants_keyboard(DEMO_RESTAURANTS)
+)
 
-
-async def orders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик списка заказов"""
-    query = update.callback_query
-    await query.answer()
-    
-    orders_text = """
+ORDERS_VIEW = View(
+    Template("""
 📋 *Мои заказы:*
 
-🟢 **Заказ #1234** - *Доставляется*
+🟢 *Заказ #1234* - _Доставляется_
 🍕 Pizza Margherita x2
 📍 ул. Пушкина, 10
 ⏰ Ожидаемое время: 15 мин
 
-🟡 **Заказ #1233** - *Готовится*
+🟡 *Заказ #1233* - _Готовится_
 🍔 Big Burger, 🍟 Картофель фри
 📍 ул. Ленина, 25
 ⏰ Ожидаемое время: 25 мин
 
-✅ **Заказ #1232** - *Доставлен*
+✅ *Заказ #1232* - _Доставлен_
 🍜 Суши сет "Филадельфия"
 📍 пр. Мира, 15
 ⏰ Доставлен вчера в 19:30
-    """
-    
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-    
-    keyboard = [
-        [InlineKeyboardButton("📍 Отследить заказ #1234", callback_data="track_1234")],
-        [InlineKeyboardButton("🔄 Повторить заказ #1232", callback_data="repeat_1232")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        orders_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup
-    )"""
-Обработчики команд Telegram бота
-"""
-
-from telegram import Update
-from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
-
-from app.bot.keyboards import get_main_menu_keyboard, get_restaurants_keyboard
+""").render(),
+    keyboard(
+        [("📍 Отследить заказ #1234", "track_1234")],
+        [("🔄 Повторить заказ #1232", "repeat_1232")],
+        [("🔙 Назад", "back_to_main")]
+    )
+)
+
+RESTAURANT_NOT_FOUND_VIEW = View(Template("😔 Ресторан не найден или временно не работает").render())
+MENU_TEXT = Template("🍽️ *Меню*\n\nВыберите категорию:").render()
+CATEGORY_TEXT = Template("🍽️ *Блюда категории:*").render()
+ITEM_NOT_FOUND_VIEW = View(Template("😔 Блюдо не найдено или закончилось").render())
+ITEM_TEMPLATE = Template("*{name}*{description}\n\n💰 {price:.0f}₽")
+
+
+@render_stats.timed("start")
+def render_start(first_name: str) -> View:
+    return View(WELCOME_TEMPLATE.render(first_name=first_name), get_main_menu_keyboard())
+
+
+@render_stats.timed("restaurant_menu")
+def render_restaurant_menu(restaurant_id: int, menu) -> View:
+    if menu is None:
+        return RESTAURANT_NOT_FOUND_VIEW
+    return View(MENU_TEXT, get_restaurant_menu_keyboard(restaurant_id, json.loads(menu)))
+
+
+@render_stats.timed("category_items")
+def render_category_items(restaurant_id: int, category_id: int, items) -> View:
+    return View(CATEGORY_TEXT, get_menu_items_keyboard(restaurant_id, category_id, json.loads(items)))
+
+
+@render_stats.timed("item")
+def render_item(restaurant_id: int, item_id: int, menu) -> View:
+    items = (item for category in json.loads(menu or "[]") for item in category["items"])
+    item = next((item for item in items if item["id"] == item_id), None)
+    if item is None:
+        return ITEM_NOT_FOUND_VIEW
+    return View(
+        ITEM_TEMPLATE.render(
+            name=item["name"],
+            description=f"\n{item['description']}" if item["description"] else "",
+            price=item["price"]
+        ),
+        get_item_actions_keyboard(restaurant_id, item_id),
+        item["image_url"]
+    )
 
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
-    user = update.effective_user
-    
-    welcome_text = f"""
-🍕 *Добро пожаловать в FoodDelivery Bot!*
-
-Привет, {user.first_name}! 👋
-
-Я помогу тебе заказать вкусную еду из лучших ресторанов города.
-
-🚀 *Что я умею:*
-• 📱 Показывать каталог ресторанов
-• 🛒 Оформлять заказы
-• 📍 Отслеживать доставку
-• ⭐ Сохранять твои предпочтения
-• 🎁 Начислять бонусы
-
-Нажми на кнопку ниже, чтобы начать! 👇
-    """
+    view = render_start(update.effective_user.first_name)
     
     await update.message.reply_text(
-        welcome_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=get_main_menu_keyboard()
+        view.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=view.reply_markup
     )
 
 
@@ -162,80 +162,108 @@ async def restaurants_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
     
-    # Здесь будет логика получения ресторанов из базы данных
-    restaurants_text = """
-🏪 *Доступные рестораны:*
+    await query.edit_message_text(
+        RESTAURANTS_VIEW.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=RESTAURANTS_VIEW.reply_markup
+    )
 
-🍕 **Pizza Palace**
-⭐ 4.8 • 🚚 25-35 мин • 💰 от 500₽
 
-🍔 **Burger King**
-⭐ 4.5 • 🚚 20-30 мин • 💰 от 300₽
+async def orders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик списка заказов"""
+    query = update.callback_query
+    await query.answer()
+    
+    await query.edit_message_text(
+        ORDERS_VIEW.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=ORDERS_VIEW.reply_markup
+    )
 
-🍜 **Суши Мастер**
-⭐ 4.9 • 🚚 30-40 мин • 💰 от 800₽
 
-🥗 **Healthy Food**
-⭐ 4.6 • 🚚 15-25 мин • 💰 от 400₽
-    """
+async def restaurant_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик меню ресторана (категории)"""
+    query = update.callback_query
+    await query.answer()
     
-    # Создаем фиктивные рестораны для демонстрации
-    class MockRestaurant:
-        def __init__(self, id, name, rating):
-            self.id = id
-            self.name = name
-            self.rating = rating
+    restaurant_id = int(query.data.split("_")[1])
     
-    mock_restaurants = [
-        MockRestaurant(1, "🍕 Pizza Palace", 4.8),
-        MockRestaurant(2, "🍔 Burger King", 4.5),
-        MockRestaurant(3, "🍜 Суши Мастер", 4.9),
-        MockRestaurant(4, "🥗 Healthy Food", 4.6),
-    ]
+    # Готовое сообщение действительно, пока не изменилась версия меню ресторана
+    key = ("restaurant_menu", restaurant_id)
+    version = menu_cache.version(restaurant_id)
+    view = render_cache.get(key, version)
+    if view is None:
+        # Меню берется из общего с API кэша снимков
+        async with AsyncSessionLocal() as db:
+            menu = await RestaurantService(db).get_menu_snapshot(restaurant_id)
+        view = render_cache.put(key, version, render_restaurant_menu(restaurant_id, menu))
     
     await query.edit_message_text(
-        restaurants_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=get_restaurants_keyboard(mock_restaurants)
+        view.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=view.reply_markup
     )
+    
+    # Фото ресторана и блюд загружаются в Telegram заранее, пока пользователь выбирает
+    media_cache.prewarm_restaurant(context.bot, restaurant_id)
 
 
-async def orders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик списка заказов"""
+async def category_items_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик блюд категории"""
     query = update.callback_query
     await query.answer()
     
-    orders_text = """
-📋 *Мои заказы:*
-
-🟢 **Заказ #1234** - *Доставляется*
-🍕 Pizza Margherita x2
-📍 ул. Пушкина, 10
-⏰ Ожидаемое время: 15 мин
+    _, restaurant_id, category_id = query.data.split("_")
+    restaurant_id, category_id = int(restaurant_id), int(category_id)
+    
+    key = ("category_items", restaurant_id, category_id)
+    version = menu_cache.version(restaurant_id)
+    view = render_cache.get(key, version)
+    if view is None:
+        async with AsyncSessionLocal() as db:
+            items = await RestaurantService(db).get_menu_items_snapshot(restaurant_id, category_id=category_id)
+        view = render_cache.put(key, version, render_category_items(restaurant_id, category_id, items))
+    
+    await query.edit_message_text(
+        view.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=view.reply_markup
+    )
 
-🟡 **Заказ #1233** - *Готовится*
-🍔 Big Burger, 🍟 Картофель фри
-📍 ул. Ленина, 25
-⏰ Ожидаемое время: 25 мин
 
-✅ **Заказ #1232** - *Доставлен*
-🍜 Суши сет "Филадельфия"
-📍 пр. Мира, 15
-⏰ Доставлен вчера в 19:30
-    """
+async def item_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик карточки блюда"""
+    query = update.callback_query
+    await query.answer()
     
-    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    _, restaurant_id, item_id = query.data.split("_")
+    restaurant_id, item_id = int(restaurant_id), int(item_id)
     
-    keyboard = [
-        [InlineKeyboardButton("📍 Отследить заказ #1234", callback_data="track_1234")],
-        [InlineKeyboardButton("🔄 Повторить заказ #1232", callback_data="repeat_1232")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
+    key = ("item", restaurant_id, item_id)
+    version = menu_cache.version(restaurant_id)
+    view = render_cache.get(key, version)
+    if view is None:
+        async with AsyncSessionLocal() as db:
+            menu = await RestaurantService(db).get_menu_snapshot(restaurant_id)
+        view = render_cache.put(key, version, render_item(restaurant_id, item_id, menu))
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    if view.photo:
+        # Фото отправляется по file_id, если Telegram его уже видел
+        try:
+            await media_cache.send_photo(
+                context.bot,
+                query.message.chat_id,
+                view.photo,
+                caption=view.text,
+                parse_mode=PARSE_MODE,
+                reply_markup=view.reply_markup
+            )
+            return
+        except (TelegramError, ValueError, OSError):
+            logger.warning("Не удалось отправить фото блюда %s", view.photo, exc_info=True)
     
     await query.edit_message_text(
-        orders_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup
-    )
\ No newline at end of file
+        view.text,
+        parse_mode=PARSE_MODE,
+        reply_markup=view.reply_markup
+    )
@@ -5,20 +5,39 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 
 
+# Клавиатуры без данных строятся один раз: InlineKeyboardMarkup неизменяем,
+# один объект можно отправлять в любом числе сообщений
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🍕 Открыть приложение", web_app=WebAppInfo(url="https://your-domain.com/webapp"))],
+    [
+        InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list"),
+        InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")
+    ],
+    [
+        InlineKeyboardButton("🎁 Бонусы", callback_data="loyalty_program"),
+        InlineKeyboardButton("ℹ️ Помощь", callback_data="help")
+    ]
+])
+
+ADMIN_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📊 Статистика", callback_data="admin_stats"),
+        InlineKeyboardButton("🏪 Рестораны", callback_data="admin_restaurants")
+    ],
+    [
+        InlineKeyboardButton("📋 Заказы", callback_data="admin_orders"),
+        InlineKeyboardButton("👥 Пользователи", callback_data="admin_users")
+    ],
+    [
+        InlineKeyboardButton("🚚 Курьеры", callback_data="admin_couriers"),
+        InlineKeyboardButton("💰 Финансы", callback_data="admin_finance")
+    ]
+])
+
+
 def get_main_menu_keyboard():
     """Главное меню бота"""
-    keyboard = [
-        [InlineKeyboardButton("🍕 Открыть приложение", web_app=WebAppInfo(url="https://your-domain.com/webapp"))],
-        [
-            InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list"),
-            InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")
-        ],
-        [
-            InlineKeyboardButton("🎁 Бонусы", callback_data="loyalty_program"),
-            InlineKeyboardButton("ℹ️ Помощь", callback_data="help")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return MAIN_MENU_KEYBOARD
 
 
 def get_restaurants_keyboard(restaurants):
@@ -38,14 +57,14 @@ def get_restaurants_keyboard(restaurants):
 
 
 def get_restaurant_menu_keyboard(restaurant_id, categories):
-    """Клавиатура меню ресторана"""
+    """Клавиатура меню ресторана (categories - снимок меню из кэша)"""
     keyboard = []
     
     for category in categories:
         keyboard.append([
             InlineKeyboardButton(
-                category.name,
-                callback_data=f"category_{restaurant_id}_{category.id}"
+                category["name"],
+                callback_data=f"category_{restaurant_id}_{category['id']}"
             )
         ])
     
@@ -58,14 +77,14 @@ def get_restaurant_menu_keyboard(restaurant_id, categories):
 
 
 def get_menu_items_keyboard(restaurant_id, category_id, items):
-    """Клавиатура с блюдами категории"""
+    """Клавиатура с блюдами категории (items - снимок блюд из кэша)"""
     keyboard = []
     
     for item in items:
         keyboard.append([
             InlineKeyboardButton(
-                f"{item.name} - {item.price}₽",
-                callback_data=f"item_{restaurant_id}_{item.id}"
+                f"{item['name']} - {item['price']}₽",
+                callback_data=f"item_{restaurant_id}_{item['id']}"
             )
         ])
     
@@ -128,18 +147,4 @@ def get_order_tracking_keyboard(order_id):
 
 def get_admin_keyboard():
     """Админская клавиатура"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📊 Статистика", callback_data="admin_stats"),
-            InlineKeyboardButton("🏪 Рестораны", callback_data="admin_restaurants")
-        ],
-        [
-            InlineKeyboardButton("📋 Заказы", callback_data="admin_orders"),
-            InlineKeyboardButton("👥 Пользователи", callback_data="admin_users")
-        ],
-        [
-            InlineKeyboardButton("🚚 Курьеры", callback_data="admin_couriers"),
-            InlineKeyboardButton("💰 Финансы", callback_data="admin_finance")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    return ADMIN_KEYBOARD
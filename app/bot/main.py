@@ -3,13 +3,19 @@
 """
 
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from telegram.constants import ParseMode
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler
 
 from app.core.config import settings
-from app.bot.keyboards import get_main_menu_keyboard, get_restaurants_keyboard
-from app.bot.handlers import start_handler, restaurants_handler, orders_handler
+from app.bot.sender import SendScheduler
+from app.bot.webhook import update_dispatcher
+from app.bot.handlers import (
+    start_handler,
+    restaurants_handler,
+    orders_handler,
+    restaurant_menu_handler,
+    category_items_handler,
+    item_handler
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,23 +30,42 @@ class FoodDeliveryBot:
     
     def __init__(self):
         self.application = None
+        # Все запросы к Bot API идут через очереди с лимитами Telegram. Рассылки
+        # админ-бота идут со своим ведром CAMPAIGN_RATE, в режиме polling
+        # уведомления шлет отдельный бот API со своим ведром BROADCAST_RATE
+        global_rate = 30.0 - settings.CAMPAIGN_RATE
+        if not settings.TELEGRAM_WEBHOOK_URL:
+            global_rate -= settings.BROADCAST_RATE
+        self.send_scheduler = SendScheduler(global_rate=global_rate)
         
     async def setup_bot(self):
         """Настройка и запуск бота"""
         # Создание приложения
-        self.application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(settings.TELEGRAM_BOT_TOKEN)
+            .rate_limiter(self.send_scheduler)
+            .build()
+        )
         
         # Регистрация обработчиков
         self.application.add_handler(CommandHandler("start", start_handler))
         self.application.add_handler(CallbackQueryHandler(restaurants_handler, pattern="^restaurants"))
         self.application.add_handler(CallbackQueryHandler(orders_handler, pattern="^orders"))
+        self.application.add_handler(CallbackQueryHandler(restaurant_menu_handler, pattern=r"^restaurant_\d+$"))
+        self.application.add_handler(CallbackQueryHandler(category_items_handler, pattern=r"^category_\d+_\d+$"))
+        self.application.add_handler(CallbackQueryHandler(item_handler, pattern=r"^item_\d+_\d+$"))
         
         # Запуск бота
         if settings.TELEGRAM_WEBHOOK_URL:
-            # Webhook режим для продакшена
+            # Webhook режим для продакшена: обновления принимает /webhook приложения FastAPI
+            await self.application.initialize()
+            await self.application.start()
+            update_dispatcher.start(self.application.process_update, self.application.bot)
             await self.application.bot.set_webhook(
                 url=f"{settings.TELEGRAM_WEBHOOK_URL}/webhook",
-                allowed_updates=["message", "callback_query"]
+                allowed_updates=["message", "callback_query"],
+                secret_token=update_dispatcher.secret
             )
         else:
             # Polling режим для разработки
@@ -53,6 +78,9 @@ class FoodDeliveryBot:
     async def stop_bot(self):
         """Остановка бота"""
         if self.application:
+            await update_dispatcher.stop()
+            if self.application.updater and self.application.updater.running:
+                await self.application.updater.stop()
             await self.application.stop()
             await self.application.shutdown()
 
@@ -70,121 +98,3 @@ async def stop_bot():
     """Функция для остановки бота"""
     await bot_instance.stop_bot()
 
-
-# Обработчики команд
-async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик команды /start"""
-    user = update.effective_user
-    
-    # Создание Web App кнопки
-    web_app = WebAppInfo(url="https://your-domain.com/webapp")
-    
-    keyboard = [
-        [InlineKeyboardButton("🍕 Открыть приложение", web_app=web_app)],
-        [InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")],
-        [InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list")],
-        [InlineKeyboardButton("ℹ️ Помощь", callback_data="help")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = f"""
-🍕 *Добро пожаловать в FoodDelivery Bot!*
-
-Привет, {user.first_name}! 👋
-
-Я помогу тебе заказать вкусную еду из лучших ресторанов города.
-
-🚀 *Что я умею:*
-• 📱 Показывать каталог ресторанов
-• 🛒 Оформлять заказы
-• 📍 Отслеживать доставку
-• ⭐ Сохранять твои предпочтения
-• 🎁 Начислять бонусы
-
-Нажми на кнопку ниже, чтобы начать! 👇
-    """
-    
-    await update.message.reply_text(
-        welcome_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup
-    )
-
-
-async def restaurants_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик списка ресторанов"""
-    query = update.callback_query
-    await query.answer()
-    
-    # Здесь будет логика получения ресторанов из базы данных
-    restaurants_text = """
-🏪 *Доступные рестораны:*
-
-🍕 **Pizza Palace**
-⭐ 4.8 • 🚚 25-35 мин • 💰 от 500₽
-
-🍔 **Burger King**
-⭐ 4.5 • 🚚 20-30 мин • 💰 от 300₽
-
-🍜 **Суши Мастер**
-⭐ 4.9 • 🚚 30-40 мин • 💰 от 800₽
-
-🥗 **Healthy Food**
-⭐ 4.6 • 🚚 15-25 мин • 💰 от 400₽
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("🍕 Pizza Palace", callback_data="restaurant_1")],
-        [InlineKeyboardButton("🍔 Burger King", callback_data="restaurant_2")],
-        [InlineKeyboardButton("🍜 Суши Мастер", callback_data="restaurant_3")],
-        [InlineKeyboardButton("🥗 Healthy Food", callback_data="restaurant_4")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        restaurants_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup
-    )
-
-
-async def orders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик списка заказов"""
-    query = update.callback_query
-    await query.answer()
-    
-    orders_text = """
-📋 *Мои заказы:*
-
-🟢 **Заказ #1234** - *Доставляется*
-🍕 Pizza Margherita x2
-📍 ул. Пушкина, 10
-⏰ Ожидаемое время: 15 мин
-
-🟡 **Заказ #1233** - *Готовится*
-🍔 Big Burger, 🍟 Картофель фри
-📍 ул. Ленина, 25
-⏰ Ожидаемое время: 25 мин
-
-✅ **Заказ #1232** - *Доставлен*
-🍜 Суши сет "Филадельфия"
-📍 пр. Мира, 15
-⏰ Доставлен вчера в 19:30
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("📍 Отследить заказ #1234", callback_data="track_1234")],
-        [InlineKeyboardButton("🔄 Повторить заказ #1232", callback_data="repeat_1232")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        orders_text,
-        parse_mode=ParseMode.MARKDOWN,
-        reply_markup=reply_markup
-    )
@@ -0,0 +1,192 @@
+"""
+Подготовка сообщений бота: шаблоны MarkdownV2, готовые клавиатуры и кэш представлений
+"""
+
+import re
+import time
+from collections import OrderedDict
+from functools import wraps
+from string import Formatter
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Sequence, Tuple, Union
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+
+# Все сообщения бота размечены MarkdownV2
+PARSE_MODE = ParseMode.MARKDOWN_V2
+
+# Символы, которые в MarkdownV2 нужно экранировать вне разметки
+MARKDOWN_V2_SPECIAL = "\\_*[]()~`>#+-=|{}.!"
+
+_ESCAPE = str.maketrans({char: "\\" + char for char in MARKDOWN_V2_SPECIAL})
+
+# Разметка шаблона: *жирный*, _курсив_, ~зачеркнутый~, ||скрытый||, `код`.
+# Остальные спецсимволы текста шаблона экранируются при компиляции,
+# "\\" перед символом разметки делает его обычным символом.
+# Разметка - только двойная "||", одиночная "|" экранируется.
+_TEMPLATE_LITERAL = re.compile(r"\\(.)|(\|\|)|([\[\]()>#+\-={}.!|])", re.DOTALL)
+
+
+def escape_markdown(value: Any) -> str:
+    """Текст для MarkdownV2 без разметки"""
+    return str(value).translate(_ESCAPE)
+
+
+def _compile_literal(text: str) -> str:
+    escaped = _TEMPLATE_LITERAL.sub(
+        lambda match: match.group(2) or "\\" + (match.group(1) or match.group(3)), text
+    )
+    # Фигурные скобки текста не должны стать полями str.format
+    return escaped.replace("{", "{{").replace("}", "}}")
+
+
+class Template:
+    """
+    Шаблон сообщения MarkdownV2 с полями {name} и {name:format}.
+
+    Текст шаблона разбирается и экранируется один раз при создании;
+    render() только форматирует и экранирует подставляемые значения.
+    Шаблон без полей сразу хранит готовый текст.
+    """
+
+    __slots__ = ("_format", "_fields", "text")
+
+    def __init__(self, source: str):
+        parts = []
+        fields = []
+        for literal, field, spec, _ in Formatter().parse(source):
+            parts.append(_compile_literal(literal))
+            if field is not None:
+                parts.append("{}")
+                fields.append((field, spec or ""))
+
+        self._format = "".join(parts)
+        self._fields: Tuple[Tuple[str, str], ...] = tuple(fields)
+        self.text: Optional[str] = None if fields else self._format.format()
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        """Имена полей шаблона в порядке появления"""
+        return tuple(dict.fromkeys(name for name, _ in self._fields))
+
+    def render(self, **values: Any) -> str:
+        if self.text is not None:
+            return self.text
+        return self._format.format(*[
+            escape_markdown(format(values[name], spec)) for name, spec in self._fields
+        ])
+
+
+Button = Union[InlineKeyboardButton, Tuple[str, str]]
+
+
+def keyboard(*rows: Sequence[Button]) -> InlineKeyboardMarkup:
+    """Клавиатура из рядов кнопок; пара (текст, callback_data) - обычная кнопка"""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(button[0], callback_data=button[1]) if isinstance(button, tuple) else button
+            for button in row
+        ]
+        for row in rows
+    ])
+
+
+class View(NamedTuple):
+    """Готовое сообщение: текст MarkdownV2, клавиатура и URL фото (текст - подпись к нему)"""
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+    photo: Optional[str] = None
+
+
+class RenderCache:
+    """
+    LRU готовых представлений, зависящих от данных.
+
+    Запись хранится с версией данных, из которых построена; при другой
+    версии она считается промахом и заменяется новой. Версию нужно брать
+    до загрузки данных - тогда изменение во время загрузки не оставит
+    в кэше устаревшее представление под новой версией.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: Hashable, value: Any) -> Any:
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class RenderStats:
+    """Время подготовки сообщений по обработчикам: число, среднее и максимум"""
+
+    def __init__(self):
+        # имя -> [число, суммарное время, максимум], секунды
+        self._views: Dict[str, list] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        entry = self._views.get(name)
+        if entry is None:
+            entry = self._views[name] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+
+    def timed(self, name: str) -> Callable[[Callable[..., View]], Callable[..., View]]:
+        """Декоратор функции, готовящей сообщение обработчика name"""
+        def decorator(render: Callable[..., View]) -> Callable[..., View]:
+            @wraps(render)
+            def wrapper(*args, **kwargs) -> View:
+                started = time.perf_counter()
+                try:
+                    return render(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def clear(self) -> None:
+        self._views.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "renders": count,
+                "avg_us": round(total / count * 1e6, 2),
+                "max_us": round(longest * 1e6, 2)
+            }
+            for name, (count, total, longest) in self._views.items()
+        }
+
+
+# Глобальный кэш представлений и метрики подготовки сообщений
+render_cache = RenderCache()
+render_stats = RenderStats()
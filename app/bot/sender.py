@@ -0,0 +1,388 @@
+"""
+Планировщик исходящих запросов к Bot API: лимиты Telegram, приоритеты и повтор 429
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Правки сообщения, из которых в очереди достаточно последней
+COALESCED_ENDPOINTS = frozenset({
+    "editMessageText",
+    "editMessageCaption",
+    "editMessageMedia",
+    "editMessageReplyMarkup",
+    "editMessageLiveLocation",
+})
+
+# Последних задержек доставки для перцентилей
+LATENCY_WINDOW = 1000
+
+
+class SendPriority(IntEnum):
+    """Класс срочности запроса; передается как rate_limit_args метода бота"""
+    INTERACTIVE = 0  # Ответ на действие пользователя
+    STATUS = 1  # Уведомление о заказе
+    MARKETING = 2  # Рассылки
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity сразу"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def full_at(self, now: float) -> float:
+        """Момент, когда ведро снова наполнится"""
+        self._refill(now)
+        return now + (self.capacity - self.tokens) / self.rate
+
+
+class _Job:
+    __slots__ = ("priority", "callback", "args", "kwargs", "waiters", "enqueued", "retries", "edit_key")
+
+    def __init__(self, priority, callback, args, kwargs, enqueued, edit_key):
+        self.priority = priority
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.waiters: List[asyncio.Future] = []
+        self.enqueued = enqueued
+        self.retries = 0
+        self.edit_key = edit_key
+
+
+class _Chat:
+    __slots__ = ("chat_id", "jobs", "bucket", "busy", "scheduled", "priority")
+
+    def __init__(self, chat_id: Hashable, bucket: TokenBucket):
+        self.chat_id = chat_id
+        self.jobs: Deque[_Job] = deque()
+        self.bucket = bucket
+        self.busy = False
+        # Очередность и срочность актуальной записи чата в _ready/_waiting
+        self.scheduled: Optional[int] = None
+        self.priority = SendPriority.MARKETING
+
+
+class SendScheduler(BaseRateLimiter[SendPriority]):
+    """
+    Ограничитель запросов для Application.builder().rate_limiter(...).
+
+    Запросы в чат встают в очередь чата (FIFO): в каждом чате не больше
+    одного запроса в полете (порядок сообщений сохраняется) и своё ведро
+    токенов (chat_rate в секунду, группы - group_rate), все чаты вместе
+    берут токены из общего ведра global_rate (global_burst сразу). Из
+    готовых к отправке чатов первым идет тот, в очереди которого самый
+    срочный запрос (SendPriority, затем очередность). Правки одного
+    сообщения, еще не ушедшие в Telegram, сливаются в одну - уходит
+    последняя, на месте последней правки, ответ получают все вызывающие. На 429 отправка всех чатов
+    приостанавливается на retry_after, и запрос повторяется. Запросы без
+    chat_id (answerCallbackQuery, getMe, ...) идут сразу, с тем же повтором.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        global_burst: float = 1.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._clock = clock
+
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._chats: Dict[Hashable, _Chat] = {}
+        self._edits: Dict[Tuple[Hashable, str, Any], _Job] = {}
+        # (приоритет, очередность, чат) - чаты, которые можно отправлять сейчас
+        self._ready: List[Tuple[int, int, _Chat]] = []
+        # (момент, очередность, чат) - чаты, ждущие свой токен
+        self._waiting: List[Tuple[float, int, _Chat]] = []
+        # (момент наполнения ведра, чат) - пустые чаты, которые можно забыть
+        self._idle: List[Tuple[float, int, _Chat]] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._queued = 0
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._latency_max = 0.0
+
+    async def initialize(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Остановить отправку; ожидающие запросы завершаются ошибкой"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._inflight):
+            await asyncio.gather(task, return_exceptions=True)
+
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                self._finish(job, error=RuntimeError("Send scheduler is shut down"))
+            chat.jobs.clear()
+        self._chats.clear()
+        self._edits.clear()
+        self._ready.clear()
+        self._waiting.clear()
+        self._idle.clear()
+        self._queued = 0
+
+    async def process_request(
+        self,
+        callback,
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[SendPriority],
+    ):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._call_direct(callback, args, kwargs)
+
+        if self._task is None:
+            await self.initialize()
+
+        priority = SendPriority(rate_limit_args) if rate_limit_args is not None else SendPriority.INTERACTIVE
+        waiter = asyncio.get_running_loop().create_future()
+
+        edit_key = None
+        if endpoint in COALESCED_ENDPOINTS and data.get("message_id") is not None:
+            edit_key = (chat_id, endpoint, data["message_id"])
+            job = self._edits.get(edit_key)
+            if job is not None:
+                # Предыдущая правка еще в очереди - уйдет только новая, в конце очереди чата
+                chat = self._chats[chat_id]
+                chat.jobs.remove(job)
+                self._queued -= 1
+                job.callback, job.args, job.kwargs = callback, args, kwargs
+                job.priority = min(job.priority, priority)
+                job.waiters.append(waiter)
+                self.coalesced += 1
+                self._enqueue(chat, job)
+                return await waiter
+
+        job = _Job(priority, callback, args, kwargs, self._clock(), edit_key)
+        job.waiters.append(waiter)
+        if edit_key is not None:
+            self._edits[edit_key] = job
+
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = self.group_rate if self._is_group(chat_id) else self.chat_rate
+            chat = self._chats[chat_id] = _Chat(chat_id, TokenBucket(rate, self.chat_burst, self._clock()))
+        self._enqueue(chat, job)
+        return await waiter
+
+    def _enqueue(self, chat: _Chat, job: _Job) -> None:
+        chat.jobs.append(job)
+        self._queued += 1
+        if chat.scheduled is not None and job.priority < chat.priority:
+            # Новый запрос срочнее тех, с которыми чат уже стоит в очереди
+            chat.scheduled = None
+        self._schedule(chat)
+
+    @staticmethod
+    def _is_group(chat_id: Any) -> bool:
+        if isinstance(chat_id, str):
+            return chat_id.startswith("@") or chat_id.startswith("-")
+        return chat_id < 0
+
+    async def _call_direct(self, callback, args, kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as error:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(float(error.retry_after))
+
+    def _schedule(self, chat: _Chat) -> None:
+        """Поставить чат в очередь готовых или ждущих токен"""
+        if chat.busy or chat.scheduled is not None or not chat.jobs:
+            return
+
+        now = self._clock()
+        seq = chat.scheduled = next(self._seq)
+        delay = chat.bucket.delay(now)
+        priority = chat.priority = min(job.priority for job in chat.jobs)
+        if delay > 0:
+            heapq.heappush(self._waiting, (now + delay, seq, chat))
+        else:
+            heapq.heappush(self._ready, (priority, seq, chat))
+        self._wakeup.set()
+
+    async def _sleep(self, timeout: Optional[float]) -> None:
+        """Ждать timeout секунд или нового запроса"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            now = self._clock()
+
+            while self._waiting and self._waiting[0][0] <= now:
+                _, seq, chat = heapq.heappop(self._waiting)
+                if chat.scheduled == seq:
+                    heapq.heappush(self._ready, (chat.priority, seq, chat))
+
+            while self._idle and self._idle[0][0] <= now:
+                _, _, chat = heapq.heappop(self._idle)
+                if not chat.jobs and not chat.busy and self._chats.get(chat.chat_id) is chat:
+                    del self._chats[chat.chat_id]
+
+            # Записи чатов, поставленных заново с более срочным запросом, устарели
+            while self._ready and self._ready[0][2].scheduled != self._ready[0][1]:
+                heapq.heappop(self._ready)
+
+            if self._paused_until > now:
+                await self._sleep(self._paused_until - now)
+                continue
+
+            if not self._ready:
+                await self._sleep(self._waiting[0][0] - now if self._waiting else None)
+                continue
+
+            delay = self._global.delay(now)
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+
+            _, _, chat = heapq.heappop(self._ready)
+            job = chat.jobs.popleft()
+            self._queued -= 1
+            if job.edit_key is not None and self._edits.get(job.edit_key) is job:
+                del self._edits[job.edit_key]
+
+            chat.scheduled = None
+            chat.busy = True
+            self._global.take(now)
+            chat.bucket.take(now)
+
+            task = asyncio.create_task(self._send(chat, job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat: _Chat, job: _Job) -> None:
+        try:
+            result = await job.callback(*job.args, **job.kwargs)
+        except RetryAfter as error:
+            if job.retries < self.max_retries:
+                job.retries += 1
+                self.retries += 1
+                # 429 обычно означает общий лимит бота - пауза для всех чатов
+                self._paused_until = max(self._paused_until, self._clock() + float(error.retry_after))
+                chat.jobs.appendleft(job)
+                self._queued += 1
+                logger.warning("Telegram 429, повтор через %s с", error.retry_after)
+            else:
+                self.failed += 1
+                self._finish(job, error=error)
+        except Exception as error:
+            self.failed += 1
+            self._finish(job, error=error)
+        else:
+            self.sent += 1
+            self._finish(job, result=result)
+        finally:
+            chat.busy = False
+            if chat.jobs:
+                self._schedule(chat)
+            else:
+                now = self._clock()
+                heapq.heappush(self._idle, (chat.bucket.full_at(now), next(self._seq), chat))
+            self._wakeup.set()
+
+    def _finish(self, job: _Job, result: Any = None, error: Optional[BaseException] = None) -> None:
+        latency = self._clock() - job.enqueued
+        self._latencies.append(latency)
+        if latency > self._latency_max:
+            self._latency_max = latency
+
+        for waiter in job.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Запросов в очередях по классам срочности"""
+        depth = {priority.name.lower(): 0 for priority in SendPriority}
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                depth[SendPriority(job.priority).name.lower()] += 1
+        return depth
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики отправки: очередь, отправлено, слито, повторы и задержка"""
+        latencies = sorted(self._latencies)
+        return {
+            "queued": self._queued,
+            "chats": len(self._chats),
+            "inflight": len(self._inflight),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failed": self.failed,
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else 0.0,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else 0.0,
+            "latency_max_ms": round(self._latency_max * 1000, 1)
+        }
@@ -0,0 +1,218 @@
+"""
+Прием обновлений Telegram через webhook FastAPI: проверка секрета, ограниченная
+очередь и пул обработчиков с сохранением порядка обновлений одного чата
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from telegram import Update
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Последних замеров для перцентилей
+LATENCY_WINDOW = 1000
+
+
+def webhook_secret() -> str:
+    """
+    Секрет X-Telegram-Bot-Api-Secret-Token: из настроек или, если он не
+    задан, производный от токена бота (Telegram допускает A-Z, a-z, 0-9, _ и -)
+    """
+    if settings.TELEGRAM_WEBHOOK_SECRET:
+        return settings.TELEGRAM_WEBHOOK_SECRET
+    return hashlib.sha256(f"webhook:{settings.TELEGRAM_BOT_TOKEN}".encode()).hexdigest()
+
+
+def update_key(update: Update) -> Optional[Hashable]:
+    """Ключ упорядочивания: чат обновления, иначе пользователь"""
+    chat = update.effective_chat
+    if chat is not None:
+        return chat.id
+    user = update.effective_user
+    return ("user", user.id) if user is not None else None
+
+
+def _percentile(values: List[float], share: float) -> float:
+    return round(values[min(int(len(values) * share), len(values) - 1)] * 1000, 2) if values else 0.0
+
+
+class UpdateDispatcher:
+    """
+    Пул обработчиков обновлений.
+
+    В очереди не больше max_pending обновлений: submit() ждет места не
+    дольше submit_timeout и при переполнении возвращает False (webhook
+    отвечает 503, Telegram повторит доставку позже), так что под нагрузкой
+    не создается лишних задач. workers задач обрабатывают обновления
+    параллельно; у чата, обновление которого уже в работе или в очереди,
+    следующие ждут в его цепочке и попадают в общую очередь по одному,
+    поэтому обновления одного чата обрабатываются строго по порядку.
+    """
+
+    def __init__(self, workers: int = 64, max_pending: int = 1000, submit_timeout: float = 5.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+
+        self.bot = None
+        self.secret: Optional[str] = None
+        self._handler: Optional[Callable[[Update], Awaitable[Any]]] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._chains: Dict[Hashable, Deque[Tuple[Hashable, Update, float]]] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+        self._drained: Optional[asyncio.Event] = None
+
+        self.received = 0
+        self.processed = 0
+        self.rejected = 0
+        self.errors = 0
+        self._handler_times: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._queue_times: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def submit(self, update: Update) -> bool:
+        """Поставить обновление в очередь; False - очередь переполнена"""
+        if self._slots.locked():
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.submit_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        else:
+            await self._slots.acquire()
+
+        self.received += 1
+        self._pending += 1
+        self._drained.clear()
+
+        key = update_key(update)
+        item = (key, update, time.monotonic())
+        if key is not None:
+            chain = self._chains.get(key)
+            if chain is not None:
+                # Предыдущее обновление чата еще не обработано
+                chain.append(item)
+                return True
+            self._chains[key] = deque()
+        self._ready.put_nowait(item)
+        return True
+
+    async def _work(self) -> None:
+        while True:
+            key, update, queued = await self._ready.get()
+            started = time.monotonic()
+            self._queue_times.append(started - queued)
+            try:
+                await self._handler(update)
+            except Exception:
+                self.errors += 1
+                logger.exception("Ошибка обработки обновления %s", update.update_id)
+            finally:
+                self._handler_times.append(time.monotonic() - started)
+                self.processed += 1
+                if key is not None:
+                    chain = self._chains[key]
+                    if chain:
+                        self._ready.put_nowait(chain.popleft())
+                    else:
+                        del self._chains[key]
+                self._pending -= 1
+                if not self._pending:
+                    self._drained.set()
+                self._slots.release()
+
+    def start(self, handler: Callable[[Update], Awaitable[Any]], bot=None) -> None:
+        """Запустить обработчики; handler - обычно Application.process_update"""
+        self._handler = handler
+        self.bot = bot
+        self.secret = webhook_secret()
+        if not self._tasks:
+            self._slots = asyncio.Semaphore(self.max_pending)
+            self._ready = asyncio.Queue()
+            self._drained = asyncio.Event()
+            self._drained.set()
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дообработать принятые обновления (не дольше timeout) и остановить обработчики"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Остановка webhook: не обработано %d обновлений", self._pending)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._chains.clear()
+        self._pending = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики приема обновлений"""
+        handler_times = sorted(self._handler_times)
+        queue_times = sorted(self._queue_times)
+        return {
+            "pending": self._pending,
+            "chats": len(self._chains),
+            "received": self.received,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "handler_p50_ms": _percentile(handler_times, 0.5),
+            "handler_p95_ms": _percentile(handler_times, 0.95),
+            "handler_p99_ms": _percentile(handler_times, 0.99),
+            "queue_p95_ms": _percentile(queue_times, 0.95)
+        }
+
+
+# Глобальный прием обновлений
+update_dispatcher = UpdateDispatcher(
+    workers=settings.WEBHOOK_WORKERS,
+    max_pending=settings.WEBHOOK_QUEUE_SIZE
+)
+
+router = APIRouter()
+
+
+@router.post("/webhook", include_in_schema=False)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    """Обновление от Telegram: принимается в очередь, ответ - сразу"""
+    if not update_dispatcher.running:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    # Секрет проверяется до чтения и разбора тела
+    if x_telegram_bot_api_secret_token is None or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token.encode(), update_dispatcher.secret.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    try:
+        update = Update.de_json(json.loads(await request.body()), update_dispatcher.bot)
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid update")
+    if update is None:
+        raise HTTPException(status_code=400, detail="Invalid update")
+
+    if not await update_dispatcher.submit(update):
+        raise HTTPException(status_code=503, detail="Too many pending updates")
+    return Response(status_code=200)
@@ -20,14 +20,28 @@ class Settings(BaseSettings):
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
     
+    # Корзины
+    CART_BACKEND: str = "memory"  # memory, database (память + запись в БД; один процесс) или redis (несколько процессов)
+    CART_TTL: int = 86400  # корзина без изменений хранится, секунды
+    
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = ""
     TELEGRAM_WEBHOOK_URL: Optional[str] = None
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None  # по умолчанию выводится из токена бота
+    WEBHOOK_WORKERS: int = 64  # параллельных обработчиков обновлений
+    WEBHOOK_QUEUE_SIZE: int = 1000  # принятых, но не обработанных обновлений
+    TELEGRAM_AUTH_MAX_AGE: int = 86400  # срок действия данных Login Widget / initData, секунды
+    TELEGRAM_MEDIA_CHAT_ID: Optional[int] = None  # служебный чат для предзагрузки изображений в Telegram
+    # Лимит клиентского бота - 30 сообщений в секунду на все процессы, которые шлют от его имени
+    BROADCAST_RATE: float = 10.0  # уведомления о заказах из API в режиме polling
+    CAMPAIGN_RATE: float = 10.0  # рассылки из админ-бота
     
     # Безопасность
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    JWT_BACKEND: str = "jose"  # jose или native (встроенная проверка HS256/384/512)
+    JWT_CACHE_SIZE: int = 10000  # проверенных токенов в кэше
     
     # CORS
     ALLOWED_HOSTS: List[str] = ["*"]
@@ -38,6 +52,7 @@ class Settings(BaseSettings):
     # Файлы
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
+    IMAGE_WORKERS: int = 2  # процессов для подготовки вариантов изображений
     
     # Доставка
     DEFAULT_DELIVERY_FEE: float = 150.0
@@ -11,17 +11,60 @@ from contextlib import asynccontextmanager
 import uvicorn
 
 from app.core.config import settings
-from app.core.database import engine, init_db
+from app.core.database import engine, init_db, AsyncSessionLocal
+from app.api.routes import api_router
+from app.api.response_cache import ResponseCacheMiddleware
+from app.bot.main import bot_instance, setup_bot, stop_bot
+from app.bot.webhook import router as webhook_router
 from app.admin.views import *  # Импорт админ-моделей
+from app.services.location_service import courier_locations
+from app.services.dispatch_service import courier_dispatcher
+from app.services.popularity import popularity
+from app.services.aggregates import order_aggregates
+from app.services.presence import user_presence, courier_presence
+from app.services.cart import cart_service
+from app.services.broadcast import broadcast_engine
+from app.services.media_cache import media_cache
+from app.services.menu_cache import menu_cache
+from app.services.uploads import image_pipeline
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
     # Инициализация при запуске
     await init_db()
+    courier_locations.start(AsyncSessionLocal)
+    courier_dispatcher.start(AsyncSessionLocal)
+    popularity.start(AsyncSessionLocal)
+    order_aggregates.start(AsyncSessionLocal)
+    user_presence.start(AsyncSessionLocal)
+    courier_presence.start(AsyncSessionLocal)
+    cart_service.start(AsyncSessionLocal)
+    media_cache.start(AsyncSessionLocal)
+    menu_cache.start(AsyncSessionLocal)
+    image_pipeline.start()
+    if settings.TELEGRAM_WEBHOOK_URL:
+        # Бот в webhook режиме получает обновления через /webhook этого приложения
+        await setup_bot()
+        # Уведомления идут через того же бота - одно ведро с обработчиками обновлений
+        broadcast_engine.start(AsyncSessionLocal, bot=bot_instance.application.bot)
+    else:
+        broadcast_engine.start(AsyncSessionLocal)
     yield
     # Очистка при завершении
-    pass
+    await broadcast_engine.stop()
+    if settings.TELEGRAM_WEBHOOK_URL:
+        await stop_bot()
+    await image_pipeline.stop()
+    await menu_cache.stop()
+    await media_cache.stop()
+    await cart_service.stop()
+    await courier_presence.stop()
+    await user_presence.stop()
+    await order_aggregates.stop()
+    await popularity.stop()
+    await courier_dispatcher.stop()
+    await courier_locations.stop()
 
 # Создание FastAPI приложения
 app = FastAPI(
@@ -31,6 +74,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Кэш ответов каталога (внутри CORS, чтобы и ответы из кэша получали его заголовки)
+app.add_middleware(ResponseCacheMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +86,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Подключение API
+app.include_router(api_router, prefix="/api/v1")
+app.include_router(webhook_router)
+
+# Загруженные изображения (в продакшене /uploads/ отдает nginx)
+app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False), name="uploads")
+
 # Подключение админки
 admin = Admin(app=app, engine=engine)
 admin.add_view(UserAdmin)
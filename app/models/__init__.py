@@ -8,6 +8,11 @@ from app.models.menu import MenuCategory, MenuItem
 from app.models.order import Order, OrderItem, OrderStatus, PaymentMethod
 from app.models.review import Review
 from app.models.courier import Courier, CourierStatus, CourierType, DeliveryTracking
+from app.models.loyalty import LoyaltyTransaction
+from app.models.cart import SavedCart
+from app.models.broadcast import Broadcast, BroadcastStatus
+from app.models.media import MediaFile
+from app.models.cache_version import CacheVersion
 
 __all__ = [
     "User",
@@ -24,4 +29,10 @@ __all__ = [
     "CourierStatus",
     "CourierType",
     "DeliveryTracking",
+    "LoyaltyTransaction",
+    "SavedCart",
+    "Broadcast",
+    "BroadcastStatus",
+    "MediaFile",
+    "CacheVersion",
 ]
@@ -0,0 +1,57 @@
+﻿"""
+Рассылки пользователям бота
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Enum
+from sqlalchemy.sql import func
+import enum
+
+from app.core.database import Base
+
+
+class BroadcastStatus(enum.Enum):
+    """Статусы рассылки"""
+    DRAFT = "draft"            # Создана, не запущена
+    RUNNING = "running"        # Идет (или прервана сбоем и будет продолжена)
+    DONE = "done"              # Завершена
+    CANCELLED = "cancelled"    # Остановлена администратором
+
+
+class Broadcast(Base):
+    """
+    Рассылка по активным пользователям.
+
+    Получатели перебираются по возрастанию users.id, поэтому ход рассылки -
+    это два ID: claimed_until (до него получатели отданы на отправку,
+    записывается до отправки) и done_until (до него все отправки завершены).
+    После сбоя рассылка продолжается с claimed_until, а получатели между
+    done_until и claimed_until считаются неподтвержденными - повторно
+    им ничего не отправляется.
+
+    run_token - метка запуска, который сейчас проводит рассылку: запуск
+    захватывает строку сравнением с прочитанной меткой и пишет ход только
+    пока метка его, поэтому одну рассылку не проводят два запуска сразу.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False)  # Шаблон MarkdownV2
+    status = Column(Enum(BroadcastStatus), default=BroadcastStatus.DRAFT, nullable=False, index=True)
+    created_by = Column(BigInteger, nullable=True)  # Telegram ID администратора
+    run_token = Column(String(32), nullable=True)  # Метка текущего запуска
+    
+    # Ход рассылки
+    total = Column(Integer, default=0)  # Получателей на момент запуска
+    claimed_until = Column(Integer, default=0)
+    done_until = Column(Integer, default=0)
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    unconfirmed = Column(Integer, default=0)
+    
+    # Временные метки
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    def __repr__(self):
+        return f"<Broadcast(id={self.id}, status={self.status}, sent={self.sent}/{self.total})>"
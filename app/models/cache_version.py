@@ -0,0 +1,24 @@
+"""
+Общие версии кэшей процессов
+"""
+
+from sqlalchemy import Column, Integer, String
+
+from app.core.database import Base
+
+
+class CacheVersion(Base):
+    """
+    Номер версии данных, общий для всех процессов приложения.
+
+    Процесс, изменивший данные, повышает версию ключа в той же транзакции;
+    остальные процессы периодически читают таблицу и сбрасывают свои
+    кэши по изменившимся ключам (app/services/menu_cache.py).
+    """
+    __tablename__ = "cache_versions"
+
+    key = Column(String(64), primary_key=True)  # "catalog", "menu:<restaurant_id>"
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheVersion(key={self.key}, version={self.version})>"
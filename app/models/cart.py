@@ -0,0 +1,28 @@
+﻿"""
+Сохраненные корзины пользователей
+"""
+
+from sqlalchemy import Column, BigInteger, Integer, Text, DateTime
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class SavedCart(Base):
+    """
+    Корзина пользователя Telegram.
+
+    Пишется пачками из памяти (DatabaseCartStore), поэтому хранится целиком:
+    позиции - JSON, итоги - в копейках рядом с ними.
+    """
+    __tablename__ = "carts"
+
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)  # Telegram ID
+    items = Column(Text, nullable=False)  # {item_id: [name, price_cents, quantity, restaurant]}
+    total_cents = Column(Integer, nullable=False, default=0)
+    items_count = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+    
+    def __repr__(self):
+        return f"<SavedCart(user_id={self.user_id}, items_count={self.items_count})>"
@@ -0,0 +1,36 @@
+﻿"""
+Журнал бонусных баллов
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class LoyaltyTransaction(Base):
+    """
+    Начисление или списание бонусных баллов.
+
+    Журнал только дополняется; users.loyalty_points - его текущая сумма,
+    которая меняется атомарным UPDATE в той же транзакции, что и запись.
+    """
+    __tablename__ = "loyalty_transactions"
+    __table_args__ = (
+        # История баллов пользователя
+        Index("ix_loyalty_transactions_user_created", "user_id", "created_at"),
+        # Баллы за заказ начисляются один раз
+        Index("ix_loyalty_transactions_order_reason", "order_id", "reason", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True)
+    
+    points = Column(Integer, nullable=False)  # Отрицательное значение - списание
+    reason = Column(String(50), nullable=False)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<LoyaltyTransaction(id={self.id}, user_id={self.user_id}, points={self.points})>"
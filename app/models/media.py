@@ -0,0 +1,33 @@
+﻿"""
+Загруженные в Telegram изображения
+"""
+
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+
+from app.core.database import Base
+
+
+class MediaFile(Base):
+    """
+    file_id изображения, уже отправленного ботом.
+
+    Telegram хранит загруженный файл и позволяет отправлять его повторно
+    по file_id без скачивания и загрузки. Ключ - URL изображения из моделей
+    (image_url, logo_url, cover_url); для локальных файлов запоминается и
+    хэш содержимого, чтобы одинаковые файлы по разным URL не загружались
+    дважды. file_id действует только для того бота, который его получил.
+    """
+    __tablename__ = "media_files"
+
+    url = Column(String(500), primary_key=True)
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 локального файла
+    file_id = Column(String(255), nullable=False)
+    file_unique_id = Column(String(64), nullable=True)
+    
+    # Временные метки
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<MediaFile(url={self.url}, file_id={self.file_id})>"
@@ -2,7 +2,7 @@
 Модели меню и блюд
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Index, JSON, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -34,6 +34,10 @@ class MenuCategory(Base):
 class MenuItem(Base):
     """Блюдо в меню"""
     __tablename__ = "menu_items"
+    __table_args__ = (
+        # Блюда ресторана в порядке меню и курсорная пагинация (sort_order, name, id)
+        Index("ix_menu_items_restaurant_sort", "restaurant_id", "sort_order", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -46,6 +50,7 @@ class MenuItem(Base):
     
     # Изображения
     image_url = Column(String(500), nullable=True)
+    image_variants = Column(JSON, nullable=True)  # {размер: {"width", "height", "webp", "jpg"}}
     
     # Статус
     is_available = Column(Boolean, default=True)
@@ -55,7 +60,7 @@ class MenuItem(Base):
     is_vegan = Column(Boolean, default=False)
     
     # Сортировка и статистика
-    sort_order = Column(Integer, default=0)
+    sort_order = Column(Integer, nullable=False, default=0, server_default=text("0"))  # ключ курсора меню
     orders_count = Column(Integer, default=0)
     rating = Column(Float, default=0.0)
     
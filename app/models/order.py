@@ -2,14 +2,26 @@
 Модели заказов
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Enum, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects import sqlite
 import enum
 
 from app.core.database import Base
 
 
+# SQLite записывает CURRENT_TIMESTAMP без микросекунд. Значения из Python
+# храним в том же виде, иначе сравнение с курсором (created_at, id) неверно
+# для строк одной секунды
+CREATED_AT_TYPE = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(
+        storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+    ),
+    "sqlite"
+)
+
+
 class OrderStatus(enum.Enum):
     """Статусы заказа"""
     PENDING = "pending"          # Ожидает подтверждения
@@ -32,6 +44,19 @@ class PaymentMethod(enum.Enum):
 class Order(Base):
     """Модель заказа"""
     __tablename__ = "orders"
+    __table_args__ = (
+        # История заказов пользователя и курсорная пагинация (created_at, id)
+        Index("ix_orders_user_created", "user_id", "created_at", "id"),
+        # Заказы, еще не учтенные в счетчиках ресторанов и пользователей (см. aggregates)
+        Index(
+            "ix_orders_stats_pending", "id",
+            postgresql_where=text("NOT stats_applied"), sqlite_where=text("NOT stats_applied")
+        ),
+        Index(
+            "ix_orders_stats_pending_restaurant", "restaurant_id",
+            postgresql_where=text("NOT stats_applied"), sqlite_where=text("NOT stats_applied")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String(50), unique=True, nullable=False, index=True)
@@ -45,6 +70,7 @@ class Order(Base):
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
     payment_method = Column(Enum(PaymentMethod), default=PaymentMethod.CASH)
     is_paid = Column(Boolean, default=False)
+    stats_applied = Column(Boolean, nullable=False, default=False, server_default=text("false"))
     
     # Суммы
     subtotal = Column(Float, nullable=False)  # Сумма блюд
@@ -71,7 +97,7 @@ class Order(Base):
     actual_delivery_time = Column(DateTime(timezone=True), nullable=True)
     
     # Временные метки
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(CREATED_AT_TYPE, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     confirmed_at = Column(DateTime(timezone=True), nullable=True)
     delivered_at = Column(DateTime(timezone=True), nullable=True)
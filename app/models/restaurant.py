@@ -2,7 +2,7 @@
 Модель ресторана
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, Time
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, Time, Index, JSON, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -12,6 +12,12 @@ from app.core.database import Base
 class Restaurant(Base):
     """Модель ресторана"""
     __tablename__ = "restaurants"
+    __table_args__ = (
+        # Отбор по ограничивающему прямоугольнику при поиске рядом
+        Index("ix_restaurants_lat_lng", "latitude", "longitude"),
+        # Каталог по рейтингу и курсорная пагинация (rating DESC, id)
+        Index("ix_restaurants_active_rating", "is_active", text("rating DESC"), "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -29,6 +35,8 @@ class Restaurant(Base):
     # Изображения
     logo_url = Column(String(500), nullable=True)
     cover_url = Column(String(500), nullable=True)
+    logo_variants = Column(JSON, nullable=True)  # {размер: {"width", "height", "webp", "jpg"}}
+    cover_variants = Column(JSON, nullable=True)
     
     # Рабочие часы
     work_start = Column(Time, nullable=False)
@@ -43,7 +51,7 @@ class Restaurant(Base):
     # Статус и рейтинг
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
-    rating = Column(Float, default=0.0)
+    rating = Column(Float, nullable=False, default=0.0, server_default=text("0"))  # ключ курсора каталога
     reviews_count = Column(Integer, default=0)
     
     # Статистика
@@ -50,7 +50,7 @@ class User(Base):
     last_activity = Column(DateTime(timezone=True), nullable=True)
     
     # Связи
-    orders = relationship("Order", back_populates="user")
+    orders = relationship("Order", back_populates="user", foreign_keys="Order.user_id")
     reviews = relationship("Review", back_populates="user")
     
     def __repr__(self):
@@ -0,0 +1,180 @@
+"""
+Отложенные счетчики заказов и выручки ресторанов и пользователей
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.models import Order, OrderStatus, Restaurant, User
+
+logger = logging.getLogger(__name__)
+
+# Заказы учитываются, когда их статус больше не меняется; в счетчики идут только доставленные
+FINISHED_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+
+class AggregateFolder:
+    """
+    Счетчики Restaurant.total_orders/total_revenue и User.total_orders/total_spent.
+
+    Оформление заказа не трогает строки ресторана и пользователя: сами
+    заказы с stats_applied = false служат журналом приращений. Фоновая
+    задача пачками помечает заказы учтенными (UPDATE ... RETURNING, так что
+    параллельные экземпляры не учтут заказ дважды) и прибавляет суммы
+    к счетчикам одним пакетным UPDATE на таблицу в той же транзакции.
+    Точное значение в любой момент - счетчик плюс еще не учтенные заказы
+    (restaurant_totals и user_totals: GET /restaurants/{id}/stats, GET /users/me).
+
+    Считаются только доставленные заказы: отмененный заказ помечается
+    учтенным без приращения, поэтому создание и отмена заказов не
+    поднимают счетчики (и уровень лояльности).
+    """
+
+    def __init__(self, interval: float = 5.0, batch_size: int = 5000):
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.folded_orders = 0
+        self.fold_errors = 0
+        self.last_fold_seconds = 0.0
+
+    async def fold(self, db) -> int:
+        """Учесть пачку заказов в счетчиках; возвращает число учтенных заказов"""
+        started = time.perf_counter()
+        orders = Order.__table__
+
+        batch = select(orders.c.id).where(~orders.c.stats_applied, orders.c.status.in_(FINISHED_STATUSES))\
+            .order_by(orders.c.id).limit(self.batch_size)\
+            .with_for_update(skip_locked=True)
+
+        try:
+            result = await db.execute(
+                update(orders)
+                .where(orders.c.id.in_(batch.scalar_subquery()))
+                .where(~orders.c.stats_applied)
+                .values(stats_applied=True)
+                .returning(orders.c.restaurant_id, orders.c.user_id, orders.c.total, orders.c.status)
+            )
+            rows = result.all()
+            if not rows:
+                await db.rollback()
+                return 0
+
+            restaurants: Dict[int, list] = defaultdict(lambda: [0, 0.0])
+            users: Dict[int, list] = defaultdict(lambda: [0, 0.0])
+            for restaurant_id, user_id, total, status in rows:
+                if status != OrderStatus.DELIVERED:
+                    continue
+                restaurants[restaurant_id][0] += 1
+                restaurants[restaurant_id][1] += total or 0.0
+                users[user_id][0] += 1
+                users[user_id][1] += total or 0.0
+
+            await self._add(db, Restaurant.__table__, "total_revenue", restaurants)
+            await self._add(db, User.__table__, "total_spent", users)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self.fold_errors += 1
+            logger.exception("Не удалось обновить счетчики заказов")
+            return 0
+
+        self.folded_orders += len(rows)
+        self.last_fold_seconds = time.perf_counter() - started
+        return len(rows)
+
+    @staticmethod
+    async def _add(db, table, amount_column: str, deltas: Dict[int, list]) -> None:
+        """Прибавить (заказы, сумма) к счетчикам строк; по возрастанию ID - единый порядок блокировок"""
+        if not deltas:
+            return
+        statement = update(table).where(table.c.id == bindparam("row_id")).values({
+            "total_orders": func.coalesce(table.c.total_orders, 0) + bindparam("orders"),
+            amount_column: func.coalesce(table.c[amount_column], 0.0) + bindparam("amount")
+        })
+        await db.execute(statement, [
+            {"row_id": row_id, "orders": orders, "amount": amount}
+            for row_id, (orders, amount) in sorted(deltas.items())
+        ])
+
+    async def restaurant_totals(self, db, restaurant_id: int) -> Optional[Tuple[int, float]]:
+        """Точные (заказы, выручка) ресторана с учетом еще не учтенных заказов"""
+        pending = (Order.restaurant_id == restaurant_id, ~Order.stats_applied, Order.status == OrderStatus.DELIVERED)
+        pending_orders = select(func.count(Order.id)).where(*pending).scalar_subquery()
+        pending_amount = select(func.coalesce(func.sum(Order.total), 0.0)).where(*pending).scalar_subquery()
+
+        result = await db.execute(
+            select(
+                func.coalesce(Restaurant.total_orders, 0) + pending_orders,
+                func.coalesce(Restaurant.total_revenue, 0.0) + pending_amount
+            ).where(Restaurant.id == restaurant_id)
+        )
+        row = result.first()
+        return (int(row[0]), float(row[1])) if row else None
+
+    async def user_totals(self, db, user_id: int) -> Optional[Tuple[int, float]]:
+        """Точные (заказы, сумма) пользователя с учетом еще не учтенных заказов"""
+        pending = (Order.user_id == user_id, ~Order.stats_applied, Order.status == OrderStatus.DELIVERED)
+        pending_orders = select(func.count(Order.id)).where(*pending).scalar_subquery()
+        pending_amount = select(func.coalesce(func.sum(Order.total), 0.0)).where(*pending).scalar_subquery()
+
+        result = await db.execute(
+            select(
+                func.coalesce(User.total_orders, 0) + pending_orders,
+                func.coalesce(User.total_spent, 0.0) + pending_amount
+            ).where(User.id == user_id)
+        )
+        row = result.first()
+        return (int(row[0]), float(row[1])) if row else None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with self._session_factory() as db:
+                    # Если накопилось больше пачки, досчитываем без паузы
+                    while await self.fold(db) >= self.batch_size:
+                        pass
+            except Exception:
+                logger.exception("Ошибка фонового обновления счетчиков заказов")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическое обновление счетчиков"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить обновление и учесть оставшиеся заказы"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                while await self.fold(db):
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики счетчиков"""
+        return {
+            "folded_orders": self.folded_orders,
+            "fold_errors": self.fold_errors,
+            "last_fold_seconds": round(self.last_fold_seconds, 4)
+        }
+
+
+# Глобальный обработчик счетчиков заказов
+order_aggregates = AggregateFolder()
@@ -2,15 +2,19 @@
 Сервис аутентификации
 """
 
-import hashlib
-import hmac
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Tuple, Optional
-from jose import JWTError, jwt
+from jose import jwt
+from sqlalchemy import case, func, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.models import User
+from app.models import User, UserRole
+from app.services.presence import user_presence
+from app.services.telegram_auth import telegram_auth_validator
+from app.services.tokens import token_verifier
 from app.services.user_service import UserService
 
 
@@ -22,67 +26,57 @@ class AuthService:
         self.user_service = UserService(db)
     
     def verify_telegram_auth(self, auth_data: Dict[str, Any]) -> bool:
-        """Проверить подлинность данных от Telegram"""
-        
-        # Извлекаем hash из данных
-        received_hash = auth_data.pop('hash', '')
-        
-        # Создаем строку для проверки
-        data_check_string = '\n'.join([
-            f"{key}={value}" for key, value in sorted(auth_data.items())
-        ])
-        
-        # Создаем секретный ключ
-        secret_key = hashlib.sha256(settings.TELEGRAM_BOT_TOKEN.encode()).digest()
-        
-        # Вычисляем hash
-        calculated_hash = hmac.new(
-            secret_key,
-            data_check_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        # Проверяем hash
-        if not hmac.compare_digest(calculated_hash, received_hash):
-            return False
-        
-        # Проверяем время (данные должны быть не старше 24 часов)
-        auth_date = auth_data.get('auth_date', 0)
-        current_time = int(datetime.now().timestamp())
-        
-        if current_time - auth_date > 86400:  # 24 часа
-            return False
-        
-        return True
+        """Проверить подлинность данных Login Widget (поля в том виде, как их прислал Telegram)"""
+        return telegram_auth_validator.validate_login(auth_data) is not None
     
     async def get_or_create_user(self, auth_data) -> Tuple[User, bool]:
-        """Получить или создать пользователя"""
-        
-        # Ищем существующего пользователя
-        user = await self.user_service.get_user_by_telegram_id(auth_data.telegram_id)
-        
-        if user:
-            # Обновляем данные пользователя
-            user.username = auth_data.username
-            user.first_name = auth_data.first_name
-            user.last_name = auth_data.last_name
-            user.last_activity = datetime.now()
-            
-            await self.db.commit()
-            await self.db.refresh(user)
-            
-            return user, False
-        
-        # Создаем нового пользователя
-        user = await self.user_service.create_user(
+        """
+        Получить или создать пользователя одним INSERT ... ON CONFLICT DO UPDATE
+        ... RETURNING - один обмен с БД и для нового, и для известного пользователя.
+        
+        updated_at меняется, только если изменился профиль; у строки, уже
+        встречавшей конфликт, он не бывает пустым (в крайнем случае равен
+        created_at), поэтому пустой updated_at отличает только что вставленную
+        строку. last_activity существующих пользователей пишет user_presence.
+        """
+        connection = await self.db.connection()
+        dialect_insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+        
+        statement = dialect_insert(User).values(
             telegram_id=auth_data.telegram_id,
             username=auth_data.username,
             first_name=auth_data.first_name,
             last_name=auth_data.last_name,
-            last_activity=datetime.now()
+            role=UserRole.CLIENT,
+            last_activity=datetime.now(timezone.utc)
         )
-        
-        return user, True
+        excluded = statement.excluded
+        profile_changed = or_(
+            User.username.is_distinct_from(excluded.username),
+            User.first_name.is_distinct_from(excluded.first_name),
+            User.last_name.is_distinct_from(excluded.last_name)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                "username": excluded.username,
+                "first_name": excluded.first_name,
+                "last_name": excluded.last_name,
+                "updated_at": case(
+                    (profile_changed, func.now()),
+                    else_=func.coalesce(User.updated_at, User.created_at)
+                )
+            }
+        ).returning(User)
+        
+        result = await self.db.execute(statement, execution_options={"populate_existing": True})
+        user = result.scalar_one()
+        is_new = user.updated_at is None
+        
+        await self.db.commit()
+        user_presence.heartbeat(user.id)
+        
+        return user, is_new
     
     def create_access_token(self, user_id: int) -> str:
         """Создать JWT токен"""
@@ -105,22 +99,7 @@ class AuthService:
     
     def verify_token(self, token: str) -> Optional[int]:
         """Проверить JWT токен и получить user_id"""
-        
-        try:
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=[settings.ALGORITHM]
-            )
-            
-            user_id = payload.get("sub")
-            if user_id is None:
-                return None
-            
-            return int(user_id)
-            
-        except JWTError:
-            return None
+        return token_verifier.verify(token)
     
     async def get_user(self, user_id: int) -> Optional[User]:
         """Получить пользователя (обертка для user_service)"""
@@ -0,0 +1,562 @@
+﻿"""
+Рассылки: уведомления о статусе заказов и кампании по всем пользователям бота
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, literal, select, update
+from telegram.error import Forbidden, TelegramError
+from telegram.ext import ExtBot
+
+from app.bot.render import PARSE_MODE, Template
+from app.bot.sender import SendPriority, SendScheduler
+from app.core.config import settings
+from app.models import Broadcast, BroadcastStatus, Order, OrderStatus, User
+
+logger = logging.getLogger(__name__)
+
+# Предел длины сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+# Поля пользователя, доступные в шаблоне рассылки, и подстановка для пустых значений
+BROADCAST_FIELDS = {
+    "first_name": (User.first_name, "друг"),
+}
+
+# Готовых вариантов текста кампании в памяти; сверх этого текст готовится на получателя
+MAX_VARIANTS = 10000
+
+# Уведомления клиенту о смене статуса заказа
+STATUS_TEMPLATES = {
+    OrderStatus.CONFIRMED: Template("✅ Заказ *#{number}* подтвержден рестораном"),
+    OrderStatus.PREPARING: Template("👨‍🍳 Заказ *#{number}* готовится"),
+    OrderStatus.READY: Template("📦 Заказ *#{number}* готов и ждет курьера"),
+    OrderStatus.DELIVERING: Template("🚚 Курьер везет заказ *#{number}*"),
+    OrderStatus.DELIVERED: Template("🎉 Заказ *#{number}* доставлен. Приятного аппетита!"),
+    OrderStatus.CANCELLED: Template("❌ Заказ *#{number}* отменен"),
+}
+
+ProgressCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def compile_broadcast(text: str) -> Template:
+    """Шаблон рассылки; ValueError, если текст не годится для отправки"""
+    if not text or not text.strip():
+        raise ValueError("Broadcast text is empty")
+    try:
+        template = Template(text)
+    except (ValueError, IndexError) as error:
+        raise ValueError(f"Invalid broadcast template: {error}")
+
+    unknown = [name for name in template.fields if name not in BROADCAST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown broadcast fields: {', '.join(unknown)}")
+    return template
+
+
+class _Campaign:
+    """
+    Ход рассылки в памяти.
+
+    Текст готовится один раз на вариант - набор значений полей шаблона.
+    Отправки завершаются не по порядку, поэтому done_until продвигается
+    только по непрерывно завершенному началу очереди получателей;
+    в БД пишутся итоги этого начала, чтобы они совпадали с done_until.
+    """
+
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast_id = broadcast.id
+        self.run_token = broadcast.run_token
+        self.template = compile_broadcast(broadcast.text)
+        self.defaults = tuple(BROADCAST_FIELDS[name][1] for name in self.template.fields)
+        self.columns = [BROADCAST_FIELDS[name][0] for name in self.template.fields]
+
+        self.total = broadcast.total
+        self.claimed_until = broadcast.claimed_until
+        self.done_until = broadcast.done_until
+        self.base_sent = broadcast.sent
+        self.base_failed = broadcast.failed
+        self.unconfirmed = broadcast.unconfirmed
+
+        # Завершенное начало очереди (пишется в БД) и все завершенные за этот запуск
+        self.prefix_sent = 0
+        self.prefix_failed = 0
+        self.run_sent = 0
+        self.run_failed = 0
+        self.blocked = 0
+
+        self.cancelled = False
+        self.started = time.monotonic()
+
+        self._variants: Dict[Tuple[Any, ...], str] = {}
+        self.renders = 0
+
+        # [user_id, результат] в порядке выдачи; результат None - отправка идет
+        self._pending: Deque[list] = deque()
+        self._entries: Dict[int, list] = {}
+
+    def text(self, values: Tuple[Any, ...]) -> str:
+        text = self._variants.get(values)
+        if text is None:
+            filled = [default if value is None else value for value, default in zip(values, self.defaults)]
+            text = self.template.render(**dict(zip(self.template.fields, filled)))
+            self.renders += 1
+            if len(self._variants) < MAX_VARIANTS:
+                self._variants[values] = text
+        return text
+
+    def claim(self, user_id: int) -> None:
+        entry = [user_id, None]
+        self._pending.append(entry)
+        self._entries[user_id] = entry
+
+    def complete(self, user_id: int, sent: bool) -> None:
+        self._entries.pop(user_id)[1] = sent
+        if sent:
+            self.run_sent += 1
+        else:
+            self.run_failed += 1
+
+        while self._pending and self._pending[0][1] is not None:
+            done_id, done_sent = self._pending.popleft()
+            self.done_until = done_id
+            if done_sent:
+                self.prefix_sent += 1
+            else:
+                self.prefix_failed += 1
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Значения для записи в строку рассылки"""
+        return {
+            "claimed_until": self.claimed_until,
+            "done_until": self.done_until,
+            "sent": self.base_sent + self.prefix_sent,
+            "failed": self.base_failed + self.prefix_failed,
+            "unconfirmed": self.unconfirmed
+        }
+
+    def progress(self) -> Dict[str, Any]:
+        """Ход рассылки: счетчики, скорость этого запуска и оценка оставшегося времени"""
+        sent = self.base_sent + self.run_sent
+        failed = self.base_failed + self.run_failed
+        remaining = max(self.total - sent - failed - self.unconfirmed, 0)
+        rate = (self.run_sent + self.run_failed) / max(time.monotonic() - self.started, 1e-6)
+        return {
+            "broadcast_id": self.broadcast_id,
+            "total": self.total,
+            "sent": sent,
+            "failed": failed,
+            "blocked": self.blocked,
+            "unconfirmed": self.unconfirmed,
+            "remaining": remaining,
+            "rate": round(rate, 1),
+            "eta_seconds": round(remaining / rate) if rate > 0 else None,
+            "variants": self.renders,
+            "cancelled": self.cancelled
+        }
+
+
+class BroadcastEngine:
+    """
+    Отправка сообщений пользователям от имени клиентского бота.
+
+    Уведомления о статусе заказа ставятся в очередь из OrderService
+    и уходят с приоритетом STATUS. Кампании (run/launch) перебирают
+    активных пользователей пачками по возрастанию ID (keyset), отдают
+    получателей ограниченному числу отправителей и перед каждой порцией
+    записывают в строку рассылки, до какого ID получатели отданы - после
+    сбоя рассылка продолжается с этого места без повторных сообщений.
+    Все отправки идут через SendScheduler клиентского бота.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        claim_size: int = 100,
+        concurrency: int = 32,
+        progress_interval: float = 5.0,
+        queue_size: int = 10000
+    ):
+        self.batch_size = batch_size
+        self.claim_size = claim_size
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.queue_size = queue_size
+
+        self._bot = None
+        self._own_bot = False
+        self._session_factory = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # None - запуск захватывает рассылку
+        self._campaigns: Dict[int, Optional[_Campaign]] = {}
+        self._launched: set = set()
+
+        self.status_sent = 0
+        self.status_failed = 0
+        self.status_dropped = 0
+        self.campaigns_finished = 0
+
+    def preview(self, text: str) -> str:
+        """Текст рассылки с подстановками по умолчанию; ValueError, если текст не годится"""
+        template = compile_broadcast(text)
+        preview = template.render(**{name: BROADCAST_FIELDS[name][1] for name in template.fields})
+        if len(preview) > MAX_MESSAGE_LENGTH:
+            raise ValueError("Broadcast text is too long")
+        return preview
+
+    async def create(self, text: str, created_by: Optional[int] = None) -> Broadcast:
+        """Создать черновик рассылки"""
+        self.preview(text)
+        async with self._session_factory() as db:
+            broadcast = Broadcast(text=text, created_by=created_by, status=BroadcastStatus.DRAFT)
+            db.add(broadcast)
+            await db.commit()
+            await db.refresh(broadcast)
+            return broadcast
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        """Остановить рассылку; уже отправленное не отзывается"""
+        campaign = self._campaigns.get(broadcast_id)
+        if campaign is not None:
+            campaign.cancelled = True
+            return True
+
+        async with self._session_factory() as db:
+            result = await db.execute(
+                update(Broadcast).where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status.in_((BroadcastStatus.DRAFT, BroadcastStatus.RUNNING))
+                ).values(status=BroadcastStatus.CANCELLED, finished_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+            return result.rowcount > 0
+
+    def progress(self, broadcast_id: int) -> Optional[Dict[str, Any]]:
+        """Ход рассылки, идущей в этом процессе"""
+        campaign = self._campaigns.get(broadcast_id)
+        return campaign.progress() if campaign is not None else None
+
+    async def run(self, broadcast_id: int, on_progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Провести рассылку или продолжить прерванную; возвращает итоговый ход"""
+        if broadcast_id in self._campaigns:
+            raise ValueError("Broadcast is already running")
+        # Место занимается до первого await: второй запуск в этом процессе сюда не дойдет
+        self._campaigns[broadcast_id] = None
+        try:
+            async with self._session_factory() as db:
+                campaign = await self._claim(db, broadcast_id)
+                self._campaigns[broadcast_id] = campaign
+                await self._run_campaign(db, campaign, on_progress)
+        finally:
+            del self._campaigns[broadcast_id]
+
+        self.campaigns_finished += 1
+        progress = campaign.progress()
+        if on_progress is not None:
+            await on_progress(progress)
+        return progress
+
+    async def _claim(self, db, broadcast_id: int) -> _Campaign:
+        """
+        Захватить рассылку для этого запуска: UPDATE со сравнением статуса,
+        метки запуска и claimed_until с прочитанными. Если строку успел
+        захватить или изменить другой запуск, ничего не меняется.
+        """
+        broadcast = await db.get(Broadcast, broadcast_id)
+        if broadcast is None:
+            raise ValueError("Broadcast not found")
+        if broadcast.status in (BroadcastStatus.DONE, BroadcastStatus.CANCELLED):
+            raise ValueError("Broadcast is already finished")
+
+        token = uuid.uuid4().hex
+        values: Dict[str, Any] = {"run_token": token}
+        active = User.is_active.is_(True)
+        if broadcast.status == BroadcastStatus.DRAFT:
+            values.update(
+                total=await db.scalar(select(func.count()).select_from(User).where(active)),
+                status=BroadcastStatus.RUNNING,
+                started_at=datetime.now(timezone.utc)
+            )
+        elif broadcast.claimed_until > broadcast.done_until:
+            # Прерванный запуск: дошли ли отданные на отправку сообщения, неизвестно
+            values.update(
+                unconfirmed=broadcast.unconfirmed + await db.scalar(
+                    select(func.count()).select_from(User).where(
+                        active,
+                        User.id > broadcast.done_until,
+                        User.id <= broadcast.claimed_until
+                    )
+                ),
+                done_until=broadcast.claimed_until
+            )
+
+        same_run = (
+            Broadcast.run_token.is_(None) if broadcast.run_token is None
+            else Broadcast.run_token == broadcast.run_token
+        )
+        result = await db.execute(
+            update(Broadcast).where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status == broadcast.status,
+                Broadcast.claimed_until == broadcast.claimed_until,
+                same_run
+            ).values(**values)
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            raise ValueError("Broadcast is already running")
+
+        await db.refresh(broadcast)
+        return _Campaign(broadcast)
+
+    async def _run_campaign(self, db, campaign: _Campaign, on_progress: Optional[ProgressCallback]) -> None:
+        finished = False
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._campaign_worker(campaign, queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report(campaign, on_progress)) if on_progress else None
+        try:
+            await self._produce(db, campaign, queue)
+            await queue.join()
+
+            status = BroadcastStatus.CANCELLED if campaign.cancelled else BroadcastStatus.DONE
+            await self._checkpoint(db, campaign, status=status)
+            finished = True
+        finally:
+            for task in workers + ([reporter] if reporter else []):
+                task.cancel()
+            await asyncio.gather(*workers, *([reporter] if reporter else []), return_exceptions=True)
+
+            if not finished:
+                # Запуск прерван: сохраняем ход, рассылка останется RUNNING
+                try:
+                    async with self._session_factory() as checkpoint_db:
+                        await self._checkpoint(checkpoint_db, campaign)
+                except Exception:
+                    logger.exception("Не удалось сохранить ход рассылки %s", campaign.broadcast_id)
+
+    def launch(self, broadcast_id: int, on_progress: Optional[ProgressCallback] = None) -> asyncio.Task:
+        """Запустить рассылку в фоне"""
+        task = asyncio.create_task(self._run_logged(broadcast_id, on_progress))
+        self._launched.add(task)
+        task.add_done_callback(self._launched.discard)
+        return task
+
+    async def _run_logged(self, broadcast_id: int, on_progress: Optional[ProgressCallback]) -> None:
+        try:
+            await self.run(broadcast_id, on_progress)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Ошибка рассылки %s", broadcast_id)
+
+    async def _checkpoint(
+        self,
+        db,
+        campaign: _Campaign,
+        status: Optional[BroadcastStatus] = None,
+        running: bool = False
+    ) -> bool:
+        """
+        Записать ход рассылки, пока она принадлежит этому запуску.
+        status - итоговый статус: он не заменяет отмену, записанную другим
+        процессом. running - писать, только если рассылка еще идет
+        (не отменена в другом процессе). Возвращает, записан ли ход.
+        """
+        conditions = [Broadcast.id == campaign.broadcast_id, Broadcast.run_token == campaign.run_token]
+        if running:
+            conditions.append(Broadcast.status == BroadcastStatus.RUNNING)
+
+        values = campaign.checkpoint()
+        if status is not None:
+            still_running = Broadcast.status == BroadcastStatus.RUNNING
+            values.update(
+                status=case((still_running, literal(status, Broadcast.status.type)), else_=Broadcast.status),
+                finished_at=case((still_running, datetime.now(timezone.utc)), else_=Broadcast.finished_at)
+            )
+
+        result = await db.execute(update(Broadcast).where(*conditions).values(**values))
+        await db.commit()
+        return result.rowcount > 0
+
+    async def _produce(self, db, campaign: _Campaign, queue: asyncio.Queue) -> None:
+        """Отдать получателей отправителям, отмечая выданное до отправки"""
+        query = select(User.id, User.telegram_id, *campaign.columns).where(
+            User.is_active.is_(True)
+        ).order_by(User.id).limit(self.batch_size)
+
+        cursor = campaign.claimed_until
+        while not campaign.cancelled:
+            rows = (await db.execute(query.where(User.id > cursor))).all()
+            if not rows:
+                return
+
+            for start in range(0, len(rows), self.claim_size):
+                if campaign.cancelled:
+                    return
+                chunk = rows[start:start + self.claim_size]
+                claimed_until, campaign.claimed_until = campaign.claimed_until, chunk[-1][0]
+                if not await self._checkpoint(db, campaign, running=True):
+                    # Рассылку отменили (или перехватили) в другом процессе
+                    campaign.claimed_until = claimed_until
+                    campaign.cancelled = True
+                    return
+
+                for row in chunk:
+                    campaign.claim(row[0])
+                    await queue.put((row[0], row[1], campaign.text(tuple(row[2:]))))
+
+            cursor = rows[-1][0]
+
+    async def _campaign_worker(self, campaign: _Campaign, queue: asyncio.Queue) -> None:
+        while True:
+            user_id, chat_id, text = await queue.get()
+            try:
+                await self._bot.send_message(
+                    chat_id, text, parse_mode=PARSE_MODE, rate_limit_args=SendPriority.MARKETING
+                )
+            except Forbidden:
+                # Пользователь заблокировал бота
+                campaign.blocked += 1
+                campaign.complete(user_id, False)
+            except TelegramError as error:
+                logger.warning("Рассылка %s: не отправлено %s: %s", campaign.broadcast_id, chat_id, error)
+                campaign.complete(user_id, False)
+            except Exception:
+                # Любой сбой отправки - неудача получателя, отправитель продолжает работу
+                logger.exception("Рассылка %s: ошибка отправки %s", campaign.broadcast_id, chat_id)
+                campaign.complete(user_id, False)
+            else:
+                campaign.complete(user_id, True)
+            finally:
+                queue.task_done()
+
+    async def _report(self, campaign: _Campaign, on_progress: ProgressCallback) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                await on_progress(campaign.progress())
+            except Exception:
+                logger.exception("Ошибка отчета о ходе рассылки %s", campaign.broadcast_id)
+
+    async def notify_order_status(self, db, order_ids: List[int], status: OrderStatus) -> int:
+        """Поставить в очередь уведомления клиентам о новом статусе заказов"""
+        template = STATUS_TEMPLATES.get(status)
+        if self._queue is None or template is None or not order_ids:
+            return 0
+
+        result = await db.execute(
+            select(Order.order_number, User.telegram_id)
+            .join(User, Order.user_id == User.id)
+            .where(Order.id.in_(order_ids))
+        )
+        queued = 0
+        for number, chat_id in result.all():
+            try:
+                self._queue.put_nowait((chat_id, template.render(number=number)))
+                queued += 1
+            except asyncio.QueueFull:
+                self.status_dropped += 1
+        return queued
+
+    async def _status_worker(self) -> None:
+        while True:
+            chat_id, text = await self._queue.get()
+            try:
+                await self._bot.send_message(
+                    chat_id, text, parse_mode=PARSE_MODE, rate_limit_args=SendPriority.STATUS
+                )
+                self.status_sent += 1
+            except TelegramError as error:
+                self.status_failed += 1
+                logger.warning("Уведомление о заказе не отправлено %s: %s", chat_id, error)
+            except Exception:
+                # Сбой одной отправки не должен останавливать остальные обработчики
+                self.status_failed += 1
+                logger.exception("Ошибка отправки уведомления о заказе %s", chat_id)
+
+    async def _run(self, resume: bool, rate: float) -> None:
+        if self._bot is None:
+            try:
+                bot = ExtBot(
+                    settings.TELEGRAM_BOT_TOKEN,
+                    rate_limiter=SendScheduler(global_rate=rate)
+                )
+                await bot.initialize()
+            except Exception:
+                logger.exception("Клиентский бот недоступен - рассылки и уведомления отключены")
+                self._queue = None
+                return
+            self._bot, self._own_bot = bot, True
+
+        if resume:
+            async with self._session_factory() as db:
+                result = await db.execute(select(Broadcast.id).where(Broadcast.status == BroadcastStatus.RUNNING))
+                for broadcast_id in result.scalars().all():
+                    logger.info("Продолжение прерванной рассылки %s", broadcast_id)
+                    self.launch(broadcast_id)
+
+        workers = [asyncio.create_task(self._status_worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def start(self, session_factory, bot=None, resume: bool = False, rate: Optional[float] = None) -> None:
+        """
+        Запустить отправку. Без bot создается клиентский бот из настроек
+        со своим ведром rate (по умолчанию BROADCAST_RATE) - доля лимита
+        бота, которую остальные процессы не используют. resume продолжает
+        прерванные рассылки - его включает один процесс, который проводит рассылки.
+        """
+        self._session_factory = session_factory
+        if bot is not None:
+            self._bot = bot
+        elif self._bot is None and not settings.TELEGRAM_BOT_TOKEN:
+            logger.warning("TELEGRAM_BOT_TOKEN не задан - рассылки и уведомления отключены")
+            return
+
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run(resume, rate or settings.BROADCAST_RATE))
+
+    async def stop(self) -> None:
+        """Остановить отправку; прерванные рассылки сохраняют ход и продолжатся при resume"""
+        tasks = list(self._launched)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+        if self._own_bot:
+            await self._bot.shutdown()
+            self._bot, self._own_bot = None, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики рассылок"""
+        return {
+            "status_queue": self._queue.qsize() if self._queue is not None else 0,
+            "status_sent": self.status_sent,
+            "status_failed": self.status_failed,
+            "status_dropped": self.status_dropped,
+            "campaigns_finished": self.campaigns_finished,
+            "campaigns": {
+                broadcast_id: campaign.progress()
+                for broadcast_id, campaign in self._campaigns.items() if campaign is not None
+            }
+        }
+
+
+# Глобальный движок рассылок
+broadcast_engine = BroadcastEngine()
@@ -0,0 +1,433 @@
+"""
+Корзины пользователей: общее хранилище для ботов, API и WebApp
+"""
+
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.resp import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+# Разных позиций в одной корзине - ограничивает память на корзину
+MAX_CART_LINES = 50
+
+# Попыток WATCH ... EXEC при одновременном изменении корзины
+MAX_WATCH_RETRIES = 5
+
+
+def to_cents(price: float) -> int:
+    """Цена в копейках: суммы корзины считаются в целых числах без ошибок округления"""
+    return int(round(price * 100))
+
+
+def _shared(value: Optional[str]) -> Optional[str]:
+    """Одна копия строки на все корзины: ID и названия блюд повторяются у всех пользователей"""
+    return sys.intern(value) if value is not None else None
+
+
+class CartLine:
+    """Позиция корзины; цена фиксируется при первом добавлении"""
+
+    __slots__ = ("name", "price_cents", "quantity", "restaurant")
+
+    def __init__(self, name: str, price_cents: int, quantity: int, restaurant: Optional[str] = None):
+        self.name = _shared(name)
+        self.price_cents = price_cents
+        self.quantity = quantity
+        self.restaurant = _shared(restaurant)
+
+    @property
+    def price(self) -> float:
+        return self.price_cents / 100
+
+    @property
+    def total(self) -> float:
+        return self.price_cents * self.quantity / 100
+
+
+class Cart:
+    """
+    Корзина с суммой и числом единиц, которые меняются вместе с позициями:
+    просмотр корзины и оформление заказа их не пересчитывают.
+    """
+
+    __slots__ = ("lines", "total_cents", "count", "touched")
+
+    def __init__(self):
+        self.lines: Dict[str, CartLine] = {}
+        self.total_cents = 0
+        self.count = 0
+        self.touched = 0.0
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __iter__(self) -> Iterator[Tuple[str, CartLine]]:
+        return iter(self.lines.items())
+
+    @property
+    def total(self) -> float:
+        return self.total_cents / 100
+
+    def add(
+        self,
+        item_id: str,
+        name: str,
+        price_cents: int,
+        quantity: int = 1,
+        restaurant: Optional[str] = None
+    ) -> CartLine:
+        line = self.lines.get(item_id)
+        if line is None:
+            if len(self.lines) >= MAX_CART_LINES:
+                raise ValueError("Cart is full")
+            line = self.lines[_shared(item_id)] = CartLine(name, price_cents, 0, restaurant)
+
+        line.quantity += quantity
+        self.total_cents += line.price_cents * quantity
+        self.count += quantity
+        return line
+
+    def remove(self, item_id: str, quantity: Optional[int] = None) -> bool:
+        """Убрать quantity единиц позиции (None - всю позицию)"""
+        line = self.lines.get(item_id)
+        if line is None:
+            return False
+
+        if quantity is None or quantity >= line.quantity:
+            quantity = line.quantity
+            del self.lines[item_id]
+        else:
+            line.quantity -= quantity
+
+        self.total_cents -= line.price_cents * quantity
+        self.count -= quantity
+        return True
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """Позиции для сохранения: {item_id: [name, price_cents, quantity, restaurant]}"""
+        return {
+            item_id: [line.name, line.price_cents, line.quantity, line.restaurant]
+            for item_id, line in self.lines.items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[Any]]) -> "Cart":
+        cart = cls()
+        for item_id, (name, price_cents, quantity, restaurant) in data.items():
+            cart.lines[_shared(item_id)] = CartLine(name, price_cents, quantity, restaurant)
+            cart.total_cents += price_cents * quantity
+            cart.count += quantity
+        return cart
+
+
+class MemoryCartStore:
+    """
+    Корзины в памяти процесса.
+
+    OrderedDict в порядке последнего обращения: корзины, не тронутые
+    дольше ttl, снимаются с начала при каждом изменении, сверх max_carts
+    вытесняются самые старые. Вместе с MAX_CART_LINES это ограничивает
+    память на всех пользователей.
+    """
+
+    def __init__(self, ttl: float = 86400, max_carts: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._clock = clock
+        self._carts: "OrderedDict[int, Cart]" = OrderedDict()
+
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._carts)
+
+    def peek(self, user_id: int) -> Optional[Cart]:
+        """Корзина без продления срока"""
+        cart = self._carts.get(user_id)
+        if cart is not None and self._clock() - cart.touched > self.ttl:
+            del self._carts[user_id]
+            self.expired += 1
+            return None
+        return cart
+
+    def put(self, user_id: int, cart: Cart) -> None:
+        """Сохранить корзину и продлить ее срок"""
+        now = self._clock()
+        cart.touched = now
+        self._carts[user_id] = cart
+        self._carts.move_to_end(user_id)
+
+        while self._carts:
+            oldest = next(iter(self._carts.values()))
+            if now - oldest.touched <= self.ttl:
+                break
+            self._carts.popitem(last=False)
+            self.expired += 1
+
+        while len(self._carts) > self.max_carts:
+            self._carts.popitem(last=False)
+            self.evicted += 1
+
+    def pop(self, user_id: int) -> Optional[Cart]:
+        cart = self.peek(user_id)
+        if cart is not None:
+            del self._carts[user_id]
+        return cart
+
+    def clear(self) -> None:
+        self._carts.clear()
+
+    async def get(self, user_id: int) -> Optional[Cart]:
+        return self.peek(user_id)
+
+    async def add(self, user_id: int, item_id: str, name: str, price_cents: int,
+                  quantity: int, restaurant: Optional[str]) -> Cart:
+        cart = self.peek(user_id) or Cart()
+        cart.add(item_id, name, price_cents, quantity, restaurant)
+        self.put(user_id, cart)
+        return cart
+
+    async def remove(self, user_id: int, item_id: str, quantity: Optional[int]) -> Optional[Cart]:
+        cart = self.peek(user_id)
+        if cart is None:
+            return None
+        cart.remove(item_id, quantity)
+        if not cart:
+            del self._carts[user_id]
+            return None
+        self.put(user_id, cart)
+        return cart
+
+    async def take(self, user_id: int) -> Optional[Cart]:
+        return self.pop(user_id)
+
+    def start(self, session_factory) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "carts": len(self._carts),
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+
+class RespCartStore:
+    """
+    Корзины в Redis (или совместимом сервере) - общие для всех процессов.
+
+    Корзина - хеш cart:<user_id>: q:<item> - количество, m:<item> - JSON
+    [name, price_cents, restaurant], count - число единиц. Сумма не
+    хранится, а считается по позициям при чтении: цена позиции - та, что
+    записана в m:<item> первым добавлением, и отдельной поправки суммы вне
+    транзакции не нужно. Добавление - одна транзакция MULTI ... EXEC за
+    один обмен: HSETNX описания, HINCRBY количества и count, EXPIRE и
+    HGETALL с готовой корзиной. Уменьшение количества читает позицию под
+    WATCH, чтобы count не ушел от позиций при одновременных изменениях.
+    """
+
+    def __init__(self, url: str, ttl: int = 86400, prefix: str = "cart:"):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = RespClient(url)
+
+        self.conflicts = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    @staticmethod
+    def _parse(fields: Optional[List[str]]) -> Optional[Cart]:
+        """Корзина из ответа HGETALL"""
+        if not fields:
+            return None
+
+        values = dict(zip(fields[::2], fields[1::2]))
+        cart = Cart()
+        cart.count = int(values.get("count", 0))
+        for field, value in values.items():
+            if field.startswith("q:"):
+                meta = values.get("m:" + field[2:])
+                if meta is None:
+                    continue
+                name, price_cents, restaurant = json.loads(meta)
+                line = CartLine(name, price_cents, int(value), restaurant)
+                cart.lines[_shared(field[2:])] = line
+                cart.total_cents += line.price_cents * line.quantity
+        return cart if cart.count > 0 else None
+
+    async def get(self, user_id: int) -> Optional[Cart]:
+        return self._parse(await self.client.execute("HGETALL", self._key(user_id)))
+
+    async def add(self, user_id: int, item_id: str, name: str, price_cents: int,
+                  quantity: int, restaurant: Optional[str]) -> Cart:
+        key = self._key(user_id)
+        meta = json.dumps([name, price_cents, restaurant], ensure_ascii=False)
+        replies = await self.client.pipeline([
+            ("MULTI",),
+            ("HSETNX", key, f"m:{item_id}", meta),
+            ("HINCRBY", key, f"q:{item_id}", quantity),
+            ("HINCRBY", key, "count", quantity),
+            ("EXPIRE", key, self.ttl),
+            ("HGETALL", key),
+            ("EXEC",)
+        ])
+        results = self._exec_result(replies)
+        cart = self._parse(results[-1])
+
+        if cart is not None and len(cart.lines) > MAX_CART_LINES and results[0] == 1:
+            await self.remove(user_id, item_id, None)
+            raise ValueError("Cart is full")
+        return cart
+
+    async def remove(self, user_id: int, item_id: str, quantity: Optional[int]) -> Optional[Cart]:
+        key = self._key(user_id)
+        for _ in range(MAX_WATCH_RETRIES):
+            async with self.client.exclusive() as pipeline:
+                replies = await pipeline([
+                    ("WATCH", key),
+                    ("HMGET", key, f"q:{item_id}", f"m:{item_id}", "count")
+                ])
+                current, meta, count = replies[1]
+                if current is None or meta is None:
+                    # Такой позиции нет - корзина не меняется
+                    return self._parse((await pipeline([("UNWATCH",), ("HGETALL", key)]))[1])
+
+                current = int(current)
+                removed = current if quantity is None or quantity >= current else quantity
+
+                commands: List[Tuple[Any, ...]] = [("MULTI",)]
+                if int(count) - removed <= 0:
+                    commands.append(("DEL", key))
+                elif removed == current:
+                    commands.append(("HDEL", key, f"q:{item_id}", f"m:{item_id}"))
+                else:
+                    commands.append(("HINCRBY", key, f"q:{item_id}", -removed))
+                if int(count) - removed > 0:
+                    commands += [
+                        ("HINCRBY", key, "count", -removed),
+                        ("EXPIRE", key, self.ttl)
+                    ]
+                commands += [("HGETALL", key), ("EXEC",)]
+
+                results = self._exec_result(await pipeline(commands))
+                if results is None:
+                    # Корзину изменили между WATCH и EXEC - повторяем
+                    self.conflicts += 1
+                    continue
+                return self._parse(results[-1])
+
+        raise RespError("Cart is modified concurrently")
+
+    async def take(self, user_id: int) -> Optional[Cart]:
+        key = self._key(user_id)
+        results = self._exec_result(await self.client.pipeline([
+            ("MULTI",), ("HGETALL", key), ("DEL", key), ("EXEC",)
+        ]))
+        return self._parse(results[0])
+
+    @staticmethod
+    def _exec_result(replies: List[Any]) -> Optional[List[Any]]:
+        """Результаты команд транзакции из ответа EXEC (None - транзакция отменена WATCH)"""
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        results = replies[-1]
+        if results is not None:
+            for reply in results:
+                if isinstance(reply, RespError):
+                    raise reply
+        return results
+
+    def start(self, session_factory) -> None:
+        pass
+
+    async def stop(self) -> None:
+        await self.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"conflicts": self.conflicts}
+
+
+class CartService:
+    """Корзины пользователей поверх выбранного хранилища"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, user_id: int) -> Cart:
+        """Корзина пользователя (пустая, если ее нет)"""
+        return await self.store.get(user_id) or Cart()
+
+    async def add_item(
+        self,
+        user_id: int,
+        item_id: Any,
+        name: str,
+        price: float,
+        quantity: int = 1,
+        restaurant: Optional[str] = None
+    ) -> Cart:
+        """Добавить quantity единиц позиции по цене price"""
+        if quantity < 1:
+            raise ValueError("Quantity must be positive")
+        if price < 0:
+            raise ValueError("Price must not be negative")
+        return await self.store.add(user_id, str(item_id), name, to_cents(price), quantity, restaurant)
+
+    async def remove_item(self, user_id: int, item_id: Any, quantity: Optional[int] = None) -> Cart:
+        """Убрать quantity единиц позиции (None - всю позицию)"""
+        if quantity is not None and quantity < 1:
+            raise ValueError("Quantity must be positive")
+        return await self.store.remove(user_id, str(item_id), quantity) or Cart()
+
+    async def checkout(self, user_id: int) -> Cart:
+        """Забрать корзину для оформления заказа; корзина пользователя очищается"""
+        return await self.store.take(user_id) or Cart()
+
+    async def clear(self, user_id: int) -> None:
+        await self.store.take(user_id)
+
+    def start(self, session_factory) -> None:
+        """Запустить фоновые задачи хранилища"""
+        self.store.start(session_factory)
+
+    async def stop(self) -> None:
+        await self.store.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики корзин"""
+        return {"backend": type(self.store).__name__, **self.store.stats()}
+
+
+def create_cart_store(backend: str):
+    """
+    Хранилище корзин по настройке CART_BACKEND: memory, database или redis.
+
+    memory и database держат корзины в памяти процесса и подходят только
+    для одного процесса; общие корзины нескольких процессов - redis.
+    """
+    if backend == "memory":
+        return MemoryCartStore(ttl=settings.CART_TTL)
+    if backend == "redis":
+        return RespCartStore(settings.REDIS_URL, ttl=settings.CART_TTL)
+    if backend == "database":
+        # Хранилище в БД тянет модели и движок; ботам без БД они не нужны
+        from app.services.cart_db import DatabaseCartStore
+        return DatabaseCartStore(ttl=settings.CART_TTL)
+    raise ValueError(f"Unknown cart backend: {backend}")
+
+
+# Глобальный сервис корзин
+cart_service = CartService(create_cart_store(settings.CART_BACKEND))
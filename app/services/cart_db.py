@@ -0,0 +1,224 @@
+"""
+Корзины в памяти с отложенной записью в БД (SQLite / PostgreSQL)
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models import SavedCart
+from app.services.cart import Cart, MemoryCartStore
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять из БД корзины, не менявшиеся дольше ttl, секунды
+PURGE_INTERVAL = 3600
+
+
+class DatabaseCartStore:
+    """
+    Корзины в памяти процесса, сохраняемые в таблицу carts.
+
+    Изменение корзины не ждет БД: корзина помечается измененной, и фоновая
+    задача раз в flush_interval записывает все измененные корзины одним
+    пакетным INSERT ... ON CONFLICT DO UPDATE и одним DELETE для опустевших.
+    Пока изменение не записано, корзина держится в очереди записи, даже
+    если память ее уже вытеснила. При промахе корзина читается из БД -
+    после перезапуска или если ее изменил другой процесс и она вытеснена
+    здесь. Отсутствие корзины тоже запоминается (пустой корзиной), чтобы
+    не спрашивать БД на каждом просмотре.
+
+    Только для одного процесса: копия корзины в памяти не узнает об
+    изменениях других процессов, и их записи затирают друг друга. Если
+    корзины меняют несколько воркеров uvicorn или отдельный процесс бота,
+    нужно хранилище redis.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        max_carts: int = 100_000,
+        flush_interval: float = 2.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.memory = MemoryCartStore(ttl=ttl, max_carts=max_carts, clock=clock)
+
+        # user_id -> корзина к записи (None - удалить)
+        self._dirty: Dict[int, Optional[Cart]] = {}
+        self._flushing: Dict[int, Optional[Cart]] = {}
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+        self._purged_at = 0.0
+
+        self.loaded = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def _pending(self, user_id: int) -> Optional[Cart]:
+        """Еще не записанное состояние корзины (пустая корзина - удалена)"""
+        for queue in (self._dirty, self._flushing):
+            if user_id in queue:
+                return queue[user_id] or Cart()
+        return None
+
+    async def _load(self, user_id: int) -> Cart:
+        cart = self.memory.peek(user_id)
+        if cart is None:
+            cart = self._pending(user_id)
+        if cart is None:
+            items = None
+            if self._session_factory is not None:
+                async with self._session_factory() as db:
+                    items = await db.scalar(select(SavedCart.items).where(SavedCart.user_id == user_id))
+                self.loaded += 1
+
+            # Пока шло чтение, корзину могли создать или изменить
+            cart = self.memory.peek(user_id) or self._pending(user_id)
+            if cart is None:
+                cart = Cart.from_dict(json.loads(items)) if items else Cart()
+
+        self.memory.put(user_id, cart)
+        return cart
+
+    def _changed(self, user_id: int, cart: Cart) -> None:
+        self._dirty[user_id] = cart
+
+    async def get(self, user_id: int) -> Optional[Cart]:
+        return await self._load(user_id) or None
+
+    async def add(self, user_id: int, item_id: str, name: str, price_cents: int,
+                  quantity: int, restaurant: Optional[str]) -> Cart:
+        cart = await self._load(user_id)
+        cart.add(item_id, name, price_cents, quantity, restaurant)
+        self._changed(user_id, cart)
+        return cart
+
+    async def remove(self, user_id: int, item_id: str, quantity: Optional[int]) -> Optional[Cart]:
+        cart = await self._load(user_id)
+        if cart.remove(item_id, quantity):
+            self._changed(user_id, cart)
+        return cart or None
+
+    async def take(self, user_id: int) -> Optional[Cart]:
+        cart = await self._load(user_id)
+        if not cart:
+            return None
+        self.memory.put(user_id, Cart())
+        self._dirty[user_id] = None
+        return cart
+
+    async def flush(self, db) -> int:
+        """Записать измененные корзины; возвращает их число"""
+        if not self._dirty:
+            return 0
+
+        batch, self._dirty = self._dirty, {}
+        self._flushing = batch
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        removed = []
+        for user_id, cart in sorted(batch.items()):
+            if cart:
+                rows.append({
+                    "user_id": user_id,
+                    "items": json.dumps(cart.to_dict(), ensure_ascii=False),
+                    "total_cents": cart.total_cents,
+                    "items_count": cart.count,
+                    "updated_at": now
+                })
+            else:
+                removed.append(user_id)
+
+        try:
+            if rows:
+                connection = await db.connection()
+                dialect_insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+                statement = dialect_insert(SavedCart)
+                excluded = statement.excluded
+                await db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[SavedCart.user_id],
+                        set_={
+                            "items": excluded["items"],
+                            "total_cents": excluded.total_cents,
+                            "items_count": excluded.items_count,
+                            "updated_at": excluded.updated_at
+                        }
+                    ),
+                    rows
+                )
+            if removed:
+                await db.execute(delete(SavedCart).where(SavedCart.user_id.in_(removed)))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            # Более новые изменения, сделанные во время записи, важнее
+            for user_id, cart in batch.items():
+                self._dirty.setdefault(user_id, cart)
+            self.flush_errors += 1
+            logger.exception("Не удалось записать %d корзин", len(batch))
+            return 0
+        finally:
+            self._flushing = {}
+
+        self.flushed += len(batch)
+        return len(batch)
+
+    async def purge(self, db) -> int:
+        """Удалить корзины, не менявшиеся дольше ttl"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        result = await db.execute(delete(SavedCart).where(SavedCart.updated_at < cutoff))
+        await db.commit()
+        return result.rowcount
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with self._session_factory() as db:
+                    await self.flush(db)
+                    if time.monotonic() - self._purged_at >= PURGE_INTERVAL:
+                        self._purged_at = time.monotonic()
+                        await self.purge(db)
+            except Exception:
+                logger.exception("Ошибка фоновой записи корзин")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическую запись"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить запись и сохранить остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                await self.flush(db)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.memory.stats(),
+            "dirty": len(self._dirty),
+            "loaded": self.loaded,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors
+        }
@@ -0,0 +1,102 @@
+﻿"""
+Расчет стоимости и времени доставки
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.models import Restaurant
+from app.services.geo import haversine_km
+
+# Надбавка за дальние расстояния: +20₽ за каждый км свыше 5км
+SURCHARGE_FREE_DISTANCE_KM = 5.0
+SURCHARGE_PER_KM = 20.0
+
+# Примерно 2 минуты в пути на каждый км
+MINUTES_PER_KM = 2
+
+# Значение стоимости, означающее, что доставка невозможна
+DELIVERY_UNAVAILABLE = -1
+
+
+def quote_delivery_batch(
+    user_latitude: float,
+    user_longitude: float,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    base_fees: np.ndarray,
+    free_delivery_thresholds: np.ndarray,
+    max_delivery_distances: np.ndarray,
+    avg_delivery_times: np.ndarray,
+    order_total: float = 0.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Расстояние, стоимость и время доставки от N ресторанов до одной точки.
+
+    Все вычисления выполняются одним векторным проходом. Возвращает
+    (distances_km, fees, minutes); стоимость -1 означает, что адрес
+    за пределами зоны доставки ресторана.
+    """
+
+    distances = haversine_km(user_latitude, user_longitude, latitudes, longitudes)
+
+    fees = base_fees + np.maximum(distances - SURCHARGE_FREE_DISTANCE_KM, 0.0) * SURCHARGE_PER_KM
+
+    # Бесплатная доставка - только в пределах зоны доставки
+    fees = np.where(order_total >= free_delivery_thresholds, 0.0, fees)
+    fees = np.where(distances > max_delivery_distances, DELIVERY_UNAVAILABLE, fees)
+
+    minutes = avg_delivery_times + np.floor(distances * MINUTES_PER_KM).astype(np.int64)
+
+    return distances, fees, minutes
+
+
+def quote_restaurants(
+    restaurants: Sequence[Restaurant],
+    user_latitude: float,
+    user_longitude: float,
+    order_total: float = 0.0
+) -> List[Dict[str, Any]]:
+    """Расчет доставки для списка ресторанов (например, для экрана каталога)"""
+
+    if not restaurants:
+        return []
+
+    distances, fees, minutes = quote_delivery_batch(
+        user_latitude,
+        user_longitude,
+        np.array([r.latitude for r in restaurants], dtype=np.float64),
+        np.array([r.longitude for r in restaurants], dtype=np.float64),
+        np.array([r.delivery_fee for r in restaurants], dtype=np.float64),
+        np.array([r.free_delivery_threshold for r in restaurants], dtype=np.float64),
+        np.array([r.max_delivery_distance for r in restaurants], dtype=np.float64),
+        np.array([r.avg_delivery_time for r in restaurants], dtype=np.int64),
+        order_total
+    )
+
+    return [
+        {
+            "restaurant_id": restaurant.id,
+            "distance_km": round(distance, 2),
+            "delivery_fee": fee,
+            "delivery_available": fee != DELIVERY_UNAVAILABLE,
+            "estimated_minutes": eta
+        }
+        for restaurant, distance, fee, eta in zip(
+            restaurants, distances.tolist(), fees.tolist(), minutes.tolist()
+        )
+    ]
+
+
+def quote_restaurant(
+    restaurant: Restaurant,
+    user_latitude: float,
+    user_longitude: float,
+    order_total: float = 0.0
+) -> Tuple[float, int]:
+    """Стоимость и время доставки из одного ресторана: (fee, minutes)"""
+
+    quote = quote_restaurants([restaurant], user_latitude, user_longitude, order_total)[0]
+    return quote["delivery_fee"], quote["estimated_minutes"]
+
@@ -0,0 +1,413 @@
+"""
+Назначение курьеров на заказы
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, case, select, update
+
+from app.models import Courier, CourierStatus, Order, OrderStatus, Restaurant
+from app.services.geo import GeoGridIndex
+from app.services.location_service import courier_assignments, courier_locations
+from app.services.tracking_hub import tracking_hub
+
+logger = logging.getLogger(__name__)
+
+# Заказы, которым ищем курьера
+DISPATCH_STATUSES = (OrderStatus.PREPARING, OrderStatus.READY)
+
+# Веса функции выгоды (в километрах пути до ресторана)
+RATING_WEIGHT_KM = 0.5      # звезда рейтинга курьера "стоит" 0.5 км
+READY_BONUS_KM = 2.0        # готовые заказы важнее тех, что еще готовятся
+
+# Начальный шаг аукциона, км (50 м - меньше погрешности GPS): итог не хуже
+# оптимума более чем на итоговый шаг на каждого курьера
+AUCTION_EPSILON = 0.05
+
+# Через сколько раундов аукциона шаг удваивается
+AUCTION_ROUNDS_PER_STEP = 100
+
+
+def auction_assignment(
+    edge_bidders: np.ndarray,
+    edge_classes: np.ndarray,
+    edge_benefit: np.ndarray,
+    n_bidders: int,
+    capacities: np.ndarray,
+    epsilon: float = AUCTION_EPSILON
+) -> np.ndarray:
+    """
+    Задача о назначениях: максимизация суммарной выгоды пар (участник, объект).
+
+    Объекты объединены в классы одинаковых: класс c содержит capacities[c]
+    взаимозаменяемых объектов, которые занимают подряд идущие слоты.
+    Допустимые пары задаются ребрами (edge_bidders[k], edge_classes[k], edge_benefit[k]);
+    у каждого участника есть вариант "остаться без пары" с выгодой 0.
+
+    Аукцион Бертсекаса (вариант Якоби): все свободные участники одновременно
+    ставят на самый дешевый слот лучшего для себя класса, слот достается
+    наибольшей ставке. Возвращает для каждого участника номер слота или -1.
+    """
+
+    assigned = np.full(n_bidders, -1, dtype=np.int64)
+    useful = edge_benefit > 0
+    if not useful.any():
+        return assigned
+    edge_bidders, edge_classes, edge_benefit = edge_bidders[useful], edge_classes[useful], edge_benefit[useful]
+
+    n_classes = len(capacities)
+    n_slots = int(capacities.sum())
+    class_start = np.cumsum(capacities) - capacities
+    slot_class = np.repeat(np.arange(n_classes), capacities)
+
+    # Ребра участника - по убыванию выгоды
+    by_bidder = np.lexsort((-edge_benefit, edge_bidders))
+    edge_bidders, edge_classes, edge_benefit = edge_bidders[by_bidder], edge_classes[by_bidder], edge_benefit[by_bidder]
+    counts = np.bincount(edge_bidders, minlength=n_bidders)
+    row_start = np.cumsum(counts) - counts
+
+    # Если у участника есть n_bidders слотов не хуже данного, хотя бы один
+    # из них остается свободным - более слабые варианты ему не нужны
+    capacity_before = np.cumsum(capacities[edge_classes]) - capacities[edge_classes]
+    capacity_before -= np.repeat(capacity_before[row_start[counts > 0]], counts[counts > 0])
+    needed = capacity_before < n_bidders
+    edge_bidders, edge_classes, edge_benefit = edge_bidders[needed], edge_classes[needed], edge_benefit[needed]
+    counts = np.bincount(edge_bidders, minlength=n_bidders)
+    row_start = np.cumsum(counts) - counts
+    columns = np.arange(edge_bidders.size) - row_start[edge_bidders]
+
+    # Ребра раскладываются в построчную таблицу n_bidders x K; пустые места
+    # ссылаются на фиктивный класс n_classes с выгодой -inf
+    width = max(int(counts.max()), 2)
+    candidate = np.full((n_bidders, width), n_classes, dtype=np.int64)
+    gain = np.full((n_bidders, width), -np.inf)
+    candidate[edge_bidders, columns] = edge_classes
+    gain[edge_bidders, columns] = edge_benefit
+
+    # Цены стартуют с нуля и только растут: у незанятых слотов цена остается
+    # минимальной, поэтому прямой аукцион точен и для прямоугольной задачи
+    prices = np.zeros(n_slots)
+    owner = np.full(n_slots, -1, dtype=np.int64)
+
+    # Самый дешевый и второй по цене слот каждого класса (последний элемент -
+    # фиктивный класс пустых мест таблицы)
+    slot_index = np.arange(n_slots)
+    cheapest_slot = class_start.copy()
+    cheapest_price = np.zeros(n_classes + 1)
+    second_price = np.append(np.where(capacities > 1, 0.0, np.inf), np.inf)
+
+    active = np.flatnonzero(counts)
+    eps = epsilon
+    rounds = 0
+
+    while active.size:
+        # Затяжные ценовые войны ограничиваем ростом шага: точность
+        # понижается плавно, а время такта остается предсказуемым
+        rounds += 1
+        if rounds % AUCTION_ROUNDS_PER_STEP == 0:
+            eps *= 2
+
+        values = gain[active] - cheapest_price[candidate[active]]
+
+        best = values.argmax(axis=1)
+        rows = np.arange(active.size)
+        best_value = values[rows, best]
+        best_class = candidate[active, best]
+        values[rows, best] = -np.inf
+
+        # Вторая альтернатива: другой класс, второй слот того же класса или простой
+        second_value = np.maximum(values.max(axis=1), 0.0)
+        second_value = np.maximum(second_value, gain[active, best] - second_price[best_class])
+
+        # Участнику выгоднее остаться без пары - он выбывает из торгов
+        bidding = best_value > 0
+        bidders = active[bidding]
+        targets = cheapest_slot[best_class[bidding]]
+        bids = prices[targets] + best_value[bidding] - second_value[bidding] + eps
+
+        # На каждый слот побеждает максимальная ставка
+        order = np.lexsort((-bids, targets))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = targets[order[1:]] != targets[order[:-1]]
+        winners = order[first]
+
+        won_slots = targets[winners]
+        outbid = owner[won_slots]
+        outbid = outbid[outbid >= 0]
+        assigned[outbid] = -1
+
+        prices[won_slots] = bids[winners]
+        owner[won_slots] = bidders[winners]
+        assigned[bidders[winners]] = won_slots
+
+        lost = np.ones(bidders.size, dtype=bool)
+        lost[winners] = False
+        active = np.concatenate([bidders[lost], outbid])
+
+        # Самый дешевый и второй по цене слот каждого класса
+        cheapest_price[:-1] = np.minimum.reduceat(prices, class_start)
+        cheapest_slot = np.minimum.reduceat(
+            np.where(prices == cheapest_price[slot_class], slot_index, n_slots), class_start
+        )
+        remaining = prices.copy()
+        remaining[cheapest_slot] = np.inf
+        second_price[:-1] = np.minimum.reduceat(remaining, class_start)
+
+    return assigned
+
+
+def plan_assignments(
+    courier_ids: np.ndarray,
+    courier_lats: np.ndarray,
+    courier_lons: np.ndarray,
+    courier_radii: np.ndarray,
+    courier_ratings: np.ndarray,
+    order_ids: np.ndarray,
+    pickup_lats: np.ndarray,
+    pickup_lons: np.ndarray,
+    order_ready: np.ndarray,
+    index: Optional[GeoGridIndex] = None
+) -> List[Tuple[int, int]]:
+    """
+    Подобрать курьеров для заказов: [(order_id, courier_id), ...].
+
+    Кандидаты для каждого ресторана берутся из сеточного индекса курьеров
+    в пределах их рабочего радиуса, затем пары распределяются аукционом
+    по функции выгоды: ближе к ресторану, выше рейтинг, готовый заказ.
+    """
+
+    if len(courier_ids) == 0 or len(order_ids) == 0:
+        return []
+
+    if index is None:
+        index = GeoGridIndex()
+    index.load(zip(range(len(courier_ids)), courier_lats, courier_lons, courier_ratings))
+
+    max_radius = float(courier_radii.max())
+    courier_base = 1.0 + max_radius + courier_ratings * RATING_WEIGHT_KM
+
+    # Заказы одного ресторана с одной готовностью взаимозаменяемы: они образуют
+    # класс и делят общий список кандидатов
+    keys = np.column_stack((pickup_lats, pickup_lons, order_ready.astype(np.float64)))
+    class_keys, order_class = np.unique(keys, axis=0, return_inverse=True)
+    order_class = order_class.ravel()
+    capacities = np.bincount(order_class, minlength=len(class_keys))
+    # Внутри класса слоты идут по порядку заказов - старшие заказы первыми
+    slot_order = np.argsort(order_class, kind="stable")
+
+    # Кандидаты ищутся один раз на ресторан
+    pickups, class_pickup = np.unique(class_keys[:, :2], axis=0, return_inverse=True)
+    class_pickup = class_pickup.ravel()
+
+    edge_couriers, edge_classes, edge_benefit = [], [], []
+    for pickup, (lat, lon) in enumerate(pickups):
+        candidates, distances, _ = index.query(float(lat), float(lon), max_radius)
+        reachable = distances <= courier_radii[candidates]
+        candidates, distances = candidates[reachable], distances[reachable]
+        if candidates.size == 0:
+            continue
+
+        for cls in np.flatnonzero(class_pickup == pickup).tolist():
+            bonus = READY_BONUS_KM if class_keys[cls, 2] else 0.0
+            edge_couriers.append(candidates)
+            edge_classes.append(np.full(candidates.size, cls))
+            edge_benefit.append(courier_base[candidates] - distances + bonus)
+
+    if not edge_couriers:
+        return []
+
+    slots = auction_assignment(
+        np.concatenate(edge_couriers),
+        np.concatenate(edge_classes),
+        np.concatenate(edge_benefit),
+        len(courier_ids),
+        capacities
+    )
+    matched = np.flatnonzero(slots >= 0)
+
+    return list(zip(order_ids[slot_order[slots[matched]]].tolist(), courier_ids[matched].tolist()))
+
+
+class CourierDispatcher:
+    """
+    Периодическое назначение свободных курьеров на заказы.
+
+    На каждом такте загружает курьеров в статусе ONLINE (с учетом свежих
+    координат из приемника геопозиций) в сеточный индекс, решает задачу
+    назначения для всех заказов без курьера и применяет результат
+    атомарно: курьер переводится в BUSY, заказ получает курьера,
+    только если их успели не занять параллельно.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.index = GeoGridIndex()
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.ticks = 0
+        self.assigned = 0
+        self.conflicts = 0
+        self.last_open_orders = 0
+        self.last_online_couriers = 0
+        self.last_plan_seconds = 0.0
+        self.last_tick_seconds = 0.0
+
+    async def tick(self, db) -> List[Tuple[int, int]]:
+        """Один такт назначения; возвращает [(order_id, courier_id)]"""
+        started = time.perf_counter()
+
+        couriers = (await db.execute(
+            select(
+                Courier.id, Courier.user_id, Courier.current_latitude, Courier.current_longitude,
+                Courier.work_radius, Courier.rating
+            ).where(
+                Courier.status == CourierStatus.ONLINE,
+                Courier.is_active == True,
+                Courier.current_latitude.is_not(None),
+                Courier.current_longitude.is_not(None)
+            )
+        )).all()
+
+        orders = (await db.execute(
+            select(Order.id, Order.status, Restaurant.latitude, Restaurant.longitude)
+            .join(Restaurant, Restaurant.id == Order.restaurant_id)
+            .where(Order.status.in_(DISPATCH_STATUSES), Order.courier_id.is_(None))
+            .order_by(Order.id)
+        )).all()
+
+        self.ticks += 1
+        self.last_online_couriers = len(couriers)
+        self.last_open_orders = len(orders)
+        if not couriers or not orders:
+            self.last_tick_seconds = time.perf_counter() - started
+            return []
+
+        positions = []
+        for courier in couriers:
+            # Приемник геопозиций знает координаты свежее, чем БД
+            latest = courier_locations.latest(courier.id)
+            positions.append(latest[:2] if latest else (courier.current_latitude, courier.current_longitude))
+        positions = np.array(positions, dtype=np.float64)
+
+        plan_started = time.perf_counter()
+        plan = plan_assignments(
+            np.array([courier.id for courier in couriers], dtype=np.int64),
+            positions[:, 0],
+            positions[:, 1],
+            np.array([courier.work_radius or 0.0 for courier in couriers], dtype=np.float64),
+            np.array([courier.rating or 0.0 for courier in couriers], dtype=np.float64),
+            np.array([order.id for order in orders], dtype=np.int64),
+            np.array([order.latitude for order in orders], dtype=np.float64),
+            np.array([order.longitude for order in orders], dtype=np.float64),
+            np.array([order.status == OrderStatus.READY for order in orders]),
+            index=self.index
+        )
+        self.last_plan_seconds = time.perf_counter() - plan_started
+
+        applied = await self._apply(db, plan, {courier.id: courier.user_id for courier in couriers})
+
+        self.assigned += len(applied)
+        self.conflicts += len(plan) - len(applied)
+        self.last_tick_seconds = time.perf_counter() - started
+        return applied
+
+    async def _apply(
+        self,
+        db,
+        plan: List[Tuple[int, int]],
+        user_ids: Dict[int, int]
+    ) -> List[Tuple[int, int]]:
+        """Применить назначения compare-and-set запросами"""
+        if not plan:
+            return []
+
+        # Занимаем курьеров, которые все еще свободны
+        result = await db.execute(
+            update(Courier)
+            .where(Courier.id.in_([courier_id for _, courier_id in plan]), Courier.status == CourierStatus.ONLINE)
+            .values(status=CourierStatus.BUSY)
+            .returning(Courier.id)
+        )
+        busy = set(result.scalars().all())
+        plan = [(order_id, courier_id) for order_id, courier_id in plan if courier_id in busy]
+
+        # Order.courier_id ссылается на пользователя курьера
+        applied = []
+        if plan:
+            courier_by_order = {order_id: courier_id for order_id, courier_id in plan}
+            result = await db.execute(
+                update(Order)
+                .where(and_(
+                    Order.id.in_(list(courier_by_order)),
+                    Order.courier_id.is_(None),
+                    Order.status.in_(DISPATCH_STATUSES)
+                ))
+                .values(courier_id=case(
+                    {order_id: user_ids[courier_id] for order_id, courier_id in plan},
+                    value=Order.id
+                ))
+                .returning(Order.id)
+            )
+            applied = [(order_id, courier_by_order[order_id]) for order_id in result.scalars().all()]
+
+        # Курьеров, чей заказ успели забрать, возвращаем в ONLINE
+        released = busy - {courier_id for _, courier_id in applied}
+        if released:
+            await db.execute(
+                update(Courier).where(Courier.id.in_(released)).values(status=CourierStatus.ONLINE)
+            )
+
+        await db.commit()
+
+        for order_id, courier_id in applied:
+            courier_assignments.assign(user_ids[courier_id], order_id)
+            tracking_hub.publish(order_id, {"courier_id": user_ids[courier_id]})
+
+        return applied
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with self._session_factory() as db:
+                    await self.tick(db)
+            except Exception:
+                logger.exception("Ошибка такта назначения курьеров")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическое назначение"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить назначение"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики назначения"""
+        return {
+            "ticks": self.ticks,
+            "assigned": self.assigned,
+            "conflicts": self.conflicts,
+            "open_orders": self.last_open_orders,
+            "online_couriers": self.last_online_couriers,
+            "last_plan_ms": round(self.last_plan_seconds * 1000, 1),
+            "last_tick_ms": round(self.last_tick_seconds * 1000, 1)
+        }
+
+
+# Глобальный диспетчер курьеров
+courier_dispatcher = CourierDispatcher()
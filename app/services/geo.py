@@ -0,0 +1,185 @@
+﻿"""
+Геометрия и пространственный индекс для поиска по расстоянию
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Средний радиус Земли, км
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу в км (скаляры или numpy-массивы)"""
+    lat1 = np.radians(lat1)
+    lon1 = np.radians(lon1)
+    lat2 = np.radians(lat2)
+    lon2 = np.radians(lon2)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """Прямоугольник (min_lat, max_lat, min_lon, max_lon), содержащий круг радиуса radius_km"""
+
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+
+    # У полюсов долгота вырождается - берем весь диапазон
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+
+    return (
+        max(-90.0, latitude - delta_lat),
+        min(90.0, latitude + delta_lat),
+        max(-180.0, longitude - delta_lon),
+        min(180.0, longitude + delta_lon),
+    )
+
+
+class GeoGridIndex:
+    """
+    Сеточный индекс точек в памяти.
+
+    Точки хранятся в numpy-массивах, отсортированных по номеру ячейки сетки,
+    поэтому запрос по радиусу просматривает только ячейки, попадающие
+    в ограничивающий прямоугольник. Каждой точке соответствует вес
+    (например, рейтинг), по которому сортируется выдача.
+    """
+
+    def __init__(self, cell_size_deg: float = 0.05):
+        self.cell_size = cell_size_deg
+        self._cols = int(math.ceil(360.0 / cell_size_deg)) + 1
+        self._points: Dict[int, Tuple[float, float, float]] = {}
+        self._dirty = True
+        self.loaded = False
+
+        self._keys = np.empty(0, dtype=np.int64)
+        self._lats = np.empty(0, dtype=np.float64)
+        self._lons = np.empty(0, dtype=np.float64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._cells = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._points
+
+    def _row(self, latitude):
+        return np.floor((np.asarray(latitude) + 90.0) / self.cell_size).astype(np.int64)
+
+    def _col(self, longitude):
+        return np.floor((np.asarray(longitude) + 180.0) / self.cell_size).astype(np.int64)
+
+    def load(self, points) -> None:
+        """Заменить содержимое индекса набором (key, lat, lon, weight)"""
+        self._points = {
+            int(key): (float(lat), float(lon), float(weight or 0.0))
+            for key, lat, lon, weight in points
+        }
+        self._dirty = True
+        self.loaded = True
+
+    def upsert(self, key: int, latitude: float, longitude: float, weight: float = 0.0) -> None:
+        """Добавить или переместить точку"""
+        self._points[int(key)] = (float(latitude), float(longitude), float(weight or 0.0))
+        self._dirty = True
+
+    def remove(self, key: int) -> None:
+        """Удалить точку из индекса"""
+        if self._points.pop(int(key), None) is not None:
+            self._dirty = True
+
+    def clear(self) -> None:
+        """Очистить индекс и пометить его как незагруженный"""
+        self._points.clear()
+        self._dirty = True
+        self.loaded = False
+
+    def _rebuild(self) -> None:
+        """Пересобрать массивы после изменений"""
+        count = len(self._points)
+        keys = np.fromiter(self._points.keys(), dtype=np.int64, count=count)
+        values = np.array(list(self._points.values()), dtype=np.float64).reshape(count, 3)
+
+        cells = self._row(values[:, 0]) * self._cols + self._col(values[:, 1])
+        order = np.argsort(cells, kind="stable")
+
+        self._keys = keys[order]
+        self._lats = values[order, 0]
+        self._lons = values[order, 1]
+        self._weights = values[order, 2]
+        self._cells = cells[order]
+        self._dirty = False
+
+    def query(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Найти точки в радиусе: (keys, distances_km, weights)"""
+
+        if self._dirty:
+            self._rebuild()
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        row_from, row_to = int(self._row(min_lat)), int(self._row(max_lat))
+        col_from, col_to = int(self._col(min_lon)), int(self._col(max_lon))
+
+        # Для каждой строки сетки ячейки [col_from, col_to] лежат в массиве подряд
+        row_cells = np.arange(row_from, row_to + 1, dtype=np.int64) * self._cols
+        starts = np.searchsorted(self._cells, row_cells + col_from, side="left")
+        ends = np.searchsorted(self._cells, row_cells + col_to, side="right")
+
+        spans = [(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        if not spans:
+            empty = np.empty(0)
+            return empty.astype(np.int64), empty, empty
+
+        candidates = np.concatenate([np.arange(start, end) for start, end in spans])
+        distances = haversine_km(latitude, longitude, self._lats[candidates], self._lons[candidates])
+
+        inside = distances <= radius_km
+        candidates = candidates[inside]
+
+        return self._keys[candidates], distances[inside], self._weights[candidates]
+
+    def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        skip: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Точки в радиусе, упорядоченные по весу (по убыванию) и ключу.
+
+        Возвращает страницу [(key, distance_km), ...] - порядок стабилен,
+        поэтому skip/limit дают корректную пагинацию.
+        """
+
+        keys, distances, weights = self.query(latitude, longitude, radius_km)
+
+        wanted = len(keys) if limit is None else min(len(keys), skip + limit)
+        if wanted <= skip:
+            return []
+
+        # Частичный отбор: берем только точки с весом не ниже граничного
+        if wanted < len(keys):
+            threshold = np.partition(-weights, wanted - 1)[wanted - 1]
+            selected = np.flatnonzero(-weights <= threshold)
+            keys, distances, weights = keys[selected], distances[selected], weights[selected]
+
+        order = np.lexsort((keys, -weights))[skip:wanted]
+
+        return list(zip(keys[order].tolist(), distances[order].tolist()))
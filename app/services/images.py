@@ -0,0 +1,75 @@
+"""
+Уменьшенные копии изображений. Выполняется в процессах пула ImagePipeline,
+поэтому модуль не зависит от остального приложения.
+"""
+
+import hashlib
+import io
+import os
+import uuid
+from typing import Any, Dict
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Наибольшая сторона варианта, пиксели (от большего к меньшему)
+VARIANT_SIZES = {"large": 1280, "medium": 640, "thumb": 160}
+# Формат файла: (расширение, параметры сохранения Pillow)
+FORMATS = {
+    "WEBP": ("webp", {"quality": 80, "method": 4}),
+    "JPEG": ("jpg", {"quality": 82, "optimize": True, "progressive": True})
+}
+# Больше пикселей не распаковывается (защита от "бомб" из маленьких файлов)
+MAX_PIXELS = 40_000_000
+HASH_LENGTH = 24
+
+
+def _open_rgb(source: str) -> Image.Image:
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise ValueError("Слишком большое разрешение изображения")
+            image = ImageOps.exif_transpose(image)
+            if "A" in image.getbands() or "transparency" in image.info:
+                # Прозрачный фон - белый, как у карточек блюд
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+                return image
+            return image.convert("RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as error:
+        raise ValueError("Файл не является изображением") from error
+
+
+def _write(data: bytes, extension: str, directory: str) -> str:
+    """Записать файл под именем по хэшу содержимого; путь относительно directory"""
+    name = f"{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{extension}"
+    relative = os.path.join(name[:2], name)
+    path = os.path.join(directory, relative)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Читатель никогда не увидит файл записанным наполовину
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        with open(partial, "wb") as file:
+            file.write(data)
+        os.replace(partial, path)
+    return relative
+
+
+def make_variants(source: str, directory: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Варианты изображения source всех размеров во всех форматах, записанные
+    в directory. Возвращает {размер: {"width", "height", расширение: путь}}.
+    Меньшие варианты уменьшаются из больших, а не из исходника.
+    """
+    image = _open_rgb(source)
+    variants = {}
+    for size_name, size in VARIANT_SIZES.items():
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        variant: Dict[str, Any] = {"width": image.width, "height": image.height}
+        for image_format, (extension, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+            variant[extension] = _write(buffer.getvalue(), extension, directory)
+        variants[size_name] = variant
+    return variants
@@ -0,0 +1,332 @@
+﻿"""
+Прием геопозиций курьеров
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.models import Courier, DeliveryTracking, Order, OrderStatus
+from app.services.presence import courier_presence
+from app.services.tracking_hub import tracking_hub
+
+logger = logging.getLogger(__name__)
+
+# Статусы, в которых заказ больше не везут
+FINISHED_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+
+class CourierAssignments:
+    """
+    Заказы, которые везет курьер (ключ - user_id курьера, как в Order.courier_id).
+
+    Пинг с чужим order_id не попадает ни в историю, ни в поток отслеживания
+    клиента. Диспетчер и смена статуса заказа обновляют кэш сразу; промах
+    и записи старше ttl (назначение в другом процессе) читаются из БД.
+    """
+
+    def __init__(self, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._orders: Dict[int, Tuple[float, Set[int]]] = {}
+
+    async def orders(self, db, courier_user_id: int) -> Set[int]:
+        """ID заказов, назначенных курьеру и еще не завершенных"""
+        entry = self._orders.get(courier_user_id)
+        now = self._clock()
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+
+        result = await db.execute(
+            select(Order.id).where(Order.courier_id == courier_user_id, Order.status.notin_(FINISHED_STATUSES))
+        )
+        orders = set(result.scalars().all())
+        self._orders[courier_user_id] = (now, orders)
+        return orders
+
+    def assign(self, courier_user_id: int, order_id: int) -> None:
+        entry = self._orders.get(courier_user_id)
+        if entry is not None:
+            entry[1].add(order_id)
+
+    def release(self, courier_user_id: int, order_id: int) -> None:
+        entry = self._orders.get(courier_user_id)
+        if entry is not None:
+            entry[1].discard(order_id)
+
+    def clear(self) -> None:
+        self._orders.clear()
+
+
+class CourierLocationIngestor:
+    """
+    Буфер геопозиций курьеров с пакетной записью в БД.
+
+    Пинги складываются в кольцевой буфер в памяти, последняя позиция
+    каждого курьера доступна сразу. Фоновая задача периодически пишет
+    историю в delivery_tracking одним пакетным INSERT (COPY на PostgreSQL)
+    и обновляет текущие координаты курьеров одним UPDATE по первичному ключу.
+    """
+
+    # Core UPDATE: пинги несуществующего курьера обновляют ноль строк,
+    # а не валят весь пакет, как ORM bulk update (StaleDataError)
+    _update_positions = (
+        update(Courier.__table__)
+        .where(Courier.__table__.c.id == bindparam("_id"))
+        .values(
+            current_latitude=bindparam("_latitude"),
+            current_longitude=bindparam("_longitude"),
+            last_location_update=bindparam("_timestamp")
+        )
+    )
+
+    def __init__(
+        self,
+        buffer_size: int = 200_000,
+        flush_interval: float = 1.0,
+        batch_size: int = 20_000
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # (courier_id, order_id, lat, lng, speed, heading, accuracy, timestamp, received_at)
+        self._pending: deque = deque(maxlen=buffer_size)
+        self._latest: Dict[int, Tuple[float, float, datetime]] = {}
+        self._dirty_couriers: Dict[int, Tuple[float, float, datetime]] = {}
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.received = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_lag = 0.0
+
+    def ingest(self, pings: Iterable[Dict[str, Any]], orders: Optional[Set[int]] = None) -> int:
+        """
+        Принять пачку пингов; возвращает число принятых.
+        orders - заказы курьера: пинги с другим order_id отвергаются.
+        """
+        received_at = time.monotonic()
+        heartbeat_at = time.time()
+        now = datetime.now(timezone.utc)
+        count = 0
+
+        for ping in pings:
+            if orders is not None and ping.get("order_id") and ping["order_id"] not in orders:
+                self.rejected += 1
+                continue
+
+            courier_id = ping["courier_id"]
+            latitude = ping["latitude"]
+            longitude = ping["longitude"]
+            timestamp = ping.get("timestamp") or now
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1  # самый старый пинг вытесняется из буфера
+
+            self._pending.append((
+                courier_id,
+                ping.get("order_id"),
+                latitude,
+                longitude,
+                ping.get("speed"),
+                ping.get("heading"),
+                ping.get("accuracy"),
+                timestamp,
+                received_at
+            ))
+
+            # Пинг - заодно отметка присутствия курьера
+            courier_presence.heartbeat(courier_id, heartbeat_at)
+
+            latest = self._latest.get(courier_id)
+            if latest is None or latest[2] <= timestamp:
+                self._latest[courier_id] = self._dirty_couriers[courier_id] = (latitude, longitude, timestamp)
+
+                if ping.get("order_id"):
+                    tracking_hub.publish(ping["order_id"], {
+                        "courier_location": {
+                            "latitude": latitude,
+                            "longitude": longitude,
+                            "heading": ping.get("heading"),
+                            "timestamp": timestamp.isoformat()
+                        }
+                    })
+
+            count += 1
+
+        self.received += count
+        return count
+
+    def latest(self, courier_id: int) -> Optional[Tuple[float, float, datetime]]:
+        """Последняя известная позиция курьера: (lat, lng, timestamp)"""
+        return self._latest.get(courier_id)
+
+    @property
+    def pending(self) -> int:
+        """Число пингов, ожидающих записи"""
+        return len(self._pending)
+
+    def flush_lag(self) -> float:
+        """Возраст самого старого незаписанного пинга, секунды"""
+        if not self._pending:
+            return 0.0
+        return time.monotonic() - self._pending[0][8]
+
+    async def flush(self, db) -> int:
+        """Записать накопленные пинги в БД; возвращает число записанных"""
+        if not self._pending and not self._dirty_couriers:
+            return 0
+
+        self.max_flush_lag = max(self.max_flush_lag, self.flush_lag())
+        started = time.perf_counter()
+
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        couriers, self._dirty_couriers = self._dirty_couriers, {}
+
+        tracking_rows = [
+            {
+                "order_id": order_id,
+                "courier_id": courier_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "speed": speed,
+                "heading": heading,
+                "accuracy": accuracy,
+                "timestamp": timestamp
+            }
+            for courier_id, order_id, latitude, longitude, speed, heading, accuracy, timestamp, _ in batch
+            if order_id
+        ]
+        courier_rows = [
+            {
+                "_id": courier_id,
+                "_latitude": latitude,
+                "_longitude": longitude,
+                "_timestamp": timestamp
+            }
+            for courier_id, (latitude, longitude, timestamp) in couriers.items()
+        ]
+
+        try:
+            if tracking_rows:
+                tracking_rows = await self._existing_orders(db, tracking_rows)
+            if tracking_rows:
+                await self._insert_tracking(db, tracking_rows)
+            if courier_rows:
+                await db.execute(self._update_positions, courier_rows)
+            await db.commit()
+        except (IntegrityError, DataError):
+            await db.rollback()
+            # Историю пакета с некорректными данными повторять бесполезно, позиции курьеров допишем
+            self._dirty_couriers = {**couriers, **self._dirty_couriers}
+            self.flush_errors += 1
+            self.dropped += len(batch)
+            logger.exception("Отброшен пакет из %d геопозиций курьеров с некорректными данными", len(batch))
+            return 0
+        except Exception:
+            await db.rollback()
+            # Сбой соединения или блокировки: пакет возвращается в начало буфера,
+            # при нехватке места вытесняются самые старые пинги, как при приеме
+            self._dirty_couriers = {**couriers, **self._dirty_couriers}
+            room = self._pending.maxlen - len(self._pending)
+            requeued = batch[len(batch) - room:] if room < len(batch) else batch
+            self._pending.extendleft(reversed(requeued))
+            self.flush_errors += 1
+            self.dropped += len(batch) - len(requeued)
+            logger.exception("Не удалось записать %d геопозиций курьеров, пакет будет повторен", len(batch))
+            return 0
+
+        self.flushed += len(batch)
+        self.last_flush_seconds = time.perf_counter() - started
+        return len(batch)
+
+    async def _existing_orders(self, db, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Строки истории существующих заказов: удаленный заказ нарушил бы внешний ключ всего пакета"""
+        result = await db.execute(select(Order.id).where(Order.id.in_({row["order_id"] for row in rows})))
+        existing = set(result.scalars().all())
+        valid = [row for row in rows if row["order_id"] in existing]
+        self.rejected += len(rows) - len(valid)
+        return valid
+
+    async def _insert_tracking(self, db, rows: List[Dict[str, Any]]) -> None:
+        """Пакетная вставка истории: COPY на PostgreSQL (asyncpg), executemany в остальных случаях"""
+        connection = await db.connection()
+
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+            raw_connection = await connection.get_raw_connection()
+            columns = list(rows[0].keys())
+            await raw_connection.driver_connection.copy_records_to_table(
+                DeliveryTracking.__tablename__,
+                records=[tuple(row[column] for column in columns) for row in rows],
+                columns=columns
+            )
+            return
+
+        await db.execute(insert(DeliveryTracking), rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with self._session_factory() as db:
+                    # Если буфер вырос больше пакета, дописываем без паузы
+                    while await self.flush(db) >= self.batch_size:
+                        pass
+            except Exception:
+                logger.exception("Ошибка фоновой записи геопозиций курьеров")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическую запись"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить запись и сохранить остаток буфера"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                while await self.flush(db):
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики приема геопозиций"""
+        return {
+            "received": self.received,
+            "flushed": self.flushed,
+            "pending": self.pending,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flush_errors": self.flush_errors,
+            "couriers": len(self._latest),
+            "flush_lag_seconds": round(self.flush_lag(), 3),
+            "max_flush_lag_seconds": round(self.max_flush_lag, 3),
+            "last_flush_seconds": round(self.last_flush_seconds, 4)
+        }
+
+
+# Глобальный приемник геопозиций курьеров
+courier_locations = CourierLocationIngestor()
+
+# Глобальный кэш назначенных курьерам заказов
+courier_assignments = CourierAssignments()
@@ -0,0 +1,340 @@
+"""
+Кэш file_id изображений, отправленных ботом в Telegram
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from telegram import InputFile, Message, PhotoSize
+from telegram.error import BadRequest, TelegramError
+
+from app.bot.sender import SendPriority
+from app.core.config import settings
+from app.models import MediaFile
+from app.services.menu_cache import menu_cache
+from app.services.restaurant_service import RestaurantService
+
+logger = logging.getLogger(__name__)
+
+# URL локальных файлов, раздаваемых из settings.UPLOAD_DIR
+UPLOADS_PREFIX = "/uploads/"
+
+
+def local_path(url: str) -> Optional[str]:
+    """Путь к локальному файлу изображения; None - изображение не из загрузок"""
+    if not url.startswith(UPLOADS_PREFIX):
+        return None
+    root = os.path.abspath(settings.UPLOAD_DIR)
+    path = os.path.abspath(os.path.join(root, url[len(UPLOADS_PREFIX):]))
+    # Путь вида /uploads/../.env не должен выходить за каталог загрузок
+    return path if path.startswith(root + os.sep) else None
+
+
+def restaurant_image_urls(restaurant, menu: List[Dict[str, Any]]) -> List[str]:
+    """Изображения ресторана и его меню (снимок меню) без повторов"""
+    urls = [restaurant.logo_url, restaurant.cover_url]
+    for category in menu:
+        urls.append(category["image_url"])
+        urls.extend(item["image_url"] for item in category["items"])
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class MediaCache:
+    """
+    Соответствие URL изображения и file_id в Telegram.
+
+    Первая отправка изображения загружает файл (локальный - содержимым,
+    внешний - ссылкой, которую Telegram скачивает сам), а file_id самого
+    большого размера из ответа запоминается; все следующие отправки идут
+    по file_id. Локальные файлы дополнительно ищутся по sha256 содержимого.
+    Одновременные первые отправки одного URL ждут одну загрузку.
+
+    Соответствия держатся в памяти, читаются из таблицы media_files при
+    запуске и записываются в нее пачками раз в flush_interval. Если
+    Telegram не принимает file_id (например, после смены токена бота),
+    запись забывается и изображение загружается заново.
+    """
+
+    def __init__(self, flush_interval: float = 5.0):
+        self.flush_interval = flush_interval
+
+        self._by_url: Dict[str, str] = {}
+        self._by_hash: Dict[str, str] = {}
+        # url -> (хэш, file_id, file_unique_id) к записи (None - удалить)
+        self._dirty: Dict[str, Optional[Tuple[Optional[str], str, Optional[str]]]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Версия меню, для которой ресторан уже предзагружен
+        self._warmed: Dict[int, int] = {}
+        self._prewarm_tasks: Set[asyncio.Task] = set()
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.hits = 0
+        self.hash_hits = 0
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self.url_sends = 0
+        self.stale = 0
+        self.prewarmed = 0
+        self.prewarm_errors = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def file_id(self, url: str) -> Optional[str]:
+        """Известный file_id изображения"""
+        return self._by_url.get(url)
+
+    async def send_photo(self, bot, chat_id: int, url: str, **kwargs) -> Message:
+        """Отправить изображение по URL из моделей; kwargs - как у Bot.send_photo"""
+        file_id = self._by_url.get(url)
+        if file_id is not None:
+            try:
+                message = await bot.send_photo(chat_id, file_id, **kwargs)
+                self.hits += 1
+                return message
+            except BadRequest as error:
+                if "file" not in str(error).lower():
+                    raise
+                logger.warning("Telegram не принял file_id изображения %s: %s", url, error)
+                self.stale += 1
+                self._forget(url)
+
+        return await self._upload(bot, chat_id, url, kwargs)
+
+    async def _upload(self, bot, chat_id: int, url: str, kwargs: Dict[str, Any]) -> Message:
+        while url in self._inflight:
+            # То же изображение уже загружается - дождемся его file_id
+            await asyncio.shield(self._inflight[url])
+            file_id = self._by_url.get(url)
+            if file_id is not None:
+                self.hits += 1
+                return await bot.send_photo(chat_id, file_id, **kwargs)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            photo, content_hash = await self._source(url)
+            message = await bot.send_photo(chat_id, photo, **kwargs)
+            if message.photo:
+                self._remember(url, content_hash, message.photo[-1])
+            return message
+        finally:
+            del self._inflight[url]
+            future.set_result(None)
+
+    async def _source(self, url: str) -> Tuple[Any, Optional[str]]:
+        """Что передать в send_photo для еще не отправленного URL, и хэш содержимого"""
+        path = local_path(url)
+        if path is None:
+            if not url.startswith(("http://", "https://")):
+                raise ValueError(f"Изображение недоступно для Telegram: {url}")
+            self.url_sends += 1
+            return url, None
+
+        data = await asyncio.to_thread(_read_file, path)
+        content_hash = hashlib.sha256(data).hexdigest()
+        file_id = self._by_hash.get(content_hash)
+        if file_id is not None:
+            # Тот же файл уже загружен под другим URL
+            self.hash_hits += 1
+            return file_id, content_hash
+
+        self.uploads += 1
+        self.uploaded_bytes += len(data)
+        return InputFile(data, filename=os.path.basename(path)), content_hash
+
+    def _remember(self, url: str, content_hash: Optional[str], photo: PhotoSize) -> None:
+        self._by_url[url] = photo.file_id
+        if content_hash is not None:
+            self._by_hash[content_hash] = photo.file_id
+        self._dirty[url] = (content_hash, photo.file_id, photo.file_unique_id)
+
+    def _forget(self, url: str) -> None:
+        file_id = self._by_url.pop(url, None)
+        for content_hash in [key for key, value in self._by_hash.items() if value == file_id]:
+            del self._by_hash[content_hash]
+        self._dirty[url] = None
+
+    def prewarm_restaurant(self, bot, restaurant_id: int) -> Optional[asyncio.Task]:
+        """
+        Загрузить в фоне изображения ресторана и его меню в служебный чат
+        TELEGRAM_MEDIA_CHAT_ID, чтобы пользователи сразу получали их по file_id.
+        Повторно для той же версии меню ничего не делает.
+        """
+        chat_id = settings.TELEGRAM_MEDIA_CHAT_ID
+        if chat_id is None or self._session_factory is None:
+            return None
+        version = menu_cache.version(restaurant_id)
+        if self._warmed.get(restaurant_id) == version:
+            return None
+        self._warmed[restaurant_id] = version
+
+        task = asyncio.create_task(self._prewarm(bot, chat_id, restaurant_id))
+        self._prewarm_tasks.add(task)
+        task.add_done_callback(self._prewarm_tasks.discard)
+        return task
+
+    async def _prewarm(self, bot, chat_id: int, restaurant_id: int) -> int:
+        async with self._session_factory() as db:
+            service = RestaurantService(db)
+            restaurant = await service.get_restaurant(restaurant_id)
+            menu = await service.get_menu_snapshot(restaurant_id)
+        if restaurant is None:
+            return 0
+
+        uploaded = 0
+        for url in restaurant_image_urls(restaurant, json.loads(menu) if menu else []):
+            if url in self._by_url or url in self._inflight:
+                continue
+            try:
+                # Предзагрузка уступает очередь сообщениям пользователям
+                await self._upload(bot, chat_id, url, {
+                    "disable_notification": True,
+                    "rate_limit_args": SendPriority.MARKETING
+                })
+            except (TelegramError, ValueError, OSError):
+                self.prewarm_errors += 1
+                logger.warning("Не удалось предзагрузить изображение %s", url, exc_info=True)
+            else:
+                uploaded += 1
+                self.prewarmed += 1
+        return uploaded
+
+    async def load(self, db) -> int:
+        """Прочитать сохраненные file_id; возвращает их число"""
+        rows = (await db.execute(
+            select(MediaFile.url, MediaFile.content_hash, MediaFile.file_id)
+        )).all()
+        for url, content_hash, file_id in rows:
+            # Изменения, сделанные до загрузки, новее
+            if url in self._dirty:
+                continue
+            self._by_url.setdefault(url, file_id)
+            if content_hash is not None:
+                self._by_hash.setdefault(content_hash, file_id)
+        return len(rows)
+
+    async def flush(self, db) -> int:
+        """Записать новые и забытые file_id; возвращает число записей"""
+        if not self._dirty:
+            return 0
+
+        batch, self._dirty = self._dirty, {}
+        now = datetime.now(timezone.utc)
+        rows = []
+        removed = []
+        for url, entry in sorted(batch.items()):
+            if entry is None:
+                removed.append(url)
+                continue
+            content_hash, file_id, file_unique_id = entry
+            rows.append({
+                "url": url,
+                "content_hash": content_hash,
+                "file_id": file_id,
+                "file_unique_id": file_unique_id,
+                "updated_at": now
+            })
+
+        try:
+            if rows:
+                connection = await db.connection()
+                dialect_insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+                statement = dialect_insert(MediaFile)
+                excluded = statement.excluded
+                await db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[MediaFile.url],
+                        set_={
+                            "content_hash": excluded.content_hash,
+                            "file_id": excluded.file_id,
+                            "file_unique_id": excluded.file_unique_id,
+                            "updated_at": excluded.updated_at
+                        }
+                    ),
+                    rows
+                )
+            if removed:
+                await db.execute(delete(MediaFile).where(MediaFile.url.in_(removed)))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for url, entry in batch.items():
+                self._dirty.setdefault(url, entry)
+            self.flush_errors += 1
+            logger.exception("Не удалось записать %d file_id", len(batch))
+            return 0
+
+        self.flushed += len(batch)
+        return len(batch)
+
+    async def _run(self) -> None:
+        try:
+            async with self._session_factory() as db:
+                loaded = await self.load(db)
+            logger.info("Загружено %d file_id изображений", loaded)
+        except Exception:
+            logger.exception("Не удалось прочитать file_id изображений")
+
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with self._session_factory() as db:
+                    await self.flush(db)
+            except Exception:
+                logger.exception("Ошибка фоновой записи file_id")
+
+    def start(self, session_factory) -> None:
+        """Прочитать сохраненные file_id и запустить периодическую запись"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить предзагрузку и запись, сохранить остаток"""
+        tasks = [*self._prewarm_tasks, *([self._task] if self._task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._prewarm_tasks.clear()
+        self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                await self.flush(db)
+
+    def stats(self) -> Dict[str, Any]:
+        sends = self.hits + self.hash_hits + self.uploads + self.url_sends
+        return {
+            "entries": len(self._by_url),
+            "hits": self.hits,
+            "hash_hits": self.hash_hits,
+            "uploads": self.uploads,
+            "uploaded_bytes": self.uploaded_bytes,
+            "url_sends": self.url_sends,
+            "hit_rate": round((self.hits + self.hash_hits) / sends, 3) if sends else 0.0,
+            "stale": self.stale,
+            "prewarmed": self.prewarmed,
+            "prewarm_errors": self.prewarm_errors,
+            "dirty": len(self._dirty),
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors
+        }
+
+
+# Глобальный кэш file_id
+media_cache = MediaCache()
@@ -0,0 +1,268 @@
+"""
+Кэш снимков меню ресторанов
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from app.models import CacheVersion, MenuCategory, MenuItem, Restaurant
+
+logger = logging.getLogger(__name__)
+
+# Ключи общих версий в таблице cache_versions
+CATALOG_KEY = "catalog"
+MENU_KEY_PREFIX = "menu:"
+
+
+class MenuCache:
+    """
+    Версионированный кэш готовых JSON-ответов меню.
+
+    У каждого ресторана есть номер версии; запись в кэше действительна,
+    пока версия ресторана не изменилась. Версия повышается при изменении
+    блюд, категорий и самого ресторана (события SQLAlchemy) или явным
+    вызовом invalidate(). Одновременные промахи по одному ключу выполняют
+    одну загрузку из БД, остальные ждут ее результата. Отдельная версия
+    каталога повышается при добавлении, изменении и удалении любого ресторана.
+
+    Версии в памяти относятся к одному процессу. Чтобы воркеры uvicorn и
+    бот не отдавали старое меню, изменение повышает и общую версию в
+    таблице cache_versions (в той же транзакции), а каждый процесс раз в
+    sync_interval читает таблицу и сбрасывает изменившиеся рестораны.
+    Другие процессы видят изменение не позже чем через sync_interval.
+    """
+
+    def __init__(self, max_entries: int = 2048, sync_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.sync_interval = sync_interval
+        self._versions: Dict[int, int] = {}
+        self._catalog_version = 0
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[int, Optional[bytes]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, Hashable, int], asyncio.Future] = {}
+        self._shared_versions: Dict[str, int] = {}
+
+        self._session_factory = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.remote_invalidations = 0
+
+    def version(self, restaurant_id: int) -> int:
+        """Текущая версия меню ресторана"""
+        return self._versions.get(restaurant_id, 0)
+
+    def invalidate(self, restaurant_id: int) -> None:
+        """Сбросить меню ресторана в этом процессе (например, после массового UPDATE в обход ORM)"""
+        self._versions[restaurant_id] = self._versions.get(restaurant_id, 0) + 1
+        self.invalidations += 1
+
+    def catalog_version(self) -> int:
+        """Текущая версия списка ресторанов"""
+        return self._catalog_version
+
+    def invalidate_catalog(self) -> None:
+        """Сбросить список ресторанов"""
+        self._catalog_version += 1
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Очистить кэш полностью"""
+        self._entries.clear()
+        self._versions.clear()
+
+    async def get_or_load(
+        self,
+        restaurant_id: int,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[bytes]:
+        """Снимок из кэша или из loader(); None тоже кэшируется (ресторан не найден)"""
+        version = self.version(restaurant_id)
+        cache_key = (restaurant_id, key)
+
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        flight_key = (restaurant_id, key, version)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            self.loads += 1
+            payload = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # ожидающих может не быть - не логируем как потерянное
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
+
+        future.set_result(payload)
+
+        # Меню могли изменить во время загрузки - такой снимок не сохраняем
+        if self.version(restaurant_id) == version:
+            self._store(cache_key, version, payload)
+
+        return payload
+
+    def _store(self, cache_key: Tuple[int, Hashable], version: int, payload: Optional[bytes]) -> None:
+        self._entries[cache_key] = (version, payload)
+        self._entries.move_to_end(cache_key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "remote_invalidations": self.remote_invalidations
+        }
+
+    async def sync(self, db: AsyncSession) -> int:
+        """Сбросить рестораны, общая версия которых изменилась с прошлого чтения"""
+        rows = (await db.execute(select(CacheVersion.key, CacheVersion.version))).all()
+
+        changed = 0
+        for key, version in rows:
+            if self._shared_versions.get(key) == version:
+                continue
+            self._shared_versions[key] = version
+            changed += 1
+            if key == CATALOG_KEY:
+                self.invalidate_catalog()
+            elif key.startswith(MENU_KEY_PREFIX):
+                self.invalidate(int(key[len(MENU_KEY_PREFIX):]))
+
+        self.remote_invalidations += changed
+        return changed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as db:
+                    await self.sync(db)
+            except Exception:
+                logger.exception("Не удалось прочитать общие версии меню")
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическое чтение общих версий"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный кэш меню
+menu_cache = MenuCache()
+
+
+# Версия повышается сразу при записи в БД (чтобы не отдать старый снимок
+# той же сессии) и еще раз после коммита (чтобы снимок, загруженный
+# параллельно до коммита, тоже стал недействительным). Общая версия
+# повышается один раз за транзакцию, при первой записи ресторана.
+_DIRTY_KEY = "menu_cache_restaurants"
+_CATALOG_KEY = "menu_cache_catalog"
+
+
+def _bump_shared(connection, key: str) -> None:
+    dialect_insert = postgresql_insert if connection.dialect.name == "postgresql" else sqlite_insert
+    statement = dialect_insert(CacheVersion).values(key=key, version=1)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[CacheVersion.key],
+        set_={"version": CacheVersion.version + 1}
+    ))
+
+
+def _mark_changed(target, connection, restaurant_id: Optional[int]) -> None:
+    if restaurant_id is None:
+        return
+    menu_cache.invalidate(restaurant_id)
+
+    session = object_session(target)
+    dirty = session.info.setdefault(_DIRTY_KEY, set()) if session is not None else set()
+    if restaurant_id not in dirty:
+        dirty.add(restaurant_id)
+        _bump_shared(connection, f"{MENU_KEY_PREFIX}{restaurant_id}")
+
+
+@event.listens_for(MenuItem, "after_insert")
+@event.listens_for(MenuItem, "after_update")
+@event.listens_for(MenuItem, "after_delete")
+@event.listens_for(MenuCategory, "after_insert")
+@event.listens_for(MenuCategory, "after_update")
+@event.listens_for(MenuCategory, "after_delete")
+def _invalidate_menu(mapper, connection, target):
+    _mark_changed(target, connection, target.restaurant_id)
+
+
+@event.listens_for(Restaurant, "after_update")
+@event.listens_for(Restaurant, "after_delete")
+def _invalidate_restaurant_menu(mapper, connection, target):
+    _mark_changed(target, connection, target.id)
+
+
+@event.listens_for(Restaurant, "after_insert")
+@event.listens_for(Restaurant, "after_update")
+@event.listens_for(Restaurant, "after_delete")
+def _invalidate_catalog(mapper, connection, target):
+    menu_cache.invalidate_catalog()
+
+    session = object_session(target)
+    if session is None or not session.info.get(_CATALOG_KEY):
+        if session is not None:
+            session.info[_CATALOG_KEY] = True
+        _bump_shared(connection, CATALOG_KEY)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    for restaurant_id in session.info.pop(_DIRTY_KEY, ()):
+        menu_cache.invalidate(restaurant_id)
+    if session.info.pop(_CATALOG_KEY, False):
+        menu_cache.invalidate_catalog()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_after_rollback(session, previous_transaction):
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_CATALOG_KEY, None)
@@ -3,14 +3,50 @@
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, insert, update, and_, or_, tuple_
 from sqlalchemy.orm import selectinload
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import logging
 import uuid
 
-from app.models import Order, OrderItem, MenuItem, Restaurant, User, OrderStatus, PaymentMethod
+from app.models import Courier, CourierStatus, Order, OrderItem, MenuItem, Restaurant, User, UserRole, OrderStatus, PaymentMethod
 from app.services.restaurant_service import RestaurantService
+from app.services.broadcast import broadcast_engine
+from app.services.delivery import quote_restaurant, DELIVERY_UNAVAILABLE
+from app.services.location_service import courier_assignments
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.popularity import popularity
+from app.services.tracking_hub import tracking_hub
+from app.services.user_service import UserService, LOYALTY_REASON_ORDER, order_points
+
+logger = logging.getLogger(__name__)
+
+
+# Допустимые переходы статусов заказа
+ALLOWED_TRANSITIONS = {
+    OrderStatus.PENDING: (OrderStatus.CONFIRMED, OrderStatus.CANCELLED),
+    OrderStatus.CONFIRMED: (OrderStatus.PREPARING, OrderStatus.CANCELLED),
+    OrderStatus.PREPARING: (OrderStatus.READY,),
+    OrderStatus.READY: (OrderStatus.DELIVERING,),
+    OrderStatus.DELIVERING: (OrderStatus.DELIVERED,),
+    OrderStatus.DELIVERED: (),
+    OrderStatus.CANCELLED: ()
+}
+
+# Статусы, которые назначенный курьер выставляет сам
+COURIER_STATUSES = (OrderStatus.DELIVERING, OrderStatus.DELIVERED)
+
+# Статусы, после которых курьер заказа снова свободен
+COURIER_RELEASE_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELLED)
+
+# Обратная таблица: из каких статусов можно перейти в данный
+ALLOWED_FROM = {
+    new_status: tuple(
+        current for current, targets in ALLOWED_TRANSITIONS.items() if new_status in targets
+    )
+    for new_status in OrderStatus
+}
 
 
 class OrderService:
@@ -23,20 +59,93 @@ class OrderService:
     async def create_order(self, user_id: int, order_data) -> Order:
         """Создать новый заказ"""
         
+        pricing = await self._price_order(order_data)
+        
+        # Генерируем номер заказа
+        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+        
+        # Создаем заказ (created_at возвращается тем же INSERT)
+        order = Order(
+            order_number=order_number,
+            user_id=user_id,
+            restaurant_id=order_data.restaurant_id,
+            status=OrderStatus.PENDING,
+            payment_method=order_data.payment_method,
+            subtotal=pricing['subtotal'],
+            delivery_fee=pricing['delivery_fee'],
+            discount=pricing['discount'],
+            total=pricing['total'],
+            delivery_address=order_data.delivery_address,
+            delivery_latitude=order_data.delivery_latitude,
+            delivery_longitude=order_data.delivery_longitude,
+            customer_name=order_data.customer_name,
+            customer_phone=order_data.customer_phone,
+            comment=order_data.comment,
+            estimated_delivery_time=pricing['estimated_delivery_time']
+        )
+        
+        self.db.add(order)
+        await self.db.flush()  # Получаем ID заказа
+        
+        # Создаем все позиции заказа одним пакетным INSERT
+        await self.db.execute(
+            insert(OrderItem),
+            [dict(item_data, order_id=order.id) for item_data in pricing['items']]
+        )
+        
+        # Бонусные баллы начисляются в той же транзакции, что и заказ
+        points = order_points(order.total)
+        if points:
+            await UserService(self.db).add_loyalty_points(
+                user_id, points, reason=LOYALTY_REASON_ORDER, order_id=order.id, commit=False
+            )
+        
+        await self.db.commit()
+        
+        popularity.record(
+            order.restaurant_id,
+            [(item_data['menu_item_id'], item_data['quantity']) for item_data in pricing['items']]
+        )
+        
+        return order
+    
+    async def _price_order(self, order_data) -> Dict[str, Any]:
+        """
+        Рассчитать заказ: ресторан и все блюда загружаются одним запросом,
+        проверка доступности, суммы, доставка и время считаются в памяти.
+        """
+        
+        menu_item_ids = {item_data.menu_item_id for item_data in order_data.items}
+        
+        query = select(Restaurant, MenuItem).outerjoin(
+            MenuItem,
+            and_(
+                MenuItem.restaurant_id == Restaurant.id,
+                MenuItem.id.in_(menu_item_ids)
+            )
+        ).where(
+            and_(
+                Restaurant.id == order_data.restaurant_id,
+                Restaurant.is_active == True
+            )
+        )
+        
+        result = await self.db.execute(query)
+        rows = result.all()
+        
         # Проверяем ресторан
-        restaurant = await self.restaurant_service.get_restaurant(order_data.restaurant_id)
-        if not restaurant:
+        if not rows:
             raise ValueError("Restaurant not found")
         
+        restaurant = rows[0][0]
+        menu_items = {menu_item.id: menu_item for _, menu_item in rows if menu_item is not None}
+        
         # Проверяем блюда и рассчитываем сумму
         subtotal = 0.0
         order_items_data = []
         
         for item_data in order_data.items:
-            menu_item = await self.restaurant_service.get_menu_item(
-                order_data.restaurant_id, 
-                item_data.menu_item_id
-            )
+            menu_item = menu_items.get(item_data.menu_item_id)
             if not menu_item:
                 raise ValueError(f"Menu item {item_data.menu_item_id} not found")
             
@@ -47,99 +156,68 @@ class OrderService:
             subtotal += item_total
             
             order_items_data.append({
-                'menu_item': menu_item,
+                'menu_item_id': menu_item.id,
                 'quantity': item_data.quantity,
                 'price': menu_item.price,
                 'total': item_total,
                 'comment': item_data.comment
             })
         
-        # Рассчитываем стоимость доставки
-        delivery_fee = 0.0
+        # Рассчитываем стоимость и время доставки
+        estimated_delivery_time = None
         if order_data.delivery_latitude and order_data.delivery_longitude:
-            delivery_fee = await self.restaurant_service.calculate_delivery_fee(
-                order_data.restaurant_id,
+            delivery_fee, delivery_minutes = quote_restaurant(
+                restaurant,
                 order_data.delivery_latitude,
                 order_data.delivery_longitude,
                 subtotal
             )
-            if delivery_fee == -1:
+            if delivery_fee == DELIVERY_UNAVAILABLE:
                 raise ValueError("Delivery to this address is not available")
+            
+            estimated_delivery_time = datetime.now() + timedelta(minutes=delivery_minutes)
         else:
             delivery_fee = restaurant.delivery_fee
         
         # Применяем скидки (пока без скидок)
         discount = 0.0
-        total = subtotal + delivery_fee - discount
-        
-        # Генерируем номер заказа
-        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-        
-        # Оценка времени доставки
-        estimated_delivery_time = None
-        if order_data.delivery_latitude and order_data.delivery_longitude:
-            delivery_minutes = await self.restaurant_service.estimate_delivery_time(
-                order_data.restaurant_id,
-                order_data.delivery_latitude,
-                order_data.delivery_longitude
-            )
-            estimated_delivery_time = datetime.now() + timedelta(minutes=delivery_minutes)
         
-        # Создаем заказ
-        order = Order(
-            order_number=order_number,
-            user_id=user_id,
-            restaurant_id=order_data.restaurant_id,
-            status=OrderStatus.PENDING,
-            payment_method=order_data.payment_method,
-            subtotal=subtotal,
-            delivery_fee=delivery_fee,
-            discount=discount,
-            total=total,
-            delivery_address=order_data.delivery_address,
-            delivery_latitude=order_data.delivery_latitude,
-            delivery_longitude=order_data.delivery_longitude,
-            customer_name=order_data.customer_name,
-            customer_phone=order_data.customer_phone,
-            comment=order_data.comment,
-            estimated_delivery_time=estimated_delivery_time
-        )
-        
-        self.db.add(order)
-        await self.db.flush()  # Получаем ID заказа
-        
-        # Создаем позиции заказа
-        for item_data in order_items_data:
-            order_item = OrderItem(
-                order_id=order.id,
-                menu_item_id=item_data['menu_item'].id,
-                quantity=item_data['quantity'],
-                price=item_data['price'],
-                total=item_data['total'],
-                comment=item_data['comment']
-            )
-            self.db.add(order_item)
-        
-        await self.db.commit()
-        await self.db.refresh(order)
-        
-        return order
+        return {
+            'restaurant': restaurant,
+            'items': order_items_data,
+            'subtotal': subtotal,
+            'delivery_fee': delivery_fee,
+            'discount': discount,
+            'total': subtotal + delivery_fee - discount,
+            'estimated_delivery_time': estimated_delivery_time
+        }
     
     async def get_user_orders(
         self, 
         user_id: int, 
         skip: int = 0, 
-        limit: int = 20
+        limit: int = 20,
+        cursor: Optional[str] = None
     ) -> List[Order]:
-        """Получить заказы пользователя"""
+        """Получить заказы пользователя (новые первыми); cursor - продолжение с прошлой страницы"""
         
         query = select(Order).where(Order.user_id == user_id)\
-            .order_by(Order.created_at.desc())\
-            .offset(skip).limit(limit)
+            .order_by(Order.created_at.desc(), Order.id.desc())
         
-        result = await self.db.execute(query)
+        if cursor:
+            created_at, order_id = decode_cursor(cursor, (datetime, int))
+            query = query.where(tuple_(Order.created_at, Order.id) < (created_at, order_id))
+        else:
+            query = query.offset(skip)
+        
+        result = await self.db.execute(query.limit(limit))
         return list(result.scalars().all())
     
+    @staticmethod
+    def order_cursor(order: Order) -> str:
+        """Курсор страницы, следующей за заказом"""
+        return encode_cursor(order.created_at, order.id)
+    
     async def get_order(self, order_id: int, user_id: int) -> Optional[Order]:
         """Получить заказ по ID"""
         
@@ -162,60 +240,140 @@ class OrderService:
         new_status: OrderStatus, 
         user_id: int
     ) -> bool:
-        """Обновить статус заказа"""
-        
-        query = select(Order).where(
-            and_(
-                Order.id == order_id,
-                Order.user_id == user_id
-            )
-        )
-        
-        result = await self.db.execute(query)
-        order = result.scalar_one_or_none()
-        
-        if not order:
+        """
+        Обновить статус заказа. Владелец может только отменить заказ,
+        назначенный курьер - забрать и доставить его, остальные переходы -
+        администратору (сотрудники не привязаны к ресторанам).
+        """
+        
+        role = await self.db.scalar(select(User.role).where(User.id == user_id))
+        if role == UserRole.ADMIN:
+            conditions = []
+        elif new_status == OrderStatus.CANCELLED:
+            conditions = [Order.user_id == user_id]
+        elif new_status in COURIER_STATUSES:
+            conditions = [Order.courier_id == user_id]
+        else:
             return False
         
-        # Проверяем возможность изменения статуса
-        if not self._can_change_status(order.status, new_status):
-            return False
+        moved = await self._transition_orders([order_id], new_status, *conditions)
+        return bool(moved)
+    
+    async def transition_orders(
+        self,
+        order_ids: List[int],
+        new_status: OrderStatus,
+        restaurant_id: Optional[int] = None
+    ) -> List[int]:
+        """
+        Перевести несколько заказов в новый статус одним запросом
+        (например, ресторан подтверждает все ожидающие заказы).
+        
+        Возвращает ID заказов, статус которых действительно изменился.
+        """
+        
+        conditions = []
+        if restaurant_id is not None:
+            conditions.append(Order.restaurant_id == restaurant_id)
+        
+        return await self._transition_orders(order_ids, new_status, *conditions)
+    
+    async def cancel_order(self, order_id: int, user_id: int) -> bool:
+        """Отменить заказ"""
         
-        order.status = new_status
+        # Можно отменить только заказы в статусах, из которых разрешена отмена
+        moved = await self._transition_orders(
+            [order_id], OrderStatus.CANCELLED, Order.user_id == user_id
+        )
+        return bool(moved)
+    
+    async def _transition_orders(
+        self,
+        order_ids: List[int],
+        new_status: OrderStatus,
+        *conditions
+    ) -> List[int]:
+        """
+        Атомарная смена статуса (compare-and-set): UPDATE ... WHERE status IN (...).
+        Заказ, статус которого успели изменить параллельно, просто не попадет в выборку.
+        """
+        
+        allowed_from = ALLOWED_FROM[new_status]
+        if not order_ids or not allowed_from:
+            return []
+        
+        values = {"status": new_status}
         
         # Обновляем временные метки
+        now = datetime.now()
         if new_status == OrderStatus.CONFIRMED:
-            order.confirmed_at = datetime.now()
+            values["confirmed_at"] = now
         elif new_status == OrderStatus.DELIVERED:
-            order.delivered_at = datetime.now()
-            order.actual_delivery_time = datetime.now()
-        
-        await self.db.commit()
-        return True
-    
-    async def cancel_order(self, order_id: int, user_id: int) -> bool:
-        """Отменить заказ"""
+            values["delivered_at"] = now
+            values["actual_delivery_time"] = now
         
-        query = select(Order).where(
+        query = update(Order).where(
             and_(
-                Order.id == order_id,
-                Order.user_id == user_id
+                Order.id.in_(order_ids),
+                Order.status.in_(allowed_from),
+                *conditions
             )
-        )
+        ).values(**values).returning(Order.id, Order.courier_id, Order.restaurant_id, Order.created_at)
         
         result = await self.db.execute(query)
-        order = result.scalar_one_or_none()
-        
-        if not order:
-            return False
+        rows = result.all()
+        moved = [row.id for row in rows]
+        
+        # Курьер доставленного или отмененного заказа возвращается в ONLINE
+        courier_user_ids = {row.courier_id for row in rows if row.courier_id is not None}
+        if new_status in COURIER_RELEASE_STATUSES and courier_user_ids:
+            await self.db.execute(
+                update(Courier)
+                .where(Courier.user_id.in_(courier_user_ids), Courier.status == CourierStatus.BUSY)
+                .values(status=CourierStatus.ONLINE)
+            )
         
-        # Можно отменить только заказы в определенных статусах
-        if order.status not in [OrderStatus.PENDING, OrderStatus.CONFIRMED]:
-            return False
+        # Баллы за отмененный заказ списываются в той же транзакции
+        cancelled_items = {}
+        if new_status == OrderStatus.CANCELLED and moved:
+            await UserService(self.db).revoke_order_points(moved)
+            items = await self.db.execute(
+                select(OrderItem.order_id, OrderItem.menu_item_id, OrderItem.quantity)
+                .where(OrderItem.order_id.in_(moved))
+            )
+            for order_id, menu_item_id, quantity in items:
+                cancelled_items.setdefault(order_id, []).append((menu_item_id, quantity))
         
-        order.status = OrderStatus.CANCELLED
         await self.db.commit()
-        return True
+        
+        if new_status in COURIER_RELEASE_STATUSES:
+            for row in rows:
+                if row.courier_id is not None:
+                    courier_assignments.release(row.courier_id, row.id)
+        
+        # Отмененные заказы вычитаются из популярности и трендов
+        for row in rows:
+            if row.id in cancelled_items:
+                created_at = row.created_at
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)  # SQLite хранит UTC без зоны
+                popularity.retract(row.restaurant_id, cancelled_items[row.id], created_at.timestamp())
+        
+        # Уведомляем подписчиков отслеживания
+        changes = {
+            key: value.value if key == "status" else value.isoformat()
+            for key, value in values.items()
+        }
+        for order_id in moved:
+            tracking_hub.publish(order_id, changes)
+        
+        # И клиентов в Telegram: статус уже сохранен, сбой уведомления не ошибка запроса
+        try:
+            await broadcast_engine.notify_order_status(self.db, moved, new_status)
+        except Exception:
+            logger.exception("Не удалось поставить уведомления о заказах %s в очередь", moved)
+        
+        return moved
     
     async def get_order_tracking(self, order_id: int, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию для отслеживания заказа"""
@@ -242,22 +400,6 @@ class OrderService:
         
         return tracking_info
     
-    def _can_change_status(self, current_status: OrderStatus, new_status: OrderStatus) -> bool:
-        """Проверить возможность изменения статуса"""
-        
-        # Определяем допустимые переходы статусов
-        allowed_transitions = {
-            OrderStatus.PENDING: [OrderStatus.CONFIRMED, OrderStatus.CANCELLED],
-            OrderStatus.CONFIRMED: [OrderStatus.PREPARING, OrderStatus.CANCELLED],
-            OrderStatus.PREPARING: [OrderStatus.READY],
-            OrderStatus.READY: [OrderStatus.DELIVERING],
-            OrderStatus.DELIVERING: [OrderStatus.DELIVERED],
-            OrderStatus.DELIVERED: [],
-            OrderStatus.CANCELLED: []
-        }
-        
-        return new_status in allowed_transitions.get(current_status, [])
-    
     def _get_order_timeline(self, order: Order) -> List[Dict[str, Any]]:
         """Получить временную линию заказа"""
         
@@ -0,0 +1,50 @@
+"""
+Курсорная (keyset) пагинация
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence, Tuple
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """Непрозрачный курсор из значений ключа сортировки последней строки страницы"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple[Any, ...]:
+    """
+    Разобрать курсор; types - ожидаемые типы значений (int, float, str, datetime).
+
+    Поднимает ValueError, если курсор поврежден или от другого списка.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(payload, list) or len(payload) != len(types):
+        raise ValueError("Invalid cursor")
+
+    values = []
+    for value, expected in zip(payload, types):
+        try:
+            if expected is datetime:
+                value = datetime.fromisoformat(value)
+            elif expected is float and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+            elif not isinstance(value, expected) or isinstance(value, bool):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        values.append(value)
+
+    return tuple(values)
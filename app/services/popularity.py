@@ -0,0 +1,315 @@
+"""
+Популярность и тренды блюд
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, select, update
+
+from app.models import MenuItem
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityEngine:
+    """
+    Счетчики заказов блюд в памяти.
+
+    Каждый заказ увеличивает счетчики своих блюд, отмена - уменьшает; для
+    ресторана держится min-куча из top_k самых заказываемых блюд (блюдо
+    попадает в кучу, когда обгоняет ее минимум; новые значения участников
+    добавляются в кучу, устаревшие записи отбрасываются при чтении минимума).
+    Тренды - скользящее окно из минутных корзин за последний час.
+    Накопленные приращения периодически записываются в menu_items.orders_count
+    одним пакетным UPDATE, а не отдельным UPDATE горячей строки на каждый
+    заказ. Счетчики ресторана перечитываются из БД раз в reload_interval -
+    так учитываются заказы других процессов, а top-K собирается заново.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 50,
+        window_seconds: int = 3600,
+        bucket_seconds: int = 60,
+        flush_interval: float = 30.0,
+        reload_interval: float = 300.0
+    ):
+        self.top_k = top_k
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(1, window_seconds // bucket_seconds)
+        self.flush_interval = flush_interval
+        self.reload_interval = reload_interval
+
+        # Полные счетчики загруженных ресторанов и их top-K
+        self._counts: Dict[int, Dict[int, int]] = {}
+        self._heaps: Dict[int, List[Tuple[int, int]]] = {}
+        self._members: Dict[int, Dict[int, int]] = {}
+        self._loaded_at: Dict[int, float] = {}
+
+        # Приращения, еще не записанные в БД; загрузка счетчиков не
+        # пересекается с записью, чтобы не учесть пачку дважды или ни разу
+        self._pending: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+
+        # Окно трендов: (номер корзины, {restaurant_id: Counter}) и суммы по окну
+        self._buckets: deque = deque()
+        self._window: Dict[int, Counter] = {}
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.recorded = 0
+        self.retracted = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def record(
+        self,
+        restaurant_id: int,
+        items: Iterable[Tuple[int, int]],
+        now: Optional[float] = None
+    ) -> None:
+        """Учесть заказ: [(menu_item_id, quantity), ...]"""
+        bucket = self._advance(time.time() if now is None else now)
+        self._apply(restaurant_id, items, 1, bucket)
+        self.recorded += 1
+
+    def retract(
+        self,
+        restaurant_id: int,
+        items: Iterable[Tuple[int, int]],
+        ordered_at: float,
+        now: Optional[float] = None
+    ) -> None:
+        """Вычесть отмененный заказ; из трендов - если минута заказа еще в окне"""
+        self._advance(time.time() if now is None else now)
+        number = int(ordered_at // self.bucket_seconds)
+        bucket = next((counters for bucket_number, counters in self._buckets if bucket_number == number), None)
+        self._apply(restaurant_id, items, -1, bucket)
+        self.retracted += 1
+
+    def _apply(
+        self,
+        restaurant_id: int,
+        items: Iterable[Tuple[int, int]],
+        sign: int,
+        bucket: Optional[Dict[int, Counter]]
+    ) -> None:
+        counts = self._counts.get(restaurant_id)
+
+        for item_id, quantity in items:
+            delta = sign * quantity
+            pending = self._pending.get(item_id, 0) + delta
+            if pending:
+                self._pending[item_id] = pending
+            else:
+                self._pending.pop(item_id, None)
+
+            if bucket is not None:
+                bucket.setdefault(restaurant_id, Counter())[item_id] += delta
+                window = self._window.setdefault(restaurant_id, Counter())
+                window[item_id] += delta
+                if window[item_id] <= 0:
+                    del window[item_id]
+                if not window:
+                    del self._window[restaurant_id]
+
+            if counts is not None:
+                counts[item_id] = max(counts.get(item_id, 0) + delta, 0)
+                self._offer(restaurant_id, item_id, counts[item_id])
+                if delta < 0 and item_id in self._members[restaurant_id]:
+                    self._promote(restaurant_id, counts)
+
+    def _advance(self, now: float) -> Dict[int, Counter]:
+        """Корзина текущей минуты; корзины старше окна вычитаются из сумм"""
+        number = int(now // self.bucket_seconds)
+
+        while self._buckets and self._buckets[0][0] <= number - self.window_buckets:
+            _, expired = self._buckets.popleft()
+            for restaurant_id, counter in expired.items():
+                window = self._window[restaurant_id]
+                window.subtract(counter)
+                for item_id in counter:
+                    if window[item_id] <= 0:
+                        del window[item_id]
+                if not window:
+                    del self._window[restaurant_id]
+
+        if not self._buckets or self._buckets[-1][0] < number:
+            self._buckets.append((number, {}))
+        return self._buckets[-1][1]
+
+    def _offer(self, restaurant_id: int, item_id: int, count: int) -> None:
+        """
+        Обновить top-K ресторана новым значением счетчика блюда.
+
+        Новое значение участника добавляется в кучу, а прежняя запись
+        остается и выбрасывается, когда окажется на вершине; куча
+        пересобирается, только когда устаревших записей больше, чем живых.
+        """
+        heap = self._heaps[restaurant_id]
+        members = self._members[restaurant_id]
+
+        if item_id in members or len(members) < self.top_k:
+            members[item_id] = count
+            heapq.heappush(heap, (count, item_id))
+        else:
+            while members.get(heap[0][1]) != heap[0][0]:
+                heapq.heappop(heap)
+            if (count, item_id) > heap[0]:
+                _, evicted = heapq.heapreplace(heap, (count, item_id))
+                del members[evicted]
+                members[item_id] = count
+
+        if len(heap) > 2 * max(len(members), 1):
+            heap[:] = [(value, key) for key, value in members.items()]
+            heapq.heapify(heap)
+
+    def _promote(self, restaurant_id: int, counts: Dict[int, int]) -> None:
+        """После отмены вернуть в top-K блюдо, обогнавшее уменьшившегося участника"""
+        heap = self._heaps[restaurant_id]
+        members = self._members[restaurant_id]
+        if len(members) < self.top_k:
+            return
+
+        while members.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        candidate = max(
+            ((count, item_id) for item_id, count in counts.items() if item_id not in members), default=None
+        )
+        if candidate is not None and candidate > heap[0]:
+            _, evicted = heapq.heapreplace(heap, candidate)
+            del members[evicted]
+            members[candidate[1]] = candidate[0]
+
+    async def ensure_loaded(self, db, restaurant_id: int, now: Optional[float] = None) -> None:
+        """Загрузить счетчики ресторана из БД при первом обращении и раз в reload_interval"""
+        now = time.time() if now is None else now
+        loaded_at = self._loaded_at.get(restaurant_id)
+        if loaded_at is not None and now - loaded_at < self.reload_interval:
+            return
+
+        async with self._flush_lock:
+            result = await db.execute(
+                select(MenuItem.id, MenuItem.orders_count).where(MenuItem.restaurant_id == restaurant_id)
+            )
+            rows = result.all()
+
+            # Приращения, еще не дошедшие до БД, добавляются к сохраненным значениям
+            counts = {
+                item_id: max((orders_count or 0) + self._pending.get(item_id, 0), 0)
+                for item_id, orders_count in rows
+            }
+        top = heapq.nlargest(self.top_k, ((count, item_id) for item_id, count in counts.items()))
+        heapq.heapify(top)
+
+        self._counts[restaurant_id] = counts
+        self._heaps[restaurant_id] = top
+        self._members[restaurant_id] = {item_id: count for count, item_id in top}
+        self._loaded_at[restaurant_id] = now
+
+    def top(self, restaurant_id: int, limit: int) -> List[Tuple[int, int]]:
+        """Самые заказываемые блюда ресторана: [(menu_item_id, orders), ...]"""
+        members = self._members.get(restaurant_id, {})
+        ranked = sorted(members.items(), key=lambda member: (-member[1], member[0]))
+        return [(item_id, count) for item_id, count in ranked[:limit] if count > 0]
+
+    def trending(self, restaurant_id: int, limit: int, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """Блюда ресторана, чаще всего заказанные за последний час: [(menu_item_id, orders), ...]"""
+        self._advance(time.time() if now is None else now)
+        window = self._window.get(restaurant_id)
+        if not window:
+            return []
+        return sorted(window.items(), key=lambda entry: (-entry[1], entry[0]))[:limit]
+
+    def clear(self) -> None:
+        """Забыть все счетчики (незаписанные приращения теряются)"""
+        for state in (self._counts, self._heaps, self._members, self._loaded_at, self._pending, self._window):
+            state.clear()
+        self._buckets.clear()
+
+    async def flush(self, db) -> int:
+        """Записать накопленные приращения в orders_count; возвращает число блюд"""
+        if not self._pending:
+            return 0
+
+        async with self._flush_lock:
+            return await self._flush(db)
+
+    async def _flush(self, db) -> int:
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+
+        table = MenuItem.__table__
+        statement = update(table).where(table.c.id == bindparam("item_id")).values(
+            orders_count=func.coalesce(table.c.orders_count, 0) + bindparam("delta")
+        )
+
+        try:
+            # По возрастанию ID - одинаковый порядок блокировок у всех экземпляров
+            await db.execute(
+                statement,
+                [{"item_id": item_id, "delta": delta} for item_id, delta in sorted(batch.items())]
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for item_id, delta in batch.items():
+                self._pending[item_id] = self._pending.get(item_id, 0) + delta
+            self.flush_errors += 1
+            logger.exception("Не удалось записать счетчики заказов %d блюд", len(batch))
+            return 0
+
+        self.flushed += len(batch)
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                async with self._session_factory() as db:
+                    await self.flush(db)
+            except Exception:
+                logger.exception("Ошибка фоновой записи счетчиков заказов")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическую запись"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить запись и сохранить остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                await self.flush(db)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики счетчиков популярности"""
+        return {
+            "recorded_orders": self.recorded,
+            "retracted_orders": self.retracted,
+            "pending_items": len(self._pending),
+            "flushed_items": self.flushed,
+            "flush_errors": self.flush_errors,
+            "loaded_restaurants": len(self._counts),
+            "trending_restaurants": len(self._window)
+        }
+
+
+# Глобальные счетчики популярности блюд
+popularity = PopularityEngine()
@@ -0,0 +1,255 @@
+"""
+Присутствие пользователей и курьеров: last_activity / last_online
+"""
+
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, List, Optional
+
+from sqlalchemy import bindparam, or_, update
+
+from app.models import Courier, User
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """
+    Хешированное колесо таймеров.
+
+    Срок округляется вверх до тика и кладется в слот tick % slots; сдвиг
+    колеса просматривает только слоты прошедших тиков, так что стоимость
+    не зависит от числа отслеживаемых ключей. Сроки должны быть ближе
+    slots тиков от текущего момента.
+    """
+
+    def __init__(self, slots: int, resolution: float = 1.0):
+        self.resolution = resolution
+        self._slots: List[list] = [[] for _ in range(slots)]
+        self._current: Optional[int] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Запланировать срабатывание ключа не раньше deadline"""
+        tick = math.ceil(deadline / self.resolution)
+        if self._current is not None and tick <= self._current:
+            tick = self._current + 1
+        self._slots[tick % len(self._slots)].append((tick, key))
+        self._size += 1
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Сдвинуть колесо к now; возвращает ключи, срок которых наступил"""
+        target = math.floor(now / self.resolution)
+        if self._current is None:
+            self._current = target
+            return []
+        if target <= self._current:
+            return []
+
+        due = []
+        slots = len(self._slots)
+        # При долгой паузе каждый слот просматривается один раз
+        for tick in range(max(self._current + 1, target - slots + 1), target + 1):
+            slot = self._slots[tick % slots]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                if entry[0] <= target:
+                    due.append(entry[1])
+                else:
+                    keep.append(entry)
+            self._slots[tick % slots] = keep
+
+        self._current = target
+        self._size -= len(due)
+        return due
+
+    def clear(self) -> None:
+        for slot in self._slots:
+            slot.clear()
+        self._current = None
+        self._size = 0
+
+
+class PresenceTracker:
+    """
+    Отметки присутствия в памяти с пакетной записью в БД.
+
+    heartbeat() только обновляет время в словаре: сущность считается
+    в сети, пока ее последняя отметка моложе online_seconds. Выход из сети
+    отслеживает колесо таймеров - у каждой сущности в сети одна запись,
+    которая при срабатывании либо удаляет ее, либо переносится на срок
+    от последней отметки. Поэтому в словаре только сущности в сети, и
+    online() отдает его ключи без проверки каждой отметки (с точностью
+    до тика колеса). Накопленные отметки фоновая задача записывает
+    в колонку модели одним пакетным UPDATE; более новое значение в БД
+    не перезаписывается.
+    """
+
+    def __init__(
+        self,
+        model,
+        column: str,
+        online_seconds: float = 60.0,
+        flush_interval: float = 10.0,
+        resolution: float = 1.0
+    ):
+        self.online_seconds = online_seconds
+        self.flush_interval = flush_interval
+
+        self._table = model.__table__
+        self._column = column
+
+        # Сущности в сети и время их последней отметки (time.time())
+        self._seen: Dict[int, float] = {}
+        self._wheel = TimerWheel(math.ceil(online_seconds / resolution) + 2, resolution)
+
+        # Отметки, еще не записанные в БД
+        self._dirty: Dict[int, float] = {}
+
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory = None
+
+        self.heartbeats = 0
+        self.expired = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def heartbeat(self, entity_id: int, now: Optional[float] = None) -> None:
+        """Отметить присутствие"""
+        now = time.time() if now is None else now
+        self._expire(now)
+
+        seen = self._seen.get(entity_id)
+        if seen is None:
+            self._wheel.schedule(entity_id, now + self.online_seconds)
+        if seen is None or seen < now:
+            self._seen[entity_id] = now
+        if self._dirty.get(entity_id, 0.0) < now:
+            self._dirty[entity_id] = now
+
+        self.heartbeats += 1
+
+    def _expire(self, now: float) -> None:
+        """Убрать из сети сущности без отметок за online_seconds"""
+        for entity_id in self._wheel.advance(now):
+            seen = self._seen.get(entity_id)
+            if seen is None:
+                continue
+            if seen + self.online_seconds <= now:
+                del self._seen[entity_id]
+                self.expired += 1
+            else:
+                self._wheel.schedule(entity_id, seen + self.online_seconds)
+
+    def is_online(self, entity_id: int, now: Optional[float] = None) -> bool:
+        """В сети ли сущность"""
+        now = time.time() if now is None else now
+        seen = self._seen.get(entity_id)
+        return seen is not None and seen + self.online_seconds > now
+
+    def online(self, now: Optional[float] = None) -> List[int]:
+        """ID сущностей в сети; вышедшие из сети меньше тика назад еще могут попасть в список"""
+        self._expire(time.time() if now is None else now)
+        return list(self._seen)
+
+    def last_seen(self, entity_id: int) -> Optional[float]:
+        """Время последней отметки сущности в сети"""
+        return self._seen.get(entity_id)
+
+    def clear(self) -> None:
+        """Забыть все отметки (незаписанные теряются)"""
+        self._seen.clear()
+        self._dirty.clear()
+        self._wheel.clear()
+
+    async def flush(self, db) -> int:
+        """Записать накопленные отметки; возвращает число строк"""
+        if not self._dirty:
+            return 0
+
+        batch, self._dirty = self._dirty, {}
+        table = self._table
+        column = table.c[self._column]
+
+        values = {self._column: bindparam("seen")}
+        if "updated_at" in table.c:
+            # Отметка присутствия - не изменение данных
+            values["updated_at"] = table.c.updated_at
+        statement = update(table).where(
+            table.c.id == bindparam("row_id"),
+            or_(column.is_(None), column < bindparam("seen"))
+        ).values(values)
+
+        try:
+            # По возрастанию ID - одинаковый порядок блокировок у всех экземпляров
+            await db.execute(statement, [
+                {"row_id": entity_id, "seen": datetime.fromtimestamp(seen, timezone.utc)}
+                for entity_id, seen in sorted(batch.items())
+            ])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for entity_id, seen in batch.items():
+                if self._dirty.get(entity_id, 0.0) < seen:
+                    self._dirty[entity_id] = seen
+            self.flush_errors += 1
+            logger.exception("Не удалось записать %d отметок присутствия в %s", len(batch), table.name)
+            return 0
+
+        self.flushed += len(batch)
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._expire(time.time())
+            try:
+                async with self._session_factory() as db:
+                    await self.flush(db)
+            except Exception:
+                logger.exception("Ошибка фоновой записи отметок присутствия")
+
+    def start(self, session_factory) -> None:
+        """Запустить периодическую запись"""
+        self._session_factory = session_factory
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить запись и сохранить остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._session_factory is not None:
+            async with self._session_factory() as db:
+                await self.flush(db)
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики присутствия"""
+        return {
+            "online": len(self._seen),
+            "pending": len(self._dirty),
+            "heartbeats": self.heartbeats,
+            "expired": self.expired,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "timers": len(self._wheel)
+        }
+
+
+# Глобальные отметки присутствия
+user_presence = PresenceTracker(User, "last_activity", online_seconds=300.0)
+courier_presence = PresenceTracker(Courier, "last_online", online_seconds=60.0)
@@ -0,0 +1,127 @@
+"""
+Минимальный асинхронный клиент протокола Redis (RESP2)
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """Ошибка, которую вернул сервер"""
+
+
+Command = Sequence[Any]
+
+
+def encode_command(command: Command) -> bytes:
+    """Команда в виде массива bulk-строк"""
+    parts = [b"*%d\r\n" % len(command)]
+    for argument in command:
+        if isinstance(argument, bytes):
+            data = argument
+        else:
+            data = str(argument).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+class RespClient:
+    """
+    Одно соединение с Redis-совместимым сервером.
+
+    Команды отправляются пачкой (pipeline) и ответы читаются по порядку;
+    соединение открывается при первом запросе и переоткрывается после
+    сетевой ошибки. Ответы-ошибки внутри пачки возвращаются объектами
+    RespError, execute() их выбрасывает. exclusive() отдает соединение
+    в монопольное пользование, например на WATCH ... EXEC.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def execute(self, *command: Any) -> Any:
+        """Выполнить одну команду"""
+        reply = (await self.pipeline([command]))[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def pipeline(self, commands: List[Command]) -> List[Any]:
+        """Выполнить пачку команд за один обмен с сервером"""
+        async with self._lock:
+            return await self._pipeline(commands)
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[Callable[[List[Command]], Awaitable[List[Any]]]]:
+        """Монопольный доступ к соединению; отдает функцию выполнения пачки"""
+        async with self._lock:
+            yield self._pipeline
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _pipeline(self, commands: List[Command]) -> List[Any]:
+        if self._writer is None:
+            await self._connect()
+
+        try:
+            self._writer.write(b"".join(encode_command(command) for command in commands))
+            await self._writer.drain()
+            return [
+                await asyncio.wait_for(self._read_reply(), self.timeout)
+                for _ in commands
+            ]
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            # Ответы на остаток пачки потеряны - соединение дальше непригодно
+            await self.close()
+            raise
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        setup: List[Tuple[Any, ...]] = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for reply in (await self._pipeline(setup) if setup else []):
+            if isinstance(reply, RespError):
+                await self.close()
+                raise reply
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readuntil(b"\r\n")
+        kind, payload = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2].decode()
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+
+        raise RespError(f"Unexpected reply: {line!r}")
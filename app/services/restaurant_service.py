@@ -3,12 +3,112 @@
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func
-from sqlalchemy.orm import selectinload
-from typing import List, Optional
-from geopy.distance import geodesic
+from sqlalchemy import select, and_, or_, func, event, tuple_
+from sqlalchemy.orm import Session, object_session, selectinload
+from typing import List, Optional, Dict, Any, Tuple
+import asyncio
+import json
+
+import numpy as np
 
 from app.models import Restaurant, MenuItem, MenuCategory
+from app.services.geo import GeoGridIndex, bounding_box, haversine_km
+from app.services.delivery import quote_restaurant, quote_restaurants
+from app.services.menu_cache import menu_cache
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.popularity import popularity
+from app.services.search import SearchIndex
+
+
+# Поля снимков меню (совпадают с MenuCategoryResponse / MenuItemResponse в API)
+MENU_CATEGORY_FIELDS = ("id", "name", "description", "image_url")
+MENU_ITEM_FIELDS = (
+    "id", "name", "description", "price", "weight", "calories",
+    "image_url", "image_variants", "is_available", "is_popular", "is_vegetarian"
+)
+# Изображения ресторана, которые можно загрузить
+RESTAURANT_IMAGE_KINDS = ("logo", "cover")
+
+
+# Сколько лучших совпадений поиска по меню одного ресторана отбирать
+MENU_SEARCH_LIMIT = 200
+
+# Индекс активных ресторанов для поиска по расстоянию (горячий набор)
+restaurant_geo_index = GeoGridIndex()
+
+# Полнотекстовые индексы: активные рестораны и все блюда (группа - ресторан)
+restaurant_search_index = SearchIndex()
+menu_search_index = SearchIndex()
+# Индекс блюд собирает один запрос, остальные ждут его
+_menu_search_index_lock = asyncio.Lock()
+
+
+# Изменения ресторанов сессии, ожидающие фиксации: {id: (lat, lon, rating) или None}
+_GEO_INDEX_CHANGES = "restaurant_geo_index_changes"
+
+
+@event.listens_for(Restaurant, "after_insert")
+@event.listens_for(Restaurant, "after_update")
+def _queue_restaurant_geo_change(mapper, connection, target):
+    """Запомнить изменение ресторана: в индекс оно попадет после фиксации транзакции"""
+    change = (target.latitude, target.longitude, target.rating) if target.is_active else None
+    object_session(target).info.setdefault(_GEO_INDEX_CHANGES, {})[target.id] = change
+
+
+@event.listens_for(Restaurant, "after_delete")
+def _queue_restaurant_geo_removal(mapper, connection, target):
+    object_session(target).info.setdefault(_GEO_INDEX_CHANGES, {})[target.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_restaurant_geo_changes(session):
+    """Поддерживать индекс в актуальном состоянии после фиксации изменений ресторанов"""
+    changes = session.info.pop(_GEO_INDEX_CHANGES, None)
+    if not changes or not restaurant_geo_index.loaded:
+        return
+    
+    for restaurant_id, change in changes.items():
+        if change is None:
+            restaurant_geo_index.remove(restaurant_id)
+        else:
+            restaurant_geo_index.upsert(restaurant_id, *change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_restaurant_geo_changes(session):
+    # Откаченные изменения в индекс не попадают
+    session.info.pop(_GEO_INDEX_CHANGES, None)
+
+
+@event.listens_for(Restaurant, "after_insert")
+@event.listens_for(Restaurant, "after_update")
+def _sync_restaurant_search_index(mapper, connection, target):
+    if not restaurant_search_index.loaded:
+        return
+    
+    if target.is_active:
+        restaurant_search_index.upsert(target.id, None, target.name, target.description, target.rating)
+    else:
+        restaurant_search_index.remove(target.id)
+
+
+@event.listens_for(Restaurant, "after_delete")
+def _remove_restaurant_from_search_index(mapper, connection, target):
+    restaurant_search_index.remove(target.id)
+
+
+@event.listens_for(MenuItem, "after_insert")
+@event.listens_for(MenuItem, "after_update")
+def _sync_menu_search_index(mapper, connection, target):
+    if menu_search_index.loaded or menu_search_index.loading:
+        menu_search_index.upsert(
+            target.id, target.restaurant_id, target.name, target.description, target.orders_count
+        )
+
+
+@event.listens_for(MenuItem, "after_delete")
+def _remove_menu_item_from_search_index(mapper, connection, target):
+    menu_search_index.remove(target.id)
 
 
 class RestaurantService:
@@ -24,43 +124,216 @@ class RestaurantService:
         search: Optional[str] = None,
         latitude: Optional[float] = None,
         longitude: Optional[float] = None,
-        max_distance: Optional[float] = None
+        max_distance: Optional[float] = None,
+        cursor: Optional[str] = None
     ) -> List[Restaurant]:
-        """Получить список ресторанов с фильтрацией"""
+        """Получить список ресторанов с фильтрацией; cursor - продолжение с прошлой страницы"""
         
-        query = select(Restaurant).where(Restaurant.is_active == True)
+        # Фильтрация по расстоянию выполняется до пагинации
+        if latitude is not None and longitude is not None and max_distance:
+            if cursor:
+                raise ValueError("Cursor pagination is not supported with distance filter")
+            return await self._get_nearby_restaurants(
+                skip, limit, search, latitude, longitude, max_distance
+            )
         
-        # Поиск по названию
+        # Поиск по названию - по релевантности, листается через skip
         if search:
+            if cursor:
+                raise ValueError("Cursor pagination is not supported with search")
+            
+            await self._ensure_restaurant_search_index()
+            
+            matches = restaurant_search_index.search(search, limit=skip + limit)[skip:]
+            return await self._restaurants_by_ids([restaurant_id for restaurant_id, _ in matches])
+        
+        query = select(Restaurant).where(Restaurant.is_active == True)
+        
+        # Сортировка по рейтингу, при равном рейтинге - по ID (как в поиске рядом)
+        query = query.order_by(Restaurant.rating.desc(), Restaurant.id)
+        
+        if cursor:
+            rating, restaurant_id = decode_cursor(cursor, (float, int))
             query = query.where(
                 or_(
-                    Restaurant.name.ilike(f"%{search}%"),
-                    Restaurant.description.ilike(f"%{search}%")
+                    Restaurant.rating < rating,
+                    and_(Restaurant.rating == rating, Restaurant.id > restaurant_id)
                 )
             )
+        else:
+            query = query.offset(skip)
         
-        # Сортировка по рейтингу
-        query = query.order_by(Restaurant.rating.desc())
-        query = query.offset(skip).limit(limit)
+        result = await self.db.execute(query.limit(limit))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    def restaurant_cursor(restaurant: Restaurant) -> str:
+        """Курсор страницы, следующей за рестораном"""
+        return encode_cursor(restaurant.rating, restaurant.id)
+    
+    async def _get_nearby_restaurants(
+        self,
+        skip: int,
+        limit: int,
+        search: Optional[str],
+        latitude: float,
+        longitude: float,
+        max_distance: float
+    ) -> List[Restaurant]:
+        """Рестораны в радиусе max_distance, по рейтингу, с корректной пагинацией"""
+        
+        if search:
+            return await self._search_nearby_restaurants(
+                skip, limit, search, latitude, longitude, max_distance
+            )
+        
+        await self._ensure_geo_index()
+        
+        page = restaurant_geo_index.nearby(latitude, longitude, max_distance, skip, limit)
+        return await self._restaurants_by_ids([restaurant_id for restaurant_id, _ in page])
+    
+    async def _restaurants_by_ids(self, ids: List[int]) -> List[Restaurant]:
+        """Активные рестораны в порядке ids"""
+        if not ids:
+            return []
+        
+        query = select(Restaurant).where(
+            and_(
+                Restaurant.id.in_(ids),
+                Restaurant.is_active == True
+            )
+        )
         
         result = await self.db.execute(query)
-        restaurants = result.scalars().all()
+        restaurants = {restaurant.id: restaurant for restaurant in result.scalars().all()}
+        
+        return [restaurants[restaurant_id] for restaurant_id in ids if restaurant_id in restaurants]
+    
+    async def _search_nearby_restaurants(
+        self,
+        skip: int,
+        limit: int,
+        search: str,
+        latitude: float,
+        longitude: float,
+        max_distance: float
+    ) -> List[Restaurant]:
+        """
+        Поиск по названию в радиусе: совпадения по релевантности среди
+        ресторанов, отобранных по ограничивающему прямоугольнику
+        (индекс ix_restaurants_lat_lng) и точному расстоянию
+        """
+        
+        await self._ensure_restaurant_search_index()
         
-        # Фильтрация по расстоянию (если указаны координаты)
-        if latitude and longitude and max_distance:
-            filtered_restaurants = []
-            user_location = (latitude, longitude)
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, max_distance)
+        result = await self.db.execute(
+            select(Restaurant.id, Restaurant.latitude, Restaurant.longitude).where(
+                Restaurant.latitude.between(min_lat, max_lat),
+                Restaurant.longitude.between(min_lon, max_lon),
+                Restaurant.is_active == True
+            )
+        )
+        rows = result.all()
+        if not rows:
+            return []
+        
+        ids, lats, lons = (np.array(column) for column in zip(*rows))
+        inside = haversine_km(latitude, longitude, lats.astype(np.float64), lons.astype(np.float64)) <= max_distance
+        nearby = set(ids[inside].tolist())
+        matches = restaurant_search_index.search(search, limit=len(restaurant_search_index))
+        ids = [restaurant_id for restaurant_id, _ in matches if restaurant_id in nearby]
+        
+        return await self._restaurants_by_ids(ids[skip:skip + limit])
+    
+    async def _ensure_geo_index(self) -> None:
+        """Загрузить индекс ресторанов при первом обращении"""
+        if restaurant_geo_index.loaded:
+            return
+        
+        query = select(
+            Restaurant.id,
+            Restaurant.latitude,
+            Restaurant.longitude,
+            Restaurant.rating
+        ).where(Restaurant.is_active == True)
+        
+        result = await self.db.execute(query)
+        restaurant_geo_index.load(result.all())
+    
+    async def _ensure_restaurant_search_index(self) -> None:
+        """Загрузить поисковый индекс ресторанов при первом обращении"""
+        if restaurant_search_index.loaded:
+            return
+        
+        query = select(
+            Restaurant.id,
+            Restaurant.name,
+            Restaurant.description,
+            Restaurant.rating
+        ).where(Restaurant.is_active == True)
+        
+        result = await self.db.execute(query)
+        restaurant_search_index.load(
+            (restaurant_id, None, name, description, rating)
+            for restaurant_id, name, description, rating in result.all()
+        )
+    
+    async def _ensure_menu_search_index(self) -> None:
+        """Загрузить поисковый индекс блюд при первом обращении (сборка - в отдельном потоке)"""
+        if menu_search_index.loaded:
+            return
+        
+        async with _menu_search_index_lock:
+            if menu_search_index.loaded:
+                return
             
-            for restaurant in restaurants:
-                restaurant_location = (restaurant.latitude, restaurant.longitude)
-                distance = geodesic(user_location, restaurant_location).kilometers
-                
-                if distance <= max_distance:
-                    filtered_restaurants.append(restaurant)
+            query = select(
+                MenuItem.id,
+                MenuItem.restaurant_id,
+                MenuItem.name,
+                MenuItem.description,
+                MenuItem.orders_count
+            )
             
-            return filtered_restaurants
+            # Правки блюд во время запроса и сборки копятся и применяются после
+            menu_search_index.begin_load()
+            try:
+                result = await self.db.execute(query)
+                index = SearchIndex(menu_search_index.rebuild_threshold)
+                await asyncio.to_thread(index.load, result.all())
+            except BaseException:
+                menu_search_index.finish_load(None)
+                raise
+            menu_search_index.finish_load(index)
+    
+    async def search(self, query: str, limit: int = 10) -> Dict[str, list]:
+        """Поиск по ресторанам и блюдам сразу: {"restaurants": [...], "items": [...]}"""
+        
+        await self._ensure_restaurant_search_index()
+        await self._ensure_menu_search_index()
+        
+        restaurant_matches = restaurant_search_index.search(query, limit=limit)
+        restaurants = await self._restaurants_by_ids([restaurant_id for restaurant_id, _ in restaurant_matches])
+        
+        # С запасом: часть блюд может быть недоступна или из закрытых ресторанов
+        item_matches = menu_search_index.search(query, limit=limit * 3)
+        ranks = {item_id: rank for rank, (item_id, _) in enumerate(item_matches)}
         
-        return list(restaurants)
+        items = []
+        if ranks:
+            result = await self.db.execute(
+                select(MenuItem).join(Restaurant, MenuItem.restaurant_id == Restaurant.id).where(
+                    and_(
+                        MenuItem.id.in_(list(ranks)),
+                        MenuItem.is_available == True,
+                        Restaurant.is_active == True
+                    )
+                )
+            )
+            items = sorted(result.scalars().all(), key=lambda item: ranks[item.id])[:limit]
+        
+        return {"restaurants": restaurants, "items": items}
     
     async def get_restaurant(self, restaurant_id: int) -> Optional[Restaurant]:
         """Получить ресторан по ID"""
@@ -74,6 +347,37 @@ class RestaurantService:
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
     
+    async def set_restaurant_image(
+        self, restaurant_id: int, kind: str, variants: Dict[str, Dict[str, Any]]
+    ) -> Optional[Restaurant]:
+        """Сохранить варианты логотипа или обложки; основной URL - большой JPEG"""
+        if kind not in RESTAURANT_IMAGE_KINDS:
+            raise ValueError(f"Unknown image kind: {kind}")
+        
+        restaurant = await self.db.get(Restaurant, restaurant_id)
+        if restaurant is None:
+            return None
+        
+        setattr(restaurant, f"{kind}_url", variants["large"]["jpg"])
+        setattr(restaurant, f"{kind}_variants", variants)
+        await self.db.commit()
+        return restaurant
+    
+    async def set_menu_item_image(
+        self, restaurant_id: int, item_id: int, variants: Dict[str, Dict[str, Any]]
+    ) -> Optional[MenuItem]:
+        """Сохранить варианты фото блюда (в том числе недоступного)"""
+        item = await self.db.scalar(
+            select(MenuItem).where(and_(MenuItem.id == item_id, MenuItem.restaurant_id == restaurant_id))
+        )
+        if item is None:
+            return None
+        
+        item.image_url = variants["large"]["jpg"]
+        item.image_variants = variants
+        await self.db.commit()
+        return item
+    
     async def get_restaurant_menu(self, restaurant_id: int) -> List[MenuCategory]:
         """Получить меню ресторана по категориям"""
         query = select(MenuCategory).where(
@@ -82,23 +386,92 @@ class RestaurantService:
                 MenuCategory.is_active == True
             )
         ).options(
-            selectinload(MenuCategory.menu_items).where(
-                MenuItem.is_available == True
-            )
-        ).order_by(MenuCategory.sort_order)
+            selectinload(MenuCategory.menu_items.and_(MenuItem.is_available == True))
+        ).order_by(MenuCategory.sort_order, MenuCategory.id)
         
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
-    async def get_menu_items(
+    async def get_menu_snapshot(self, restaurant_id: int) -> Optional[bytes]:
+        """Меню ресторана в виде готового JSON (из кэша); None, если ресторан не найден"""
+        return await menu_cache.get_or_load(
+            restaurant_id, ("menu",), lambda: self._load_menu_snapshot(restaurant_id)
+        )
+    
+    async def get_menu_items_snapshot(
         self,
         restaurant_id: int,
         category_id: Optional[int] = None,
         search: Optional[str] = None,
         vegetarian_only: bool = False,
         available_only: bool = True
+    ) -> bytes:
+        """Блюда ресторана с фильтрацией в виде готового JSON (из кэша)"""
+        search = search.strip().lower() if search else None
+        key = ("items", category_id, search, vegetarian_only, available_only)
+        
+        async def load() -> bytes:
+            items = await self.get_menu_items(
+                restaurant_id, category_id, search, vegetarian_only, available_only
+            )
+            return self._dump_json([self._menu_item_snapshot(item) for item in items])
+        
+        return await menu_cache.get_or_load(restaurant_id, key, load)
+    
+    async def get_menu_items_page(
+        self,
+        restaurant_id: int,
+        category_id: Optional[int] = None,
+        search: Optional[str] = None,
+        vegetarian_only: bool = False,
+        available_only: bool = True,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[bytes, Optional[str]]:
+        """Страница блюд в виде JSON и курсор следующей страницы (None - страница последняя)"""
+        items = await self.get_menu_items(
+            restaurant_id, category_id, search, vegetarian_only, available_only, limit, cursor
+        )
+        
+        # Результаты поиска листать курсором нельзя
+        next_cursor = self.menu_item_cursor(items[-1]) if len(items) == limit and not search else None
+        return self._dump_json([self._menu_item_snapshot(item) for item in items]), next_cursor
+    
+    async def _load_menu_snapshot(self, restaurant_id: int) -> Optional[bytes]:
+        if await self.get_restaurant(restaurant_id) is None:
+            return None
+        
+        categories = await self.get_restaurant_menu(restaurant_id)
+        return self._dump_json([
+            {
+                **{field: getattr(category, field) for field in MENU_CATEGORY_FIELDS},
+                "items": [
+                    self._menu_item_snapshot(item)
+                    for item in sorted(category.menu_items, key=lambda item: (item.sort_order or 0, item.name))
+                ]
+            }
+            for category in categories
+        ])
+    
+    @staticmethod
+    def _menu_item_snapshot(item: MenuItem) -> Dict[str, Any]:
+        return {field: getattr(item, field) for field in MENU_ITEM_FIELDS}
+    
+    @staticmethod
+    def _dump_json(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    async def get_menu_items(
+        self,
+        restaurant_id: int,
+        category_id: Optional[int] = None,
+        search: Optional[str] = None,
+        vegetarian_only: bool = False,
+        available_only: bool = True,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
     ) -> List[MenuItem]:
-        """Получить блюда ресторана с фильтрацией"""
+        """Получить блюда ресторана с фильтрацией; limit/cursor - постраничная выдача"""
         
         query = select(MenuItem).where(MenuItem.restaurant_id == restaurant_id)
         
@@ -108,22 +481,42 @@ class RestaurantService:
         if category_id:
             query = query.where(MenuItem.category_id == category_id)
         
+        if vegetarian_only:
+            query = query.where(MenuItem.is_vegetarian == True)
+        
+        # Поиск - по релевантности, без курсора
         if search:
+            if cursor:
+                raise ValueError("Cursor pagination is not supported with search")
+            
+            await self._ensure_menu_search_index()
+            
+            matches = menu_search_index.search(search, limit=MENU_SEARCH_LIMIT, group=restaurant_id)
+            ranks = {item_id: rank for rank, (item_id, _) in enumerate(matches)}
+            
+            result = await self.db.execute(query.where(MenuItem.id.in_(list(ranks))))
+            items = sorted(result.scalars().all(), key=lambda item: ranks[item.id])
+            return items[:limit] if limit is not None else items
+        
+        query = query.order_by(MenuItem.sort_order, MenuItem.name, MenuItem.id)
+        
+        if cursor:
+            sort_order, name, item_id = decode_cursor(cursor, (int, str, int))
             query = query.where(
-                or_(
-                    MenuItem.name.ilike(f"%{search}%"),
-                    MenuItem.description.ilike(f"%{search}%")
-                )
+                tuple_(MenuItem.sort_order, MenuItem.name, MenuItem.id) > (sort_order, name, item_id)
             )
         
-        if vegetarian_only:
-            query = query.where(MenuItem.is_vegetarian == True)
-        
-        query = query.order_by(MenuItem.sort_order, MenuItem.name)
+        if limit is not None:
+            query = query.limit(limit)
         
         result = await self.db.execute(query)
         return list(result.scalars().all())
     
+    @staticmethod
+    def menu_item_cursor(item: MenuItem) -> str:
+        """Курсор страницы, следующей за блюдом"""
+        return encode_cursor(item.sort_order, item.name, item.id)
+    
     async def get_menu_item(self, restaurant_id: int, item_id: int) -> Optional[MenuItem]:
         """Получить блюдо по ID"""
         query = select(MenuItem).where(
@@ -138,20 +531,49 @@ class RestaurantService:
         return result.scalar_one_or_none()
     
     async def get_popular_items(self, restaurant_id: int, limit: int = 10) -> List[MenuItem]:
-        """Получить популярные блюда ресторана"""
+        """Получить популярные блюда ресторана (по числу заказов, затем отмеченные как популярные)"""
+        await popularity.ensure_loaded(self.db, restaurant_id)
+        
+        ranked = [item_id for item_id, _ in popularity.top(restaurant_id, popularity.top_k)]
+        items = (await self._available_items_by_ids(restaurant_id, ranked))[:limit]
+        
+        if len(items) < limit:
+            query = select(MenuItem).where(
+                and_(
+                    MenuItem.restaurant_id == restaurant_id,
+                    MenuItem.is_available == True,
+                    MenuItem.is_popular == True,
+                    MenuItem.id.notin_([item.id for item in items])
+                )
+            ).order_by(MenuItem.rating.desc(), MenuItem.id).limit(limit - len(items))
+            
+            result = await self.db.execute(query)
+            items.extend(result.scalars().all())
+        
+        return items
+    
+    async def get_trending_items(self, restaurant_id: int, limit: int = 10) -> List[MenuItem]:
+        """Блюда ресторана, чаще всего заказанные за последний час"""
+        ranked = [item_id for item_id, _ in popularity.trending(restaurant_id, limit * 2)]
+        return (await self._available_items_by_ids(restaurant_id, ranked))[:limit]
+    
+    async def _available_items_by_ids(self, restaurant_id: int, ids: List[int]) -> List[MenuItem]:
+        """Доступные блюда ресторана в порядке ids"""
+        if not ids:
+            return []
+        
         query = select(MenuItem).where(
             and_(
+                MenuItem.id.in_(ids),
                 MenuItem.restaurant_id == restaurant_id,
-                MenuItem.is_available == True,
-                MenuItem.is_popular == True
+                MenuItem.is_available == True
             )
-        ).order_by(
-            MenuItem.orders_count.desc(),
-            MenuItem.rating.desc()
-        ).limit(limit)
+        )
         
         result = await self.db.execute(query)
-        return list(result.scalars().all())
+        items = {item.id: item for item in result.scalars().all()}
+        
+        return [items[item_id] for item_id in ids if item_id in items]
     
     async def calculate_delivery_fee(
         self,
@@ -160,32 +582,13 @@ class RestaurantService:
         user_longitude: float,
         order_total: float
     ) -> float:
-        """Рассчитать стоимость доставки"""
+        """Рассчитать стоимость доставки (-1, если доставка невозможна)"""
         
         restaurant = await self.get_restaurant(restaurant_id)
         if not restaurant:
             return 0.0
         
-        # Проверяем бесплатную доставку
-        if order_total >= restaurant.free_delivery_threshold:
-            return 0.0
-        
-        # Рассчитываем расстояние
-        restaurant_location = (restaurant.latitude, restaurant.longitude)
-        user_location = (user_latitude, user_longitude)
-        distance = geodesic(restaurant_location, user_location).kilometers
-        
-        # Проверяем максимальное расстояние доставки
-        if distance > restaurant.max_delivery_distance:
-            return -1  # Доставка невозможна
-        
-        # Базовая стоимость доставки
-        delivery_fee = restaurant.delivery_fee
-        
-        # Увеличиваем стоимость для дальних расстояний
-        if distance > 5:
-            delivery_fee += (distance - 5) * 20  # +20₽ за каждый км свыше 5км
-        
+        delivery_fee, _ = quote_restaurant(restaurant, user_latitude, user_longitude, order_total)
         return delivery_fee
     
     async def estimate_delivery_time(
@@ -200,15 +603,26 @@ class RestaurantService:
         if not restaurant:
             return 60  # По умолчанию 60 минут
         
-        # Базовое время приготовления
-        base_time = restaurant.avg_delivery_time
+        _, delivery_minutes = quote_restaurant(restaurant, user_latitude, user_longitude)
+        return delivery_minutes
+    
+    async def get_delivery_quotes(
+        self,
+        restaurant_ids: List[int],
+        user_latitude: float,
+        user_longitude: float,
+        order_total: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """Рассчитать доставку сразу для нескольких ресторанов"""
         
-        # Рассчитываем расстояние
-        restaurant_location = (restaurant.latitude, restaurant.longitude)
-        user_location = (user_latitude, user_longitude)
-        distance = geodesic(restaurant_location, user_location).kilometers
+        query = select(Restaurant).where(
+            and_(
+                Restaurant.id.in_(restaurant_ids),
+                Restaurant.is_active == True
+            )
+        )
         
-        # Добавляем время на доставку (примерно 2 мин на км)
-        delivery_time = int(distance * 2)
+        result = await self.db.execute(query)
+        restaurants = list(result.scalars().all())
         
-        return base_time + delivery_time
+        return quote_restaurants(restaurants, user_latitude, user_longitude, order_total)
@@ -0,0 +1,556 @@
+"""
+Полнотекстовый поиск по ресторанам и блюдам: русский стемминг, ранжирование, опечатки
+"""
+
+import bisect
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+_VOWELS = set("аеиоуыэюя")
+
+_PERFECTIVE_GERUND = (("вшись", "вши", "в"), ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв"))
+_REFLEXIVE = ("ся", "сь")
+_ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому", "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой",
+    "ем", "им", "ым", "ом", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею"
+)
+_PARTICIPLE = (("ем", "нн", "вш", "ющ", "щ"), ("ивш", "ывш", "ующ"))
+_VERB = (
+    ("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н"),
+    (
+        "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют",
+        "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю"
+    )
+)
+_NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях", "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой",
+    "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья", "а", "е", "и", "й", "о", "у",
+    "ы", "ь", "ю", "я"
+)
+_SUPERLATIVE = ("ейше", "ейш")
+_DERIVATIONAL = ("ость", "ост")
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+# Служебные слова не несут смысла для поиска по меню
+STOP_WORDS = frozenset(
+    "и в во с со на по из к ко о об от до для без под над при а или не the and with of".split()
+)
+
+
+def _regions(word: str) -> Tuple[int, int]:
+    """Начала областей RV и R2 алгоритма Snowball"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+
+    def after_consonant(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = after_consonant(0)
+    r2 = after_consonant(r1)
+    return rv, r2
+
+
+def _strip(word: str, start: int, endings: Sequence[str]) -> Optional[str]:
+    """Отрезать первое (самое длинное) окончание, целиком лежащее в области от start"""
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            return word[:-len(ending)]
+    return None
+
+
+def _strip_grouped(word: str, start: int, groups) -> Optional[str]:
+    """Окончания первой группы должны следовать за "а" или "я" (остаются в слове)"""
+    first, second = groups
+    candidates = [(ending, True) for ending in first] + [(ending, False) for ending in second]
+    candidates.sort(key=lambda candidate: -len(candidate[0]))
+
+    for ending, needs_a in candidates:
+        if not word.endswith(ending):
+            continue
+        cut = len(word) - len(ending)
+        if needs_a:
+            if cut - 1 >= start and word[cut - 1] in "ая":
+                return word[:cut]
+        elif cut >= start:
+            return word[:cut]
+    return None
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    """Основа русского слова (Snowball Russian); латиница и числа возвращаются как есть"""
+    if len(word) < 3 or not ("а" <= word[0] <= "я" or word[0] == "ё"):
+        return word
+
+    word = word.replace("ё", "е")
+    rv, r2 = _regions(word)
+
+    stripped = _strip_grouped(word, rv, _PERFECTIVE_GERUND)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, _REFLEXIVE) or word
+
+        adjective = _strip(word, rv, _ADJECTIVE)
+        if adjective is not None:
+            word = _strip_grouped(adjective, rv, _PARTICIPLE) or adjective
+        else:
+            word = (
+                _strip_grouped(word, rv, _VERB)
+                or _strip(word, rv, _NOUN)
+                or word
+            )
+
+    word = _strip(word, rv, ("и",)) or word
+    word = _strip(word, max(rv, r2), _DERIVATIONAL) or word
+
+    if word.endswith("нн") and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip(word, rv, _SUPERLATIVE)
+    if superlative is not None:
+        return superlative[:-1] if superlative.endswith("нн") else superlative
+    return _strip(word, rv, ("ь",)) or word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Слова текста в нижнем регистре, без служебных"""
+    if not text:
+        return []
+    words = _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+    return [word for word in words if word not in STOP_WORDS]
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    """Основы слов текста - термы индекса"""
+    return [stem(word) for word in tokenize(text)]
+
+
+def trigrams(term: str) -> Set[str]:
+    """Триграммы терма с границами слова"""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (перестановка соседних букв - одна ошибка); limit + 1, если больше"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def allowed_typos(term: str) -> int:
+    """Допустимое число опечаток в зависимости от длины слова"""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс документов (название + описание) в памяти.
+
+    Основной сегмент хранится в numpy-массивах (списки документов по термам
+    подряд), изменения копятся в небольшом словарном сегменте и сливаются
+    с основным при пересборке. Ранжирование - BM25 с весом названия выше
+    описания; слово запроса сопоставляется с термами индекса точно,
+    по префиксу (последнее слово - поиск по мере набора) и с опечатками
+    (кандидаты по общим триграммам, проверка расстоянием редактирования).
+    Документ может относиться к группе (например, блюдо - к ресторану),
+    по которой фильтруется выдача; вес документа (рейтинг) - вторичный
+    ключ сортировки.
+    """
+
+    NAME_WEIGHT = 3.0
+    K1 = 1.2
+    B = 0.75
+    PREFIX_SIMILARITY = 0.8
+    TYPO_SIMILARITY = (1.0, 0.7, 0.5)
+    MAX_EXPANSIONS = 16
+
+    def __init__(self, rebuild_threshold: int = 2000):
+        self.rebuild_threshold = rebuild_threshold
+        self.loaded = False
+        # Правки, пришедшие во время сборки индекса в другом потоке: (key, документ или None)
+        self._changes: Optional[List[Tuple[int, Optional[tuple]]]] = None
+
+        # Словарь термов; номера не меняются при пересборке
+        self._term_ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._trigram_terms: Dict[str, List[int]] = {}
+        self._trigram_arrays: Dict[str, np.ndarray] = {}
+        self._sorted_terms: List[str] = []
+        self._sorted_dirty = False
+
+        # Основной сегмент: документы упорядочены по ключу
+        self._keys = np.empty(0, dtype=np.int64)
+        self._groups = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0, dtype=np.float64)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._postings = np.empty(0, dtype=np.int32)
+        self._tf = np.empty(0, dtype=np.float32)
+        self._scores = np.empty(0, dtype=np.float32)
+        self._average_length = 1.0
+        self._df = np.empty(0, dtype=np.int64)
+        self._dead = 0
+
+        # Сегмент изменений: key -> (group, weight, length, {term_id: tf})
+        self._pending: Dict[int, Tuple[int, float, float, Dict[int, float]]] = {}
+        self._pending_postings: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return int(self._alive.sum()) + len(self._pending)
+
+    @property
+    def loading(self) -> bool:
+        """Идет сборка индекса (begin_load ... finish_load)"""
+        return self._changes is not None
+
+    def begin_load(self) -> None:
+        """
+        Начать сборку вне цикла событий: индекс собирается отдельным
+        экземпляром (load в потоке), а правки до finish_load копятся
+        и применяются к собранному индексу.
+        """
+        self._changes = []
+
+    def finish_load(self, index: Optional["SearchIndex"]) -> None:
+        """Принять собранный индекс и доприменить накопленные правки (None - сборка не удалась)"""
+        changes, self._changes = self._changes or [], None
+        if index is None:
+            return
+        self.__dict__.update(index.__dict__)
+        for key, document in changes:
+            if document is None:
+                self.remove(key)
+            else:
+                self.upsert(key, *document)
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._term_ids[term] = term_id
+            self._terms.append(term)
+            for trigram in trigrams(term):
+                self._trigram_terms.setdefault(trigram, []).append(term_id)
+                self._trigram_arrays.pop(trigram, None)
+            self._sorted_dirty = True
+        return term_id
+
+    def _document(self, name: Optional[str], description: Optional[str]) -> Tuple[float, Dict[int, float]]:
+        """Длина документа и взвешенные частоты термов"""
+        frequencies: Dict[int, float] = {}
+        for term in analyze(name):
+            term_id = self._term_id(term)
+            frequencies[term_id] = frequencies.get(term_id, 0.0) + self.NAME_WEIGHT
+        for term in analyze(description):
+            term_id = self._term_id(term)
+            frequencies[term_id] = frequencies.get(term_id, 0.0) + 1.0
+        return sum(frequencies.values()), frequencies
+
+    def load(self, documents: Iterable[Tuple[int, Optional[int], Optional[str], Optional[str], Optional[float]]]) -> None:
+        """Заменить содержимое индекса набором (key, group, name, description, weight)"""
+        keys, groups, weights, lengths = [], [], [], []
+        posting_terms, posting_docs, posting_tf = [], [], []
+
+        for key, group, name, description, weight in documents:
+            length, frequencies = self._document(name, description)
+            doc = len(keys)
+            keys.append(int(key))
+            groups.append(int(group) if group is not None else -1)
+            weights.append(float(weight or 0.0))
+            lengths.append(length)
+            posting_terms.extend(frequencies.keys())
+            posting_docs.extend([doc] * len(frequencies))
+            posting_tf.extend(frequencies.values())
+
+        self._pending.clear()
+        self._pending_postings.clear()
+        self._build(
+            np.array(keys, dtype=np.int64),
+            np.array(groups, dtype=np.int64),
+            np.array(weights, dtype=np.float64),
+            np.array(lengths, dtype=np.float32),
+            np.array(posting_terms, dtype=np.int64),
+            np.array(posting_docs, dtype=np.int64),
+            np.array(posting_tf, dtype=np.float32)
+        )
+        self.loaded = True
+
+    def _build(self, keys, groups, weights, lengths, terms, docs, tf) -> None:
+        """Собрать основной сегмент из документов и троек (терм, документ, частота)"""
+        order = np.argsort(keys, kind="stable")
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+
+        self._keys = keys[order]
+        self._groups = groups[order]
+        self._weights = weights[order]
+        self._lengths = lengths[order]
+        self._alive = np.ones(len(keys), dtype=bool)
+        self._dead = 0
+
+        docs = position[docs]
+        by_term = np.lexsort((docs, terms))
+        terms, docs, tf = terms[by_term], docs[by_term], tf[by_term]
+
+        # Вклад терма в документ по BM25 без idf (idf зависит от частоты терма и считается в запросе)
+        self._average_length = max(float(self._lengths.mean()), 1.0) if len(self._lengths) else 1.0
+        self._tf = tf
+        self._scores = self._saturate(tf, self._lengths[docs]).astype(np.float32)
+        self._postings = docs.astype(np.int32)
+
+        counts = np.bincount(terms, minlength=len(self._terms))
+        self._df = counts.astype(np.int64)
+        self._offsets = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._offsets[1:])
+
+    def _saturate(self, tf, length):
+        """Насыщение частоты терма с поправкой на длину документа (BM25)"""
+        return tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * length / self._average_length))
+
+    def _locate(self, key: int) -> int:
+        """Позиция документа в основном сегменте или -1"""
+        position = int(np.searchsorted(self._keys, key))
+        if position < len(self._keys) and self._keys[position] == key and self._alive[position]:
+            return position
+        return -1
+
+    def upsert(
+        self,
+        key: int,
+        group: Optional[int],
+        name: Optional[str],
+        description: Optional[str],
+        weight: Optional[float] = 0.0
+    ) -> None:
+        """Добавить или обновить документ"""
+        if self._changes is not None:
+            self._changes.append((int(key), (group, name, description, weight)))
+        self._discard(key)
+        length, frequencies = self._document(name, description)
+        self._pending[int(key)] = (
+            int(group) if group is not None else -1, float(weight or 0.0), length, frequencies
+        )
+        for term_id in frequencies:
+            self._pending_postings.setdefault(term_id, set()).add(int(key))
+
+    def remove(self, key: int) -> None:
+        """Удалить документ из индекса"""
+        if self._changes is not None:
+            self._changes.append((int(key), None))
+        self._discard(key)
+
+    def _discard(self, key: int) -> None:
+        key = int(key)
+        document = self._pending.pop(key, None)
+        if document is not None:
+            for term_id in document[3]:
+                self._pending_postings[term_id].discard(key)
+
+        position = self._locate(key)
+        if position >= 0:
+            self._alive[position] = False
+            self._dead += 1
+
+    def clear(self) -> None:
+        """Очистить индекс и пометить его как незагруженный"""
+        self.load([])
+        self.loaded = False
+
+    def _merge(self) -> None:
+        """Слить сегмент изменений с основным и выбросить удаленные документы"""
+        doc_terms = np.repeat(np.arange(len(self._df)), np.diff(self._offsets))
+        live = self._alive[self._postings]
+        alive_docs = np.flatnonzero(self._alive)
+        renumber = np.full(len(self._alive), -1, dtype=np.int64)
+        renumber[alive_docs] = np.arange(len(alive_docs))
+
+        keys = [self._keys[alive_docs]]
+        groups = [self._groups[alive_docs]]
+        weights = [self._weights[alive_docs]]
+        lengths = [self._lengths[alive_docs]]
+        terms = [doc_terms[live]]
+        docs = [renumber[self._postings[live]]]
+        frequencies = [self._tf[live]]
+
+        base = len(alive_docs)
+        for doc, (key, (group, weight, length, document)) in enumerate(self._pending.items(), base):
+            keys.append(np.array([key], dtype=np.int64))
+            groups.append(np.array([group], dtype=np.int64))
+            weights.append(np.array([weight], dtype=np.float64))
+            lengths.append(np.array([length], dtype=np.float32))
+            terms.append(np.fromiter(document.keys(), dtype=np.int64, count=len(document)))
+            docs.append(np.full(len(document), doc, dtype=np.int64))
+            frequencies.append(np.fromiter(document.values(), dtype=np.float32, count=len(document)))
+
+        self._pending.clear()
+        self._pending_postings.clear()
+        self._build(*(np.concatenate(parts) for parts in (keys, groups, weights, lengths, terms, docs, frequencies)))
+
+    def _expand(self, term: str, is_last: bool) -> List[Tuple[int, float]]:
+        """Термы индекса, соответствующие слову запроса, и степень сходства"""
+        matches: Dict[int, float] = {}
+
+        exact = self._term_ids.get(term)
+        if exact is not None:
+            matches[exact] = 1.0
+
+        # Префикс - для последнего, возможно недописанного, слова
+        if is_last and len(term) >= 3:
+            if self._sorted_dirty:
+                self._sorted_terms = sorted(self._terms)
+                self._sorted_dirty = False
+            start = bisect.bisect_left(self._sorted_terms, term)
+            end = bisect.bisect_left(self._sorted_terms, term + "\uffff")
+            prefixed = [self._term_ids[candidate] for candidate in self._sorted_terms[start:end]]
+            prefixed.sort(key=lambda term_id: -self._frequency(term_id))
+            for term_id in prefixed[:self.MAX_EXPANSIONS]:
+                matches.setdefault(term_id, self.PREFIX_SIMILARITY)
+
+        typos = allowed_typos(term)
+        if typos:
+            for term_id, distance in self._fuzzy(term, typos):
+                similarity = self.TYPO_SIMILARITY[distance]
+                if matches.get(term_id, 0.0) < similarity:
+                    matches[term_id] = similarity
+
+        return list(matches.items())
+
+    def _fuzzy(self, term: str, typos: int) -> List[Tuple[int, int]]:
+        """Термы на расстоянии редактирования не больше typos"""
+        grams = trigrams(term)
+        arrays = []
+        for trigram in grams:
+            array = self._trigram_arrays.get(trigram)
+            if array is None:
+                array = np.array(self._trigram_terms.get(trigram, ()), dtype=np.int64)
+                self._trigram_arrays[trigram] = array
+            arrays.append(array)
+
+        candidates = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+        if not len(candidates):
+            return []
+
+        # Каждая опечатка портит не больше трех триграмм
+        shared = np.bincount(candidates)
+        close = np.flatnonzero(shared >= max(1, len(grams) - 3 * typos))
+        close = close[np.argsort(-shared[close], kind="stable")][:self.MAX_EXPANSIONS * 4]
+
+        result = []
+        for term_id in close.tolist():
+            distance = edit_distance(term, self._terms[term_id], typos)
+            if distance <= typos:
+                result.append((term_id, distance))
+        result.sort(key=lambda match: (match[1], -self._frequency(match[0])))
+        return result[:self.MAX_EXPANSIONS]
+
+    def _frequency(self, term_id: int) -> int:
+        main = int(self._df[term_id]) if term_id < len(self._df) else 0
+        return main + len(self._pending_postings.get(term_id, ()))
+
+    def search(self, query: Optional[str], limit: int = 20, group: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Документы по убыванию релевантности: [(key, score), ...].
+
+        Документ должен совпасть хотя бы с одним словом запроса; совпавшие
+        со всеми словами ранжируются выше.
+        """
+        terms = list(dict.fromkeys(analyze(query)))
+        if not terms or limit <= 0:
+            return []
+
+        if len(self._pending) + self._dead > max(self.rebuild_threshold, len(self._keys) // 50):
+            self._merge()
+
+        total = len(self) or 1
+        documents = len(self._keys)
+        scores = np.zeros(documents, dtype=np.float32)
+        matched = np.zeros(documents, dtype=np.int8)
+        pending_scores: Counter = Counter()
+        pending_matched: Counter = Counter()
+
+        for index, term in enumerate(terms):
+            expansions = self._expand(term, index == len(terms) - 1)
+            if not expansions:
+                continue
+
+            best = np.zeros(documents, dtype=np.float32)
+            pending_best: Dict[int, float] = {}
+            for term_id, similarity in expansions:
+                # Удаленные, но еще не выброшенные документы могут завысить частоту
+                frequency = min(self._frequency(term_id), total)
+                idf = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+                if term_id < len(self._df):
+                    start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                    if end > start:
+                        # В списке одного терма документы не повторяются
+                        docs = self._postings[start:end]
+                        best[docs] = np.maximum(best[docs], self._scores[start:end] * np.float32(idf * similarity))
+
+                for key in self._pending_postings.get(term_id, ()):
+                    _, _, length, document = self._pending[key]
+                    score = idf * similarity * self._saturate(document[term_id], length)
+                    if pending_best.get(key, 0.0) < score:
+                        pending_best[key] = score
+
+            scores += best
+            matched += best > 0
+            for key, score in pending_best.items():
+                pending_scores[key] += score
+                pending_matched[key] += 1
+
+        candidates = np.flatnonzero((matched > 0) & self._alive) if documents else np.empty(0, dtype=np.int64)
+        if group is not None and len(candidates):
+            candidates = candidates[self._groups[candidates] == group]
+
+        # Доля совпавших слов запроса - основной множитель релевантности
+        coverage = (matched[candidates].astype(np.float32) / len(terms)) ** 2
+        ranked = scores[candidates] * coverage
+
+        if len(candidates) > limit:
+            top = np.argpartition(-ranked, limit - 1)[:limit]
+            candidates, ranked = candidates[top], ranked[top]
+
+        results = [
+            (key, score, weight)
+            for key, score, weight in zip(
+                self._keys[candidates].tolist(), ranked.tolist(), self._weights[candidates].tolist()
+            )
+        ]
+        for key, score in pending_scores.items():
+            pending_group, weight = self._pending[key][0], self._pending[key][1]
+            if group is not None and pending_group != group:
+                continue
+            results.append((key, score * (pending_matched[key] / len(terms)) ** 2, weight))
+
+        results.sort(key=lambda result: (-result[1], -result[2], result[0]))
+        return [(key, score) for key, score, _ in results[:limit]]
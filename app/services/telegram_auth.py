@@ -0,0 +1,218 @@
+"""
+Проверка данных авторизации Telegram: Login Widget и WebApp initData
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import unquote_plus
+
+from app.core.config import settings
+
+# Допустимое расхождение часов: auth_date немного в будущем не считается подделкой
+CLOCK_SKEW_SECONDS = 60
+
+
+def unquote_value(value: str) -> str:
+    """
+    unquote_plus для значения строки запроса.
+
+    "%XX" превращается в "\\xXX" и раскодируется встроенным unicode_escape -
+    в разы быстрее unquote_plus на JSON пользователя, где экранирован почти
+    каждый символ. Необычные значения (обратная косая черта, не-ASCII,
+    битые escape-последовательности) раскодирует unquote_plus.
+    """
+    if "%" not in value:
+        return value.replace("+", " ")
+    if "\\" in value or not value.isascii():
+        return unquote_plus(value)
+    try:
+        return value.replace("+", " ").replace("%", "\\x").encode("ascii") \
+            .decode("unicode_escape").encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return unquote_plus(value)
+
+
+class TelegramAuthValidator:
+    """
+    Проверка подписи данных, которые Telegram выдает клиенту.
+
+    Ключи HMAC обоих видов считаются один раз при создании: для Login
+    Widget - sha256(token), для WebApp - HMAC("WebAppData", token); на
+    проверку остается copy() готового HMAC. initData разбирается одним
+    проходом по парам строки запроса, без промежуточного словаря. Успешно
+    проверенные данные держатся в LRU-кэше по исходной строке (у Login
+    Widget - по строке проверки и подписи), auth_date сверяется и при
+    попадании в кэш. Кэшируются только подлинные данные: ключ - весь текст,
+    а не подпись, так что подменить поля при известной подписи нельзя.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        max_age: int = 86400,
+        cache_size: int = 10_000,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._clock = clock
+
+        token = bot_token.encode()
+        self._login_mac = hmac.new(hashlib.sha256(token).digest(), digestmod=hashlib.sha256)
+        self._webapp_mac = hmac.new(
+            hmac.new(b"WebAppData", token, hashlib.sha256).digest(), digestmod=hashlib.sha256
+        )
+
+        self._cache: "OrderedDict[str, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+
+        self.hits = 0
+        self.validated = 0
+        self.rejected = 0
+
+    def validate_login(self, fields: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Данные Login Widget в том виде, как их прислал Telegram (id, first_name,
+        ..., auth_date, hash). Возвращает поля без hash или None.
+        """
+        received_hash = fields.get("hash")
+        if not received_hash:
+            self.rejected += 1
+            return None
+
+        # Отсутствующие поля Telegram не присылает и не подписывает
+        check_string = "\n".join(sorted(
+            f"{key}={value}" for key, value in fields.items() if key != "hash" and value is not None
+        ))
+        cache_key = f"{received_hash}\n{check_string}"
+
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
+
+        mac = self._login_mac.copy()
+        mac.update(check_string.encode())
+        if not hmac.compare_digest(mac.hexdigest(), str(received_hash)):
+            self.rejected += 1
+            return None
+
+        data = {key: value for key, value in fields.items() if key != "hash"}
+        return self._accept(cache_key, data.get("auth_date"), data)
+
+    def validate_init_data(self, init_data: str) -> Optional[Dict[str, Any]]:
+        """
+        Строка initData WebApp. Возвращает поля без hash (user - разобранный
+        JSON) или None.
+        """
+        cached = self._cached(init_data)
+        if cached is not None:
+            return cached
+
+        received_hash = None
+        auth_date = None
+        user = None
+        pairs = []
+        for pair in init_data.split("&"):
+            key, separator, value = pair.partition("=")
+            if not separator:
+                continue
+            value = unquote_value(value)
+            if key == "hash":
+                received_hash = value
+                continue
+            if key == "auth_date":
+                auth_date = value
+            elif key == "user":
+                user = value
+            # Ключи Telegram - [a-z_], все больше "=": порядок "key=value" совпадает с порядком ключей
+            pairs.append(f"{key}={value}")
+
+        if not received_hash:
+            self.rejected += 1
+            return None
+
+        pairs.sort()
+        mac = self._webapp_mac.copy()
+        mac.update("\n".join(pairs).encode())
+        if not hmac.compare_digest(mac.hexdigest(), received_hash):
+            self.rejected += 1
+            return None
+
+        data: Dict[str, Any] = dict(pair.split("=", 1) for pair in pairs)
+        if user is not None:
+            try:
+                data["user"] = json.loads(user)
+            except ValueError:
+                self.rejected += 1
+                return None
+
+        return self._accept(init_data, auth_date, data)
+
+    def _fresh(self, auth_date: int) -> bool:
+        age = self._clock() - auth_date
+        return -CLOCK_SKEW_SECONDS <= age <= self.max_age
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        auth_date, data = entry
+        if not self._fresh(auth_date):
+            del self._cache[key]
+            self.rejected += 1
+            return None
+
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return self._copy(data)
+
+    def _accept(self, key: str, auth_date: Any, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Проверить auth_date подлинных данных и запомнить их"""
+        try:
+            auth_date = int(auth_date)
+        except (TypeError, ValueError):
+            self.rejected += 1
+            return None
+
+        if not self._fresh(auth_date):
+            self.rejected += 1
+            return None
+
+        data["auth_date"] = auth_date
+        if self.cache_size:
+            self._cache[key] = (auth_date, data)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        self.validated += 1
+        return self._copy(data)
+
+    @staticmethod
+    def _copy(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Копия для вызывающего: правки в ней не попадут в кэш"""
+        user = data.get("user")
+        return {**data, "user": dict(user)} if isinstance(user, dict) else dict(data)
+
+    def clear(self) -> None:
+        """Очистить кэш проверенных данных"""
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики проверки данных Telegram"""
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "validated": self.validated,
+            "rejected": self.rejected
+        }
+
+
+# Глобальная проверка данных авторизации Telegram
+telegram_auth_validator = TelegramAuthValidator(
+    settings.TELEGRAM_BOT_TOKEN,
+    max_age=settings.TELEGRAM_AUTH_MAX_AGE
+)
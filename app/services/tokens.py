@@ -0,0 +1,170 @@
+"""
+Проверка JWT доступа с кэшем проверенных токенов
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from app.core.config import settings
+
+# Алгоритмы, которые умеет проверять встроенный бэкенд
+NATIVE_ALGORITHMS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512
+}
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class TokenVerifier:
+    """
+    Проверка JWT доступа с LRU-кэшем.
+
+    Проверенный токен запоминается под sha256 от своего текста вместе
+    с user_id и exp: повторный запрос с тем же токеном не разбирает его
+    и не считает подпись, а только сверяет exp. Отвергнутые токены
+    не кэшируются, чтобы перебор не вытеснял рабочие.
+
+    backend="jose" - python-jose; backend="native" - проверка HS256/384/512
+    на hmac из стандартной библиотеки с заранее подготовленным ключом.
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        algorithm: str = "HS256",
+        backend: str = "jose",
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.time
+    ):
+        if backend not in ("jose", "native"):
+            raise ValueError(f"Unknown JWT backend: {backend}")
+        if backend == "native" and algorithm not in NATIVE_ALGORITHMS:
+            raise ValueError(f"Native JWT backend does not support {algorithm}")
+
+        self.secret = secret
+        self.algorithm = algorithm
+        self.backend = backend
+        self.max_entries = max_entries
+        self._clock = clock
+
+        # Ключ HMAC подготавливается один раз, на токен - только copy()
+        self._mac = hmac.new(secret.encode(), digestmod=NATIVE_ALGORITHMS[algorithm]) \
+            if backend == "native" else None
+
+        self._entries: "OrderedDict[bytes, Tuple[int, Optional[float]]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def verify(self, token: str) -> Optional[int]:
+        """user_id из действующего токена доступа или None"""
+        now = self._clock()
+        key = hashlib.sha256(token.encode()).digest()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            user_id, expires_at = entry
+            if expires_at is None or now < expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return user_id
+
+            del self._entries[key]
+            self.expired += 1
+            return None
+
+        self.misses += 1
+        claims = self._decode(token, now)
+        if claims is None or claims.get("type", "access") != "access":
+            self.rejected += 1
+            return None
+
+        try:
+            user_id = int(claims["sub"])
+        except (KeyError, TypeError, ValueError):
+            self.rejected += 1
+            return None
+
+        expires_at = claims.get("exp")
+        self._entries[key] = (user_id, float(expires_at) if expires_at is not None else None)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return user_id
+
+    def _decode(self, token: str, now: float) -> Optional[Dict[str, Any]]:
+        """Проверенные claims токена или None"""
+        if self.backend == "jose":
+            try:
+                return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+            except JWTError:
+                return None
+
+        try:
+            header, payload, signature = token.split(".")
+            if json.loads(_b64url_decode(header)).get("alg") != self.algorithm:
+                return None
+
+            mac = self._mac.copy()
+            mac.update(f"{header}.{payload}".encode("ascii"))
+            if not hmac.compare_digest(mac.digest(), _b64url_decode(signature)):
+                return None
+
+            claims = json.loads(_b64url_decode(payload))
+        except (ValueError, UnicodeError, binascii.Error, AttributeError):
+            return None
+
+        if not isinstance(claims, dict):
+            return None
+
+        # Те же временные проверки, что делает python-jose
+        try:
+            if "exp" in claims and now >= float(claims["exp"]):
+                return None
+            if "nbf" in claims and now < float(claims["nbf"]):
+                return None
+        except (TypeError, ValueError):
+            return None
+
+        return claims
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Метрики проверки токенов"""
+        return {
+            "backend": self.backend,
+            "cached": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "evictions": self.evictions
+        }
+
+
+# Глобальная проверка токенов доступа
+token_verifier = TokenVerifier(
+    settings.SECRET_KEY,
+    settings.ALGORITHM,
+    backend=settings.JWT_BACKEND,
+    max_entries=settings.JWT_CACHE_SIZE
+)
@@ -0,0 +1,136 @@
+﻿"""
+Push-обновления для отслеживания заказов (pub/sub в памяти процесса)
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+
+
+class TrackingSubscription:
+    """Подписка клиента на обновления одного заказа"""
+
+    __slots__ = ("order_id", "queue")
+
+    def __init__(self, order_id: int, queue_size: int):
+        self.order_id = order_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def get(self, timeout: float) -> Optional[str]:
+        """Следующее сообщение (JSON-строка) или None, если за timeout ничего не пришло"""
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class TrackingHub:
+    """
+    Хаб обновлений заказов.
+
+    Для каждого заказа с активными подписчиками хранится последнее известное
+    состояние. Публикация сравнивает изменения с ним и рассылает только
+    отличающиеся поля, сериализуя сообщение один раз для всех подписчиков.
+    Медленный клиент с переполненной очередью получает вместо накопленных
+    сообщений один полный снимок.
+    """
+
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[TrackingSubscription]] = {}
+        self._state: Dict[int, Dict[str, Any]] = {}
+        self._seq: Dict[int, int] = {}
+
+        self.published = 0
+        self.delivered = 0
+        self.resyncs = 0
+
+    def subscribe(self, order_id: int, snapshot: Dict[str, Any]) -> TrackingSubscription:
+        """Подписаться на заказ; snapshot - состояние из БД, если хаб его еще не знает"""
+        if order_id not in self._state:
+            self._state[order_id] = dict(snapshot)
+            self._seq[order_id] = 0
+
+        subscription = TrackingSubscription(order_id, self.queue_size)
+        self._subscribers.setdefault(order_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TrackingSubscription) -> None:
+        """Отписаться; состояние заказа без подписчиков не хранится"""
+        subscribers = self._subscribers.get(subscription.order_id)
+        if subscribers is None:
+            return
+
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.order_id]
+            self._state.pop(subscription.order_id, None)
+            self._seq.pop(subscription.order_id, None)
+
+    def snapshot_message(self, order_id: int) -> str:
+        """Полное текущее состояние заказа в виде сообщения"""
+        return self._encode({
+            "type": "snapshot",
+            "order_id": order_id,
+            "seq": self._seq.get(order_id, 0),
+            "data": self._state.get(order_id, {})
+        })
+
+    def publish(self, order_id: int, changes: Dict[str, Any]) -> int:
+        """Опубликовать изменения заказа; возвращает число получателей"""
+        subscribers = self._subscribers.get(order_id)
+        if not subscribers:
+            return 0
+
+        state = self._state[order_id]
+        diff = {key: value for key, value in changes.items() if state.get(key) != value}
+        if not diff:
+            return 0
+
+        state.update(diff)
+        self._seq[order_id] += 1
+        self.published += 1
+
+        message = self._encode({
+            "type": "diff",
+            "order_id": order_id,
+            "seq": self._seq[order_id],
+            "changes": diff
+        })
+
+        for subscription in subscribers:
+            self._deliver(subscription, message)
+
+        self.delivered += len(subscribers)
+        return len(subscribers)
+
+    def _deliver(self, subscription: TrackingSubscription, message: str) -> None:
+        try:
+            subscription.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Клиент не успевает - заменяем накопленные diff полным снимком
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait(self.snapshot_message(subscription.order_id))
+            self.resyncs += 1
+
+    @staticmethod
+    def _encode(message: Dict[str, Any]) -> str:
+        return json.dumps(message, ensure_ascii=False, default=str)
+
+    def stats(self) -> Dict[str, int]:
+        """Метрики хаба"""
+        return {
+            "orders": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resyncs": self.resyncs
+        }
+
+
+# Глобальный хаб обновлений заказов
+tracking_hub = TrackingHub()
@@ -0,0 +1,153 @@
+"""
+Загрузка изображений: потоковый прием с ограничением размера и подготовка
+вариантов в пуле процессов
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import aiofiles
+import aiofiles.os
+
+from app.core.config import settings
+from app.services.images import make_variants
+
+logger = logging.getLogger(__name__)
+
+# Варианты лежат в UPLOAD_DIR/images и раздаются nginx как /uploads/images/
+IMAGES_DIR = "images"
+UPLOADS_URL = "/uploads"
+ACCEPTED_TYPES = {"image/jpeg", "image/png", "image/webp"}
+# Последних замеров для перцентилей
+LATENCY_WINDOW = 1000
+
+
+class UploadTooLarge(ValueError):
+    """Файл больше разрешенного размера"""
+
+
+def _percentile(values, share: float) -> float:
+    return round(values[min(int(len(values) * share), len(values) - 1)] * 1000, 2) if values else 0.0
+
+
+class ImagePipeline:
+    """
+    Прием изображений и подготовка их вариантов.
+
+    Тело запроса пишется во временный файл по частям (aiofiles), размер
+    проверяется по Content-Length до чтения и по мере чтения, поэтому
+    больший файл обрывается, не заняв ни память, ни диск. Уменьшение и
+    сжатие (WebP и JPEG трех размеров) выполняются в ProcessPoolExecutor
+    и не занимают цикл событий. Имена вариантов - хэш содержимого, файл
+    по URL никогда не меняется, и nginx отдает их с immutable-кэшированием.
+    """
+
+    def __init__(self, workers: int = 2, max_size: int = 10 * 1024 * 1024, chunk_size: int = 64 * 1024):
+        self.workers = workers
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        self.processed = 0
+        self.too_large = 0
+        self.invalid = 0
+        self.bytes_received = 0
+        self._processing_times: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def images_dir(self) -> str:
+        return os.path.join(settings.UPLOAD_DIR, IMAGES_DIR)
+
+    def url(self, relative: str) -> str:
+        """URL варианта по пути относительно каталога изображений"""
+        return f"{UPLOADS_URL}/{IMAGES_DIR}/{relative.replace(os.sep, '/')}"
+
+    async def receive(self, chunks: AsyncIterator[bytes], content_length: Optional[int] = None) -> str:
+        """Записать поток во временный файл; возвращает его путь"""
+        if content_length is not None and content_length > self.max_size:
+            self.too_large += 1
+            raise UploadTooLarge(f"Файл больше {self.max_size} байт")
+
+        directory = os.path.join(settings.UPLOAD_DIR, "tmp")
+        await aiofiles.os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, uuid.uuid4().hex)
+        size = 0
+        try:
+            async with aiofiles.open(path, "wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        self.too_large += 1
+                        raise UploadTooLarge(f"Файл больше {self.max_size} байт")
+                    await file.write(chunk)
+            if not size:
+                raise ValueError("Пустой файл")
+        except BaseException:
+            await aiofiles.os.remove(path)
+            raise
+        finally:
+            self.bytes_received += size
+        return path
+
+    async def process(self, chunks: AsyncIterator[bytes], content_length: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Принять изображение и подготовить варианты.
+        Возвращает {размер: {"width", "height", "webp": URL, "jpg": URL}}.
+        """
+        path = await self.receive(chunks, content_length)
+        started = time.monotonic()
+        try:
+            variants = await asyncio.get_running_loop().run_in_executor(
+                self._executor(), make_variants, path, self.images_dir
+            )
+        except ValueError:
+            self.invalid += 1
+            raise
+        finally:
+            await aiofiles.os.remove(path)
+
+        self._processing_times.append(time.monotonic() - started)
+        self.processed += 1
+        return {
+            size: {key: self.url(value) if key in ("webp", "jpg") else value for key, value in variant.items()}
+            for size, variant in variants.items()
+        }
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self.start()
+        return self._pool
+
+    def start(self) -> None:
+        """Запустить пул процессов"""
+        if self._pool is None:
+            # spawn: рабочие процессы не наследуют потоки и соединения приложения
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self) -> None:
+        """Дождаться начатой обработки и остановить пул"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        times = sorted(self._processing_times)
+        return {
+            "processed": self.processed,
+            "too_large": self.too_large,
+            "invalid": self.invalid,
+            "bytes_received": self.bytes_received,
+            "processing_p50_ms": _percentile(times, 0.5),
+            "processing_p95_ms": _percentile(times, 0.95)
+        }
+
+
+# Глобальный конвейер загрузок
+image_pipeline = ImagePipeline(workers=settings.IMAGE_WORKERS, max_size=settings.MAX_FILE_SIZE)
@@ -3,10 +3,21 @@
 """
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import Optional, Dict, Any
+from sqlalchemy import select, insert, update, func
+from typing import List, Optional, Dict, Any
 
-from app.models import User, UserRole
+from app.models import User, UserRole, LoyaltyTransaction
+
+
+# Причины движения баллов в журнале
+LOYALTY_REASON_ORDER = "order"
+LOYALTY_REASON_MANUAL = "manual"
+LOYALTY_REASON_ORDER_CANCEL = "order_cancel"
+
+
+def order_points(order_total: float) -> int:
+    """Бонусные баллы за заказ: 1 балл за каждые 100 рублей"""
+    return int(order_total // 100)
 
 
 class UserService:
@@ -62,11 +73,18 @@ class UserService:
         if not user:
             return None
         
+        # Баланс баллов - сумма журнала, поддерживаемая в строке пользователя.
+        # Уровень считается по счетчикам строки: они отстают от доставленных
+        # заказов не больше чем на интервал order_aggregates, точные значения
+        # (order_aggregates.user_totals) здесь не нужны
+        total_orders = user.total_orders or 0
+        total_spent = user.total_spent or 0.0
+        
         # Определяем уровень лояльности
         loyalty_level = "Bronze"
-        if user.total_orders >= 50:
+        if total_orders >= 50:
             loyalty_level = "Gold"
-        elif user.total_orders >= 20:
+        elif total_orders >= 20:
             loyalty_level = "Silver"
         
         # Рассчитываем скидку
@@ -79,37 +97,84 @@ class UserService:
         return {
             "user_id": user.id,
             "loyalty_points": user.loyalty_points,
-            "total_orders": user.total_orders,
-            "total_spent": user.total_spent,
+            "total_orders": total_orders,
+            "total_spent": total_spent,
             "loyalty_level": loyalty_level,
             "discount_percent": discount_percent,
-            "points_to_next_level": max(0, (20 if loyalty_level == "Bronze" else 50) - user.total_orders)
+            "points_to_next_level": max(0, (20 if loyalty_level == "Bronze" else 50) - total_orders)
         }
     
-    async def add_loyalty_points(self, user_id: int, points: int) -> bool:
-        """Добавить бонусные баллы"""
-        user = await self.get_user(user_id)
-        if not user:
+    async def add_loyalty_points(
+        self,
+        user_id: int,
+        points: int,
+        reason: str = LOYALTY_REASON_MANUAL,
+        order_id: Optional[int] = None,
+        commit: bool = True
+    ) -> bool:
+        """
+        Начислить (или списать, если points < 0) бонусные баллы.
+        
+        Баланс меняется одним атомарным UPDATE без чтения строки, поэтому
+        параллельные начисления не теряются; каждое движение пишется в журнал.
+        commit=False - начисление в транзакции вызывающего (например, заказа).
+        """
+        users = User.__table__
+        result = await self.db.execute(
+            update(users)
+            .where(users.c.id == user_id)
+            .values(loyalty_points=func.coalesce(users.c.loyalty_points, 0) + points)
+        )
+        if result.rowcount == 0:
             return False
         
-        user.loyalty_points += points
-        await self.db.commit()
+        await self.db.execute(
+            insert(LoyaltyTransaction).values(
+                user_id=user_id,
+                order_id=order_id,
+                points=points,
+                reason=reason
+            )
+        )
+        
+        if commit:
+            await self.db.commit()
         
         return True
     
-    async def update_user_stats(self, user_id: int, order_total: float) -> bool:
-        """Обновить статистику пользователя после заказа"""
-        user = await self.get_user(user_id)
-        if not user:
-            return False
-        
-        user.total_orders += 1
-        user.total_spent += order_total
+    async def revoke_order_points(self, order_ids: List[int]) -> int:
+        """
+        Списать баллы, начисленные за отмененные заказы.
         
-        # Начисляем бонусные баллы (1 балл за каждые 100 рублей)
-        bonus_points = int(order_total // 100)
-        user.loyalty_points += bonus_points
+        Выполняется в транзакции вызывающего; уникальный индекс
+        (order_id, reason) не даст списать баллы за заказ дважды.
+        """
+        if not order_ids:
+            return 0
         
-        await self.db.commit()
+        result = await self.db.execute(
+            select(LoyaltyTransaction.user_id, LoyaltyTransaction.order_id, LoyaltyTransaction.points)
+            .where(
+                LoyaltyTransaction.order_id.in_(order_ids),
+                LoyaltyTransaction.reason == LOYALTY_REASON_ORDER,
+                LoyaltyTransaction.points != 0
+            )
+        )
+        revoked = 0
+        for user_id, order_id, points in result.all():
+            await self.add_loyalty_points(
+                user_id, -points, reason=LOYALTY_REASON_ORDER_CANCEL, order_id=order_id, commit=False
+            )
+            revoked += 1
+        return revoked
+    
+    async def update_user_stats(self, user_id: int, order_total: float, order_id: Optional[int] = None) -> bool:
+        """
+        Обновить статистику пользователя после заказа.
         
-        return True
+        Число заказов и сумму покупок считает order_aggregates по самим
+        заказам, здесь начисляются только бонусные баллы.
+        """
+        return await self.add_loyalty_points(
+            user_id, order_points(order_total), reason=LOYALTY_REASON_ORDER, order_id=order_id
+        )
@@ -0,0 +1,110 @@
+"""
+Бенчмарк 500 одновременных заказов в один ресторан: счетчики в строке ресторана
+при каждом заказе против отложенного пакетного учета
+
+Запуск: DATABASE_URL="sqlite+aiosqlite:///bench.db?timeout=120" python -m benchmarks.bench_aggregates
+"""
+
+import asyncio
+import time
+from datetime import time as dtime
+
+from sqlalchemy import func, select
+
+from app.api.orders import OrderCreate, OrderItemCreate
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import MenuItem, Order, Restaurant, User
+from app.services.aggregates import AggregateFolder
+from app.services.order_service import OrderService
+
+CHECKOUTS = 500
+USERS = 50
+CONCURRENCY = 500
+
+
+async def prepare():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        users = [User(telegram_id=i + 1, first_name=f"Bench {i}") for i in range(USERS)]
+        restaurant = Restaurant(
+            name="Bench", address="-", latitude=55.75, longitude=37.62,
+            work_start=dtime(9), work_end=dtime(23)
+        )
+        db.add_all(users + [restaurant])
+        await db.flush()
+        menu_item = MenuItem(name="Блюдо", price=500.0, restaurant_id=restaurant.id)
+        db.add(menu_item)
+        await db.commit()
+        return [user.id for user in users], restaurant.id, menu_item.id
+
+
+async def hot_row_checkout(user_id, restaurant_id, order_data):
+    """Прежняя схема: заказ и чтение-изменение-запись строк ресторана и пользователя"""
+    async with AsyncSessionLocal() as db:
+        order = await OrderService(db).create_order(user_id, order_data)
+        restaurant = await db.get(Restaurant, restaurant_id, populate_existing=True)
+        user = await db.get(User, user_id, populate_existing=True)
+        restaurant.total_orders += 1
+        restaurant.total_revenue += order.total
+        user.total_orders += 1
+        user.total_spent += order.total
+        await db.commit()
+
+
+async def deferred_checkout(user_id, order_data):
+    """Новая схема: только заказ, счетчики учитываются фоном"""
+    async with AsyncSessionLocal() as db:
+        await OrderService(db).create_order(user_id, order_data)
+
+
+async def run(name, checkout, fold=None):
+    user_ids, restaurant_id, menu_item_id = await prepare()
+    order_data = OrderCreate(
+        restaurant_id=restaurant_id,
+        items=[OrderItemCreate(menu_item_id=menu_item_id, quantity=1)],
+        delivery_address="ул. Ленина, 25"
+    )
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(number):
+        async with semaphore:
+            await checkout(user_ids[number % USERS], restaurant_id, order_data)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(number) for number in range(CHECKOUTS)))
+    elapsed = time.perf_counter() - started
+
+    fold_seconds = 0.0
+    if fold is not None:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            while await fold.fold(db):
+                pass
+        fold_seconds = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as db:
+        restaurant = await db.get(Restaurant, restaurant_id)
+        orders = await db.scalar(select(func.count(Order.id)))
+
+    print(
+        f"{name}: {CHECKOUTS} заказов за {elapsed * 1000:.0f} мс "
+        f"({CHECKOUTS / elapsed:.0f} заказов/с), учет счетчиков {fold_seconds * 1000:.1f} мс; "
+        f"total_orders={restaurant.total_orders} при {orders} заказах"
+    )
+
+
+async def main():
+    await run("Строка ресторана в каждом заказе", hot_row_checkout)
+    await run(
+        "Отложенный пакетный учет",
+        lambda user_id, restaurant_id, order_data: deferred_checkout(user_id, order_data),
+        fold=AggregateFolder()
+    )
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+Бенчмарк накладных расходов авторизации на запрос: проверка JWT без кэша
+(python-jose и встроенный HS256) и из кэша проверенных токенов
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_auth
+"""
+
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.api.deps import get_current_user_id
+from app.services.auth_service import AuthService
+from app.services.tokens import TokenVerifier, token_verifier
+
+REQUESTS = 50_000
+USERS = 1_000
+
+
+def per_request_us(verify, tokens):
+    started = time.perf_counter()
+    for number in range(REQUESTS):
+        verify(tokens[number % len(tokens)])
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+async def dependency_us(tokens):
+    credentials = [HTTPAuthorizationCredentials(scheme="Bearer", credentials=token) for token in tokens]
+    started = time.perf_counter()
+    for number in range(REQUESTS):
+        await get_current_user_id(credentials[number % len(credentials)])
+    return (time.perf_counter() - started) / REQUESTS * 1e6
+
+
+async def main():
+    service = AuthService(db=None)
+    tokens = [service.create_access_token(user_id) for user_id in range(1, USERS + 1)]
+
+    for backend in ("jose", "native"):
+        # max_entries=0 - запись вытесняется сразу, каждый запрос проверяет подпись заново
+        uncached = TokenVerifier(token_verifier.secret, token_verifier.algorithm, backend=backend, max_entries=0)
+        cached = TokenVerifier(token_verifier.secret, token_verifier.algorithm, backend=backend)
+        print(
+            f"{backend}: без кэша {per_request_us(uncached.verify, tokens):.1f} мкс/запрос, "
+            f"из кэша {per_request_us(cached.verify, tokens):.2f} мкс/запрос"
+        )
+
+    token_verifier.clear()
+    print(f"Зависимость get_current_user_id ({token_verifier.backend}, кэш): {await dependency_us(tokens):.2f} мкс/запрос")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""
+Бенчмарк обработчиков бота (bot_production.py): колбэков в секунду через
+настоящий python-telegram-bot с подмененным HTTP-запросом. Для сравнения -
+прежний обработчик меню, который собирал текст и клавиатуру на каждый колбэк.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_bot_render
+"""
+
+import asyncio
+import time
+
+from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import ParseMode
+from telegram.request import BaseRequest
+
+import bot_production
+from app.bot.render import render_stats
+
+CALLBACKS = 5_000
+USER = {"id": 42, "is_bot": False, "first_name": "Иван"}
+
+
+class StubRequest(BaseRequest):
+    """Запрос к Bot API без сети: сериализация параметров остается, ответ - успех"""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if request_data is not None:
+            request_data.json_payload
+        self.requests += 1
+        return 200, b'{"ok":true,"result":true}'
+
+
+def callback_update(bot, data):
+    return Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "from": USER,
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 42, "type": "private"},
+                "text": "..."
+            }
+        }
+    }, bot)
+
+
+async def legacy_menu_handler(update, context):
+    # Прежний menu_handler: текст и клавиатура собираются на каждый колбэк
+    query = update.callback_query
+    await query.answer()
+
+    restaurant_type = query.data.split("_")[1]
+    restaurant = bot_production.RESTAURANTS[restaurant_type]
+
+    menu_text = f"""🍽️ *Меню {restaurant['name']}*
+
+{restaurant['info']}
+
+📋 *Доступные блюда:*
+
+"""
+
+    keyboard = []
+    for i, item in enumerate(restaurant['menu']):
+        menu_text += f"**{item['name']}** - {item['price']}₽\n_{item['desc']}_\n\n"
+        keyboard.append([InlineKeyboardButton(
+            f"➕ {item['name']} ({item['price']}₽)",
+            callback_data=f"add_{restaurant_type}_{i}"
+        )])
+
+    keyboard.append([InlineKeyboardButton("🛒 Корзина", callback_data="cart_view")])
+    keyboard.append([InlineKeyboardButton("🔙 К ресторанам", callback_data="restaurants_list")])
+
+    await query.edit_message_text(
+        menu_text,
+        parse_mode=ParseMode.MARKDOWN,
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def callbacks_per_second(handler, update):
+    started = time.perf_counter()
+    for _ in range(CALLBACKS):
+        await handler(update, None)
+    return CALLBACKS / (time.perf_counter() - started)
+
+
+async def main():
+    request = StubRequest()
+    bot = Bot("123456:BENCH", request=request, get_updates_request=request)
+
+    flows = [
+        ("restaurants_list", bot_production.restaurants_handler),
+        ("menu_pizza", bot_production.menu_handler),
+        ("add_pizza_0", bot_production.add_to_cart_handler),
+        ("cart_view", bot_production.cart_view_handler),
+        ("back_to_main", bot_production.back_to_main_handler),
+        ("help", bot_production.help_handler),
+    ]
+    await bot_production.cart_service.add_item(USER["id"], "sushi_0", "Филадельфия", 890, restaurant="🍜 Суши Мастер")
+
+    legacy = await callbacks_per_second(legacy_menu_handler, callback_update(bot, "menu_pizza"))
+    print(f"{'menu_pizza (прежний)':>22}: {legacy:,.0f} колбэков/с")
+    for data, handler in flows:
+        rate = await callbacks_per_second(handler, callback_update(bot, data))
+        print(f"{data:>22}: {rate:,.0f} колбэков/с")
+
+    print(f"Запросов к Bot API: {request.requests}")
+    for name, stats in render_stats.stats().items():
+        print(f"Подготовка {name}: {stats['avg_us']} мкс в среднем, максимум {stats['max_us']} мкс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Бенчмарк рассылки по всем пользователям: прежний подход (все пользователи
+одним запросом, текст на каждого получателя) против BroadcastEngine
+(пачки по ID, текст на вариант, контрольные точки). Бот без сети, поэтому
+меряется сама подготовка рассылки: получателей в секунду и пик памяти.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_broadcast
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from sqlalchemy import insert, select
+
+from app.bot.render import Template
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import User
+from app.services.broadcast import BroadcastEngine
+
+USERS = 200_000
+CHUNK = 50_000
+NAMES = ["Анна", "Иван", "Мария", "Алексей", "Ольга", None]
+TEXT = "🔥 *{first_name}*, только сегодня скидка 20% на всё меню! Закажите до 23:00."
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None, rate_limit_args=None):
+        self.sent += 1
+
+
+async def legacy(bot):
+    # Все пользователи одним запросом, текст готовится для каждого
+    template = Template(TEXT)
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(select(User).where(User.is_active.is_(True)))).scalars().all()
+        for user in users:
+            await bot.send_message(user.telegram_id, template.render(first_name=user.first_name or "друг"))
+
+
+async def measure(run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return USERS / elapsed, peak / 2 ** 20
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        for offset in range(0, USERS, CHUNK):
+            await db.execute(insert(User), [
+                {"telegram_id": i + 1, "first_name": NAMES[i % len(NAMES)], "is_active": True}
+                for i in range(offset, offset + CHUNK)
+            ])
+        await db.commit()
+
+    bot = StubBot()
+    rate, peak = await measure(lambda: legacy(bot))
+    print(f"Прежняя рассылка: {rate:,.0f} получателей/с, пик памяти {peak:.1f} МБ")
+
+    bot = StubBot()
+    broadcasts = BroadcastEngine()
+    broadcasts.start(AsyncSessionLocal, bot=bot)
+    broadcast = await broadcasts.create(TEXT)
+    result = {}
+
+    async def run():
+        result.update(await broadcasts.run(broadcast.id))
+
+    rate, peak = await measure(run)
+    await broadcasts.stop()
+    print(f"BroadcastEngine: {rate:,.0f} получателей/с, пик памяти {peak:.1f} МБ, "
+          f"отправлено {result['sent']}, вариантов текста {result['variants']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
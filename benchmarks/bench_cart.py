@@ -0,0 +1,82 @@
+"""
+Бенчмарк корзин: память на простаивающую корзину (прежний список словарей
+против Cart в MemoryCartStore) и время добавления и просмотра.
+Каждое блюдо добавляется дважды, ID позиции собирается заново, как из
+callback_data в боте.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_cart
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from app.services.cart import CartService, MemoryCartStore
+
+CARTS = 100_000
+MENU = [("pizza", 0, "Маргарита", 650), ("burger", 1, "Чизбургер", 500), ("sushi", 3, "Сет Мастер", 1200)]
+CLICKS = 2
+RESTAURANT = "🍕 Pizza Palace"
+
+
+def measure(build):
+    """Байт на корзину, которые остаются занятыми после заполнения"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    holder = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del holder
+    return used / CARTS
+
+
+def legacy_carts():
+    # Как в прежних ботах: user_carts[user_id] - список словарей, по одному на нажатие
+    user_carts = {}
+    for user_id in range(CARTS):
+        user_carts[user_id] = [
+            {"restaurant": RESTAURANT, "name": name, "price": price}
+            for _, _, name, price in MENU for _ in range(CLICKS)
+        ]
+    return user_carts
+
+
+def memory_store_carts():
+    service = CartService(MemoryCartStore(max_carts=CARTS))
+    loop = asyncio.new_event_loop()
+    for user_id in range(CARTS):
+        for restaurant_type, index, name, price in MENU * CLICKS:
+            loop.run_until_complete(service.add_item(
+                user_id, f"{restaurant_type}_{index}", name, price, restaurant=RESTAURANT
+            ))
+    loop.close()
+    return service
+
+
+async def timings():
+    service = CartService(MemoryCartStore(max_carts=CARTS))
+    started = time.perf_counter()
+    for user_id in range(CARTS):
+        for restaurant_type, index, name, price in MENU * CLICKS:
+            await service.add_item(user_id, f"{restaurant_type}_{index}", name, price, restaurant=RESTAURANT)
+    add_us = (time.perf_counter() - started) / (CARTS * len(MENU) * CLICKS) * 1e6
+
+    started = time.perf_counter()
+    for user_id in range(CARTS):
+        cart = await service.get(user_id)
+        cart.total, cart.count
+    view_us = (time.perf_counter() - started) / CARTS * 1e6
+    return add_us, view_us
+
+
+def main():
+    lines = f"{len(MENU)} позиций по {CLICKS} шт."
+    print(f"Прежний список словарей: {measure(legacy_carts):.0f} байт на корзину из {lines}")
+    print(f"MemoryCartStore: {measure(memory_store_carts):.0f} байт на корзину из {lines}")
+
+    add_us, view_us = asyncio.run(timings())
+    print(f"Добавление позиции: {add_us:.2f} мкс, итоги корзины: {view_us:.2f} мкс")
+
+
+if __name__ == "__main__":
+    main()
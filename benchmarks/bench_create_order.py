@@ -0,0 +1,79 @@
+﻿"""
+Бенчмарк создания заказа из 20 позиций: время и число запросов к базе
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///bench.db python -m benchmarks.bench_create_order
+"""
+
+import asyncio
+import time
+from datetime import time as dtime
+
+from sqlalchemy import event
+
+from app.api.orders import OrderCreate, OrderItemCreate
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import MenuItem, Restaurant, User
+from app.services.order_service import OrderService
+
+ITEMS_PER_ORDER = 20
+ORDERS = 200
+MAX_STATEMENTS = 5
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        user = User(telegram_id=1, first_name="Bench")
+        restaurant = Restaurant(
+            name="Bench", address="-", latitude=55.75, longitude=37.62,
+            work_start=dtime(9), work_end=dtime(23)
+        )
+        db.add_all([user, restaurant])
+        await db.flush()
+        menu_items = [
+            MenuItem(name=f"Блюдо {i}", price=100.0 + i, restaurant_id=restaurant.id)
+            for i in range(ITEMS_PER_ORDER)
+        ]
+        db.add_all(menu_items)
+        await db.commit()
+        user_id, restaurant_id, item_ids = user.id, restaurant.id, [item.id for item in menu_items]
+
+    order_data = OrderCreate(
+        restaurant_id=restaurant_id,
+        items=[OrderItemCreate(menu_item_id=item_id, quantity=1) for item_id in item_ids],
+        delivery_address="ул. Ленина, 25",
+        delivery_latitude=55.76,
+        delivery_longitude=37.63
+    )
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    timings = []
+    for _ in range(ORDERS):
+        statements.clear()
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await OrderService(db).create_order(user_id, order_data)
+            timings.append(time.perf_counter() - started)
+
+        assert len(statements) <= MAX_STATEMENTS, statements
+
+    timings.sort()
+    print(
+        f"Заказ из {ITEMS_PER_ORDER} позиций: {len(statements)} запросов к базе, "
+        f"p50={timings[len(timings) // 2] * 1000:.2f} мс, p99={timings[int(len(timings) * 0.99)] * 1000:.2f} мс"
+    )
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+﻿"""
+Бенчмарк расчета доставки: векторный расчет против geodesic на каждый ресторан
+
+Запуск: python -m benchmarks.bench_delivery_quotes
+"""
+
+import random
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from app.services.delivery import quote_delivery_batch
+
+USER_LOCATION = (55.75, 37.62)
+ORDER_TOTAL = 700.0
+
+
+def geopy_quotes(restaurants):
+    """Прежний путь: отдельный geodesic на каждую пару и расчет в Python"""
+    quotes = []
+    for lat, lon, base_fee, threshold, max_distance, avg_time in restaurants:
+        distance = geodesic((lat, lon), USER_LOCATION).kilometers
+        if ORDER_TOTAL >= threshold:
+            fee = 0.0
+        elif distance > max_distance:
+            fee = -1
+        else:
+            fee = base_fee + (distance - 5) * 20 if distance > 5 else base_fee
+        quotes.append((distance, fee, avg_time + int(distance * 2)))
+    return quotes
+
+
+def numpy_quotes(columns):
+    return quote_delivery_batch(USER_LOCATION[0], USER_LOCATION[1], *columns, order_total=ORDER_TOTAL)
+
+
+def main():
+    rng = random.Random(7)
+
+    for count in (10, 1_000, 100_000):
+        restaurants = [
+            (
+                55.75 + rng.gauss(0, 0.1),
+                37.62 + rng.gauss(0, 0.15),
+                rng.choice([99.0, 150.0, 199.0]),
+                rng.choice([800.0, 1000.0, 1500.0]),
+                rng.choice([7.0, 10.0, 15.0]),
+                rng.choice([25, 30, 40]),
+            )
+            for _ in range(count)
+        ]
+        columns = [np.array(column) for column in zip(*restaurants)]
+
+        repeats = max(1, 10_000 // count)
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            expected = geopy_quotes(restaurants)
+        geopy_time = (time.perf_counter() - started) / repeats
+
+        started = time.perf_counter()
+        for _ in range(repeats * 10):
+            distances, fees, minutes = numpy_quotes(columns)
+        numpy_time = (time.perf_counter() - started) / (repeats * 10)
+
+        # Сверка: haversine отличается от эллипсоида не более чем на ~0.5%
+        max_error = max(abs(d - e[0]) / max(e[0], 1e-9) for d, e in zip(distances.tolist(), expected))
+
+        print(
+            f"N={count:>6}: geopy {geopy_time * 1000:9.2f} мс, numpy {numpy_time * 1000:7.3f} мс, "
+            f"ускорение x{geopy_time / numpy_time:,.0f}, макс. расхождение расстояния {max_error:.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Бенчмарк назначения курьеров: детерминированная симуляция города
+
+Каждый такт: новые заказы в ресторанах, решение задачи назначения для всех
+открытых заказов и свободных курьеров, занятые курьеры возвращаются в сеть
+у адреса доставки. Сравнивается с жадным назначением "ближайший свободный".
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_dispatch
+"""
+
+import time
+
+import numpy as np
+
+from app.services.dispatch_service import plan_assignments
+from app.services.geo import GeoGridIndex, haversine_km
+
+SEED = 2024
+RESTAURANTS = 400
+FLEET = 5_500
+OPEN_ORDERS = 2_000
+TICKS = 30
+ORDERS_PER_TICK = 1_000
+BUSY_TICKS = (3, 9)
+TARGET_MS = 200
+
+CENTER = (55.75, 37.62)
+
+
+def greedy_assignments(courier_lats, courier_lons, radii, pickup_lats, pickup_lons):
+    """Базовая линия: заказы по очереди забирают ближайшего свободного курьера"""
+    index = GeoGridIndex()
+    index.load(zip(range(len(courier_lats)), courier_lats, courier_lons, np.zeros(len(courier_lats))))
+    max_radius = float(radii.max())
+
+    result = []
+    for order, (lat, lon) in enumerate(zip(pickup_lats.tolist(), pickup_lons.tolist())):
+        keys, distances, _ = index.query(lat, lon, max_radius)
+        reachable = distances <= radii[keys]
+        if not reachable.any():
+            continue
+        courier = int(keys[reachable][distances[reachable].argmin()])
+        index.remove(courier)
+        result.append((order, courier))
+    return result
+
+
+def pickup_km(pairs, courier_lats, courier_lons, pickup_lats, pickup_lons):
+    if not pairs:
+        return 0.0
+    orders, couriers = np.array(pairs).T
+    return float(haversine_km(
+        courier_lats[couriers], courier_lons[couriers], pickup_lats[orders], pickup_lons[orders]
+    ).sum())
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+
+    restaurant_lats = CENTER[0] + rng.normal(0, 0.06, RESTAURANTS)
+    restaurant_lons = CENTER[1] + rng.normal(0, 0.10, RESTAURANTS)
+    # Популярность ресторанов неравномерна
+    popularity = rng.pareto(1.5, RESTAURANTS) + 1
+    popularity /= popularity.sum()
+
+    courier_lats = CENTER[0] + rng.normal(0, 0.08, FLEET)
+    courier_lons = CENTER[1] + rng.normal(0, 0.12, FLEET)
+    courier_radii = rng.choice([5.0, 8.0, 10.0], FLEET)
+    courier_ratings = np.round(rng.uniform(3.5, 5.0, FLEET), 1)
+    # Курьеры выходят на линию волнами: на каждом такте свободна примерно тысяча
+    busy_until = rng.integers(0, BUSY_TICKS[1] - 3, FLEET)
+
+    open_restaurants = rng.choice(RESTAURANTS, OPEN_ORDERS, p=popularity)
+    open_ready = rng.random(OPEN_ORDERS) < 0.5
+    next_order_id = OPEN_ORDERS
+
+    timings = []
+    total_assigned = total_km = greedy_assigned = greedy_km = 0.0
+    print(f"{'такт':>4} {'заказов':>8} {'курьеров':>9} {'назначено':>10} {'время, мс':>10}")
+
+    for tick in range(TICKS):
+        online = np.flatnonzero(busy_until <= tick)
+        pickup_lats = restaurant_lats[open_restaurants]
+        pickup_lons = restaurant_lons[open_restaurants]
+        order_ids = np.arange(next_order_id - len(open_restaurants), next_order_id)
+
+        started = time.perf_counter()
+        plan = plan_assignments(
+            online,
+            courier_lats[online],
+            courier_lons[online],
+            courier_radii[online],
+            courier_ratings[online],
+            order_ids,
+            pickup_lats,
+            pickup_lons,
+            open_ready
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+        timings.append(elapsed)
+
+        # Тот же срез, решенный жадно, - для сравнения качества
+        greedy = greedy_assignments(
+            courier_lats[online], courier_lons[online], courier_radii[online], pickup_lats, pickup_lons
+        )
+        greedy_assigned += len(greedy)
+        greedy_km += pickup_km(greedy, courier_lats[online], courier_lons[online], pickup_lats, pickup_lons)
+
+        pairs = [(int(order_id - order_ids[0]), int(courier)) for order_id, courier in plan]
+        total_assigned += len(pairs)
+        total_km += pickup_km(pairs, courier_lats, courier_lons, pickup_lats, pickup_lons)
+
+        print(f"{tick:>4} {len(order_ids):>8} {len(online):>9} {len(plan):>10} {elapsed:>10.1f}")
+
+        # Назначенные курьеры уезжают и появляются у клиента через несколько тактов
+        if pairs:
+            taken, couriers = np.array(pairs).T
+            busy_until[couriers] = tick + rng.integers(*BUSY_TICKS, len(couriers))
+            courier_lats[couriers] = pickup_lats[taken] + rng.normal(0, 0.02, len(couriers))
+            courier_lons[couriers] = pickup_lons[taken] + rng.normal(0, 0.03, len(couriers))
+
+            keep = np.ones(len(order_ids), dtype=bool)
+            keep[taken] = False
+            # Заказы, оставшиеся без курьера, со временем становятся готовыми
+            open_restaurants = open_restaurants[keep]
+            open_ready = open_ready[keep] | (rng.random(keep.sum()) < 0.3)
+
+        new_restaurants = rng.choice(RESTAURANTS, ORDERS_PER_TICK, p=popularity)
+        open_restaurants = np.concatenate([open_restaurants, new_restaurants])
+        open_ready = np.concatenate([open_ready, np.zeros(ORDERS_PER_TICK, dtype=bool)])
+        next_order_id += ORDERS_PER_TICK
+
+    slow = sum(elapsed > TARGET_MS for elapsed in timings)
+    timings.sort()
+    print()
+    print(
+        f"Время такта: p50={timings[len(timings) // 2]:.1f} мс, max={timings[-1]:.1f} мс, "
+        f"дольше {TARGET_MS} мс: {slow} из {TICKS}"
+    )
+    print(
+        f"Аукцион: назначено {total_assigned:.0f}, "
+        f"средний путь до ресторана {total_km / max(total_assigned, 1):.2f} км"
+    )
+    print(
+        f"Жадно:   назначено {greedy_assigned:.0f}, "
+        f"средний путь до ресторана {greedy_km / max(greedy_assigned, 1):.2f} км"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+﻿"""
+Бенчмарк поиска ресторанов рядом с пользователем
+
+Запуск: python -m benchmarks.bench_geo_index
+"""
+
+import random
+import time
+
+from geopy.distance import geodesic
+
+from app.services.geo import GeoGridIndex
+
+
+RESTAURANTS = 50_000
+QUERIES = 1_000
+
+
+def main():
+    rng = random.Random(1)
+
+    # Рестораны нескольких крупных городов
+    cities = [(55.75, 37.62), (59.94, 30.31), (56.84, 60.61), (55.03, 82.92), (43.24, 76.89)]
+    points = []
+    for key in range(1, RESTAURANTS + 1):
+        lat, lon = rng.choice(cities)
+        points.append((key, lat + rng.gauss(0, 0.12), lon + rng.gauss(0, 0.2), round(rng.uniform(3, 5), 1)))
+
+    index = GeoGridIndex()
+    started = time.perf_counter()
+    index.load(points)
+    index.nearby(55.75, 37.62, 1.0)
+    print(f"Построение индекса на {RESTAURANTS} ресторанов: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    queries = []
+    for _ in range(QUERIES):
+        lat, lon = rng.choice(cities)
+        queries.append((lat + rng.gauss(0, 0.1), lon + rng.gauss(0, 0.15)))
+
+    for radius in (3.0, 5.0, 15.0):
+        timings = []
+        found = 0
+        for lat, lon in queries:
+            started = time.perf_counter()
+            page = index.nearby(lat, lon, radius, skip=40, limit=20)
+            timings.append(time.perf_counter() - started)
+            found += len(page)
+
+        timings.sort()
+        print(
+            f"radius={radius:>4} км: p50={timings[len(timings) // 2] * 1e6:.0f} мкс, "
+            f"p99={timings[int(len(timings) * 0.99)] * 1e6:.0f} мкс, "
+            f"в среднем {found / QUERIES:.1f} на странице"
+        )
+
+    # Прежний путь: geodesic для каждого ресторана
+    lat, lon = queries[0]
+    started = time.perf_counter()
+    nearby = [key for key, r_lat, r_lon, _ in points[:5000] if geodesic((lat, lon), (r_lat, r_lon)).km <= 5.0]
+    elapsed = time.perf_counter() - started
+    print(f"geodesic по 5000 ресторанов: {elapsed * 1000:.1f} мс (найдено {len(nearby)})")
+
+
+if __name__ == "__main__":
+    main()
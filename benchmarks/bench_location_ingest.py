@@ -0,0 +1,135 @@
+"""
+Нагрузочный тест приема геопозиций курьеров: HTTP-пакеты -> буфер -> пакетная запись в БД
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_location_ingest
+"""
+
+import asyncio
+import random
+import tempfile
+import time
+from datetime import time as dtime
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api import couriers
+from app.core.database import Base, get_db
+from app.models import Courier, DeliveryTracking, Order, Restaurant, User
+from app.services.auth_service import AuthService
+from app.services.location_service import CourierLocationIngestor
+
+COURIERS = 500
+PINGS_PER_BATCH = 10  # Приложение курьера копит пинги и шлет пачкой
+DURATION_SECONDS = 10
+TARGET_PINGS_PER_SECOND = 5_000
+
+
+async def seed(session_factory):
+    """Курьеры и по одному активному заказу на каждого"""
+    async with session_factory() as db:
+        restaurant = Restaurant(
+            name="Bench", address="-", latitude=55.75, longitude=37.62,
+            work_start=dtime(0, 0), work_end=dtime(23, 59)
+        )
+        users = [User(telegram_id=10_000 + i, first_name=f"Курьер {i}") for i in range(COURIERS)]
+        db.add(restaurant)
+        db.add_all(users)
+        await db.flush()
+
+        courier_rows = [Courier(user_id=user.id) for user in users]
+        orders = [
+            Order(
+                order_number=f"BENCH-{i}", user_id=user.id, restaurant_id=restaurant.id, courier_id=user.id,
+                subtotal=100, total=100, delivery_address="-"
+            )
+            for i, user in enumerate(users)
+        ]
+        db.add_all(courier_rows + orders)
+        await db.commit()
+        auth = AuthService(db=None)
+        return [
+            (courier.id, order.id, auth.create_access_token(user.id))
+            for user, courier, order in zip(users, courier_rows, orders)
+        ]
+
+
+async def main():
+    workdir = Path(tempfile.mkdtemp())
+    engine = create_async_engine(f"sqlite+aiosqlite:///{workdir / 'bench.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    assignments = await seed(session_factory)
+
+    # Отдельный приемник с той же конфигурацией, что и глобальный
+    ingestor = CourierLocationIngestor()
+    couriers.courier_locations = ingestor
+    app = FastAPI()
+    app.include_router(couriers.router, prefix="/couriers")
+
+    async def session():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = session
+
+    rng = random.Random(7)
+    positions = {courier_id: [55.75 + rng.gauss(0, 0.05), 37.62 + rng.gauss(0, 0.08)] for courier_id, _, _ in assignments}
+
+    def make_batch():
+        courier_id, order_id, token = rng.choice(assignments)
+        position = positions[courier_id]
+        pings = []
+        for _ in range(PINGS_PER_BATCH):
+            position[0] += rng.gauss(0, 0.0003)
+            position[1] += rng.gauss(0, 0.0003)
+            pings.append({
+                "order_id": order_id,
+                "latitude": position[0],
+                "longitude": position[1],
+                "speed": 20.0,
+                "heading": 90.0
+            })
+        return {"pings": pings}, {"Authorization": f"Bearer {token}"}
+
+    ingestor.start(session_factory)
+    sent = 0
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Поток пингов с постоянной целевой частотой; запись в БД идет в том же event loop
+        while time.perf_counter() - started < DURATION_SECONDS:
+            batch, headers = make_batch()
+            response = await client.post("/couriers/locations", json=batch, headers=headers)
+            response.raise_for_status()
+            sent += PINGS_PER_BATCH
+
+            delay = started + sent / TARGET_PINGS_PER_SECOND - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    elapsed = time.perf_counter() - started
+    await ingestor.stop()
+
+    async with session_factory() as db:
+        stored = await db.scalar(select(func.count()).select_from(DeliveryTracking))
+
+    stats = ingestor.stats()
+    rate = sent / elapsed
+    print(f"Принято {sent} пингов за {elapsed:.1f} с: {rate:,.0f} пингов/с (цель {TARGET_PINGS_PER_SECOND:,})")
+    print(f"Записано в delivery_tracking: {stored}, потеряно: {stats['dropped']}, ошибок записи: {stats['flush_errors']}")
+    print(
+        f"Лаг записи: max={stats['max_flush_lag_seconds']} с, "
+        f"последняя запись пакета {stats['last_flush_seconds'] * 1000:.1f} мс"
+    )
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Бенчмарк отправки фото блюд: загрузка файла на каждый просмотр против
+MediaCache (file_id после первой отправки). Бот без сети: отправка
+ждет задержку Bot API, а загрузки файлов по очереди занимают общий
+канал UPLINK байт/с.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_media_cache
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from telegram import InputFile, PhotoSize
+
+from app.core.config import settings
+from app.services.media_cache import MediaCache, _read_file
+
+ITEMS = 50
+VIEWS = 1_000
+CONCURRENCY = 50
+IMAGE_SIZE = 200 * 1024
+UPLINK = 12.5 * 2 ** 20  # 100 Мбит/с
+API_LATENCY = 0.05
+
+
+class StubBot:
+    def __init__(self):
+        self.uploaded = 0
+        self.uplink = asyncio.Lock()
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if isinstance(photo, InputFile):
+            size = len(photo.input_file_content)
+            self.uploaded += size
+            async with self.uplink:
+                await asyncio.sleep(size / UPLINK)
+        await asyncio.sleep(API_LATENCY)
+        return SimpleNamespace(photo=[PhotoSize(f"file-{id(photo)}", f"u-{id(photo)}", 800, 800)])
+
+
+async def run(send):
+    started = time.perf_counter()
+    views = iter(range(VIEWS))
+
+    async def user():
+        for view in views:
+            await send(view, f"/uploads/item-{view % ITEMS}.jpg")
+
+    await asyncio.gather(*(user() for _ in range(CONCURRENCY)))
+    return time.perf_counter() - started
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        settings.UPLOAD_DIR = directory
+        for item in range(ITEMS):
+            with open(os.path.join(directory, f"item-{item}.jpg"), "wb") as file:
+                file.write(os.urandom(IMAGE_SIZE))
+
+        bot = StubBot()
+
+        async def upload_every_time(chat_id, url):
+            data = await asyncio.to_thread(_read_file, os.path.join(directory, os.path.basename(url)))
+            await bot.send_photo(chat_id, InputFile(data, filename="item.jpg"))
+
+        elapsed = await run(upload_every_time)
+        print(f"Загрузка на каждый просмотр: {VIEWS / elapsed:,.0f} фото/с, "
+              f"загружено {bot.uploaded / 2 ** 20:,.0f} МБ")
+
+        bot = StubBot()
+        cache = MediaCache()
+        elapsed = await run(lambda chat_id, url: cache.send_photo(bot, chat_id, url))
+        stats = cache.stats()
+        print(f"MediaCache: {VIEWS / elapsed:,.0f} фото/с, загружено {bot.uploaded / 2 ** 20:,.0f} МБ, "
+              f"загрузок {stats['uploads']}, по file_id {stats['hits']} (hit rate {stats['hit_rate']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
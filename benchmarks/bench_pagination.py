@@ -0,0 +1,92 @@
+"""
+Бенчмарк пагинации истории заказов: OFFSET против курсора на глубоких страницах
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_pagination
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+from datetime import time as dtime
+
+from sqlalchemy import insert
+
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import Order, Restaurant, User
+from app.services.order_service import OrderService
+
+ORDERS = 1_000_000
+USERS = 4
+CHUNK = 50_000
+PAGE = 20
+DEPTHS = (0, 1_000, 10_000, 100_000, 240_000)
+REPEATS = 5
+
+
+async def timed(fetch):
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        page = await fetch()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, page
+
+
+async def main():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        users = [User(telegram_id=i + 1, first_name=f"Bench {i}") for i in range(USERS)]
+        restaurant = Restaurant(
+            name="Bench", address="-", latitude=55.75, longitude=37.62,
+            work_start=dtime(9), work_end=dtime(23)
+        )
+        db.add_all(users + [restaurant])
+        await db.flush()
+        user_ids, restaurant_id = [user.id for user in users], restaurant.id
+
+        # Несколько заказов в секунду - много строк с одинаковым created_at
+        started_at = datetime(2023, 1, 1)
+        started = time.perf_counter()
+        for offset in range(0, ORDERS, CHUNK):
+            await db.execute(insert(Order), [
+                {
+                    "order_number": f"ORD-{i}",
+                    "user_id": user_ids[i % USERS],
+                    "restaurant_id": restaurant_id,
+                    "subtotal": 500.0,
+                    "total": 500.0,
+                    "delivery_address": "ул. Ленина, 25",
+                    "created_at": started_at + timedelta(seconds=i // 3)
+                }
+                for i in range(offset, offset + CHUNK)
+            ])
+        await db.commit()
+        print(f"Загружено {ORDERS} заказов за {time.perf_counter() - started:.1f} с")
+
+    user_id = user_ids[0]
+    print(f"{'глубина':>8} {'OFFSET, мс':>11} {'курсор, мс':>11}")
+
+    async with AsyncSessionLocal() as db:
+        service = OrderService(db)
+        for depth in DEPTHS:
+            offset_ms, offset_page = await timed(lambda: service.get_user_orders(user_id, depth, PAGE))
+
+            # Курсор на строку перед страницей - то, что клиент получил бы с предыдущей
+            previous = await service.get_user_orders(user_id, depth - 1, 1) if depth else []
+            cursor = service.order_cursor(previous[0]) if previous else None
+            cursor_ms, cursor_page = await timed(
+                lambda: service.get_user_orders(user_id, limit=PAGE, cursor=cursor)
+            )
+
+            assert [order.id for order in cursor_page] == [order.id for order in offset_page]
+            db.expunge_all()
+            print(f"{depth:>8} {offset_ms:>11.2f} {cursor_ms:>11.2f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
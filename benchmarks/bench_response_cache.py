@@ -0,0 +1,99 @@
+"""
+Бенчмарк кэша ответов каталога: список ресторанов и меню без кэша
+ответов и с ResponseCacheMiddleware. Половина клиентов перепроверяет
+сохраненный ответ через If-None-Match, как браузер WebApp.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_response_cache
+"""
+
+import asyncio
+import random
+import time
+from datetime import time as daytime
+
+import httpx
+from fastapi import FastAPI
+
+from app.api import restaurants
+from app.api.response_cache import ResponseCache, ResponseCacheMiddleware
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import MenuCategory, MenuItem, Restaurant
+
+RESTAURANTS = 50
+REQUESTS = 4_000
+CONNECTIONS = 20
+REVALIDATING = 0.5  # Доля запросов с If-None-Match
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        for number in range(RESTAURANTS):
+            restaurant = Restaurant(
+                name=f"Ресторан {number}", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+                work_start=daytime(0, 0), work_end=daytime(23, 59), rating=4 + number % 10 / 10
+            )
+            db.add(restaurant)
+            await db.flush()
+            for category_number in range(5):
+                category = MenuCategory(name=f"Категория {category_number}", restaurant_id=restaurant.id)
+                db.add(category)
+                await db.flush()
+                db.add_all([
+                    MenuItem(
+                        name=f"Блюдо {category_number}-{item}", description="Описание блюда " * 5,
+                        price=300 + item * 10, restaurant_id=restaurant.id, category_id=category.id
+                    )
+                    for item in range(8)
+                ])
+        await db.commit()
+
+
+async def run(app):
+    rng = random.Random(1)
+    paths = ["/restaurants/?limit=20"] + [f"/restaurants/{number + 1}/menu" for number in range(RESTAURANTS)]
+    etags = {}
+    received = 0
+    requests = iter(range(REQUESTS))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def connection():
+            nonlocal received
+            for _ in requests:
+                path = rng.choice(paths)
+                headers = {"If-None-Match": etags[path]} if path in etags and rng.random() < REVALIDATING else {}
+                response = await client.get(path, headers=headers)
+                assert response.status_code in (200, 304)
+                received += len(response.content)
+                if "etag" in response.headers:
+                    etags[path] = response.headers["etag"]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(connection() for _ in range(CONNECTIONS)))
+    return REQUESTS / (time.perf_counter() - started), received
+
+
+async def main():
+    await seed()
+
+    app = FastAPI()
+    app.include_router(restaurants.router, prefix="/restaurants")
+    rate, received = await run(app)
+    print(f"Без кэша ответов: {rate:,.0f} запросов/с, передано {received / 2 ** 20:,.1f} МБ")
+
+    cache = ResponseCache()
+    app = FastAPI()
+    app.include_router(restaurants.router, prefix="/restaurants")
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    rate, received = await run(app)
+    stats = cache.stats()
+    print(f"ResponseCacheMiddleware: {rate:,.0f} запросов/с, передано {received / 2 ** 20:,.1f} МБ, "
+          f"hit ratio {stats['hit_ratio']}, ответов 304 {stats['not_modified']}, "
+          f"сэкономлено {stats['bytes_saved'] / 2 ** 20:,.1f} МБ")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
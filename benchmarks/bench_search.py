@@ -0,0 +1,110 @@
+"""
+Бенчмарк поиска по блюдам: миллион позиций меню, запросы со словоформами и опечатками
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_search
+"""
+
+import time
+
+import numpy as np
+
+from app.services.search import SearchIndex
+
+SEED = 7
+ITEMS = 1_000_000
+RESTAURANTS = 20_000
+QUERIES = 2_000
+TARGET_P99_MS = 20
+
+DISHES = (
+    "пицца бургер ролл суп салат паста лапша шаурма пельмени вареники блины сэндвич "
+    "стейк плов хинкали хачапури донер тако буррито поке рамен фо омлет сырники котлета "
+    "шашлык курица лосось креветки тирамису чизкейк пирог эклер морс лимонад латте капучино"
+).split()
+ADJECTIVES = (
+    "острый сырный грибной куриный говяжий свиной овощной вегетарианский домашний "
+    "фирменный классический копченый жареный запеченный сливочный томатный сладкий "
+    "детский большой маленький двойной итальянский японский грузинский мексиканский"
+).split()
+INGREDIENTS = (
+    "грибами сыром беконом ветчиной курицей говядиной лососем креветками томатами "
+    "базиликом чесноком луком перцем ананасом моцареллой пармезаном шпинатом авокадо "
+    "огурцом картофелем рисом соусом сметаной медом орехами ягодами шоколадом"
+).split()
+NAMES = "Маргарита Пепперони Цезарь Филадельфия Калифорния Карбонара Болоньезе Греческий Оливье Борщ".split()
+
+
+def generate(rng):
+    dishes = rng.integers(0, len(DISHES), ITEMS)
+    adjectives = rng.integers(0, len(ADJECTIVES), ITEMS)
+    names = rng.integers(0, len(NAMES), ITEMS)
+    first = rng.integers(0, len(INGREDIENTS), ITEMS)
+    second = rng.integers(0, len(INGREDIENTS), ITEMS)
+    shape = rng.random(ITEMS)
+    restaurants = rng.integers(1, RESTAURANTS + 1, ITEMS)
+    popularity = rng.pareto(1.5, ITEMS)
+
+    for key in range(ITEMS):
+        if shape[key] < 0.3:
+            name = f"{DISHES[dishes[key]].capitalize()} {NAMES[names[key]]}"
+        else:
+            name = f"{ADJECTIVES[adjectives[key]].capitalize()} {DISHES[dishes[key]]}"
+        description = f"С {INGREDIENTS[first[key]]} и {INGREDIENTS[second[key]]}, порция {key % 7 + 2}00 г"
+        yield key + 1, int(restaurants[key]), name, description, float(popularity[key])
+
+
+def typo(word, rng):
+    """Одна случайная опечатка: замена, пропуск или перестановка букв"""
+    position = int(rng.integers(1, len(word) - 1))
+    kind = rng.integers(0, 3)
+    if kind == 0:
+        return word[:position] + "оаеи"[int(rng.integers(0, 4))] + word[position + 1:]
+    if kind == 1:
+        return word[:position] + word[position + 1:]
+    return word[:position - 1] + word[position] + word[position - 1] + word[position + 1:]
+
+
+def make_queries(rng):
+    queries = []
+    for _ in range(QUERIES):
+        kind = rng.integers(0, 5)
+        dish = DISHES[int(rng.integers(0, len(DISHES)))]
+        if kind == 0:
+            queries.append((dish, None))
+        elif kind == 1:
+            queries.append((typo(NAMES[int(rng.integers(0, len(NAMES)))].lower(), rng), None))
+        elif kind == 2:
+            queries.append((f"{dish} с {INGREDIENTS[int(rng.integers(0, len(INGREDIENTS)))]}", None))
+        elif kind == 3:
+            queries.append((f"{ADJECTIVES[int(rng.integers(0, len(ADJECTIVES)))]} {dish[:4]}", None))
+        else:
+            queries.append((dish, int(rng.integers(1, RESTAURANTS + 1))))
+    return queries
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    index = SearchIndex()
+
+    started = time.perf_counter()
+    index.load(generate(rng))
+    print(f"Индекс {ITEMS} блюд построен за {time.perf_counter() - started:.1f} с")
+
+    # Изменения после загрузки живут в сегменте изменений
+    for key in range(1, 1_001):
+        index.upsert(key, 1, "Пицца Четыре сыра", "С моцареллой, пармезаном и горгонзолой", 1.0)
+
+    timings = []
+    for query, group in make_queries(rng):
+        started = time.perf_counter()
+        index.search(query, limit=20, group=group)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+    print(f"Запросов: {QUERIES}, p50={p50:.2f} мс, p99={p99:.2f} мс, max={timings[-1]:.2f} мс")
+    print("Цель p99 <", TARGET_P99_MS, "мс:", "выполнена" if p99 < TARGET_P99_MS else "НЕ выполнена")
+
+
+if __name__ == "__main__":
+    main()
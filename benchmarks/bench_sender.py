@@ -0,0 +1,115 @@
+"""
+Бенчмарк планировщика отправки (app/bot/sender.py) через настоящий ExtBot с
+подмененным HTTP-запросом: накладные расходы очереди и всплеск правок
+статусов заказов - без планировщика каждая правка уходит в Telegram сразу,
+с ним сообщения идут в пределах 30/с, а ждущие правки сливаются.
+
+Запуск: python -m benchmarks.bench_sender
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+
+from telegram.ext import ExtBot
+from telegram.request import BaseRequest
+
+from app.bot.sender import SendScheduler
+
+MESSAGES = 5_000
+CHATS = 90
+EDITS_PER_CHAT = 5
+LATENCY = 0.05
+
+
+class StubRequest(BaseRequest):
+    """Запрос к Bot API без сети с задержкой ответа; считает запросы по секундам"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.per_second = Counter()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        self.per_second[int(time.monotonic())] += 1
+        if url.endswith("/getMe"):
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        else:
+            params = request_data.parameters
+            result = {"message_id": 1, "date": 0, "chat": {"id": params["chat_id"], "type": "private"}, "text": "ok"}
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+async def make_bot(request, scheduler=None):
+    bot = ExtBot("123456:BENCH", request=request, get_updates_request=request, rate_limiter=scheduler)
+    await bot.initialize()
+    return bot
+
+
+async def overhead():
+    direct_request = StubRequest()
+    direct = await make_bot(direct_request)
+    started = time.perf_counter()
+    for i in range(MESSAGES):
+        await direct.send_message(i, "Заказ принят")
+    direct_rate = MESSAGES / (time.perf_counter() - started)
+
+    scheduler = SendScheduler(global_rate=1e9, global_burst=1e9, chat_rate=1e9)
+    queued = await make_bot(StubRequest(), scheduler)
+    started = time.perf_counter()
+    for i in range(MESSAGES):
+        await queued.send_message(i, "Заказ принят")
+    queued_rate = MESSAGES / (time.perf_counter() - started)
+    await queued.shutdown()
+
+    print(f"Напрямую: {direct_rate:,.0f} сообщений/с, через планировщик: {queued_rate:,.0f} сообщений/с")
+
+
+async def status_burst(scheduler):
+    request = StubRequest(LATENCY)
+    bot = await make_bot(request, scheduler)
+    request.requests = 0
+    request.per_second.clear()
+
+    async def chat_flow(chat_id):
+        # Каждое обновление статуса правит одно и то же сообщение заказа
+        await asyncio.gather(*(
+            bot.edit_message_text(f"Статус {step}", chat_id=chat_id, message_id=1)
+            for step in range(EDITS_PER_CHAT)
+        ))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat_flow(chat_id) for chat_id in range(CHATS)))
+    elapsed = time.perf_counter() - started
+    await bot.shutdown()
+    return request, elapsed
+
+
+async def main():
+    await overhead()
+
+    request, elapsed = await status_burst(None)
+    print(f"Всплеск правок без планировщика: {request.requests} запросов за {elapsed:.2f} с, "
+          f"пик {max(request.per_second.values())} запросов/с (лимит Telegram - 30/с)")
+
+    scheduler = SendScheduler()
+    request, elapsed = await status_burst(scheduler)
+    stats = scheduler.stats()
+    print(f"Всплеск правок с планировщиком: {request.requests} запросов за {elapsed:.2f} с, "
+          f"пик {max(request.per_second.values())} запросов/с, слито правок: {stats['coalesced']}")
+    print(f"Задержка доставки: p50 {stats['latency_p50_ms']} мс, p95 {stats['latency_p95_ms']} мс, "
+          f"максимум {stats['latency_max_ms']} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Бенчмарк проверки initData Telegram WebApp: прежний алгоритм, валидатор
+без кэша и с кэшем; цель - 50 тыс. проверок в секунду
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_telegram_auth
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from app.services.telegram_auth import TelegramAuthValidator
+
+BOT_TOKEN = "123456:BENCH-TOKEN"
+USERS = 2_000
+VALIDATIONS = 200_000
+TARGET_PER_SECOND = 50_000
+
+
+def make_init_data(user_id, auth_date):
+    fields = {
+        "query_id": f"AAH{user_id:08d}",
+        "user": json.dumps({
+            "id": user_id, "first_name": "Иван", "last_name": "Петров",
+            "username": f"user{user_id}", "language_code": "ru", "allows_write_to_pm": True
+        }, ensure_ascii=False),
+        "auth_date": str(auth_date)
+    }
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    return urlencode({**fields, "hash": hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()})
+
+
+def naive_validate(init_data):
+    """Прежний подход: ключ заново на каждый вызов, словарь, pop и сортировка"""
+    data = dict(parse_qsl(init_data))
+    received_hash = data.pop("hash", "")
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(data.items()))
+    secret = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    calculated = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(calculated, received_hash):
+        return None
+    data["user"] = json.loads(data["user"])
+    return data
+
+
+def throughput(validate, payloads):
+    started = time.perf_counter()
+    for number in range(VALIDATIONS):
+        assert validate(payloads[number % len(payloads)]) is not None
+    return VALIDATIONS / (time.perf_counter() - started)
+
+
+def main():
+    now = int(time.time())
+    payloads = [make_init_data(user_id, now) for user_id in range(1, USERS + 1)]
+
+    results = [
+        ("Прежний алгоритм", throughput(naive_validate, payloads)),
+        ("Валидатор без кэша", throughput(TelegramAuthValidator(BOT_TOKEN, cache_size=0).validate_init_data, payloads)),
+        ("Валидатор с кэшем", throughput(TelegramAuthValidator(BOT_TOKEN).validate_init_data, payloads))
+    ]
+    for name, per_second in results:
+        print(f"{name}: {per_second:,.0f} проверок/с")
+
+    # Цель должна выполняться и без кэша - на потоке новых initData
+    print("Цель", f"{TARGET_PER_SECOND:,}", "проверок/с без кэша:", "выполнена" if results[1][1] >= TARGET_PER_SECOND else "НЕ выполнена")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+﻿"""
+Нагрузочный тест push-отслеживания: 10k одновременных SSE-подписчиков в одном процессе
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_tracking_push
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from app.api.orders import tracking_event_stream
+from app.services.tracking_hub import tracking_hub
+
+SUBSCRIBERS = 10_000
+ORDERS = 2_000
+ROUNDS = 20
+
+
+async def consume(subscription, expected, done):
+    """Клиент: читает поток SSE до получения всех обновлений"""
+    received = 0
+    stream = tracking_event_stream(subscription)
+    async for frame in stream:
+        if '"type": "diff"' in frame or '"type": "snapshot"' in frame:
+            received += 1
+        if received > expected:
+            break
+    await stream.aclose()
+    done.append(received)
+
+
+async def main():
+    snapshots = {
+        order_id: {"order_id": order_id, "status": "pending", "courier": None}
+        for order_id in range(1, ORDERS + 1)
+    }
+
+    done = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    subscriptions = [
+        tracking_hub.subscribe(order_id, snapshots[order_id])
+        for order_id in range(1, ORDERS + 1)
+        for _ in range(SUBSCRIBERS // ORDERS)
+    ]
+    consumers = [asyncio.create_task(consume(s, ROUNDS, done)) for s in subscriptions]
+    await asyncio.sleep(0)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Подписка {len(subscriptions)} клиентов: {(time.perf_counter() - started) * 1000:.0f} мс, "
+          f"{memory / SUBSCRIBERS:.0f} байт на подписчика")
+
+    publish_time = 0.0
+    started = time.perf_counter()
+    for round_number in range(ROUNDS):
+        round_started = time.perf_counter()
+        for order_id in range(1, ORDERS + 1):
+            tracking_hub.publish(order_id, {"courier": {"lat": 55.75 + round_number * 1e-4, "lng": 37.62}})
+        publish_time += time.perf_counter() - round_started
+        # Даем клиентам вычитать очереди, как это происходит между пингами курьеров
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+
+    stats = tracking_hub.stats()
+    messages = sum(done)
+
+    print(f"Доставлено сообщений: {messages} за {elapsed:.2f} с ({messages / elapsed:,.0f} сообщений/с)")
+    print(f"Публикация {ORDERS * ROUNDS} обновлений: {publish_time * 1000:.0f} мс "
+          f"({publish_time / (ORDERS * ROUNDS) * 1e6:.1f} мкс на заказ с {SUBSCRIBERS // ORDERS} подписчиками)")
+    print(f"Пересинхронизаций медленных клиентов: {stats['resyncs']}")
+
+    assert all(received == ROUNDS + 1 for received in done), "клиенты получили не все обновления"
+    assert tracking_hub.stats()["subscribers"] == 0
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Бенчмарк загрузки фото блюд: подготовка вариантов прямо в цикле событий
+против ImagePipeline (пул процессов). Меряется время обработки, задержка
+цикла событий (ее почувствуют все остальные запросы) и размер фото,
+которое WebApp скачивает вместо исходника.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_uploads
+"""
+
+import asyncio
+import io
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.core.config import settings
+from app.services.images import make_variants
+from app.services.uploads import ImagePipeline
+
+PHOTOS = 16
+CONCURRENCY = 4
+SIZE = (3000, 2000)
+
+
+def photo(seed):
+    """Похожая на фотографию картинка: пятна, размытие и шум, JPEG 90"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", SIZE, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(SIZE[0]), rng.randrange(SIZE[1])
+        radius = rng.randrange(50, 400)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    image = image.filter(ImageFilter.GaussianBlur(8))
+    noise = Image.effect_noise(SIZE, 24).convert("RGB")
+    image = Image.blend(image, noise, 0.15)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def chunks(data, size=64 * 1024):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+async def measure(upload, photos):
+    """Время обработки всех фото и наибольшая задержка цикла событий"""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+
+    ticks = asyncio.create_task(ticker())
+    queue = iter(photos)
+
+    async def worker():
+        for data in queue:
+            await upload(data)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+    done = True
+    await ticks
+    return elapsed, lag
+
+
+async def main():
+    photos = [photo(seed) for seed in range(PHOTOS)]
+    with tempfile.TemporaryDirectory() as directory:
+        settings.UPLOAD_DIR = directory
+        source = os.path.join(directory, "source.jpg")
+
+        async def inline(data):
+            async for _ in chunks(data):
+                await asyncio.sleep(0)  # Прием тела запроса
+            with open(source, "wb") as file:
+                file.write(data)
+            make_variants(source, os.path.join(directory, "images"))
+
+        elapsed, lag = await measure(inline, photos)
+        print(f"В цикле событий: {PHOTOS / elapsed:.1f} фото/с, задержка цикла до {lag * 1000:,.0f} мс")
+
+        pipeline = ImagePipeline(workers=CONCURRENCY, max_size=settings.MAX_FILE_SIZE)
+        pipeline.start()
+        await pipeline.process(chunks(photos[0]))  # Запуск процессов пула
+        variants = {}
+
+        async def pooled(data):
+            variants.update(await pipeline.process(chunks(data), len(data)))
+
+        elapsed, lag = await measure(pooled, photos)
+        await pipeline.stop()
+        print(f"ImagePipeline: {PHOTOS / elapsed:.1f} фото/с, задержка цикла до {lag * 1000:,.0f} мс")
+
+        def size(url):
+            return os.path.getsize(os.path.join(directory, url[len("/uploads/"):])) / 1024
+
+        print(f"Исходник {len(photos[-1]) / 1024:,.0f} КБ; medium WebP {size(variants['medium']['webp']):,.0f} КБ, "
+              f"JPEG {size(variants['medium']['jpg']):,.0f} КБ; thumb WebP {size(variants['thumb']['webp']):,.1f} КБ")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+"""
+Бенчмарк приема обновлений через /webhook: обновлений в секунду, время
+ответа Telegram и перцентили обработчика. Для сравнения - обработка прямо
+в запросе webhook (ответ Telegram только после обработчика). Telegram
+держит до 40 одновременных соединений webhook - столько же клиентов здесь.
+
+Запуск: DATABASE_URL=sqlite+aiosqlite:///:memory: python -m benchmarks.bench_webhook
+"""
+
+import asyncio
+import random
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from telegram import Update
+
+from app.bot import webhook
+from app.bot.webhook import UpdateDispatcher, router
+from app.core.config import settings
+
+UPDATES = 5_000
+CHATS = 500
+CONNECTIONS = 40
+HANDLER_LATENCY = (0.02, 0.1)  # Обработчик ждет БД и ответ Bot API, секунды
+
+
+def message_update(update_id):
+    chat_id = update_id % CHATS + 1
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Иван"},
+            "text": "/start"
+        }
+    }
+
+
+async def handler(update):
+    await asyncio.sleep(random.uniform(*HANDLER_LATENCY))
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)] * 1000
+
+
+async def post_all(app, headers):
+    """Отправить все обновления CONNECTIONS клиентами; время ответа на каждое"""
+    acks = []
+    updates = iter(range(UPDATES))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def connection():
+            for update_id in updates:
+                started = time.perf_counter()
+                response = await client.post("/webhook", json=message_update(update_id), headers=headers)
+                assert response.status_code == 200
+                acks.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(connection() for _ in range(CONNECTIONS)))
+    return acks
+
+
+async def inline():
+    app = FastAPI()
+
+    @app.post("/webhook")
+    async def process_in_request(request: Request):
+        await handler(Update.de_json(await request.json(), None))
+        return {}
+
+    started = time.perf_counter()
+    acks = await post_all(app, {})
+    return UPDATES / (time.perf_counter() - started), acks
+
+
+async def dispatched():
+    dispatcher = UpdateDispatcher(workers=settings.WEBHOOK_WORKERS, max_pending=settings.WEBHOOK_QUEUE_SIZE)
+    webhook.update_dispatcher = dispatcher
+    app = FastAPI()
+    app.include_router(router)
+
+    dispatcher.start(handler)
+    started = time.perf_counter()
+    acks = await post_all(app, {"X-Telegram-Bot-Api-Secret-Token": dispatcher.secret})
+    await dispatcher.stop()
+    return UPDATES / (time.perf_counter() - started), acks, dispatcher.stats()
+
+
+async def main():
+    rate, acks = await inline()
+    print(f"Обработка в запросе: {rate:,.0f} обновлений/с, ответ Telegram p50 {percentile(acks, 0.5):.1f} мс, "
+          f"p99 {percentile(acks, 0.99):.1f} мс")
+
+    rate, acks, stats = await dispatched()
+    print(f"Очередь и пул: {rate:,.0f} обновлений/с, ответ Telegram p50 {percentile(acks, 0.5):.1f} мс, "
+          f"p99 {percentile(acks, 0.99):.1f} мс")
+    print(f"Обработчик: p50 {stats['handler_p50_ms']} мс, p95 {stats['handler_p95_ms']} мс, "
+          f"p99 {stats['handler_p99_ms']} мс; ожидание в очереди p95 {stats['queue_p95_ms']} мс; "
+          f"отклонено {stats['rejected']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
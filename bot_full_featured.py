@@ -5,6 +5,10 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 from telegram.constants import ParseMode
 
+from app.bot.sender import SendScheduler
+from app.core.database import AsyncSessionLocal
+from app.services.cart import cart_service
+
 # Настройка логирования
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -48,19 +52,12 @@ RESTAURANTS = {
     }
 }
 
-# Корзины пользователей
-user_carts = {}
-
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"Получена команда /start от пользователя {update.effective_user.id}")
     
     user = update.effective_user
     user_id = user.id
     
-    # Инициализируем корзину пользователя
-    if user_id not in user_carts:
-        user_carts[user_id] = []
-    
     keyboard = [
         [InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list")],
         [InlineKeyboardButton("🛒 Корзина", callback_data="cart_view")],
@@ -161,7 +158,6 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def add_to_cart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer("Добавлено в корзину! 🛒")
     
     user_id = query.from_user.id
     data_parts = query.data.split("_")  # add_pizza_0
@@ -172,14 +168,16 @@ async def add_to_cart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     item = restaurant['menu'][item_index]
     
     # Добавляем в корзину
-    if user_id not in user_carts:
-        user_carts[user_id] = []
+    try:
+        await cart_service.add_item(
+            user_id, f"{restaurant_type}_{item_index}", item['name'], item['price'],
+            restaurant=restaurant['name']
+        )
+    except ValueError:
+        await query.answer("Корзина заполнена", show_alert=True)
+        return
     
-    user_carts[user_id].append({
-        "restaurant": restaurant['name'],
-        "name": item['name'],
-        "price": item['price']
-    })
+    await query.answer("Добавлено в корзину! 🛒")
     
     logger.info(f"Пользователь {user_id} добавил в корзину: {item['name']}")
 
@@ -188,7 +186,7 @@ async def cart_view_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    cart = user_carts.get(user_id, [])
+    cart = await cart_service.get(user_id)
     
     if not cart:
         cart_text = """🛒 *Ваша корзина пуста*
@@ -200,13 +198,11 @@ async def cart_view_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     else:
         cart_text = "🛒 *Ваша корзина:*\n\n"
-        total = 0
         
-        for item in cart:
-            cart_text += f"• {item['name']} - {item['price']}₽\n  _{item['restaurant']}_\n\n"
-            total += item['price']
+        for item_id, line in cart:
+            cart_text += f"• {line.name} × {line.quantity} - {line.total:.0f}₽\n  _{line.restaurant}_\n\n"
         
-        cart_text += f"💰 **Итого: {total}₽**"
+        cart_text += f"💰 **Итого: {cart.total:.0f}₽**"
         
         keyboard = [
             [InlineKeyboardButton("✅ Оформить заказ", callback_data="checkout")],
@@ -228,7 +224,7 @@ async def cart_clear_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer("Корзина очищена! 🗑️")
     
     user_id = query.from_user.id
-    user_carts[user_id] = []
+    await cart_service.clear(user_id)
     
     await cart_view_handler(update, context)
 
@@ -237,17 +233,14 @@ async def checkout_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    cart = user_carts.get(user_id, [])
+    cart = await cart_service.checkout(user_id)
     
     if not cart:
         await query.edit_message_text("❌ Корзина пуста!")
         return
     
-    total = sum(item['price'] for item in cart)
-    order_id = f"#{user_id}{len(cart)}{total}"
-    
-    # Очищаем корзину после заказа
-    user_carts[user_id] = []
+    total = f"{cart.total:.0f}"
+    order_id = f"#{user_id}{cart.count}{total}"
     
     order_text = f"""✅ *Заказ оформлен!*
 
@@ -375,11 +368,26 @@ async def back_to_main_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=reply_markup
     )
 
+async def post_init(application: Application):
+    # Корзины читаются из БД и записываются в нее в фоне (CART_BACKEND=database)
+    cart_service.start(AsyncSessionLocal)
+
+async def post_shutdown(application: Application):
+    # Досохраняем корзины и закрываем соединение с Redis
+    await cart_service.stop()
+
 def main():
     print("🤖 Запуск полнофункционального Telegram бота @FoodDeliveryV8_Bot...")
     logger.info("Инициализация бота")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(SendScheduler())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Основные обработчики
     application.add_handler(CommandHandler("start", start_handler))
@@ -1,9 +1,13 @@
 ﻿import asyncio
 import logging
 import os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
-from telegram.constants import ParseMode
+
+from app.bot.render import PARSE_MODE, Template, View, keyboard, render_stats
+from app.bot.sender import SendScheduler
+from app.core.database import AsyncSessionLocal
+from app.services.cart import cart_service
 
 # Настройка логирования
 logging.basicConfig(
@@ -51,27 +55,17 @@ RESTAURANTS = {
     }
 }
 
-# Корзины пользователей (в продакшне будет база данных)
-user_carts = {}
+# Клавиатуры и сообщения без данных пользователя готовятся один раз при запуске
+MAIN_KEYBOARD = keyboard(
+    [("🏪 Рестораны", "restaurants_list")],
+    [("🛒 Корзина", "cart_view")],
+    [("📋 Мои заказы", "orders_list")],
+    [("ℹ️ Помощь", "help")]
+)
 
-async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user
-    user_id = user.id
-    
-    if user_id not in user_carts:
-        user_carts[user_id] = []
-    
-    keyboard = [
-        [InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list")],
-        [InlineKeyboardButton("🛒 Корзина", callback_data="cart_view")],
-        [InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")],
-        [InlineKeyboardButton("ℹ️ Помощь", callback_data="help")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = f"""🍕 *Добро пожаловать в FoodDelivery Bot!*
+WELCOME_TEMPLATE = Template("""🍕 *Добро пожаловать в FoodDelivery Bot!*
 
-Привет, {user.first_name}! 👋
+Привет, {first_name}! 👋
 
 Я помогу тебе заказать вкусную еду из лучших ресторанов города.
 
@@ -81,82 +75,191 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • 📋 Оформлять заказы
 • 📍 Отслеживать доставку
 
-Выберите действие из меню ниже! 👇"""
+Выберите действие из меню ниже! 👇""")
 
-    await update.message.reply_text(
-        welcome_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+MAIN_TEMPLATE = Template("""🍕 *FoodDelivery Bot*
 
-async def restaurants_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    restaurants_text = """🏪 *Доступные рестораны:*
+Привет, {first_name}! 👋
+
+Выберите действие из меню ниже:""")
+
+RESTAURANTS_VIEW = View(
+    Template("""🏪 *Доступные рестораны:*
 
-🍕 **Pizza Palace**
+🍕 *Pizza Palace*
 ⭐ 4.8 • 🚚 25-35 мин • 💰 от 500₽
 
-🍔 **Burger King**
+🍔 *Burger King*
 ⭐ 4.5 • 🚚 20-30 мин • 💰 от 300₽
 
-🍜 **Суши Мастер**
+🍜 *Суши Мастер*
 ⭐ 4.9 • 🚚 30-40 мин • 💰 от 800₽
 
-Выберите ресторан для просмотра меню:"""
+Выберите ресторан для просмотра меню:""").render(),
+    keyboard(
+        [("🍕 Pizza Palace", "menu_pizza")],
+        [("🍔 Burger King", "menu_burger")],
+        [("🍜 Суши Мастер", "menu_sushi")],
+        [("🔙 Назад", "back_to_main")]
+    )
+)
+
+MENU_HEADER_TEMPLATE = Template("""🍽️ *Меню {name}*
+
+{info}
 
-    keyboard = [
-        [InlineKeyboardButton("🍕 Pizza Palace", callback_data="menu_pizza")],
-        [InlineKeyboardButton("🍔 Burger King", callback_data="menu_burger")],
-        [InlineKeyboardButton("🍜 Суши Мастер", callback_data="menu_sushi")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
+📋 *Доступные блюда:*
+
+""")
+MENU_ITEM_TEMPLATE = Template("*{name}* - {price}₽\n_{desc}_\n\n")
+
+def build_menu_view(restaurant_type):
+    restaurant = RESTAURANTS[restaurant_type]
+    text = MENU_HEADER_TEMPLATE.render(name=restaurant['name'], info=restaurant['info'])
+    text += "".join(MENU_ITEM_TEMPLATE.render(**item) for item in restaurant['menu'])
+    
+    buttons = [
+        [(f"➕ {item['name']} ({item['price']}₽)", f"add_{restaurant_type}_{i}")]
+        for i, item in enumerate(restaurant['menu'])
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    buttons.append([("🛒 Корзина", "cart_view")])
+    buttons.append([("🔙 К ресторанам", "restaurants_list")])
     
-    await query.edit_message_text(
-        restaurants_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
+    return View(text, keyboard(*buttons))
+
+MENU_VIEWS = {restaurant_type: build_menu_view(restaurant_type) for restaurant_type in RESTAURANTS}
+
+CART_EMPTY_VIEW = View(
+    Template("""🛒 *Ваша корзина пуста*
+
+Добавьте блюда из меню ресторанов!""").render(),
+    keyboard(
+        [("🏪 К ресторанам", "restaurants_list")],
+        [("🔙 Главное меню", "back_to_main")]
     )
+)
+CART_KEYBOARD = keyboard(
+    [("✅ Оформить заказ", "checkout")],
+    [("🗑️ Очистить корзину", "cart_clear")],
+    [("🏪 Добавить еще", "restaurants_list")],
+    [("🔙 Главное меню", "back_to_main")]
+)
+CART_HEADER = Template("🛒 *Ваша корзина:*\n\n").render()
+CART_LINE_TEMPLATE = Template("• {name} × {quantity} - {total:.0f}₽\n  _{restaurant}_\n\n")
+CART_TOTAL_TEMPLATE = Template("💰 *Итого: {total:.0f}₽*")
 
-async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    
-    restaurant_type = query.data.split("_")[1]
-    restaurant = RESTAURANTS[restaurant_type]
-    
-    menu_text = f"""🍽️ *Меню {restaurant['name']}*
+CHECKOUT_EMPTY_TEXT = Template("❌ Корзина пуста!").render()
+CHECKOUT_TEMPLATE = Template("""✅ *Заказ оформлен!*
 
-{restaurant['info']}
+🆔 Номер заказа: {order_id}
+💰 Сумма: {total:.0f}₽
+⏰ Время доставки: 30-45 мин
 
-📋 *Доступные блюда:*
+📍 *Укажите адрес доставки* в следующем сообщении.
+
+Спасибо за заказ! 🍕""")
+CHECKOUT_KEYBOARD = keyboard(
+    [("📋 Мои заказы", "orders_list")],
+    [("🏪 Заказать еще", "restaurants_list")],
+    [("🔙 Главное меню", "back_to_main")]
+)
+
+ORDERS_VIEW = View(
+    Template("""📋 *Мои заказы:*
+
+🟢 *Заказ #1234* - _Доставляется_
+🍕 Pizza Margherita x2
+📍 ул. Пушкина, 10
+⏰ Ожидаемое время: 15 мин
 
-"""
+✅ *Заказ #1232* - _Доставлен_
+🍜 Суши сет "Филадельфия"
+📍 пр. Мира, 15
+⏰ Доставлен вчера в 19:30""").render(),
+    keyboard(
+        [("📍 Отследить заказ #1234", "track_1234")],
+        [("🏪 Новый заказ", "restaurants_list")],
+        [("🔙 Назад", "back_to_main")]
+    )
+)
+
+HELP_VIEW = View(
+    Template("""ℹ️ *Помощь по использованию бота*
+
+🤖 *Как сделать заказ:*
+
+1️⃣ *Выберите ресторан*
+   • Нажмите "🏪 Рестораны"
+   • Выберите понравившийся ресторан
+
+2️⃣ *Добавьте блюда*
+   • Просмотрите меню
+   • Нажмите "➕" рядом с блюдом
+
+3️⃣ *Оформите заказ*
+   • Перейдите в "🛒 Корзину"
+   • Нажмите "✅ Оформить заказ"
+
+📞 *Поддержка:* @support\\_bot""").render(),
+    keyboard([("🔙 Главное меню", "back_to_main")])
+)
+
+@render_stats.timed("start")
+def render_start(first_name):
+    return View(WELCOME_TEMPLATE.render(first_name=first_name), MAIN_KEYBOARD)
+
+@render_stats.timed("back_to_main")
+def render_main(first_name):
+    return View(MAIN_TEMPLATE.render(first_name=first_name), MAIN_KEYBOARD)
+
+@render_stats.timed("cart_view")
+def render_cart(cart):
+    if not cart:
+        return CART_EMPTY_VIEW
     
-    keyboard = []
-    for i, item in enumerate(restaurant['menu']):
-        menu_text += f"**{item['name']}** - {item['price']}₽\n_{item['desc']}_\n\n"
-        keyboard.append([InlineKeyboardButton(
-            f"➕ {item['name']} ({item['price']}₽)", 
-            callback_data=f"add_{restaurant_type}_{i}"
-        )])
+    # Итоги корзина хранит готовыми, позиции только подставляются в шаблон
+    text = CART_HEADER + "".join(
+        CART_LINE_TEMPLATE.render(name=line.name, quantity=line.quantity, total=line.total, restaurant=line.restaurant)
+        for item_id, line in cart
+    )
+    return View(text + CART_TOTAL_TEMPLATE.render(total=cart.total), CART_KEYBOARD)
+
+@render_stats.timed("checkout")
+def render_checkout(user_id, cart):
+    order_id = f"#{user_id}{cart.count}{cart.total:.0f}"
+    return View(CHECKOUT_TEMPLATE.render(order_id=order_id, total=cart.total), CHECKOUT_KEYBOARD)
+
+async def send_view(query, view):
+    await query.edit_message_text(
+        view.text, 
+        parse_mode=PARSE_MODE, 
+        reply_markup=view.reply_markup
+    )
+
+async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    view = render_start(update.effective_user.first_name)
     
-    keyboard.append([InlineKeyboardButton("🛒 Корзина", callback_data="cart_view")])
-    keyboard.append([InlineKeyboardButton("🔙 К ресторанам", callback_data="restaurants_list")])
+    await update.message.reply_text(
+        view.text, 
+        parse_mode=PARSE_MODE, 
+        reply_markup=view.reply_markup
+    )
+
+async def restaurants_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    await send_view(query, RESTAURANTS_VIEW)
+
+async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
     
-    await query.edit_message_text(
-        menu_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+    restaurant_type = query.data.split("_")[1]
+    await send_view(query, MENU_VIEWS[restaurant_type])
 
 async def add_to_cart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer("Добавлено в корзину! 🛒")
     
     user_id = query.from_user.id
     data_parts = query.data.split("_")
@@ -166,184 +269,83 @@ async def add_to_cart_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     restaurant = RESTAURANTS[restaurant_type]
     item = restaurant['menu'][item_index]
     
-    if user_id not in user_carts:
-        user_carts[user_id] = []
+    try:
+        await cart_service.add_item(
+            user_id, f"{restaurant_type}_{item_index}", item['name'], item['price'],
+            restaurant=restaurant['name']
+        )
+    except ValueError:
+        await query.answer("Корзина заполнена", show_alert=True)
+        return
     
-    user_carts[user_id].append({
-        "restaurant": restaurant['name'],
-        "name": item['name'],
-        "price": item['price']
-    })
+    await query.answer("Добавлено в корзину! 🛒")
 
 async def cart_view_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    user_id = query.from_user.id
-    cart = user_carts.get(user_id, [])
-    
-    if not cart:
-        cart_text = """🛒 *Ваша корзина пуста*
+    cart = await cart_service.get(query.from_user.id)
+    await send_view(query, render_cart(cart))
 
-Добавьте блюда из меню ресторанов!"""
-        keyboard = [
-            [InlineKeyboardButton("🏪 К ресторанам", callback_data="restaurants_list")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_main")]
-        ]
-    else:
-        cart_text = "🛒 *Ваша корзина:*\n\n"
-        total = 0
-        
-        for item in cart:
-            cart_text += f"• {item['name']} - {item['price']}₽\n  _{item['restaurant']}_\n\n"
-            total += item['price']
-        
-        cart_text += f"💰 **Итого: {total}₽**"
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Оформить заказ", callback_data="checkout")],
-            [InlineKeyboardButton("🗑️ Очистить корзину", callback_data="cart_clear")],
-            [InlineKeyboardButton("🏪 Добавить еще", callback_data="restaurants_list")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_main")]
-        ]
+async def cart_clear_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer("Корзина очищена! 🗑️")
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    user_id = query.from_user.id
+    await cart_service.clear(user_id)
     
-    await query.edit_message_text(
-        cart_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+    await send_view(query, CART_EMPTY_VIEW)
 
 async def checkout_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     user_id = query.from_user.id
-    cart = user_carts.get(user_id, [])
+    cart = await cart_service.checkout(user_id)
     
     if not cart:
-        await query.edit_message_text("❌ Корзина пуста!")
+        await query.edit_message_text(CHECKOUT_EMPTY_TEXT, parse_mode=PARSE_MODE)
         return
     
-    total = sum(item['price'] for item in cart)
-    order_id = f"#{user_id}{len(cart)}{total}"
-    
-    user_carts[user_id] = []
-    
-    order_text = f"""✅ *Заказ оформлен!*
-
-🆔 Номер заказа: {order_id}
-💰 Сумма: {total}₽
-⏰ Время доставки: 30-45 мин
-
-📍 *Укажите адрес доставки* в следующем сообщении.
-
-Спасибо за заказ! 🍕"""
-
-    keyboard = [
-        [InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")],
-        [InlineKeyboardButton("🏪 Заказать еще", callback_data="restaurants_list")],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        order_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+    await send_view(query, render_checkout(user_id, cart))
 
 async def orders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    orders_text = """📋 *Мои заказы:*
-
-🟢 **Заказ #1234** - *Доставляется*
-🍕 Pizza Margherita x2
-📍 ул. Пушкина, 10
-⏰ Ожидаемое время: 15 мин
-
-✅ **Заказ #1232** - *Доставлен*
-🍜 Суши сет "Филадельфия"
-📍 пр. Мира, 15
-⏰ Доставлен вчера в 19:30"""
-
-    keyboard = [
-        [InlineKeyboardButton("📍 Отследить заказ #1234", callback_data="track_1234")],
-        [InlineKeyboardButton("🏪 Новый заказ", callback_data="restaurants_list")],
-        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        orders_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+    await send_view(query, ORDERS_VIEW)
 
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    help_text = """ℹ️ *Помощь по использованию бота*
-
-🤖 **Как сделать заказ:**
-
-1️⃣ **Выберите ресторан**
-   • Нажмите "🏪 Рестораны"
-   • Выберите понравившийся ресторан
-
-2️⃣ **Добавьте блюда**
-   • Просмотрите меню
-   • Нажмите "➕" рядом с блюдом
-
-3️⃣ **Оформите заказ**
-   • Перейдите в "🛒 Корзину"
-   • Нажмите "✅ Оформить заказ"
-
-📞 **Поддержка:** @support_bot"""
-
-    keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_main")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
-        help_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+    await send_view(query, HELP_VIEW)
 
 async def back_to_main_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    user = query.from_user
-    
-    keyboard = [
-        [InlineKeyboardButton("🏪 Рестораны", callback_data="restaurants_list")],
-        [InlineKeyboardButton("🛒 Корзина", callback_data="cart_view")],
-        [InlineKeyboardButton("📋 Мои заказы", callback_data="orders_list")],
-        [InlineKeyboardButton("ℹ️ Помощь", callback_data="help")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = f"""🍕 *FoodDelivery Bot*
+    await send_view(query, render_main(query.from_user.first_name))
 
-Привет, {user.first_name}! 👋
+async def post_init(application: Application):
+    # Корзины читаются из БД и записываются в нее в фоне (CART_BACKEND=database)
+    cart_service.start(AsyncSessionLocal)
 
-Выберите действие из меню ниже:"""
-
-    await query.edit_message_text(
-        welcome_text, 
-        parse_mode=ParseMode.MARKDOWN, 
-        reply_markup=reply_markup
-    )
+async def post_shutdown(application: Application):
+    # Досохраняем корзины и закрываем соединение с Redis
+    await cart_service.stop()
 
 def main():
     print("🚀 Запуск FoodDelivery Bot в продакшн режиме...")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(SendScheduler())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Обработчики
     application.add_handler(CommandHandler("start", start_handler))
@@ -354,6 +356,7 @@ def main():
     application.add_handler(CallbackQueryHandler(menu_handler, pattern="^menu_"))
     application.add_handler(CallbackQueryHandler(add_to_cart_handler, pattern="^add_"))
     application.add_handler(CallbackQueryHandler(cart_view_handler, pattern="^cart_view$"))
+    application.add_handler(CallbackQueryHandler(cart_clear_handler, pattern="^cart_clear$"))
     application.add_handler(CallbackQueryHandler(checkout_handler, pattern="^checkout$"))
     
     if WEBHOOK_URL:
@@ -0,0 +1,60 @@
+"""
+Отложенные счетчики заказов (app/services/aggregates.py)
+
+Счетчики ресторанов и пользователей пересчитываются по доставленным
+заказам; завершенные заказы помечаются учтенными, незавершенные
+учтутся, когда будут доставлены.
+
+Revision ID: 0001_order_counters
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_order_counters"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+PENDING_INDEXES = {
+    "ix_orders_stats_pending": ["id"],
+    "ix_orders_stats_pending_restaurant": ["restaurant_id"],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # База, созданная init_db() уже с новыми моделями, пересчета не требует
+    if "stats_applied" in {column["name"] for column in inspector.get_columns("orders")}:
+        return
+
+    with op.batch_alter_table("orders") as batch:
+        batch.add_column(sa.Column("stats_applied", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    for table, amount_column, key in (
+        ("restaurants", "total_revenue", "restaurant_id"),
+        ("users", "total_spent", "user_id"),
+    ):
+        delivered = f"FROM orders WHERE orders.{key} = {table}.id AND orders.status = 'DELIVERED'"
+        op.execute(
+            f"UPDATE {table} SET "
+            f"total_orders = (SELECT count(orders.id) {delivered}), "
+            f"{amount_column} = (SELECT coalesce(sum(orders.total), 0) {delivered})"
+        )
+
+    op.execute("UPDATE orders SET stats_applied = true WHERE status IN ('DELIVERED', 'CANCELLED')")
+
+    for name, columns in PENDING_INDEXES.items():
+        op.create_index(
+            name, "orders", columns,
+            postgresql_where=sa.text("NOT stats_applied"), sqlite_where=sa.text("NOT stats_applied")
+        )
+
+
+def downgrade():
+    for name in PENDING_INDEXES:
+        op.drop_index(name, table_name="orders")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_column("stats_applied")
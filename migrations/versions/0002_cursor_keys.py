@@ -0,0 +1,52 @@
+"""
+Курсорная пагинация: индексы ключей и NOT NULL для ключей сортировки
+
+Revision ID: 0002_cursor_keys
+Revises: 0001_order_counters
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_cursor_keys"
+down_revision = "0001_order_counters"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    # История заказов пользователя (created_at, id)
+    "ix_orders_user_created": ("orders", ["user_id", "created_at", "id"]),
+    # Каталог по рейтингу (rating DESC, id)
+    "ix_restaurants_active_rating": ("restaurants", ["is_active", sa.text("rating DESC"), "id"]),
+    # Меню ресторана (sort_order, name, id)
+    "ix_menu_items_restaurant_sort": ("menu_items", ["restaurant_id", "sort_order", "name", "id"]),
+}
+
+# Ключи сортировки курсоров не могут быть NULL
+SORT_KEYS = {
+    "restaurants": ("rating", sa.Float()),
+    "menu_items": ("sort_order", sa.Integer()),
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, (column, type_) in SORT_KEYS.items():
+        if next(c for c in inspector.get_columns(table) if c["name"] == column)["nullable"]:
+            op.execute(f"UPDATE {table} SET {column} = 0 WHERE {column} IS NULL")
+            with op.batch_alter_table(table) as batch:
+                batch.alter_column(column, existing_type=type_, nullable=False, server_default=sa.text("0"))
+
+    for name, (table, columns) in INDEXES.items():
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table, (column, type_) in SORT_KEYS.items():
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column(column, existing_type=type_, nullable=True, server_default=None)
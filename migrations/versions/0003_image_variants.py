@@ -0,0 +1,38 @@
+"""
+Варианты загруженных изображений ресторанов и блюд
+
+Revision ID: 0003_image_variants
+Revises: 0002_cursor_keys
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_image_variants"
+down_revision = "0002_cursor_keys"
+branch_labels = None
+depends_on = None
+
+COLUMNS = {
+    "restaurants": ["logo_variants", "cover_variants"],
+    "menu_items": ["image_variants"],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        missing = [column for column in columns if column not in existing]
+        if missing:
+            with op.batch_alter_table(table) as batch:
+                for column in missing:
+                    batch.add_column(sa.Column(column, sa.JSON(), nullable=True))
+
+
+def downgrade():
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table) as batch:
+            for column in columns:
+                batch.drop_column(column)
@@ -0,0 +1,25 @@
+"""
+Индекс координат ресторанов для отбора по ограничивающему прямоугольнику
+
+Revision ID: 0004_restaurant_location_index
+Revises: 0003_image_variants
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004_restaurant_location_index"
+down_revision = "0003_image_variants"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if "ix_restaurants_lat_lng" not in {index["name"] for index in inspector.get_indexes("restaurants")}:
+        op.create_index("ix_restaurants_lat_lng", "restaurants", ["latitude", "longitude"])
+
+
+def downgrade():
+    op.drop_index("ix_restaurants_lat_lng", table_name="restaurants")
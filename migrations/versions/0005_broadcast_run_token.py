@@ -0,0 +1,30 @@
+"""
+Метка запуска рассылки: одну рассылку проводит только один запуск
+
+Revision ID: 0005_broadcast_run_token
+Revises: 0004_restaurant_location_index
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005_broadcast_run_token"
+down_revision = "0004_restaurant_location_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Таблицу broadcasts без столбца создавал init_db() предыдущей версии
+    if "broadcasts" not in inspector.get_table_names():
+        return
+    if "run_token" not in {column["name"] for column in inspector.get_columns("broadcasts")}:
+        with op.batch_alter_table("broadcasts") as batch:
+            batch.add_column(sa.Column("run_token", sa.String(32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("broadcasts") as batch:
+        batch.drop_column("run_token")
@@ -0,0 +1,35 @@
+﻿"""
+Общие настройки тестов
+"""
+
+import os
+
+# Тесты работают с SQLite, а не с PostgreSQL из настроек по умолчанию
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+import app.models  # noqa: F401 - регистрация моделей в metadata
+
+
+@pytest_asyncio.fixture
+async def db_engine(tmp_path):
+    """Движок на временной SQLite базе с созданными таблицами"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield engine
+    
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session(db_engine):
+    """Сессия базы данных для теста"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        yield session
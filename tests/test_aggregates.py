@@ -0,0 +1,107 @@
+"""
+Тесты отложенных счетчиков заказов
+"""
+
+from datetime import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.api import restaurants as restaurants_api, users as users_api
+from app.api.deps import get_current_user_id
+from app.core.database import get_db
+from app.models import Order, OrderStatus, Restaurant, User, UserRole
+from app.services.aggregates import AggregateFolder
+
+
+@pytest.mark.asyncio
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+async def test_fold_applies_each_order_once(db_session):
+    """Счетчики сходятся с доставленными заказами, точные значения доступны до обновления"""
+    users = [User(telegram_id=5000 + i, first_name=f"Пользователь {i}") for i in range(2)]
+    restaurant = Restaurant(
+        name="Шаурма", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all(users + [restaurant])
+    await db_session.flush()
+
+    db_session.add_all([
+        Order(
+            order_number=f"ORD-A{i}", user_id=users[i % 2].id, restaurant_id=restaurant.id,
+            subtotal=100.0 * (i + 1), total=100.0 * (i + 1), delivery_address="ул. Ленина, 25",
+            status=OrderStatus.DELIVERED
+        )
+        for i in range(5)
+    ])
+    # Отмененный заказ учитывается без приращения, незавершенный ждет своего статуса
+    db_session.add_all([
+        Order(
+            order_number=f"ORD-B{i}", user_id=users[0].id, restaurant_id=restaurant.id,
+            subtotal=700.0, total=700.0, delivery_address="ул. Ленина, 25", status=status
+        )
+        for i, status in enumerate((OrderStatus.CANCELLED, OrderStatus.PENDING))
+    ])
+    await db_session.commit()
+    user_id = users[0].id
+
+    folder = AggregateFolder(batch_size=3)
+    assert await folder.restaurant_totals(db_session, restaurant.id) == (5, 1500.0)
+    assert await folder.user_totals(db_session, user_id) == (3, 900.0)
+
+    assert await folder.fold(db_session) == 3
+    assert await folder.restaurant_totals(db_session, restaurant.id) == (5, 1500.0)
+    assert await folder.fold(db_session) == 3
+    assert await folder.fold(db_session) == 0
+
+    await db_session.refresh(restaurant)
+    await db_session.refresh(users[1])
+    assert (restaurant.total_orders, restaurant.total_revenue) == (5, 1500.0)
+    assert (users[1].total_orders, users[1].total_spent) == (2, 600.0)
+    assert await folder.user_totals(db_session, users[1].id) == (2, 600.0)
+    assert await folder.user_totals(db_session, user_id) == (3, 900.0)
+
+    # Поиск неучтенных заказов идет по частичному индексу
+    plan = (await db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM orders WHERE NOT stats_applied ORDER BY id"
+    ))).all()
+    assert "ix_orders_stats_pending" in str(plan)
+
+
+@pytest.mark.asyncio
+async def test_endpoints_report_exact_totals(db_session):
+    """Статистика ресторана и профиль пользователя видят еще не учтенные заказы"""
+    user = User(telegram_id=5100, first_name="Клиент")
+    admin = User(telegram_id=5101, role=UserRole.ADMIN)
+    restaurant = Restaurant(
+        name="Шаурма", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([user, admin, restaurant])
+    await db_session.flush()
+    db_session.add_all([
+        Order(
+            order_number=f"ORD-C{i}", user_id=user.id, restaurant_id=restaurant.id,
+            subtotal=250.0, total=250.0, delivery_address="ул. Ленина, 25", status=OrderStatus.DELIVERED
+        )
+        for i in range(2)
+    ])
+    await db_session.commit()
+
+    current_user = user.id
+    app = FastAPI()
+    app.include_router(restaurants_api.router, prefix="/restaurants")
+    app.include_router(users_api.router, prefix="/users")
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user_id] = lambda: current_user
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/users/me")).json()["total_orders"] == 2
+        assert (await client.get(f"/restaurants/{restaurant.id}/stats")).status_code == 403
+
+        current_user = admin.id
+        response = await client.get(f"/restaurants/{restaurant.id}/stats")
+        assert response.json() == {"restaurant_id": restaurant.id, "total_orders": 2, "total_revenue": 500.0}
+        assert (await client.get(f"/restaurants/{restaurant.id + 1}/stats")).status_code == 404
@@ -0,0 +1,53 @@
+"""
+Тесты входа через Telegram
+"""
+
+import pytest
+from sqlalchemy import event, select
+
+from app.api.auth import TelegramAuthData
+from app.models import User
+from app.services.auth_service import AuthService
+from app.services.presence import user_presence
+
+
+def _auth_data(**fields):
+    return TelegramAuthData(**{
+        "telegram_id": 7001, "username": "ivan", "first_name": "Иван", "last_name": None,
+        "auth_date": 0, "hash": "", **fields
+    })
+
+
+@pytest.mark.asyncio
+async def test_login_upserts_in_one_statement(db_engine, db_session):
+    """Вход - один запрос и для нового, и для уже известного пользователя"""
+    user_presence.clear()
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    service = AuthService(db_session)
+
+    user, is_new = await service.get_or_create_user(_auth_data())
+    assert is_new and user.id is not None and user.first_name == "Иван"
+    assert len(statements) == 1 and statements[0].startswith("INSERT")
+    first_activity = user.last_activity
+
+    # Профиль не изменился: тот же один UPSERT возвращает существующую строку
+    statements.clear()
+    same, is_new = await service.get_or_create_user(_auth_data())
+    assert (same.id, is_new) == (user.id, False)
+    assert same.updated_at == same.created_at and same.last_activity == first_activity
+    assert len(statements) == 1 and statements[0].startswith("INSERT")
+
+    # Новое имя записывается сразу, last_activity не трогается
+    statements.clear()
+    renamed, is_new = await service.get_or_create_user(_auth_data(first_name="Иоанн"))
+    assert (renamed.id, renamed.first_name, is_new) == (user.id, "Иоанн", False)
+    assert renamed.last_activity == first_activity
+    assert len(statements) == 1
+
+    # Входы отмечаются в памяти, last_activity пишет фоновая запись присутствия
+    assert user_presence.is_online(user.id)
+    assert await db_session.scalar(select(User.id).where(User.telegram_id == 7001)) == user.id
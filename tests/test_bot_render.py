@@ -0,0 +1,100 @@
+"""
+Тесты подготовки сообщений бота
+"""
+
+from datetime import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.bot import handlers
+from app.bot.keyboards import get_main_menu_keyboard
+from app.bot.render import RenderCache, RenderStats, Template, escape_markdown, render_cache
+from app.models import MenuCategory, Restaurant
+from app.services.menu_cache import menu_cache
+
+
+class StubQuery:
+    """CallbackQuery, который запоминает отправленные сообщения"""
+
+    def __init__(self, data):
+        self.data = data
+        self.sent = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, parse_mode=None, reply_markup=None):
+        self.sent.append((text, reply_markup))
+
+
+def test_template_escapes_literals_and_values():
+    """Текст шаблона экранируется при компиляции, значения - при подстановке"""
+    template = Template("*Заказ #{number}* - {total:.2f}₽ (итого)! @support\\_bot {{x}}")
+
+    assert template.render(number="12_3", total=1.5) == \
+        "*Заказ \\#12\\_3* \\- 1\\.50₽ \\(итого\\)\\! @support\\_bot \\{x\\}"
+    assert Template("_курсив_ 1.5").text == "_курсив_ 1\\.5"
+    assert Template("Пн | Вт ||скрыто||").text == "Пн \\| Вт ||скрыто||"
+    assert escape_markdown("a*b[c]") == "a\\*b\\[c\\]"
+
+
+def test_render_cache_versions_and_stats():
+    cache = RenderCache(max_entries=2)
+    cache.put("a", 1, "A1")
+    assert cache.get("a", 1) == "A1"
+    assert cache.get("a", 2) is None
+
+    cache.put("b", 1, "B")
+    cache.put("c", 1, "C")
+    assert cache.get("a", 1) is None
+    assert cache.stats()["entries"] == 2
+
+    stats = RenderStats()
+
+    @stats.timed("view")
+    def render():
+        return "text"
+
+    render()
+    render()
+    assert stats.stats()["view"]["renders"] == 2
+    assert get_main_menu_keyboard() is get_main_menu_keyboard()
+
+
+@pytest.mark.asyncio
+async def test_menu_view_rendered_once_per_version(db_engine, db_session, monkeypatch):
+    """Меню ресторана готовится один раз и пересобирается после изменения меню"""
+    monkeypatch.setattr(
+        handlers, "AsyncSessionLocal", sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+    render_cache.clear()
+    menu_cache.clear()
+
+    restaurant = Restaurant(
+        name="Шаурма", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add(restaurant)
+    await db_session.flush()
+    db_session.add(MenuCategory(name="Горячее", restaurant_id=restaurant.id))
+    await db_session.commit()
+
+    update = SimpleNamespace(callback_query=StubQuery(f"restaurant_{restaurant.id}"))
+    context = SimpleNamespace(bot=None)
+    await handlers.restaurant_menu_handler(update, context)
+    await handlers.restaurant_menu_handler(update, context)
+
+    first, second = update.callback_query.sent
+    assert first[1] is second[1]
+    assert [row[0].text for row in first[1].inline_keyboard][0] == "Горячее"
+    assert render_cache.stats()["hits"] == 1
+
+    db_session.add(MenuCategory(name="Напитки", restaurant_id=restaurant.id))
+    await db_session.commit()
+    await handlers.restaurant_menu_handler(update, context)
+
+    rows = [row[0].text for row in update.callback_query.sent[-1][1].inline_keyboard]
+    assert rows[:2] == ["Горячее", "Напитки"]
@@ -0,0 +1,257 @@
+"""
+Тесты рассылок
+"""
+
+import asyncio
+from collections import Counter
+from datetime import time
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from telegram.error import Forbidden
+
+from app.bot.sender import SendPriority
+from app.models import Broadcast, BroadcastStatus, Order, OrderStatus, Restaurant, User, UserRole
+from app.services.broadcast import BroadcastEngine
+from app.services import order_service
+from app.services.order_service import OrderService
+
+BLOCKED_CHAT = 10_013
+BROKEN_CHAT = 10_021
+
+
+class StubBot:
+    """Бот, который запоминает отправленные сообщения"""
+
+    def __init__(self, stall_after=None, broken_chat=None):
+        self.sent = []
+        self.stall_after = stall_after
+        self.broken_chat = broken_chat
+        self.release = asyncio.Event()
+
+    async def send_message(self, chat_id, text, parse_mode=None, rate_limit_args=None):
+        if self.stall_after is not None and len(self.sent) >= self.stall_after:
+            await self.release.wait()  # "Зависшая" отправка до сбоя процесса или release
+        if chat_id == BLOCKED_CHAT:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id == self.broken_chat:
+            raise RuntimeError("connection pool is closed")
+        self.sent.append((chat_id, text, rate_limit_args))
+
+
+def _session_factory(db_engine):
+    return sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _create_users(db, count):
+    db.add_all([
+        User(telegram_id=10_000 + i, first_name=["Анна", "Иван", None][i % 3], is_active=i != 7)
+        for i in range(count)
+    ])
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_campaign_renders_variants_once_and_reports_progress(db_engine, db_session):
+    await _create_users(db_session, 120)
+    bot = StubBot()
+    engine = BroadcastEngine(batch_size=50, claim_size=20, concurrency=4, progress_interval=0.01)
+    engine.start(_session_factory(db_engine), bot=bot)
+
+    with pytest.raises(ValueError):
+        engine.preview("Привет, {name}!")
+    broadcast = await engine.create("Привет, *{first_name}*! Скидка 20% до 1.05", created_by=1)
+
+    reports = []
+
+    async def on_progress(progress):
+        reports.append(progress)
+
+    result = await engine.run(broadcast.id, on_progress)
+    await engine.stop()
+
+    chats = Counter(chat_id for chat_id, _, _ in bot.sent)
+    assert len(chats) == 118 and max(chats.values()) == 1  # без неактивного и заблокировавшего
+    assert 10_007 not in chats
+    assert {priority for _, _, priority in bot.sent} == {SendPriority.MARKETING}
+    assert "Привет, *друг*\\! Скидка 20% до 1\\.05" in {text for _, text, _ in bot.sent}
+
+    assert result["variants"] == 3
+    assert (result["total"], result["sent"], result["failed"], result["blocked"]) == (119, 118, 1, 1)
+    assert reports[-1] == result and result["remaining"] == 0
+
+    broadcast = await db_session.get(Broadcast, broadcast.id, populate_existing=True)
+    assert broadcast.status == BroadcastStatus.DONE
+    assert (broadcast.sent, broadcast.failed, broadcast.done_until) == (118, 1, broadcast.claimed_until)
+
+
+@pytest.mark.asyncio
+async def test_campaign_survives_unexpected_send_error(db_engine, db_session):
+    await _create_users(db_session, 30)
+    bot = StubBot(broken_chat=BROKEN_CHAT)
+    engine = BroadcastEngine(batch_size=10, claim_size=5, concurrency=2)
+    engine.start(_session_factory(db_engine), bot=bot)
+    broadcast = await engine.create("Новое меню!")
+
+    result = await asyncio.wait_for(engine.run(broadcast.id), timeout=5)
+    await engine.stop()
+
+    assert (result["sent"], result["failed"], result["remaining"]) == (27, 2, 0)
+    broadcast = await db_session.get(Broadcast, broadcast.id, populate_existing=True)
+    assert broadcast.status == BroadcastStatus.DONE
+    assert broadcast.done_until == broadcast.claimed_until
+
+
+@pytest.mark.asyncio
+async def test_double_launch_sends_once(db_engine, db_session):
+    """Повторный запуск той же рассылки - в этом или другом процессе - не дублирует сообщения"""
+    await _create_users(db_session, 50)
+    factory = _session_factory(db_engine)
+    bot = StubBot()
+    engine, other = BroadcastEngine(concurrency=4), BroadcastEngine(concurrency=4)
+    engine.start(factory, bot=bot)
+    other.start(factory, bot=bot)
+    broadcast = await engine.create("Новое меню!")
+
+    tasks = [engine.launch(broadcast.id), engine.launch(broadcast.id), other.launch(broadcast.id)]
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+    await engine.stop()
+    await other.stop()
+
+    delivered = Counter(chat_id for chat_id, _, _ in bot.sent)
+    assert len(delivered) == 48 and max(delivered.values()) == 1
+    assert engine.stats()["campaigns_finished"] + other.stats()["campaigns_finished"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancel_from_another_process_stops_campaign(db_engine, db_session):
+    """Отмена в другом процессе останавливает рассылку на следующей порции и не перезаписывается"""
+    await _create_users(db_session, 60)
+    factory = _session_factory(db_engine)
+    bot = StubBot(stall_after=5)
+    engine = BroadcastEngine(batch_size=20, claim_size=5, concurrency=2)
+    engine.start(factory, bot=bot)
+    broadcast = await engine.create("Новое меню!")
+    task = engine.launch(broadcast.id)
+    while len(bot.sent) < 5:
+        await asyncio.sleep(0.01)
+
+    admin = BroadcastEngine()
+    admin.start(factory, bot=StubBot())
+    assert await admin.cancel(broadcast.id)
+    bot.release.set()
+    await asyncio.wait_for(task, timeout=5)
+    await engine.stop()
+    await admin.stop()
+
+    assert len(bot.sent) <= 15
+    broadcast = await db_session.get(Broadcast, broadcast.id, populate_existing=True)
+    assert broadcast.status == BroadcastStatus.CANCELLED
+    assert broadcast.sent == len(bot.sent)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_campaign_resumes_without_resending(db_engine, db_session):
+    await _create_users(db_session, 90)
+    factory = _session_factory(db_engine)
+
+    stalled = StubBot(stall_after=30)
+    engine = BroadcastEngine(batch_size=40, claim_size=10, concurrency=4)
+    engine.start(factory, bot=stalled)
+    broadcast = await engine.create("Новое меню!")
+    task = engine.launch(broadcast.id)
+    while len(stalled.sent) < 30:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    await engine.stop()  # Процесс остановлен посреди рассылки
+    assert task.cancelled()
+
+    broadcast = await db_session.get(Broadcast, broadcast.id, populate_existing=True)
+    assert broadcast.status == BroadcastStatus.RUNNING
+    assert broadcast.done_until < broadcast.claimed_until
+
+    bot = StubBot()
+    restarted = BroadcastEngine(batch_size=40, claim_size=10, concurrency=4)
+    restarted.start(factory, bot=bot, resume=True)
+    while restarted.stats()["campaigns_finished"] == 0:
+        await asyncio.sleep(0.01)
+    await restarted.stop()
+
+    delivered = Counter(chat_id for chat_id, _, _ in stalled.sent + bot.sent)
+    assert max(delivered.values()) == 1
+
+    broadcast = await db_session.get(Broadcast, broadcast.id, populate_existing=True)
+    assert broadcast.status == BroadcastStatus.DONE
+    assert broadcast.sent == len(stalled.sent) + len(bot.sent)
+    assert broadcast.sent + broadcast.failed + broadcast.unconfirmed == broadcast.total == 89
+
+
+@pytest.mark.asyncio
+async def test_order_status_change_notifies_customer(db_engine, db_session, monkeypatch):
+    user = User(telegram_id=555, first_name="Мария")
+    admin = User(telegram_id=556, role=UserRole.ADMIN)
+    restaurant = Restaurant(
+        name="Pizza Palace", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([user, admin, restaurant])
+    await db_session.flush()
+    order = Order(
+        order_number="FD-1.5", user_id=user.id, restaurant_id=restaurant.id,
+        delivery_address="ул. Ленина, 25", subtotal=500.0, total=650.0
+    )
+    db_session.add(order)
+    await db_session.commit()
+
+    bot = StubBot()
+    engine = BroadcastEngine()
+    await engine.notify_order_status(db_session, [order.id], OrderStatus.CONFIRMED)  # До запуска - без уведомлений
+
+    monkeypatch.setattr(order_service, "broadcast_engine", engine)
+    engine.start(_session_factory(db_engine), bot=bot)
+    try:
+        assert await OrderService(db_session).update_order_status(order.id, OrderStatus.CONFIRMED, admin.id)
+        while not bot.sent:
+            await asyncio.sleep(0.01)
+    finally:
+        await engine.stop()
+
+    assert bot.sent == [(555, "✅ Заказ *\\#FD\\-1\\.5* подтвержден рестораном", SendPriority.STATUS)]
+    assert engine.stats()["status_sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_status_notifications_survive_unexpected_send_error(db_engine, db_session):
+    users = [User(telegram_id=chat_id) for chat_id in (BROKEN_CHAT, 777)]
+    restaurant = Restaurant(
+        name="Pizza Palace", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([*users, restaurant])
+    await db_session.flush()
+    orders = [
+        Order(
+            order_number=f"FD-{i}", user_id=user.id, restaurant_id=restaurant.id,
+            delivery_address="ул. Ленина, 25", subtotal=500.0, total=650.0
+        )
+        for i, user in enumerate(users)
+    ]
+    db_session.add_all(orders)
+    await db_session.commit()
+
+    bot = StubBot(broken_chat=BROKEN_CHAT)
+    engine = BroadcastEngine(concurrency=1)
+    engine.start(_session_factory(db_engine), bot=bot)
+    try:
+        await engine.notify_order_status(db_session, [orders[0].id], OrderStatus.CONFIRMED)
+        while engine.stats()["status_failed"] == 0:
+            await asyncio.sleep(0.01)
+        await engine.notify_order_status(db_session, [orders[1].id], OrderStatus.CONFIRMED)
+        while not bot.sent:
+            await asyncio.sleep(0.01)
+        assert not engine._task.done()
+    finally:
+        await engine.stop()
+
+    assert [chat_id for chat_id, _, _ in bot.sent] == [777]
@@ -0,0 +1,263 @@
+"""
+Тесты корзин и их хранилищ
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.models import SavedCart
+from app.services.cart import MAX_CART_LINES, Cart, CartService, MemoryCartStore, RespCartStore
+from app.services.cart_db import DatabaseCartStore
+
+
+class RespStandIn:
+    """
+    Redis-совместимый сервер в памяти: хеши, EXPIRE (без истечения),
+    MULTI/EXEC и WATCH. before_exec вызывается перед каждым EXEC -
+    так тест изменяет корзину между WATCH и EXEC.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.versions = {}
+        self.before_exec = None
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"redis://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/0"
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _write(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+        return self.hashes.setdefault(key, {})
+
+    def run(self, name, args):
+        """Выполнить команду над данными"""
+        if name == "HGETALL":
+            return [part for pair in self.hashes.get(args[0], {}).items() for part in pair]
+        if name == "HMGET":
+            values = self.hashes.get(args[0], {})
+            return [values.get(field) for field in args[1:]]
+        if name == "HSETNX":
+            values = self._write(args[0])
+            if args[1] in values:
+                return 0
+            values[args[1]] = args[2]
+            return 1
+        if name == "HINCRBY":
+            values = self._write(args[0])
+            values[args[1]] = str(int(values.get(args[1], 0)) + int(args[2]))
+            return int(values[args[1]])
+        if name == "HDEL":
+            values = self._write(args[0])
+            return sum(values.pop(field, None) is not None for field in args[1:])
+        if name == "DEL":
+            self._write(args[0])
+            return int(self.hashes.pop(args[0], None) is not None)
+        if name == "EXPIRE":
+            return int(args[0] in self.hashes)
+        raise ValueError(name)
+
+    async def _serve(self, reader, writer):
+        queued = None
+        watched = {}
+        try:
+            while True:
+                count = int((await reader.readline())[1:])
+                command = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:])
+                    command.append((await reader.readexactly(length + 2))[:-2].decode())
+                name, args = command[0].upper(), command[1:]
+
+                if name == "WATCH":
+                    watched.update((key, self.versions.get(key, 0)) for key in args)
+                    reply = "OK"
+                elif name == "UNWATCH":
+                    watched.clear()
+                    reply = "OK"
+                elif name == "MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == "EXEC":
+                    if self.before_exec:
+                        self.before_exec(self)
+                    changed = any(self.versions.get(key, 0) != version for key, version in watched.items())
+                    reply = None if changed else [self.run(*queued_command) for queued_command in queued]
+                    queued = None
+                    watched.clear()
+                elif queued is not None:
+                    queued.append((name, args))
+                    reply = "QUEUED"
+                else:
+                    reply = self.run(name, args)
+
+                writer.write(self._encode(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ValueError, ConnectionError):
+            writer.close()
+
+    def _encode(self, reply):
+        if reply is None:
+            return b"*-1\r\n"
+        if isinstance(reply, str) and reply in ("OK", "QUEUED"):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b"".join(
+                b"$-1\r\n" if part is None else self._encode(part) for part in reply
+            )
+        data = str(reply).encode()
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+@pytest_asyncio.fixture
+async def resp_url():
+    stand_in = RespStandIn()
+    url = await stand_in.start()
+    yield stand_in, url
+    await stand_in.close()
+
+
+def test_cart_totals_follow_lines():
+    """Итоги меняются вместе с позициями и переживают сериализацию"""
+    cart = Cart()
+    cart.add("pizza_0", "Маргарита", 65000, 2, "Pizza Palace")
+    cart.add("burger_1", "Чизбургер", 50000)
+    cart.add("pizza_0", "Маргарита", 65000)
+    assert (cart.total, cart.count) == (2450.0, 4)
+
+    cart.remove("pizza_0", 2)
+    assert (cart.total_cents, cart.count) == (115000, 2)
+    assert Cart.from_dict(cart.to_dict()).to_dict() == cart.to_dict()
+
+    cart.remove("pizza_0")
+    cart.remove("burger_1", 5)
+    assert not cart and cart.total_cents == 0
+
+    for number in range(MAX_CART_LINES):
+        cart.add(str(number), "Блюдо", 100)
+    with pytest.raises(ValueError):
+        cart.add("extra", "Блюдо", 100)
+
+
+@pytest.mark.asyncio
+async def test_memory_store_expires_and_evicts():
+    clock = [0.0]
+    service = CartService(MemoryCartStore(ttl=60, max_carts=2, clock=lambda: clock[0]))
+
+    await service.add_item(1, "a", "Суп", 250.5)
+    await service.add_item(2, "a", "Суп", 250.5)
+    await service.add_item(3, "a", "Суп", 250.5)
+    assert not await service.get(1)
+    assert (await service.get(3)).total == 250.5
+
+    clock[0] = 61
+    assert not await service.get(2)
+    assert service.stats() == {"backend": "MemoryCartStore", "carts": 1, "expired": 1, "evicted": 1}
+
+    with pytest.raises(ValueError):
+        await service.add_item(4, "a", "Суп", 250.5, quantity=0)
+
+
+@pytest.mark.asyncio
+async def test_resp_store_transactions(resp_url):
+    """Корзина в Redis: итоги в транзакции, повтор WATCH при одновременном изменении"""
+    stand_in, url = resp_url
+    store = RespCartStore(url, ttl=600)
+    service = CartService(store)
+
+    await service.add_item(7, "pizza_0", "Маргарита", 650, 2, "Pizza Palace")
+    cart = await service.add_item(7, "sushi_1", "Калифорния", 750)
+    assert (cart.total, cart.count) == (2050.0, 3)
+
+    # Позиция сохраняет первую цену, итог не расходится с позициями
+    cart = await service.add_item(7, "pizza_0", "Маргарита", 700)
+    assert cart.lines["pizza_0"].price == 650 and cart.total == 2700.0
+    assert (await service.get(7)).total == 2700.0
+
+    def add_concurrently(server):
+        server.before_exec = None
+        server.run("HINCRBY", ["cart:7", "q:sushi_1", 1])
+        server.run("HINCRBY", ["cart:7", "total", 75000])
+        server.run("HINCRBY", ["cart:7", "count", 1])
+
+    stand_in.before_exec = add_concurrently
+    cart = await service.remove_item(7, "pizza_0", 2)
+    assert store.stats()["conflicts"] == 1
+    assert cart.lines["pizza_0"].quantity == 1 and cart.lines["sushi_1"].quantity == 2
+    assert cart.total == 650 + 2 * 750
+
+    assert (await service.remove_item(7, "missing")).count == 3
+    taken = await service.checkout(7)
+    assert (taken.total, taken.count) == (2150.0, 3)
+    assert not await service.get(7) and "cart:7" not in stand_in.hashes
+
+    # Позицию удалили и добавили по новой цене между отправкой и EXEC добавления
+    await service.add_item(9, "pizza_0", "Маргарита", 650)
+
+    def readd_concurrently(server):
+        server.before_exec = None
+        server.run("HDEL", ["cart:9", "q:pizza_0", "m:pizza_0"])
+        server.run("HINCRBY", ["cart:9", "count", -1])
+        server.run("HSETNX", ["cart:9", "m:pizza_0", '["Маргарита", 70000, null]'])
+        server.run("HINCRBY", ["cart:9", "q:pizza_0", 1])
+        server.run("HINCRBY", ["cart:9", "count", 1])
+
+    stand_in.before_exec = readd_concurrently
+    cart = await service.add_item(9, "pizza_0", "Маргарита", 650)
+    assert (cart.lines["pizza_0"].price, cart.count, cart.total) == (700, 2, 1400.0)
+    assert (await service.get(9)).total == 1400.0
+
+    await service.add_item(8, "a", "Суп", 100)
+    assert not await service.remove_item(8, "a")
+    assert "cart:8" not in stand_in.hashes
+    await service.stop()
+
+
+@pytest.mark.asyncio
+async def test_database_store_writes_behind(db_engine):
+    """Изменения попадают в БД пачкой и читаются другим процессом после записи"""
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    store = DatabaseCartStore(flush_interval=3600)
+    store.start(session_factory)
+    service = CartService(store)
+
+    await service.add_item(10, "pizza_0", "Маргарита", 650, 2)
+    await service.add_item(11, "burger_1", "Чизбургер", 500)
+    await service.remove_item(11, "burger_1")
+    assert store.stats()["dirty"] == 2
+
+    async with session_factory() as db:
+        assert await db.scalar(select(SavedCart.user_id)) is None
+        assert await store.flush(db) == 2
+        rows = (await db.execute(select(SavedCart))).scalars().all()
+    assert [(row.user_id, row.total_cents, row.items_count) for row in rows] == [(10, 130000, 2)]
+
+    other = DatabaseCartStore()
+    other.start(session_factory)
+    cart = await CartService(other).get(10)
+    assert (cart.total, cart.lines["pizza_0"].name) == (1300.0, "Маргарита")
+    assert not await CartService(other).get(11)
+
+    # Вытесненная из памяти, но не записанная корзина не теряется
+    store.memory.clear()
+    await service.add_item(12, "sushi_0", "Филадельфия", 890)
+    store.memory.clear()
+    assert (await service.get(12)).total == 890.0
+
+    assert (await service.checkout(10)).count == 2
+    await store.stop()
+    await other.stop()
+    async with session_factory() as db:
+        assert (await db.execute(select(SavedCart.user_id))).scalars().all() == [12]
@@ -0,0 +1,60 @@
+﻿"""
+Тесты расчета стоимости и времени доставки
+"""
+
+import numpy as np
+
+from app.models import Restaurant
+from app.services.delivery import quote_delivery_batch, quote_restaurants, DELIVERY_UNAVAILABLE
+
+
+def test_quote_delivery_batch_rules():
+    """Базовая цена, надбавка свыше 5км, бесплатная доставка и зона доставки"""
+    # Точки примерно в 1.2, 8.2 и 20.2 км к северу от пользователя
+    latitudes = 55.75 + np.array([1.2, 8.2, 20.2]) / 111.2
+    longitudes = np.full(3, 37.62)
+
+    distances, fees, minutes = quote_delivery_batch(
+        55.75, 37.62,
+        latitudes, longitudes,
+        base_fees=np.full(3, 150.0),
+        free_delivery_thresholds=np.full(3, 1000.0),
+        max_delivery_distances=np.full(3, 15.0),
+        avg_delivery_times=np.full(3, 30),
+        order_total=500.0
+    )
+
+    assert np.allclose(distances, [1.2, 8.2, 20.2], atol=0.05)
+    assert fees[0] == 150.0
+    assert abs(fees[1] - (150.0 + 3.2 * 20)) < 1.0
+    assert fees[2] == DELIVERY_UNAVAILABLE
+    assert minutes.tolist() == [32, 46, 70]
+
+    _, fees, _ = quote_delivery_batch(
+        55.75, 37.62,
+        latitudes, longitudes,
+        base_fees=np.full(3, 150.0),
+        free_delivery_thresholds=np.full(3, 1000.0),
+        max_delivery_distances=np.full(3, 15.0),
+        avg_delivery_times=np.full(3, 30),
+        order_total=1000.0
+    )
+
+    # Порог бесплатной доставки не открывает доставку за пределы зоны
+    assert fees.tolist() == [0.0, 0.0, DELIVERY_UNAVAILABLE]
+
+
+def test_free_delivery_does_not_extend_delivery_zone():
+    """Заказ выше порога бесплатной доставки за пределы зоны все равно недоступен"""
+    restaurants = [
+        Restaurant(
+            id=i, latitude=55.75 + distance / 111.2, longitude=37.62, delivery_fee=150.0,
+            free_delivery_threshold=1000.0, max_delivery_distance=15.0, avg_delivery_time=30
+        )
+        for i, distance in enumerate([1.2, 20.2])
+    ]
+
+    near, far = quote_restaurants(restaurants, 55.75, 37.62, order_total=1500.0)
+
+    assert (near["delivery_fee"], near["delivery_available"]) == (0.0, True)
+    assert (far["delivery_fee"], far["delivery_available"]) == (DELIVERY_UNAVAILABLE, False)
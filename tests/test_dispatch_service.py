@@ -0,0 +1,184 @@
+"""
+Тесты назначения курьеров
+"""
+
+import itertools
+import random
+from datetime import time
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select
+
+from app.api import couriers as couriers_api
+from app.api.deps import get_current_user_id
+from app.core.database import get_db
+from app.models import Courier, CourierStatus, Order, OrderStatus, Restaurant, User, UserRole
+from app.services.dispatch_service import (
+    AUCTION_EPSILON, CourierDispatcher, auction_assignment, plan_assignments
+)
+from app.services.location_service import courier_assignments
+from app.services.order_service import OrderService
+
+
+def _brute_force(benefit):
+    n_couriers, n_orders = benefit.shape
+    best = 0.0
+    for choice in itertools.product(range(-1, n_orders), repeat=n_couriers):
+        taken = [order for order in choice if order >= 0]
+        if len(taken) != len(set(taken)):
+            continue
+        best = max(best, sum(benefit[courier, order] for courier, order in enumerate(choice) if order >= 0))
+    return best
+
+
+def test_auction_is_near_optimal():
+    """Аукцион не хуже полного перебора более чем на eps на курьера"""
+    rng = random.Random(3)
+    for _ in range(100):
+        n_couriers, n_orders = rng.randint(1, 4), rng.randint(1, 5)
+        benefit = np.array([
+            [rng.uniform(-2, 10) if rng.random() > 0.3 else -np.inf for _ in range(n_orders)]
+            for _ in range(n_couriers)
+        ])
+
+        couriers, orders = np.nonzero(np.isfinite(benefit))
+        assigned = auction_assignment(
+            couriers, orders, benefit[couriers, orders], n_couriers, np.ones(n_orders, dtype=np.int64)
+        )
+
+        taken = assigned[assigned >= 0]
+        assert len(set(taken.tolist())) == taken.size
+
+        total = sum(benefit[courier, order] for courier, order in enumerate(assigned) if order >= 0)
+        assert total >= _brute_force(benefit) - n_couriers * AUCTION_EPSILON - 1e-9
+
+
+def test_plan_fills_identical_orders():
+    """Одинаковые заказы одного ресторана распределяются между ближайшими курьерами"""
+    plan = plan_assignments(
+        courier_ids=np.array([10, 11, 12]),
+        courier_lats=np.array([55.751, 55.752, 55.80]),
+        courier_lons=np.array([37.62, 37.62, 37.62]),
+        courier_radii=np.array([10.0, 10.0, 10.0]),
+        courier_ratings=np.array([4.5, 4.5, 4.5]),
+        order_ids=np.array([1, 2]),
+        pickup_lats=np.array([55.75, 55.75]),
+        pickup_lons=np.array([37.62, 37.62]),
+        order_ready=np.array([True, True])
+    )
+
+    assert sorted(order_id for order_id, _ in plan) == [1, 2]
+    assert sorted(courier_id for _, courier_id in plan) == [10, 11]
+
+
+@pytest.mark.asyncio
+async def test_tick_assigns_nearest_courier(db_session):
+    """Заказ получает ближайшего курьера в рабочем радиусе, курьер становится занятым"""
+    users = [User(telegram_id=3000 + i, first_name=f"Пользователь {i}") for i in range(4)]
+    restaurant = Restaurant(
+        name="Шаурма", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all(users + [restaurant])
+    await db_session.flush()
+
+    near = Courier(user_id=users[1].id, status=CourierStatus.ONLINE, current_latitude=55.751, current_longitude=37.62)
+    far = Courier(user_id=users[2].id, status=CourierStatus.ONLINE, current_latitude=55.78, current_longitude=37.62)
+    # Вне рабочего радиуса
+    remote = Courier(
+        user_id=users[3].id, status=CourierStatus.ONLINE,
+        current_latitude=55.90, current_longitude=37.62, work_radius=5.0
+    )
+    order = Order(
+        order_number="ORD-D1", user_id=users[0].id, restaurant_id=restaurant.id,
+        status=OrderStatus.READY, subtotal=500, total=500, delivery_address="ул. Ленина, 25"
+    )
+    db_session.add_all([near, far, remote, order])
+    await db_session.commit()
+
+    dispatcher = CourierDispatcher()
+    assert await dispatcher.tick(db_session) == [(order.id, near.id)]
+
+    await db_session.refresh(order)
+    await db_session.refresh(near)
+    assert order.courier_id == users[1].id
+    assert near.status == CourierStatus.BUSY
+
+    statuses = (await db_session.execute(
+        select(Courier.status).where(Courier.id.in_([far.id, remote.id]))
+    )).scalars().all()
+    assert statuses == [CourierStatus.ONLINE, CourierStatus.ONLINE]
+
+    # Повторный такт ничего не переназначает
+    assert await dispatcher.tick(db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_delivered_order_releases_courier(db_session):
+    """После доставки курьер снова свободен и получает следующий заказ"""
+    client, courier_user = User(telegram_id=3100), User(telegram_id=3101)
+    restaurant = Restaurant(
+        name="Шаурма", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([client, courier_user, restaurant])
+    await db_session.flush()
+
+    courier = Courier(
+        user_id=courier_user.id, status=CourierStatus.ONLINE, current_latitude=55.751, current_longitude=37.62
+    )
+    orders = [
+        Order(
+            order_number=f"ORD-R{i}", user_id=client.id, restaurant_id=restaurant.id,
+            status=OrderStatus.READY, subtotal=500, total=500, delivery_address="ул. Ленина, 25"
+        )
+        for i in range(2)
+    ]
+    db_session.add_all([courier] + orders)
+    await db_session.commit()
+
+    courier_assignments.clear()
+    assert await courier_assignments.orders(db_session, courier_user.id) == set()
+
+    dispatcher = CourierDispatcher()
+    first = await dispatcher.tick(db_session)
+    assert len(first) == 1 and first[0][1] == courier.id
+    assert await courier_assignments.orders(db_session, courier_user.id) == {first[0][0]}
+    assert await dispatcher.tick(db_session) == []  # Курьер занят
+
+    service = OrderService(db_session)
+    order_id = first[0][0]
+    assert await service.transition_orders([order_id], OrderStatus.DELIVERING) == [order_id]
+    assert await service.transition_orders([order_id], OrderStatus.DELIVERED) == [order_id]
+    await db_session.refresh(courier)
+    assert courier.status == CourierStatus.ONLINE
+    assert await courier_assignments.orders(db_session, courier_user.id) == set()
+
+    second = await dispatcher.tick(db_session)
+    assert second == [(next(order.id for order in orders if order.id != order_id), courier.id)]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_endpoint_requires_admin(db_session):
+    """Внеочередной такт назначения затрагивает все рестораны - только администратору"""
+    staff = User(telegram_id=3001, role=UserRole.RESTAURANT)
+    admin = User(telegram_id=3002, role=UserRole.ADMIN)
+    db_session.add_all([staff, admin])
+    await db_session.commit()
+
+    current_user = staff.id
+    app = FastAPI()
+    app.include_router(couriers_api.router, prefix="/couriers")
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user_id] = lambda: current_user
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.post("/couriers/dispatch")).status_code == 403
+
+        current_user = admin.id
+        response = await client.post("/couriers/dispatch")
+        assert response.status_code == 200
+        assert response.json()["assignments"] == []
@@ -0,0 +1,117 @@
+﻿"""
+Тесты пространственного индекса
+"""
+
+import random
+from datetime import time
+
+import pytest
+
+from app.models import Restaurant
+from app.services.geo import GeoGridIndex, haversine_km
+from app.services.restaurant_service import RestaurantService, restaurant_geo_index
+
+
+def _random_points(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        (key, rng.uniform(55.55, 55.95), rng.uniform(37.35, 37.85), round(rng.uniform(0, 5), 1))
+        for key in range(1, count + 1)
+    ]
+
+
+def test_nearby_matches_brute_force():
+    """Индекс находит те же точки, что и полный перебор, в том же порядке"""
+    points = _random_points(2000)
+    index = GeoGridIndex(cell_size_deg=0.02)
+    index.load(points)
+
+    center = (55.75, 37.62)
+    expected = sorted(
+        (
+            (key, rating) for key, lat, lon, rating in points
+            if haversine_km(center[0], center[1], lat, lon) <= 5.0
+        ),
+        key=lambda item: (-item[1], item[0])
+    )
+
+    result = index.nearby(center[0], center[1], 5.0)
+
+    assert [key for key, _ in result] == [key for key, _ in expected]
+    assert all(distance <= 5.0 for _, distance in result)
+
+
+def test_nearby_pagination_is_stable():
+    """Страницы не пересекаются и в сумме дают полную выдачу"""
+    index = GeoGridIndex()
+    index.load(_random_points(1000))
+
+    full = index.nearby(55.75, 37.62, 10.0)
+    pages = []
+    for skip in range(0, len(full), 20):
+        pages.extend(index.nearby(55.75, 37.62, 10.0, skip=skip, limit=20))
+
+    assert pages == full
+
+
+def test_upsert_and_remove():
+    """Изменения видны в следующем запросе"""
+    index = GeoGridIndex()
+    index.load([(1, 55.75, 37.62, 4.0)])
+
+    index.upsert(2, 55.751, 37.621, 5.0)
+    assert [key for key, _ in index.nearby(55.75, 37.62, 1.0)] == [2, 1]
+
+    index.remove(2)
+    index.upsert(1, 56.5, 38.5, 4.0)
+    assert index.nearby(55.75, 37.62, 1.0) == []
+
+
+def _restaurant(name, latitude, **kwargs):
+    return Restaurant(
+        name=name, address="ул. Пушкина, 10", latitude=latitude, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_geo_index_follows_committed_changes_only(db_session):
+    """Индекс меняется после фиксации транзакции, откаченные изменения в него не попадают"""
+    restaurant_geo_index.clear()
+    service = RestaurantService(db_session)
+    try:
+        db_session.add(_restaurant("Пиццерия", 55.75, rating=4.5))
+        await db_session.commit()
+        assert len(await service.get_restaurants(latitude=55.75, longitude=37.62, max_distance=1.0)) == 1
+
+        phantom = _restaurant("Суши", 55.751)
+        db_session.add(phantom)
+        await db_session.flush()
+        assert phantom.id not in restaurant_geo_index
+        await db_session.rollback()
+        assert phantom.id not in restaurant_geo_index
+
+        sushi = _restaurant("Суши", 55.751)
+        db_session.add(sushi)
+        await db_session.commit()
+        assert sushi.id in restaurant_geo_index
+
+        sushi.is_active = False
+        await db_session.commit()
+        assert sushi.id not in restaurant_geo_index
+    finally:
+        restaurant_geo_index.clear()
+
+
+@pytest.mark.asyncio
+async def test_search_nearby_uses_bounding_box_and_exact_distance(db_session):
+    """Поиск по названию рядом: прямоугольник в SQL, точное расстояние в памяти"""
+    near = _restaurant("Пиццерия у дома", 55.75)
+    far = _restaurant("Пиццерия за городом", 55.80)
+    db_session.add_all([near, far])
+    await db_session.commit()
+
+    restaurants = await RestaurantService(db_session).get_restaurants(
+        search="пиццерия", latitude=55.75, longitude=37.62, max_distance=3.0
+    )
+    assert [restaurant.id for restaurant in restaurants] == [near.id]
@@ -0,0 +1,205 @@
+﻿"""
+Тесты приема геопозиций курьеров
+"""
+
+from datetime import datetime, time, timedelta, timezone
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import func, select
+
+from app.api import couriers, deps
+from app.api.deps import get_current_courier_id, get_current_user_id
+from app.core.database import get_db
+from app.models import Courier, DeliveryTracking, Order, Restaurant, User
+from app.services.location_service import CourierLocationIngestor, courier_assignments
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_history_and_latest_position(db_session):
+    """Пакет пингов пишется одной записью: история заказа и последняя позиция курьера"""
+    user = User(telegram_id=2001, first_name="Курьер")
+    restaurant = Restaurant(
+        name="Суши", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([user, restaurant])
+    await db_session.flush()
+
+    courier = Courier(user_id=user.id)
+    order = Order(
+        order_number="ORD-1", user_id=user.id, restaurant_id=restaurant.id,
+        subtotal=100, total=100, delivery_address="ул. Ленина, 25"
+    )
+    db_session.add_all([courier, order])
+    await db_session.commit()
+
+    ingestor = CourierLocationIngestor(buffer_size=100)
+    started = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    pings = [
+        {
+            "courier_id": courier.id,
+            "order_id": order.id,
+            "latitude": 55.75 + i * 0.001,
+            "longitude": 37.62,
+            "timestamp": started + timedelta(seconds=i * 5)
+        }
+        for i in range(10)
+    ]
+    # Запоздавший пинг не должен перезаписать последнюю позицию
+    pings.append({"courier_id": courier.id, "latitude": 0.0, "longitude": 0.0, "timestamp": started})
+
+    assert ingestor.ingest(pings) == 11
+    assert ingestor.latest(courier.id)[0] == pytest.approx(55.759)
+
+    assert await ingestor.flush(db_session) == 11
+    assert ingestor.pending == 0
+
+    history = await db_session.scalar(select(func.count()).select_from(DeliveryTracking))
+    assert history == 10
+
+    await db_session.refresh(courier)
+    assert courier.current_latitude == pytest.approx(55.759)
+    assert ingestor.stats()["flushed"] == 11
+
+
+def test_buffer_overflow_is_counted():
+    """При переполнении буфера вытесняются самые старые пинги"""
+    ingestor = CourierLocationIngestor(buffer_size=5)
+    ingestor.ingest({"courier_id": 1, "latitude": 55.0, "longitude": 37.0} for _ in range(8))
+
+    assert ingestor.pending == 5
+    assert ingestor.stats()["dropped"] == 3
+
+
+@pytest.mark.asyncio
+async def test_unknown_courier_is_not_requeued(db_session):
+    """Пинг несуществующего курьера не мешает остальным и не повторяется"""
+    user = User(telegram_id=2002, first_name="Курьер")
+    db_session.add(user)
+    await db_session.flush()
+    courier = Courier(user_id=user.id)
+    db_session.add(courier)
+    await db_session.commit()
+
+    ingestor = CourierLocationIngestor()
+    ingestor.ingest([
+        {"courier_id": courier.id, "latitude": 55.75, "longitude": 37.62},
+        {"courier_id": courier.id + 100, "latitude": 55.0, "longitude": 37.0},
+        # Несуществующий заказ отбрасывается один, не весь пакет
+        {"courier_id": courier.id, "order_id": 999, "latitude": 55.74, "longitude": 37.62,
+         "timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+    ])
+
+    assert await ingestor.flush(db_session) == 3
+    assert await ingestor.flush(db_session) == 0
+    stats = ingestor.stats()
+    assert (stats["flush_errors"], stats["rejected"]) == (0, 1)
+    assert await db_session.scalar(select(func.count()).select_from(DeliveryTracking)) == 0
+
+    await db_session.refresh(courier)
+    assert courier.current_latitude == pytest.approx(55.75)
+
+
+class _BrokenSession:
+    """Сессия с оборванным соединением"""
+
+    async def execute(self, *args, **kwargs):
+        raise ConnectionResetError("connection reset by peer")
+
+    async def rollback(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_requeues_batch(db_session):
+    """Сбой соединения не теряет пакет: он повторяется при следующей записи"""
+    user = User(telegram_id=2005, first_name="Курьер")
+    db_session.add(user)
+    await db_session.flush()
+    courier = Courier(user_id=user.id)
+    db_session.add(courier)
+    await db_session.commit()
+
+    ingestor = CourierLocationIngestor(buffer_size=4, batch_size=3)
+    ingestor.ingest([
+        {"courier_id": courier.id, "latitude": 55.70 + i / 100, "longitude": 37.62}
+        for i in range(3)
+    ])
+
+    assert await ingestor.flush(_BrokenSession()) == 0
+    # Пока буфер ждет повтора, новые пинги вытесняют самые старые
+    ingestor.ingest([{"courier_id": courier.id, "latitude": 55.80, "longitude": 37.62}])
+    assert await ingestor.flush(_BrokenSession()) == 0
+    stats = ingestor.stats()
+    assert (stats["pending"], stats["dropped"], stats["flush_errors"]) == (4, 0, 2)
+
+    ingestor.ingest([{"courier_id": courier.id, "latitude": 55.81, "longitude": 37.62}])
+    assert ingestor.stats()["dropped"] == 1
+    assert await ingestor.flush(db_session) + await ingestor.flush(db_session) == 4
+
+    await db_session.refresh(courier)
+    assert courier.current_latitude == pytest.approx(55.81)
+
+
+@pytest.mark.asyncio
+async def test_locations_endpoint_takes_courier_from_token(db_session, monkeypatch):
+    """courier_id берется из токена, пинги чужих заказов отвергаются"""
+    courier_user, client_user = User(telegram_id=2003), User(telegram_id=2004)
+    restaurant = Restaurant(
+        name="Суши", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([courier_user, client_user, restaurant])
+    await db_session.flush()
+    courier = Courier(user_id=courier_user.id)
+    own, foreign = [
+        Order(
+            order_number=f"ORD-L{i}", user_id=client_user.id, restaurant_id=restaurant.id,
+            courier_id=courier_user.id if i == 0 else None,
+            subtotal=100, total=100, delivery_address="ул. Ленина, 25"
+        )
+        for i in range(2)
+    ]
+    db_session.add_all([courier, own, foreign])
+    await db_session.commit()
+    courier_assignments.clear()
+
+    ingestor = CourierLocationIngestor()
+    monkeypatch.setattr(couriers, "courier_locations", ingestor)
+    current_user = client_user.id
+    app = FastAPI()
+    app.include_router(couriers.router, prefix="/couriers")
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user_id] = lambda: current_user
+
+    batch = {"pings": [
+        {"courier_id": 999, "order_id": own.id, "latitude": 55.75, "longitude": 37.62},
+        {"order_id": foreign.id, "latitude": 55.0, "longitude": 37.0}
+    ]}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.post("/couriers/locations", json=batch)).status_code == 403
+        current_user = courier_user.id
+        response = await client.post("/couriers/locations", json=batch)
+
+    assert response.json() == {"accepted": 1, "pending": 1}
+    assert ingestor.latest(courier.id)[0] == pytest.approx(55.75) and ingestor.latest(999) is None
+    assert ingestor.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_courier_ids_cache_is_bounded(db_session, monkeypatch):
+    """Кэш user_id -> id курьера хранит только последних курьеров"""
+    users = [User(telegram_id=2100 + i, first_name=f"Курьер {i}") for i in range(3)]
+    db_session.add_all(users)
+    await db_session.flush()
+    db_session.add_all([Courier(user_id=user.id) for user in users])
+    await db_session.commit()
+    monkeypatch.setattr(deps, "COURIER_IDS_CACHE_SIZE", 2)
+    monkeypatch.setattr(deps, "_courier_ids", deps.OrderedDict())
+
+    for user in (users[0], users[1], users[0], users[2]):
+        await get_current_courier_id(user.id, db_session)
+
+    assert list(deps._courier_ids) == [users[0].id, users[2].id]
@@ -0,0 +1,80 @@
+"""
+Тесты журнала бонусных баллов
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models import LoyaltyTransaction, User
+from app.services.user_service import UserService
+
+AWARDS = 1000
+
+
+@pytest.mark.asyncio
+async def test_parallel_awards_are_not_lost(db_engine, db_session):
+    """1000 параллельных начислений: баланс равен сумме журнала"""
+    user = User(telegram_id=6001, first_name="Тест", loyalty_points=10)
+    db_session.add(user)
+    await db_session.commit()
+
+    # Каждое начисление - отдельное соединение; SQLite пропускает писателей по одному
+    engine = create_async_engine(db_engine.url, connect_args={"timeout": 120})
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def award(points):
+        async with session_factory() as db:
+            assert await UserService(db).add_loyalty_points(user.id, points)
+
+    try:
+        await asyncio.gather(*(award(number % 7 + 1) for number in range(AWARDS)))
+    finally:
+        await engine.dispose()
+
+    expected = sum(number % 7 + 1 for number in range(AWARDS))
+    balance = await db_session.scalar(select(User.loyalty_points).where(User.id == user.id))
+    entries, ledger = (await db_session.execute(
+        select(func.count(LoyaltyTransaction.id), func.sum(LoyaltyTransaction.points))
+        .where(LoyaltyTransaction.user_id == user.id)
+    )).one()
+
+    assert (entries, ledger) == (AWARDS, expected)
+    assert balance == 10 + expected
+
+    async with sessionmaker(db_engine, class_=AsyncSession)() as db:
+        info = await UserService(db).get_loyalty_info(user.id)
+    assert info["loyalty_points"] == 10 + expected
+
+
+@pytest.mark.asyncio
+async def test_award_to_missing_user(db_session):
+    """Несуществующему пользователю баллы не начисляются и в журнал не пишутся"""
+    assert not await UserService(db_session).add_loyalty_points(999, 5)
+    assert await db_session.scalar(select(func.count(LoyaltyTransaction.id))) == 0
+
+
+@pytest.mark.asyncio
+async def test_loyalty_level_reads_row_counters(db_engine, db_session):
+    """Уровень лояльности считается по счетчикам строки пользователя без запросов к заказам"""
+    user = User(telegram_id=6002, first_name="Тест", total_orders=20, total_spent=12_000.0)
+    db_session.add(user)
+    await db_session.commit()
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        info = await UserService(db_session).get_loyalty_info(user.id)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    assert (info["total_orders"], info["total_spent"], info["loyalty_level"]) == (20, 12_000.0, "Silver")
+    assert (info["discount_percent"], info["points_to_next_level"]) == (5, 30)
+    assert len(statements) == 1 and "FROM orders" not in statements[0]
@@ -0,0 +1,145 @@
+"""
+Тесты кэша file_id изображений
+"""
+
+import asyncio
+from datetime import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+from telegram import InputFile, PhotoSize
+from telegram.error import BadRequest
+
+from app.bot import handlers
+from app.bot.render import render_cache
+from app.bot.sender import SendPriority
+from app.core.config import settings
+from app.models import MenuCategory, MenuItem, Restaurant
+from app.services.media_cache import MediaCache
+from app.services.menu_cache import menu_cache
+
+MEDIA_CHAT = -100500
+
+
+class StubBot:
+    """Бот, который выдает file_id на каждую загрузку и запоминает отправки"""
+
+    def __init__(self, rejected=()):
+        self.sent = []
+        self.rejected = set(rejected)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        await asyncio.sleep(0.01)
+        if photo in self.rejected:
+            raise BadRequest("Wrong file identifier/http url specified")
+        if isinstance(photo, InputFile):
+            photo = "upload"
+        self.sent.append((chat_id, photo, kwargs.get("rate_limit_args")))
+        file_id = photo if photo.startswith("file-") else f"file-{len(self.sent)}"
+        return SimpleNamespace(photo=[
+            PhotoSize(f"{file_id}-small", f"{file_id}-u-small", 90, 90),
+            PhotoSize(file_id, f"{file_id}-u", 800, 800)
+        ])
+
+
+def _session_factory(db_engine):
+    return sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.mark.asyncio
+async def test_image_is_uploaded_once_and_persisted(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "pizza.jpg").write_bytes(b"jpeg pizza")
+    (tmp_path / "pizza-copy.jpg").write_bytes(b"jpeg pizza")
+    bot = StubBot()
+    cache = MediaCache()
+
+    # Одновременные первые отправки ждут одну загрузку
+    await asyncio.gather(*(cache.send_photo(bot, chat_id, "/uploads/pizza.jpg") for chat_id in (1, 2, 3)))
+    assert [photo for _, photo, _ in bot.sent] == ["upload", "file-1", "file-1"]
+
+    await cache.send_photo(bot, 4, "/uploads/pizza-copy.jpg")  # Тот же файл под другим URL
+    await cache.send_photo(bot, 5, "https://cdn.example.com/logo.png")
+    await cache.send_photo(bot, 6, "https://cdn.example.com/logo.png")
+    assert [photo for _, photo, _ in bot.sent[3:]] == ["file-1", "https://cdn.example.com/logo.png", "file-5"]
+
+    with pytest.raises(ValueError):
+        await cache.send_photo(bot, 7, "/uploads/../secret.txt")
+
+    stats = cache.stats()
+    assert (stats["uploads"], stats["hash_hits"], stats["url_sends"], stats["hits"]) == (1, 1, 1, 3)
+    assert stats["uploaded_bytes"] == len(b"jpeg pizza")
+
+    assert await cache.flush(db_session) == 3
+    restarted = MediaCache()
+    assert await restarted.load(db_session) == 3
+    assert restarted.file_id("/uploads/pizza.jpg") == "file-1"
+    assert restarted.file_id("https://cdn.example.com/logo.png") == "file-5"
+
+
+@pytest.mark.asyncio
+async def test_rejected_file_id_is_forgotten_and_reuploaded(db_session):
+    bot = StubBot()
+    cache = MediaCache()
+    await cache.send_photo(bot, 1, "https://cdn.example.com/soup.png")
+    await cache.flush(db_session)
+
+    bot.rejected.add("file-1")  # Например, сменился токен бота
+    await cache.send_photo(bot, 2, "https://cdn.example.com/soup.png")
+
+    assert bot.sent[-1][1] == "https://cdn.example.com/soup.png"
+    assert cache.file_id("https://cdn.example.com/soup.png") == "file-2"
+    assert cache.stats()["stale"] == 1
+    await cache.flush(db_session)
+
+    restarted = MediaCache()
+    await restarted.load(db_session)
+    assert restarted.file_id("https://cdn.example.com/soup.png") == "file-2"
+
+
+@pytest.mark.asyncio
+async def test_restaurant_prewarm_then_item_card_sent_by_file_id(db_engine, db_session, monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MEDIA_CHAT_ID", MEDIA_CHAT)
+    factory = _session_factory(db_engine)
+    monkeypatch.setattr(handlers, "AsyncSessionLocal", factory)
+    render_cache.clear()
+    menu_cache.clear()
+
+    restaurant = Restaurant(
+        name="Pizza Palace", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0), logo_url="https://cdn.example.com/logo.png"
+    )
+    db_session.add(restaurant)
+    await db_session.flush()
+    category = MenuCategory(name="Пицца", restaurant_id=restaurant.id, image_url="https://cdn.example.com/pizza.png")
+    db_session.add(category)
+    await db_session.flush()
+    item = MenuItem(
+        name="Маргарита", price=450.0, restaurant_id=restaurant.id, category_id=category.id,
+        image_url="https://cdn.example.com/margherita.png"
+    )
+    db_session.add(item)
+    await db_session.commit()
+
+    bot = StubBot()
+    cache = MediaCache()
+    monkeypatch.setattr(handlers, "media_cache", cache)
+    cache.start(factory)
+    try:
+        task = cache.prewarm_restaurant(bot, restaurant.id)
+        assert cache.prewarm_restaurant(bot, restaurant.id) is None  # Версия меню та же
+        assert await task == 3
+        assert {chat_id for chat_id, _, _ in bot.sent} == {MEDIA_CHAT}
+        assert {priority for _, _, priority in bot.sent} == {SendPriority.MARKETING}
+
+        query = SimpleNamespace(
+            data=f"item_{restaurant.id}_{item.id}", message=SimpleNamespace(chat_id=42), answer=lambda: asyncio.sleep(0)
+        )
+        await handlers.item_handler(SimpleNamespace(callback_query=query), SimpleNamespace(bot=bot))
+    finally:
+        await cache.stop()
+
+    assert bot.sent[-1] == (42, cache.file_id("https://cdn.example.com/margherita.png"), None)
+    assert cache.stats()["prewarmed"] == 3 and cache.stats()["hits"] == 1
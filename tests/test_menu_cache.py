@@ -0,0 +1,129 @@
+"""
+Тесты кэша меню
+"""
+
+import asyncio
+import json
+from datetime import time
+from typing import List
+
+import pytest
+from pydantic import TypeAdapter
+
+from app.api.restaurants import MenuCategoryResponse
+from app.models import MenuCategory, MenuItem, Restaurant
+from app.services.menu_cache import MenuCache, menu_cache
+from app.services.restaurant_service import RestaurantService
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    """Одновременные промахи по одному ключу выполняют одну загрузку"""
+    cache = MenuCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return b"[]"
+
+    results = await asyncio.gather(*(cache.get_or_load(1, "menu", loader) for _ in range(10)))
+
+    assert results == [b"[]"] * 10
+    assert len(loads) == 1
+    assert cache.stats()["coalesced"] == 9
+
+    assert await cache.get_or_load(1, "menu", loader) == b"[]"
+    assert cache.stats()["hits"] == 1
+
+    cache.invalidate(1)
+    await cache.get_or_load(1, "menu", loader)
+    assert len(loads) == 2
+
+
+@pytest.mark.asyncio
+async def test_menu_snapshot_invalidated_on_write(db_session):
+    """Снимок меню совпадает с ответом API и обновляется после изменения блюда"""
+    menu_cache.clear()
+
+    restaurant = Restaurant(
+        name="Pizza Palace", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add(restaurant)
+    await db_session.flush()
+
+    category = MenuCategory(name="Пицца", restaurant_id=restaurant.id)
+    db_session.add(category)
+    await db_session.flush()
+
+    item = MenuItem(name="Маргарита", price=450.0, restaurant_id=restaurant.id, category_id=category.id)
+    hidden = MenuItem(
+        name="Сезонная", price=500.0, restaurant_id=restaurant.id,
+        category_id=category.id, is_available=False
+    )
+    db_session.add_all([item, hidden])
+    await db_session.commit()
+
+    service = RestaurantService(db_session)
+    snapshot = await service.get_menu_snapshot(restaurant.id)
+
+    categories = await service.get_restaurant_menu(restaurant.id)
+    expected = [
+        MenuCategoryResponse(**{
+            "id": category.id, "name": category.name, "description": None, "image_url": None,
+            "items": [menu_item.__dict__ for menu_item in categories[0].menu_items]
+        })
+        for category in categories
+    ]
+    assert json.loads(snapshot) == json.loads(TypeAdapter(List[MenuCategoryResponse]).dump_json(expected))
+    assert [entry["name"] for entry in json.loads(snapshot)[0]["items"]] == ["Маргарита"]
+
+    assert await service.get_menu_snapshot(restaurant.id) is snapshot
+
+    item.price = 490.0
+    await db_session.commit()
+
+    updated = json.loads(await service.get_menu_snapshot(restaurant.id))
+    assert updated[0]["items"][0]["price"] == 490.0
+
+    assert await service.get_menu_snapshot(restaurant.id + 1) is None
+
+
+@pytest.mark.asyncio
+async def test_other_process_sees_change_through_shared_versions(db_session):
+    """Кэш другого процесса сбрасывается по общей версии из cache_versions"""
+    other = MenuCache()
+
+    restaurant = Restaurant(
+        name="Суши", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add(restaurant)
+    await db_session.commit()
+    await other.sync(db_session)
+    catalog_version = other.catalog_version()
+
+    await other.get_or_load(restaurant.id, "menu", _load_empty)
+    version = other.version(restaurant.id)
+    assert await other.sync(db_session) == 0
+
+    # Несколько записей в одной транзакции повышают общую версию один раз
+    db_session.add_all([
+        MenuItem(name=name, price=300.0, restaurant_id=restaurant.id) for name in ("Филадельфия", "Калифорния")
+    ])
+    await db_session.commit()
+
+    assert other.version(restaurant.id) == version
+    assert await other.sync(db_session) == 1
+    assert other.version(restaurant.id) == version + 1
+    assert other.catalog_version() == catalog_version
+
+    restaurant.name = "Суши-бар"
+    await db_session.commit()
+    assert await other.sync(db_session) == 2
+    assert other.catalog_version() == catalog_version + 1
+
+
+async def _load_empty():
+    return b"[]"
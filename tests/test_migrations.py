@@ -0,0 +1,88 @@
+"""
+Тесты миграций существующей базы
+"""
+
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.database import Base
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "migrations"))
+
+from init_db import upgrade_database  # noqa: E402
+
+# Индексы и столбцы, которых нет в базе предыдущей версии
+NEW_INDEXES = [
+    "ix_orders_stats_pending", "ix_orders_stats_pending_restaurant",
+    "ix_orders_user_created", "ix_restaurants_active_rating", "ix_menu_items_restaurant_sort",
+    "ix_restaurants_lat_lng",
+]
+NEW_COLUMNS = [
+    ("orders", "stats_applied"),
+    ("restaurants", "logo_variants"), ("restaurants", "cover_variants"), ("menu_items", "image_variants"),
+    ("broadcasts", "run_token"),
+]
+
+
+def _old_database(tmp_path):
+    """SQLite база со схемой до миграций и несколькими заказами"""
+    path = tmp_path / "old.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for index in NEW_INDEXES:
+            conn.execute(text(f"DROP INDEX {index}"))
+        for table, column in NEW_COLUMNS:
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+        conn.execute(text(
+            "INSERT INTO users (id, telegram_id, role, is_active, total_orders, total_spent) "
+            "VALUES (1, 100, 'CLIENT', 1, 0, 0)"
+        ))
+        conn.execute(text(
+            "INSERT INTO restaurants (id, name, address, latitude, longitude, work_start, work_end, "
+            "is_active, rating, total_orders, total_revenue) "
+            "VALUES (1, 'Суши', 'ул. Мира, 1', 55.75, 37.62, '09:00:00', '23:00:00', 1, 4.5, 0, 0)"
+        ))
+        for order_id, status in enumerate(("DELIVERED", "DELIVERED", "CANCELLED", "PENDING"), start=1):
+            conn.execute(text(
+                "INSERT INTO orders (id, order_number, user_id, restaurant_id, status, subtotal, total, "
+                "delivery_fee, discount, delivery_address, payment_method) "
+                f"VALUES ({order_id}, 'ORD-{order_id}', 1, 1, '{status}', 300, 300, 0, 0, 'ул. Ленина, 25', 'CASH')"
+            ))
+    return engine, path
+
+
+def test_upgrade_brings_old_database_to_current_schema(tmp_path):
+    engine, path = _old_database(tmp_path)
+
+    upgrade_database(f"sqlite+aiosqlite:///{path}")
+
+    inspector = inspect(engine)
+    for table, column in NEW_COLUMNS:
+        assert column in {c["name"] for c in inspector.get_columns(table)}
+    indexes = {index["name"] for table in ("orders", "restaurants", "menu_items") for index in inspector.get_indexes(table)}
+    assert set(NEW_INDEXES) <= indexes
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT total_orders, total_revenue FROM restaurants")).one() == (2, 600.0)
+        assert conn.execute(text("SELECT total_orders, total_spent FROM users")).one() == (2, 600.0)
+        folded = conn.execute(text("SELECT id FROM orders WHERE stats_applied ORDER BY id")).scalars().all()
+        assert folded == [1, 2, 3]
+    engine.dispose()
+
+
+def test_upgrade_of_new_database_changes_nothing(tmp_path):
+    """База, созданная init_db() с текущими моделями, проходит миграции без изменений"""
+    path = tmp_path / "new.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    upgrade_database(f"sqlite+aiosqlite:///{path}")
+    upgrade_database(f"sqlite+aiosqlite:///{path}")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar_one()
+    engine.dispose()
@@ -0,0 +1,268 @@
+﻿"""
+Тесты сервиса заказов
+"""
+
+from datetime import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.api import orders as orders_api
+from app.api.deps import get_current_user_id
+from app.api.orders import OrderCreate, OrderItemCreate
+from app.core.database import get_db
+from app.models import Restaurant, MenuItem, User, UserRole, OrderItem, OrderStatus, LoyaltyTransaction
+from app.services import order_service
+from app.services.order_service import OrderService
+from app.services.tracking_hub import tracking_hub
+
+
+async def _create_restaurant_with_menu(db, items_count=20):
+    user = User(telegram_id=1001, first_name="Тест")
+    restaurant = Restaurant(
+        name="Pizza Palace",
+        address="ул. Пушкина, 10",
+        latitude=55.75,
+        longitude=37.62,
+        work_start=time(9, 0),
+        work_end=time(23, 0)
+    )
+    db.add_all([user, restaurant])
+    await db.flush()
+    
+    menu_items = [
+        MenuItem(name=f"Блюдо {i}", price=100.0 + i, restaurant_id=restaurant.id)
+        for i in range(items_count)
+    ]
+    db.add_all(menu_items)
+    await db.commit()
+    
+    return user, restaurant, menu_items
+
+
+@pytest.mark.asyncio
+async def test_create_order_query_count(db_engine, db_session):
+    """Заказ из 20 позиций с начислением баллов создается за 5 запросов к базе"""
+    user, restaurant, menu_items = await _create_restaurant_with_menu(db_session)
+    
+    order_data = OrderCreate(
+        restaurant_id=restaurant.id,
+        items=[OrderItemCreate(menu_item_id=item.id, quantity=2) for item in menu_items],
+        delivery_address="ул. Ленина, 25",
+        delivery_latitude=55.76,
+        delivery_longitude=37.63
+    )
+    
+    statements = []
+    
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        order = await OrderService(db_session).create_order(user.id, order_data)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", count_statement)
+    
+    # Цена, заказ, позиции, баланс баллов и запись в журнале баллов
+    assert len(statements) <= 5, "\n".join(s[:160] for s in statements)
+    assert order.id is not None
+    assert order.created_at is not None
+    assert order.subtotal == sum((100.0 + i) * 2 for i in range(20))
+    assert order.delivery_fee == 0.0  # выше порога бесплатной доставки
+    assert order.estimated_delivery_time is not None
+    
+    result = await db_session.execute(OrderItem.__table__.select())
+    assert len(result.all()) == 20
+    
+    result = await db_session.execute(LoyaltyTransaction.__table__.select())
+    entry = result.one()
+    assert (entry.user_id, entry.order_id, entry.points) == (user.id, order.id, int(order.total // 100))
+
+
+@pytest.mark.asyncio
+async def test_create_order_rejects_unavailable_item(db_session):
+    """Недоступное блюдо не попадает в заказ"""
+    user, restaurant, menu_items = await _create_restaurant_with_menu(db_session, items_count=2)
+    menu_items[1].is_available = False
+    await db_session.commit()
+    
+    order_data = OrderCreate(
+        restaurant_id=restaurant.id,
+        items=[OrderItemCreate(menu_item_id=item.id, quantity=1) for item in menu_items],
+        delivery_address="ул. Ленина, 25"
+    )
+    
+    with pytest.raises(ValueError, match="not available"):
+        await OrderService(db_session).create_order(user.id, order_data)
+
+
+async def _create_orders(db, count=3):
+    user, restaurant, menu_items = await _create_restaurant_with_menu(db, items_count=1)
+    service = OrderService(db)
+    order_data = OrderCreate(
+        restaurant_id=restaurant.id,
+        items=[OrderItemCreate(menu_item_id=menu_items[0].id, quantity=1)],
+        delivery_address="ул. Ленина, 25"
+    )
+    orders = [await service.create_order(user.id, order_data) for _ in range(count)]
+    return service, user, restaurant, orders
+
+
+@pytest.mark.asyncio
+async def test_status_transition_is_compare_and_set(db_session):
+    """Недопустимый переход не меняет статус"""
+    service, user, _, orders = await _create_orders(db_session, count=1)
+    order_id = orders[0].id
+    admin = User(telegram_id=1003, role=UserRole.ADMIN)
+    db_session.add(admin)
+    await db_session.commit()
+    
+    assert not await service.update_order_status(order_id, OrderStatus.DELIVERED, admin.id)
+    assert await service.update_order_status(order_id, OrderStatus.CONFIRMED, admin.id)
+    assert not await service.update_order_status(order_id, OrderStatus.CONFIRMED, admin.id)
+    
+    order = await service.get_order(order_id, user.id)
+    await db_session.refresh(order)
+    assert order.status == OrderStatus.CONFIRMED
+    assert order.confirmed_at is not None
+    
+    assert await service.cancel_order(order_id, user.id)
+    assert not await service.cancel_order(order_id, user.id)
+
+
+@pytest.mark.asyncio
+async def test_owner_can_only_cancel_and_courier_only_deliver(db_session):
+    """Клиент не продвигает свой заказ сам, курьер - только забирает и доставляет свой"""
+    service, user, _, orders = await _create_orders(db_session, count=2)
+    courier = User(telegram_id=1002, role=UserRole.COURIER)
+    admin = User(telegram_id=1003, role=UserRole.ADMIN)
+    db_session.add_all([courier, admin])
+    await db_session.flush()
+    orders[0].courier_id = courier.id
+    await db_session.commit()
+    order_id = orders[0].id
+    
+    for new_status in (OrderStatus.CONFIRMED, OrderStatus.DELIVERED):
+        assert not await service.update_order_status(order_id, new_status, user.id)
+    for new_status in (OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.READY):
+        assert not await service.update_order_status(order_id, new_status, courier.id)
+        assert await service.update_order_status(order_id, new_status, admin.id)
+    
+    assert not await service.update_order_status(order_id, OrderStatus.DELIVERING, user.id)
+    assert await service.update_order_status(order_id, OrderStatus.DELIVERING, courier.id)
+    assert await service.update_order_status(order_id, OrderStatus.DELIVERED, courier.id)
+    
+    # Чужой заказ курьер не трогает, свой клиент может отменить
+    assert not await service.update_order_status(orders[1].id, OrderStatus.CANCELLED, courier.id)
+    assert await service.update_order_status(orders[1].id, OrderStatus.CANCELLED, user.id)
+
+
+@pytest.mark.asyncio
+async def test_notification_failure_keeps_committed_transition(db_session, monkeypatch):
+    """Сбой постановки уведомления не превращает сохраненный переход в ошибку"""
+    service, user, _, orders = await _create_orders(db_session, count=1)
+    
+    async def broken_notify(db, order_ids, status):
+        raise RuntimeError("database is locked")
+    
+    monkeypatch.setattr(order_service.broadcast_engine, "notify_order_status", broken_notify)
+    assert await service.cancel_order(orders[0].id, user.id)
+    
+    order = await service.get_order(orders[0].id, user.id)
+    await db_session.refresh(order)
+    assert order.status == OrderStatus.CANCELLED
+
+
+@pytest.mark.asyncio
+async def test_cancel_revokes_loyalty_points(db_session):
+    """Баллы за отмененный заказ списываются один раз"""
+    service, user, _, orders = await _create_orders(db_session, count=1)
+    order_id = orders[0].id
+    await db_session.refresh(user)
+    assert user.loyalty_points > 0
+    
+    assert await service.cancel_order(order_id, user.id)
+    assert not await service.cancel_order(order_id, user.id)
+    
+    await db_session.refresh(user)
+    assert user.loyalty_points == 0
+    
+    result = await db_session.execute(
+        LoyaltyTransaction.__table__.select().order_by(LoyaltyTransaction.id)
+    )
+    assert [(entry.order_id, entry.reason) for entry in result.all()] == [
+        (order_id, "order"), (order_id, "order_cancel")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_transition_reports_moved_orders(db_session):
+    """Массовый переход сообщает, какие заказы действительно сменили статус"""
+    service, user, restaurant, orders = await _create_orders(db_session, count=3)
+    ids = [order.id for order in orders]
+    
+    await service.cancel_order(ids[1], user.id)
+    
+    moved = await service.transition_orders(ids, OrderStatus.CONFIRMED, restaurant_id=restaurant.id)
+    assert sorted(moved) == [ids[0], ids[2]]
+    
+    assert await service.transition_orders(ids, OrderStatus.CONFIRMED, restaurant_id=restaurant.id) == []
+    assert await service.transition_orders(ids, OrderStatus.PREPARING, restaurant_id=restaurant.id + 1) == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_status_endpoint_requires_admin(db_session):
+    """Массовый переход - только администратору, restaurant_id сужает выборку"""
+    service, user, restaurant, orders = await _create_orders(db_session, count=2)
+    staff = User(telegram_id=1002, role=UserRole.RESTAURANT)
+    admin = User(telegram_id=1003, role=UserRole.ADMIN)
+    db_session.add_all([staff, admin])
+    await db_session.commit()
+
+    current_user = user.id
+    app = FastAPI()
+    app.include_router(orders_api.router, prefix="/orders")
+    app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_current_user_id] = lambda: current_user
+
+    ids = [order.id for order in orders]
+    body = {"order_ids": ids, "new_status": OrderStatus.CONFIRMED.value}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.patch("/orders/status", json=body)).status_code == 403
+
+        current_user = staff.id
+        response = await client.patch("/orders/status", json={**body, "restaurant_id": restaurant.id})
+        assert response.status_code == 403
+
+        current_user = admin.id
+        response = await client.patch("/orders/status", json={**body, "restaurant_id": restaurant.id + 1})
+        assert response.json()["moved"] == []
+        response = await client.patch("/orders/status", json={**body, "restaurant_id": restaurant.id})
+        assert sorted(response.json()["moved"]) == ids
+        body["new_status"] = OrderStatus.PREPARING.value
+        response = await client.patch("/orders/status", json=body)
+        assert sorted(response.json()["moved"]) == ids
+
+
+@pytest.mark.asyncio
+async def test_admin_can_track_any_order(db_engine, db_session, monkeypatch):
+    """Подписка на отслеживание - владельцу заказа и администратору"""
+    service, user, _, orders = await _create_orders(db_session, count=1)
+    stranger = User(telegram_id=1002)
+    admin = User(telegram_id=1003, role=UserRole.ADMIN)
+    db_session.add_all([stranger, admin])
+    await db_session.commit()
+    monkeypatch.setattr(
+        orders_api, "AsyncSessionLocal", sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+    
+    assert await orders_api._open_tracking_subscription(orders[0].id, stranger.id) is None
+    for user_id in (user.id, admin.id):
+        subscription = await orders_api._open_tracking_subscription(orders[0].id, user_id)
+        assert subscription is not None and subscription.order_id == orders[0].id
+        tracking_hub.unsubscribe(subscription)
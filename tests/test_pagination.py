@@ -0,0 +1,94 @@
+"""
+Тесты курсорной пагинации
+"""
+
+from datetime import datetime, time
+
+import pytest
+
+from app.models import MenuItem, Order, Restaurant, User
+from app.services.order_service import OrderService
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.restaurant_service import RestaurantService
+
+
+def test_cursor_roundtrip():
+    """Курсор восстанавливает значения ключа, испорченный курсор отклоняется"""
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 250)
+    cursor = encode_cursor(created_at, 42)
+
+    assert decode_cursor(cursor, (datetime, int)) == (created_at, 42)
+    assert decode_cursor(encode_cursor(4, 7), (float, int)) == (4.0, 7)
+
+    for broken in ("", "!!!", cursor[:-3], encode_cursor("x", 1), encode_cursor(created_at)):
+        with pytest.raises(ValueError):
+            decode_cursor(broken, (datetime, int))
+
+
+async def _collect(fetch, cursor_of, limit):
+    pages, cursor = [], None
+    while True:
+        page = await fetch(limit, cursor)
+        pages.append([row.id for row in page])
+        if len(page) < limit:
+            return pages
+        cursor = cursor_of(page[-1])
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_match_offset_order(db_session):
+    """Курсорные страницы проходят весь список без пропусков и повторов, как skip/limit"""
+    user = User(telegram_id=2001, first_name="Тест")
+    restaurants = [
+        Restaurant(
+            name=f"Ресторан {i}", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+            work_start=time(9, 0), work_end=time(23, 0), rating=float(i % 3)
+        )
+        for i in range(11)
+    ]
+    db_session.add_all([user] + restaurants)
+    await db_session.flush()
+
+    # Несколько заказов с одинаковым временем - порядок внутри определяет id
+    orders = [
+        Order(
+            order_number=f"ORD-P{i}", user_id=user.id, restaurant_id=restaurants[0].id,
+            subtotal=100, total=100, delivery_address="ул. Ленина, 25",
+            created_at=datetime(2024, 5, 1, 12, i // 4)
+        )
+        for i in range(13)
+    ]
+    items = [
+        MenuItem(name=f"Блюдо {i % 4}", price=100.0, restaurant_id=restaurants[0].id, sort_order=i % 2)
+        for i in range(9)
+    ]
+    db_session.add_all(orders + items)
+    await db_session.commit()
+
+    order_service = OrderService(db_session)
+    order_pages = await _collect(
+        lambda limit, cursor: order_service.get_user_orders(user.id, limit=limit, cursor=cursor),
+        order_service.order_cursor, 5
+    )
+    expected = await order_service.get_user_orders(user.id, limit=100)
+    assert sum(order_pages, []) == [order.id for order in expected]
+    assert [len(page) for page in order_pages] == [5, 5, 3]
+
+    restaurant_service = RestaurantService(db_session)
+    restaurant_pages = await _collect(
+        lambda limit, cursor: restaurant_service.get_restaurants(limit=limit, cursor=cursor),
+        restaurant_service.restaurant_cursor, 4
+    )
+    expected = await restaurant_service.get_restaurants(limit=100)
+    assert sum(restaurant_pages, []) == [restaurant.id for restaurant in expected]
+    assert len(expected) == 11
+
+    item_pages = await _collect(
+        lambda limit, cursor: restaurant_service.get_menu_items(restaurants[0].id, limit=limit, cursor=cursor),
+        restaurant_service.menu_item_cursor, 2
+    )
+    expected = await restaurant_service.get_menu_items(restaurants[0].id)
+    assert sum(item_pages, []) == [item.id for item in expected]
+
+    with pytest.raises(ValueError):
+        await restaurant_service.get_restaurants(cursor=order_service.order_cursor(orders[0]))
@@ -0,0 +1,166 @@
+"""
+Тесты популярности блюд
+"""
+
+from datetime import time
+
+import pytest
+from sqlalchemy import event, select
+
+from app.api.orders import OrderCreate, OrderItemCreate
+from app.models import MenuItem, Restaurant, User
+from app.services.order_service import OrderService
+from app.services.popularity import PopularityEngine, popularity
+from app.services.restaurant_service import RestaurantService
+
+
+@pytest.mark.asyncio
+async def test_top_k_and_trending_window(db_session):
+    """Top-K следует за счетчиками, тренды забывают заказы старше часа"""
+    restaurant = Restaurant(
+        name="Суши", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add(restaurant)
+    await db_session.flush()
+    items = [MenuItem(name=f"Ролл {i}", price=300.0, restaurant_id=restaurant.id, orders_count=i) for i in range(6)]
+    db_session.add_all(items)
+    await db_session.commit()
+
+    engine = PopularityEngine(top_k=3)
+    engine.record(restaurant.id, [(items[0].id, 2)], now=0)
+    await engine.ensure_loaded(db_session, restaurant.id)
+
+    # Незаписанные приращения учитываются при загрузке
+    assert engine.top(restaurant.id, 3) == [(items[5].id, 5), (items[4].id, 4), (items[3].id, 3)]
+
+    engine.record(restaurant.id, [(items[0].id, 5), (items[1].id, 1)], now=1800)
+    assert engine.top(restaurant.id, 2) == [(items[0].id, 7), (items[5].id, 5)]
+
+    assert engine.trending(restaurant.id, 5, now=1800) == [(items[0].id, 7), (items[1].id, 1)]
+    assert engine.trending(restaurant.id, 5, now=3700) == [(items[0].id, 5), (items[1].id, 1)]
+    assert engine.trending(restaurant.id, 5, now=6000) == []
+
+
+@pytest.mark.asyncio
+async def test_orders_feed_popular_items(db_engine, db_session):
+    """Заказы попадают в популярное сразу, в orders_count - одним пакетным UPDATE"""
+    popularity.clear()
+
+    user = User(telegram_id=4001, first_name="Тест")
+    restaurant = Restaurant(
+        name="Пиццерия", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add_all([user, restaurant])
+    await db_session.flush()
+    items = [MenuItem(name=f"Пицца {i}", price=400.0, restaurant_id=restaurant.id) for i in range(3)]
+    flagged = MenuItem(name="Фирменная", price=600.0, restaurant_id=restaurant.id, is_popular=True)
+    db_session.add_all(items + [flagged])
+    await db_session.commit()
+
+    service = OrderService(db_session)
+    for menu_item, quantity in ((items[2], 3), (items[1], 1), (items[2], 1)):
+        await service.create_order(user.id, OrderCreate(
+            restaurant_id=restaurant.id,
+            items=[OrderItemCreate(menu_item_id=menu_item.id, quantity=quantity)],
+            delivery_address="ул. Ленина, 25"
+        ))
+
+    restaurants = RestaurantService(db_session)
+    popular = await restaurants.get_popular_items(restaurant.id, limit=3)
+    assert [item.id for item in popular] == [items[2].id, items[1].id, flagged.id]
+
+    trending = await restaurants.get_trending_items(restaurant.id)
+    assert [item.id for item in trending] == [items[2].id, items[1].id]
+
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    assert await popularity.flush(db_session) == 2
+    assert len([statement for statement in statements if statement.startswith("UPDATE")]) == 1
+
+    counts = dict((await db_session.execute(
+        select(MenuItem.id, MenuItem.orders_count).where(MenuItem.restaurant_id == restaurant.id)
+    )).all())
+    assert counts == {items[0].id: 0, items[1].id: 1, items[2].id: 4, flagged.id: 0}
+
+
+@pytest.mark.asyncio
+async def test_cancel_and_reload_update_counts(db_session):
+    """Отмена вычитает заказ, перезагрузка подхватывает приращения других процессов"""
+    restaurant = Restaurant(
+        name="Суши", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    db_session.add(restaurant)
+    await db_session.flush()
+    items = [MenuItem(name=f"Ролл {i}", price=300.0, restaurant_id=restaurant.id, orders_count=i) for i in range(4)]
+    db_session.add_all(items)
+    await db_session.commit()
+
+    engine = PopularityEngine(top_k=2, reload_interval=60)
+    await engine.ensure_loaded(db_session, restaurant.id, now=0)
+    for _ in range(10):
+        engine.record(restaurant.id, [(items[3].id, 1)], now=0)
+    assert len(engine._heaps[restaurant.id]) <= 4  # устаревшие записи кучи не копятся
+
+    engine.record(restaurant.id, [(items[1].id, 5)], now=0)
+    engine.retract(restaurant.id, [(items[1].id, 5)], ordered_at=0, now=30)
+    assert engine.top(restaurant.id, 2) == [(items[3].id, 13), (items[2].id, 2)]
+    assert engine.trending(restaurant.id, 5, now=30) == [(items[3].id, 10)]
+
+    # Отмена заказа, ушедшего из окна трендов, меняет только счетчики
+    engine.retract(restaurant.id, [(items[3].id, 1)], ordered_at=-7200, now=30)
+    assert engine.trending(restaurant.id, 5, now=30) == [(items[3].id, 10)]
+
+    await engine.flush(db_session)
+    assert await db_session.scalar(select(MenuItem.orders_count).where(MenuItem.id == items[3].id)) == 12
+
+    # Другой процесс записал свои заказы
+    await db_session.execute(
+        MenuItem.__table__.update().where(MenuItem.id == items[0].id).values(orders_count=50)
+    )
+    await db_session.commit()
+
+    await engine.ensure_loaded(db_session, restaurant.id, now=30)
+    assert engine.top(restaurant.id, 1) == [(items[3].id, 12)]
+    await engine.ensure_loaded(db_session, restaurant.id, now=90)
+    assert engine.top(restaurant.id, 2) == [(items[0].id, 50), (items[3].id, 12)]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_order_leaves_popular_items(db_session):
+    popularity.clear()
+
+    user = User(telegram_id=4002, first_name="Тест")
+    restaurant = Restaurant(
+        name="Пиццерия", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(0, 0), work_end=time(23, 59)
+    )
+    db_session.add_all([user, restaurant])
+    await db_session.flush()
+    items = [MenuItem(name=f"Пицца {i}", price=400.0, restaurant_id=restaurant.id) for i in range(2)]
+    db_session.add_all(items)
+    await db_session.commit()
+
+    service = OrderService(db_session)
+    orders = [
+        await service.create_order(user.id, OrderCreate(
+            restaurant_id=restaurant.id,
+            items=[OrderItemCreate(menu_item_id=menu_item.id, quantity=quantity)],
+            delivery_address="ул. Ленина, 25"
+        ))
+        for menu_item, quantity in ((items[0], 1), (items[1], 3))
+    ]
+    restaurants = RestaurantService(db_session)
+    assert [item.id for item in await restaurants.get_trending_items(restaurant.id)] == [items[1].id, items[0].id]
+
+    retracted = popularity.stats()["retracted_orders"]
+    assert await service.cancel_order(orders[1].id, user.id)
+
+    assert [item.id for item in await restaurants.get_popular_items(restaurant.id, limit=2)][0] == items[0].id
+    assert [item.id for item in await restaurants.get_trending_items(restaurant.id)] == [items[0].id]
+    assert popularity.stats()["retracted_orders"] == retracted + 1
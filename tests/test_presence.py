@@ -0,0 +1,73 @@
+"""
+Тесты отметок присутствия
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import event, select
+
+from app.models import Courier, User
+from app.services.presence import PresenceTracker, TimerWheel
+
+
+def test_timer_wheel_long_pause():
+    """После паузы длиннее колеса срабатывают все просроченные ключи ровно один раз"""
+    wheel = TimerWheel(slots=8)
+    wheel.advance(0)
+    for key in range(20):
+        wheel.schedule(key, key * 0.5 + 0.1)
+
+    assert wheel.advance(3) == [0, 1, 2, 3, 4, 5]
+    assert sorted(wheel.advance(1000)) == list(range(6, 20))
+    assert len(wheel) == 0
+
+
+def test_online_expires_without_scans():
+    """Курьер в сети, пока отметка моложе минуты; повторная отметка продлевает"""
+    tracker = PresenceTracker(Courier, "last_online", online_seconds=60)
+    tracker.heartbeat(1, now=1000)
+    tracker.heartbeat(2, now=1010)
+
+    assert sorted(tracker.online(now=1059)) == [1, 2]
+    assert tracker.online(now=1060.5) == [2]
+
+    tracker.heartbeat(2, now=1065)
+    assert tracker.online(now=1100) == [2]
+    assert tracker.online(now=1126) == []
+    assert tracker.stats()["expired"] == 2
+    assert tracker.stats()["timers"] == 0
+
+    # Срок внутри тика: сущность выходит из сети на границе следующего тика
+    tracker.heartbeat(3, now=1200.3)
+    assert tracker.online(now=1260.2) == [3]
+    assert tracker.online(now=1261) == []
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_once_and_keeps_newer_values(db_engine, db_session):
+    """Отметки пишутся одним пакетным UPDATE, более новое значение в БД не затирается"""
+    newer = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    users = [User(telegram_id=8000 + i, first_name=f"Пользователь {i}") for i in range(3)]
+    users[2].last_activity = newer
+    db_session.add_all(users)
+    await db_session.commit()
+
+    tracker = PresenceTracker(User, "last_activity")
+    seen = datetime(2026, 5, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+    for _ in range(100):
+        for user in users:
+            tracker.heartbeat(user.id, now=seen)
+
+    statements = []
+    event.listen(
+        db_engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    assert await tracker.flush(db_session) == 3
+    assert await tracker.flush(db_session) == 0
+    assert len(statements) == 1
+
+    rows = dict((await db_session.execute(select(User.id, User.last_activity))).all())
+    assert rows[users[0].id].replace(tzinfo=None) == datetime(2026, 5, 1, 12, 0)
+    assert rows[users[2].id].replace(tzinfo=None) == newer.replace(tzinfo=None)
@@ -0,0 +1,164 @@
+"""
+Тесты кэша HTTP-ответов каталога
+"""
+
+from datetime import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.api import restaurants
+from app.api.response_cache import ResponseCache, ResponseCacheMiddleware
+from app.core.database import get_db
+from app.models import MenuCategory, MenuItem, Restaurant
+from app.services.menu_cache import menu_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _restaurant(name):
+    return Restaurant(
+        name=name, address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(0, 0), work_end=time(23, 59)
+    )
+
+
+@pytest.fixture
+def catalog(db_engine):
+    """Приложение с роутером ресторанов, кэшем ответов и счетчиком сессий БД"""
+    factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    sessions = []
+
+    async def session():
+        sessions.append(1)
+        async with factory() as db:
+            yield db
+
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    app = FastAPI()
+    app.include_router(restaurants.router, prefix="/restaurants")
+    app.add_middleware(ResponseCacheMiddleware, cache=cache)
+    app.dependency_overrides[get_db] = session
+    menu_cache.clear()
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    return client, cache, sessions, clock
+
+
+@pytest.mark.asyncio
+async def test_menu_revalidates_with_304_until_menu_changes(catalog, db_session):
+    client, cache, sessions, _ = catalog
+    restaurant = _restaurant("Pizza Palace")
+    db_session.add(restaurant)
+    await db_session.flush()
+    category = MenuCategory(name="Пицца", restaurant_id=restaurant.id)
+    db_session.add(category)
+    await db_session.flush()
+    item = MenuItem(name="Маргарита", price=450.0, restaurant_id=restaurant.id, category_id=category.id)
+    db_session.add(item)
+    await db_session.commit()
+
+    url = f"/restaurants/{restaurant.id}/menu"
+    async with client:
+        first = await client.get(url)
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and first.headers["cache-control"] == "public, max-age=10"
+
+        second = await client.get(url)
+        not_modified = await client.get(url, headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert second.content == first.content and second.headers["etag"] == etag
+        assert not_modified.status_code == 304 and not_modified.content == b""
+        assert not_modified.headers["etag"] == etag
+        assert len(sessions) == 1  # Попадание и 304 не открывают сессию БД
+
+        # Параметры запроса - часть ключа
+        await client.get(f"/restaurants/{restaurant.id}/menu/items", params={"category_id": category.id})
+        await client.get(f"/restaurants/{restaurant.id}/menu/items", params={"category_id": category.id + 1})
+        assert len(sessions) == 3
+
+        item.price = 490.0
+        await db_session.commit()
+        changed = await client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+        assert changed.json()[0]["items"][0]["price"] == 490.0
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["not_modified"], stats["misses"]) == (1, 1, 4)
+    assert stats["hit_ratio"] == 0.333
+    assert stats["bytes_saved"] == len(first.content)
+
+
+@pytest.mark.asyncio
+async def test_change_in_other_worker_invalidates_response(catalog, db_session):
+    """Изменение, сделанное другим воркером, сбрасывает ответ после чтения общих версий"""
+    client, cache, sessions, _ = catalog
+    restaurant = _restaurant("Pizza Palace")
+    db_session.add(restaurant)
+    await db_session.flush()
+    db_session.add(MenuItem(name="Маргарита", price=450.0, restaurant_id=restaurant.id))
+    await db_session.commit()
+    await menu_cache.sync(db_session)
+
+    url = f"/restaurants/{restaurant.id}/menu/items"
+    async with client:
+        etag = (await client.get(url)).headers["etag"]
+
+        # Транзакция другого процесса: данные и общая версия, без событий этого процесса
+        await db_session.execute(text("UPDATE menu_items SET price = 490"))
+        await db_session.execute(text(
+            f"UPDATE cache_versions SET version = version + 1 WHERE key = 'menu:{restaurant.id}'"
+        ))
+        await db_session.commit()
+        assert (await client.get(url, headers={"If-None-Match": etag})).status_code == 304
+
+        await menu_cache.sync(db_session)
+        changed = await client.get(url, headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.json()[0]["price"] == 490.0
+
+
+@pytest.mark.asyncio
+async def test_catalog_version_ttl_and_errors(catalog, db_session):
+    client, cache, sessions, clock = catalog
+    db_session.add_all([_restaurant("А"), _restaurant("Б")])
+    await db_session.commit()
+
+    async with client:
+        first = await client.get("/restaurants/", params={"limit": 1})
+        cached = await client.get("/restaurants/", params={"limit": 1})
+        assert cached.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+        # Параметры, которых нет у эндпоинта, не дробят кэш
+        tagged = await client.get("/restaurants/", params={"limit": 1, "utm_source": "tg"})
+        assert tagged.content == first.content
+        assert len(sessions) == 1
+
+        assert len((await client.get("/restaurants/", params={"limit": 5})).json()) == 2
+        db_session.add(_restaurant("В"))  # Новый ресторан - новая версия каталога
+        await db_session.commit()
+        response = await client.get("/restaurants/", params={"limit": 5})
+        assert len(response.json()) == 3
+
+        # Ошибки не кэшируются
+        assert (await client.get("/restaurants/999")).status_code == 404
+        assert (await client.get("/restaurants/999")).status_code == 404
+        assert (await client.get("/restaurants/abc")).status_code == 422
+        assert len(sessions) == 6
+
+        # Популярное без версии живет ttl
+        restaurant_id = response.json()[0]["id"]
+        await client.get(f"/restaurants/{restaurant_id}/popular")
+        await client.get(f"/restaurants/{restaurant_id}/popular")
+        assert len(sessions) == 7
+        clock.now += 61
+        await client.get(f"/restaurants/{restaurant_id}/popular")
+        assert len(sessions) == 8
@@ -0,0 +1,115 @@
+"""
+Тесты полнотекстового поиска
+"""
+
+from datetime import time
+
+import pytest
+
+from app.models import MenuItem, Restaurant
+from app.services.restaurant_service import RestaurantService, menu_search_index, restaurant_search_index
+from app.services.search import SearchIndex, analyze, stem
+
+
+def test_russian_stemming():
+    """Словоформы приводятся к одной основе"""
+    assert stem("пицца") == stem("пиццы") == stem("пиццей")
+    assert stem("грибами") == stem("грибы")
+    assert stem("сырный") == stem("сырная") == stem("сырные")
+    assert analyze("Пицца с грибами и сыром") == [stem("пицца"), stem("грибы"), stem("сыр")]
+    assert analyze("Ёжик") == analyze("ежик")
+
+
+def test_index_ranking_typos_and_updates():
+    """Ранжирование, опечатки, префикс, группы и изменения после загрузки"""
+    index = SearchIndex(rebuild_threshold=2)
+    index.load([
+        (1, 10, "Пицца Маргарита", "Томатный соус, моцарелла", 4.5),
+        (2, 10, "Пицца с грибами", "Шампиньоны, сыр", 4.0),
+        (3, 11, "Бургер сырный", "Говядина, чеддер", 4.8),
+        (4, 11, "Салат Цезарь", "Курица, сухарики, пармезан", 4.1)
+    ])
+
+    # Совпадение всех слов важнее
+    assert [key for key, _ in index.search("пиццы с грибами")] == [2, 1]
+    # Опечатки и недописанное слово
+    assert [key for key, _ in index.search("маргорита")] == [1]
+    assert [key for key, _ in index.search("цезр")] == [4]
+    assert {key for key, _ in index.search("пиц")} == {1, 2}
+    # Совпадение в названии весит больше, чем в описании
+    assert [key for key, _ in index.search("сыр")][0] == 3
+    assert [key for key, _ in index.search("сыр", group=10)] == [2]
+
+    index.upsert(5, 12, "Грибной суп", None, 1.0)
+    index.upsert(1, 10, "Пицца Пепперони", "Колбаса", 4.5)
+    index.remove(3)
+    assert index.search("маргарита") == []
+    assert [key for key, _ in index.search("пепперони")] == [1]
+    assert {key for key, _ in index.search("грибной")} == {2, 5}
+    assert [key for key, _ in index.search("бургер")] == []
+    assert len(index) == 4
+
+    # Слияние сегментов не меняет выдачу
+    before = index.search("пицца гриб")
+    index._merge()
+    assert [key for key, _ in index.search("пицца гриб")] == [key for key, _ in before]
+
+
+def test_background_load_keeps_concurrent_changes():
+    """Правки во время сборки в другом экземпляре применяются к собранному индексу"""
+    index = SearchIndex()
+    index.begin_load()
+    assert index.loading and not index.loaded
+
+    built = SearchIndex()
+    built.load([(1, 10, "Пицца Маргарита", None, 4.5), (2, 10, "Салат Цезарь", None, 4.1)])
+    index.upsert(1, 10, "Пицца Пепперони", None, 4.5)
+    index.upsert(3, 11, "Грибной суп", None, 1.0)
+    index.remove(2)
+    index.finish_load(built)
+
+    assert index.loaded and not index.loading
+    assert index.search("маргарита") == [] and index.search("цезарь") == []
+    assert {key for key, _ in index.search("пепперони суп")} == {1, 3}
+
+
+@pytest.mark.asyncio
+async def test_service_search(db_session):
+    """Поиск в сервисе: рестораны, блюда ресторана и общий поиск"""
+    restaurant_search_index.clear()
+    menu_search_index.clear()
+
+    pizzeria = Restaurant(
+        name="Пиццерия Додо", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0), rating=4.7
+    )
+    closed = Restaurant(
+        name="Пиццерия Закрытая", address="ул. Мира, 1", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0), is_active=False
+    )
+    db_session.add_all([pizzeria, closed])
+    await db_session.flush()
+
+    margherita = MenuItem(name="Маргарита", description="Пицца с томатами", price=450.0, restaurant_id=pizzeria.id)
+    mushrooms = MenuItem(name="Грибная пицца", price=500.0, restaurant_id=pizzeria.id)
+    hidden = MenuItem(name="Пицца дня", price=300.0, restaurant_id=closed.id)
+    db_session.add_all([margherita, mushrooms, hidden])
+    await db_session.commit()
+
+    service = RestaurantService(db_session)
+    assert [restaurant.id for restaurant in await service.get_restaurants(search="пицерия")] == [pizzeria.id]
+
+    items = await service.get_menu_items(pizzeria.id, search="пиццы")
+    assert [item.id for item in items] == [mushrooms.id, margherita.id]
+
+    # Индекс подхватывает изменения после загрузки
+    margherita.name = "Маргарита с базиликом"
+    await db_session.commit()
+    assert [item.id for item in await service.get_menu_items(pizzeria.id, search="базилик")] == [margherita.id]
+
+    found = await service.search("пицца")
+    assert [restaurant.id for restaurant in found["restaurants"]] == [pizzeria.id]
+    assert {item.id for item in found["items"]} == {margherita.id, mushrooms.id}
+
+    with pytest.raises(ValueError):
+        await service.get_restaurants(search="пицца", cursor="abc")
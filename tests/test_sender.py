@@ -0,0 +1,196 @@
+"""
+Тесты планировщика отправки на локальном подобии Bot API
+"""
+
+import asyncio
+import json
+import time
+from urllib.parse import parse_qsl
+
+import pytest
+import pytest_asyncio
+from telegram.ext import ExtBot
+
+from app.bot.sender import SendPriority, SendScheduler
+
+TOKEN = "123456:TEST"
+
+
+class FakeBotApi:
+    """HTTP-сервер с ответами Bot API; запоминает вызовы и умеет отвечать 429"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.rate_limited = 0
+        self._server = None
+        self._message_id = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/bot"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def sent(self, method):
+        return [params for name, params, _ in self.calls if name == method]
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Test", "username": "test_bot"}
+        if method == "sendMessage":
+            self._message_id += 1
+            return {
+                "message_id": self._message_id,
+                "date": 0,
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params["text"]
+            }
+        return True
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                lines = head.decode().split("\r\n")
+                path = lines[0].split()[1]
+                headers = dict(line.split(": ", 1) for line in lines[1:] if line)
+                body = await reader.readexactly(int(headers.get("Content-Length", 0)))
+
+                method = path.rsplit("/", 1)[1]
+                params = {key: json.loads(value) if value[:1] in "{[" else value
+                          for key, value in parse_qsl(body.decode())}
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+
+                if self.rate_limited:
+                    self.rate_limited -= 1
+                    self.calls.append((method + ":429", params, time.monotonic()))
+                    status, payload = 429, {
+                        "ok": False, "error_code": 429,
+                        "description": "Too Many Requests: retry after 1",
+                        "parameters": {"retry_after": 1}
+                    }
+                else:
+                    self.calls.append((method, params, time.monotonic()))
+                    status, payload = 200, {"ok": True, "result": self._result(method, params)}
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def bot_api():
+    """Подобие Bot API и фабрика ботов с заданным планировщиком"""
+    api = FakeBotApi()
+    base_url = await api.start()
+    bots = []
+
+    async def make_bot(scheduler):
+        bot = ExtBot(TOKEN, base_url=base_url, rate_limiter=scheduler)
+        await bot.initialize()
+        bots.append(bot)
+        return bot
+
+    yield api, make_bot
+
+    for bot in bots:
+        await bot.shutdown()
+    await api.stop()
+
+
+@pytest.mark.asyncio
+async def test_chat_pacing_keeps_order_within_limits(bot_api):
+    """Сообщения одного чата идут по порядку и не чаще лимита чата"""
+    api, make_bot = bot_api
+    scheduler = SendScheduler(global_rate=200, chat_rate=20, chat_burst=1)
+    bot = await make_bot(scheduler)
+
+    await asyncio.gather(*(bot.send_message(1, f"m{i}") for i in range(6)),
+                         *(bot.send_message(100 + i, "other") for i in range(6)))
+
+    own = [(params["text"], at) for name, params, at in api.calls
+           if name == "sendMessage" and params["chat_id"] == "1"]
+    assert [text for text, _ in own] == [f"m{i}" for i in range(6)]
+    gaps = [later - earlier for (_, earlier), (_, later) in zip(own, own[1:])]
+    assert min(gaps) >= 0.04
+    assert scheduler.stats()["sent"] == 12
+
+
+@pytest.mark.asyncio
+async def test_pending_edits_are_coalesced(bot_api):
+    """Правки сообщения, ждущие своей очереди, уходят одной - последней"""
+    api, make_bot = bot_api
+    scheduler = SendScheduler(chat_rate=5, chat_burst=1)
+    bot = await make_bot(scheduler)
+
+    message = await bot.send_message(7, "Заказ принят")
+    results = await asyncio.gather(*(
+        bot.edit_message_text(f"Статус {i}", chat_id=7, message_id=message.message_id)
+        for i in range(5)
+    ))
+
+    assert [params["text"] for params in api.sent("editMessageText")] == ["Статус 4"]
+    assert all(result is results[0] for result in results)
+    assert scheduler.stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_priority_does_not_reorder_chat(bot_api):
+    """Срочный запрос поднимает свой чат, но не обгоняет сообщения того же чата"""
+    api, make_bot = bot_api
+    scheduler = SendScheduler(chat_rate=20, chat_burst=1)
+    bot = await make_bot(scheduler)
+
+    message = await bot.send_message(8, "Заказ принят")
+
+    def edit(text):
+        return bot.edit_message_text(text, chat_id=8, message_id=message.message_id)
+
+    await asyncio.gather(
+        bot.send_message(8, "Акция", rate_limit_args=SendPriority.MARKETING),
+        edit("Готовится"),
+        bot.send_message(8, "Ответ"),
+        edit("Курьер в пути"),
+    )
+
+    texts = [params["text"] for name, params, _ in api.calls if name in ("sendMessage", "editMessageText")]
+    # Слитая правка уходит на месте последней
+    assert texts == ["Заказ принят", "Акция", "Ответ", "Курьер в пути"]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_429_and_priority(bot_api):
+    """После 429 запрос повторяется, а уведомление о заказе обходит рассылку"""
+    api, make_bot = bot_api
+    scheduler = SendScheduler(global_rate=20, global_burst=1)
+    bot = await make_bot(scheduler)
+
+    api.rate_limited = 1
+    started = time.monotonic()
+    marketing = [
+        asyncio.create_task(bot.send_message(200 + i, "Акция", rate_limit_args=SendPriority.MARKETING))
+        for i in range(12)
+    ]
+    await asyncio.sleep(0.02)
+    status = await bot.send_message(5, "Курьер в пути", rate_limit_args=SendPriority.STATUS)
+    await asyncio.gather(*marketing)
+
+    assert status.text == "Курьер в пути"
+    assert time.monotonic() - started >= 1
+    texts = [params["text"] for params in api.sent("sendMessage")]
+    assert texts.index("Курьер в пути") == 0
+    assert texts.count("Акция") == 12
+    stats = scheduler.stats()
+    assert stats["retries"] == 1 and stats["failed"] == 0 and stats["queued"] == 0
@@ -0,0 +1,103 @@
+"""
+Тесты проверки данных авторизации Telegram
+"""
+
+import hashlib
+import hmac
+import json
+from urllib.parse import unquote_plus, urlencode
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import deps
+from app.services.telegram_auth import TelegramAuthValidator, unquote_value
+
+BOT_TOKEN = "123456:TEST-TOKEN"
+NOW = 1_700_000_000
+
+
+def make_init_data(fields, bot_token=BOT_TOKEN):
+    """initData так, как его подписывает Telegram"""
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    signature = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": signature})
+
+
+def make_login(fields, bot_token=BOT_TOKEN):
+    """Данные Login Widget так, как их подписывает Telegram"""
+    secret = hashlib.sha256(bot_token.encode()).digest()
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    return {**fields, "hash": hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()}
+
+
+USER = {"id": 42, "first_name": "Иван", "username": "ivan"}
+
+
+def test_init_data_valid_cached_and_expiring():
+    """Подлинные initData принимаются, повтор - из кэша, устаревшие - отвергаются"""
+    clock = [NOW + 10]
+    validator = TelegramAuthValidator(BOT_TOKEN, max_age=3600, clock=lambda: clock[0])
+    init_data = make_init_data({
+        "query_id": "AAF", "user": json.dumps(USER, ensure_ascii=False), "auth_date": str(NOW)
+    })
+
+    data = validator.validate_init_data(init_data)
+    assert data["user"] == USER and data["auth_date"] == NOW and data["query_id"] == "AAF"
+    data["user"]["id"] = 1  # Правка полученной копии не меняет кэш
+    cached = validator.validate_init_data(init_data)
+    assert cached["user"] == USER and cached is not data
+    assert validator.stats()["hits"] == 1
+
+    clock[0] = NOW + 3601
+    assert validator.validate_init_data(init_data) is None
+    assert validator.stats()["cached"] == 0
+
+
+def test_init_data_forgeries_rejected():
+    validator = TelegramAuthValidator(BOT_TOKEN, clock=lambda: NOW)
+    fields = {"user": json.dumps(USER), "auth_date": str(NOW)}
+    valid = make_init_data(fields)
+    assert validator.validate_init_data(valid) is not None
+
+    signature = valid.rsplit("hash=", 1)[1]
+    forged_user = urlencode({"user": json.dumps({**USER, "id": 1}), "auth_date": str(NOW), "hash": signature})
+
+    assert validator.validate_init_data(forged_user) is None
+    assert validator.validate_init_data(make_init_data(fields, bot_token="other:TOKEN")) is None
+    assert validator.validate_init_data(make_init_data({"user": json.dumps(USER)})) is None
+    assert validator.validate_init_data(urlencode(fields)) is None
+    assert validator.stats()["rejected"] == 4
+
+
+def test_login_widget_skips_absent_fields():
+    """Поля, которых не было в виджете (None), не входят в строку проверки"""
+    validator = TelegramAuthValidator(BOT_TOKEN, clock=lambda: NOW)
+    fields = make_login({"id": 42, "first_name": "Иван", "auth_date": NOW})
+
+    assert validator.validate_login(fields)["id"] == 42
+    assert "hash" in fields  # словарь вызывающего не меняется
+    assert validator.validate_login({**fields, "last_name": None, "username": None})["id"] == 42
+    assert validator.validate_login({**fields, "first_name": "Пётр"}) is None
+
+
+@pytest.mark.asyncio
+async def test_webapp_dependency(monkeypatch):
+    """Зависимость принимает initData из заголовка Authorization: tma ..."""
+    monkeypatch.setattr(deps, "telegram_auth_validator", TelegramAuthValidator(BOT_TOKEN, clock=lambda: NOW))
+    init_data = make_init_data({"user": json.dumps(USER), "auth_date": str(NOW)})
+
+    data = await deps.get_telegram_init_data(authorization=f"tma {init_data}", x_telegram_init_data=None)
+    assert data["user"]["id"] == 42
+
+    with pytest.raises(HTTPException) as error:
+        await deps.get_telegram_init_data(authorization="Bearer x", x_telegram_init_data=None)
+    assert error.value.status_code == 401
+
+
+@pytest.mark.parametrize("value", [
+    "plain", "a+b", "%D0%98%D0%B2%D0%B0%D0%BD", "%7B%22id%22%3A1%7D", "%zz", "50%", "%FF%FE", "a\\b%20", "Ив%20ан"
+])
+def test_unquote_value_matches_stdlib(value):
+    assert unquote_value(value) == unquote_plus(value)
@@ -0,0 +1,93 @@
+"""
+Тесты проверки токенов доступа
+"""
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+from app.api.deps import get_current_user_id, get_stream_user_id
+from app.services.tokens import TokenVerifier, token_verifier
+
+SECRET = "test-secret"
+
+
+def _token(claims, secret=SECRET, algorithm="HS256"):
+    return jwt.encode({"type": "access", **claims}, secret, algorithm=algorithm)
+
+
+@pytest.mark.parametrize("backend", ["jose", "native"])
+def test_verify_and_cache_until_exp(backend):
+    """Токен проверяется один раз и действует из кэша до exp"""
+    # exp в будущем и для python-jose, который сверяет его с реальным временем
+    clock = [3_999_999_000.0]
+    verifier = TokenVerifier(SECRET, backend=backend, max_entries=2, clock=lambda: clock[0])
+    token = _token({"sub": "42", "exp": 4_000_000_000})
+
+    assert verifier.verify(token) == 42
+    assert verifier.verify(token) == 42
+    assert (verifier.misses, verifier.hits) == (1, 1)
+
+    clock[0] = 4_000_000_000.0
+    assert verifier.verify(token) is None
+    assert verifier.stats()["expired"] == 1
+
+
+@pytest.mark.parametrize("backend", ["jose", "native"])
+def test_rejects_forged_tokens(backend):
+    """Чужая подпись, другой алгоритм, refresh-токен и мусор не проходят и не кэшируются"""
+    verifier = TokenVerifier(SECRET, backend=backend)
+    forged = [
+        _token({"sub": "1"}, secret="other-secret"),
+        _token({"sub": "1"}, algorithm="HS512"),
+        jwt.encode({"sub": "1", "type": "refresh"}, SECRET, algorithm="HS256"),
+        _token({"sub": "1", "exp": 1}),
+        _token({"sub": "not-a-number"}),
+        "not.a.token",
+        ""
+    ]
+    valid = _token({"sub": "1"})
+    forged.append(valid[:-2] + ("AA" if not valid.endswith("AA") else "BB"))
+
+    assert [verifier.verify(token) for token in forged] == [None] * len(forged)
+    assert verifier.stats()["cached"] == 0
+
+
+def test_lru_is_bounded():
+    verifier = TokenVerifier(SECRET, backend="native", max_entries=2)
+    tokens = [_token({"sub": str(user_id)}) for user_id in range(3)]
+    for token in tokens:
+        verifier.verify(token)
+    verifier.verify(tokens[0])
+
+    assert verifier.stats()["cached"] == 2 and verifier.evictions == 2
+
+
+@pytest.mark.asyncio
+async def test_dependency_attaches_user_without_db():
+    """Зависимость отдает user_id из токена, без токена - 401"""
+    token = jwt.encode(
+        {"sub": "7", "type": "access"}, token_verifier.secret, algorithm=token_verifier.algorithm
+    )
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    assert await get_current_user_id(credentials) == 7
+
+    with pytest.raises(HTTPException) as error:
+        await get_current_user_id(None)
+    assert error.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stream_dependency_accepts_query_token():
+    """Для EventSource токен принимается и из ?token="""
+    token = jwt.encode(
+        {"sub": "7", "type": "access"}, token_verifier.secret, algorithm=token_verifier.algorithm
+    )
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    assert await get_stream_user_id(credentials, None) == 7
+    assert await get_stream_user_id(None, token) == 7
+
+    with pytest.raises(HTTPException) as error:
+        await get_stream_user_id(None, None)
+    assert error.value.status_code == 401
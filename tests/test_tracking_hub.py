@@ -0,0 +1,44 @@
+﻿"""
+Тесты хаба push-обновлений заказов
+"""
+
+import json
+
+import pytest
+
+from app.services.tracking_hub import TrackingHub
+
+
+@pytest.mark.asyncio
+async def test_publish_sends_only_changed_fields():
+    """Подписчик получает снимок, затем только изменившиеся поля"""
+    hub = TrackingHub()
+    subscription = hub.subscribe(1, {"status": "pending", "courier": None})
+    
+    assert json.loads(hub.snapshot_message(1))["data"]["status"] == "pending"
+    
+    assert hub.publish(1, {"status": "pending"}) == 0
+    assert hub.publish(1, {"status": "confirmed", "courier": None}) == 1
+    
+    message = json.loads(await subscription.get(timeout=0.1))
+    assert message == {"type": "diff", "order_id": 1, "seq": 1, "changes": {"status": "confirmed"}}
+    assert await subscription.get(timeout=0.01) is None
+    
+    hub.unsubscribe(subscription)
+    assert hub.publish(1, {"status": "preparing"}) == 0
+    assert hub.stats()["orders"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_snapshot():
+    """При переполнении очереди накопленные diff заменяются полным снимком"""
+    hub = TrackingHub(queue_size=2)
+    subscription = hub.subscribe(1, {"position": 0})
+    
+    for position in range(1, 6):
+        hub.publish(1, {"position": position})
+    
+    messages = [json.loads(await subscription.get(timeout=0.1)) for _ in range(subscription.queue.qsize())]
+    assert messages[0]["type"] == "snapshot"
+    assert messages[-1].get("changes", messages[-1].get("data"))["position"] == 5
+    assert hub.stats()["resyncs"] >= 1
@@ -0,0 +1,137 @@
+"""
+Тесты загрузки изображений
+"""
+
+import io
+import json
+import os
+from datetime import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.api import restaurants
+from app.api.deps import get_current_user_id
+from app.core.config import settings
+from app.core.database import get_db
+from app.models import MenuCategory, MenuItem, Restaurant, User, UserRole
+from app.services.restaurant_service import RestaurantService
+from app.services.uploads import ImagePipeline, UploadTooLarge
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGBA", (width, height), (200, 30, 30, 128)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+async def _chunks(data, size=1000):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    return ImagePipeline(workers=1, max_size=200_000)
+
+
+@pytest.mark.asyncio
+async def test_variants_are_resized_and_content_addressed(pipeline, tmp_path):
+    data = _png(2000, 1500)
+    try:
+        variants = await pipeline.process(_chunks(data), len(data))
+        again = await pipeline.process(_chunks(data))
+
+        with pytest.raises(UploadTooLarge):
+            await pipeline.process(_chunks(b"x" * 300_000))
+        with pytest.raises(UploadTooLarge):
+            await pipeline.process(_chunks(b""), content_length=300_000)
+        with pytest.raises(ValueError):
+            await pipeline.process(_chunks(b"not an image"))
+    finally:
+        await pipeline.stop()
+
+    assert again == variants  # Те же файлы и URL
+    sizes = {name: (variant["width"], variant["height"]) for name, variant in variants.items()}
+    assert sizes == {"large": (1280, 960), "medium": (640, 480), "thumb": (160, 120)}
+
+    url = variants["thumb"]["webp"]
+    assert url.startswith("/uploads/images/") and url.endswith(".webp")
+    with Image.open(os.path.join(tmp_path, url[len("/uploads/"):])) as image:
+        assert (image.format, image.size) == ("WEBP", (160, 120))
+
+    assert os.listdir(tmp_path / "tmp") == []  # Временные файлы удалены и после ошибок
+    stats = pipeline.stats()
+    assert (stats["processed"], stats["too_large"], stats["invalid"]) == (2, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_item_image_upload_endpoint(pipeline, db_engine, db_session, monkeypatch):
+    monkeypatch.setattr(restaurants, "image_pipeline", pipeline)
+    factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    restaurant = Restaurant(
+        name="Pizza Palace", address="ул. Пушкина, 10", latitude=55.75, longitude=37.62,
+        work_start=time(9, 0), work_end=time(23, 0)
+    )
+    client_user = User(telegram_id=1, role=UserRole.CLIENT)
+    staff_user = User(telegram_id=2, role=UserRole.RESTAURANT)
+    admin_user = User(telegram_id=3, role=UserRole.ADMIN)
+    db_session.add_all([restaurant, client_user, staff_user, admin_user])
+    await db_session.flush()
+    category = MenuCategory(name="Пицца", restaurant_id=restaurant.id)
+    db_session.add(category)
+    await db_session.flush()
+    item = MenuItem(name="Маргарита", price=450.0, restaurant_id=restaurant.id, category_id=category.id)
+    db_session.add(item)
+    await db_session.commit()
+
+    async def session():
+        async with factory() as db:
+            yield db
+
+    current_user = client_user.id
+    app = FastAPI()
+    app.include_router(restaurants.router, prefix="/restaurants")
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_current_user_id] = lambda: current_user
+
+    url = f"/restaurants/{restaurant.id}/menu/items/{item.id}/image"
+    data = _png(800, 600)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.put(url, content=data, headers={"Content-Type": "image/png"})
+            assert response.status_code == 403
+
+            # Сотрудник ресторана не привязан к ресторану - загрузка только администратору
+            current_user = staff_user.id
+            response = await client.put(url, content=data, headers={"Content-Type": "image/png"})
+            assert response.status_code == 403
+
+            current_user = admin_user.id
+            response = await client.put(url, content=data, headers={"Content-Type": "text/plain"})
+            assert response.status_code == 415
+            response = await client.put(url, content=b"x" * 300_000, headers={"Content-Type": "image/png"})
+            assert response.status_code == 413
+            response = await client.put(
+                f"/restaurants/{restaurant.id}/menu/items/{item.id + 1}/image",
+                content=data, headers={"Content-Type": "image/png"}
+            )
+            assert response.status_code == 404
+
+            response = await client.put(url, content=data, headers={"Content-Type": "image/png"})
+            assert response.status_code == 200
+            body = response.json()
+    finally:
+        await pipeline.stop()
+
+    assert body["image_url"] == body["image_variants"]["large"]["jpg"]
+    assert body["image_variants"]["large"]["width"] == 800  # Не увеличивается
+
+    menu = json.loads(await RestaurantService(db_session).get_menu_snapshot(restaurant.id))
+    assert menu[0]["items"][0]["image_variants"] == body["image_variants"]
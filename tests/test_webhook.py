@@ -0,0 +1,105 @@
+"""
+Тесты приема обновлений через webhook
+"""
+
+import asyncio
+import random
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from telegram import Update
+
+from app.bot import webhook
+from app.bot.webhook import UpdateDispatcher, router
+
+
+def message_update(update_id, chat_id, text="/start"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Иван"},
+            "text": text
+        }
+    }
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_chat_are_processed_in_order():
+    """Разные чаты обрабатываются параллельно, обновления одного чата - по порядку"""
+    processed = []
+    running = 0
+    max_running = 0
+
+    async def handler(update):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(random.uniform(0, 0.005))
+        processed.append((update.effective_chat.id, update.update_id))
+        running -= 1
+
+    dispatcher = UpdateDispatcher(workers=8, max_pending=100)
+    dispatcher.start(handler)
+    for update_id in range(60):
+        assert await dispatcher.submit(Update.de_json(message_update(update_id, update_id % 4), None))
+    await dispatcher.stop()
+
+    for chat_id in range(4):
+        ids = [update_id for chat, update_id in processed if chat == chat_id]
+        assert ids == sorted(ids) and len(ids) == 15
+    assert max_running == 4  # Не больше одного обновления на чат одновременно
+    assert dispatcher.stats()["processed"] == 60
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    release = asyncio.Event()
+
+    async def handler(update):
+        await release.wait()
+
+    dispatcher = UpdateDispatcher(workers=2, max_pending=3, submit_timeout=0.05)
+    dispatcher.start(handler)
+    results = [await dispatcher.submit(Update.de_json(message_update(i, i), None)) for i in range(4)]
+
+    assert results == [True, True, True, False]
+    assert dispatcher.stats()["rejected"] == 1
+    release.set()
+    await dispatcher.stop()
+    assert dispatcher.stats()["processed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_webhook_endpoint_checks_secret_before_parsing(monkeypatch):
+    received = []
+
+    async def handler(update):
+        received.append(update.update_id)
+
+    dispatcher = UpdateDispatcher(workers=2)
+    monkeypatch.setattr(webhook, "update_dispatcher", dispatcher)
+    app = FastAPI()
+    app.include_router(router)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/webhook", json=message_update(1, 42))
+        assert response.status_code == 404  # Бот не в webhook режиме
+
+        dispatcher.start(handler)
+        response = await client.post(
+            "/webhook", content=b"not json", headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"}
+        )
+        assert response.status_code == 403
+
+        headers = {"X-Telegram-Bot-Api-Secret-Token": dispatcher.secret}
+        response = await client.post("/webhook", content=b"not json", headers=headers)
+        assert response.status_code == 400
+        response = await client.post("/webhook", json=message_update(2, 42), headers=headers)
+        assert response.status_code == 200
+
+    await dispatcher.stop()
+    assert received == [2]